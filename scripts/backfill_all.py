@@ -11,6 +11,7 @@ try:
 except Exception:
     pass
 
+from sms.datastore import iter_records
 from sms.tables import get_table as _get_table
 
 DRY_RUN = os.getenv("DRY_RUN", "false").lower() == "true"
@@ -91,7 +92,7 @@ def build_leads_phone_map() -> Dict[str, str]:
     if not tbl:
         return mapping
     try:
-        for r in tbl.all():
+        for r in iter_records(tbl, fields=["Record ID", *LEAD_PHONE_FIELDS]):
             f = r.get("fields", {})
             rid = f.get("Record ID")
             if not rid:
@@ -124,7 +125,7 @@ def build_leads_leadid_map() -> Tuple[Dict[str, str], set[str], set[int]]:
         print("⚠️  Leads table unavailable")
         return mapping_str, id_str_set, id_int_set
     try:
-        for r in tbl.all():
+        for r in iter_records(tbl, fields=["Record ID", "Lead ID"]):
             f = r.get("fields", {})
             rid = f.get("Record ID")
             lead_id_val = f.get("Lead ID")
@@ -190,13 +191,8 @@ def conversations_to_leads() -> Tuple[int, int, int]:
     lead_map_leadid, lead_ids_str, lead_ids_int = build_leads_leadid_map()
 
     linked = already = scanned = phone_hits = id_hits = auto_id_hits = 0
-    try:
-        rows = conv_tbl.all()
-    except Exception as e:
-        print(f"⚠️  Conversations read error: {e}")
-        return (0, 0, 0)
-
-    for c in rows:
+    # Streamed (auto-discover below needs every column); the next page downloads while this one links
+    for c in iter_records(conv_tbl, prefetch=True):
         scanned += 1
         f = c.get("fields", {})
         if f.get("Lead"):
@@ -301,7 +297,7 @@ def conversations_to_templates() -> Tuple[int, int]:
     TEMPLATE_BODY_FIELDS = ["Message", "Body", "Text", "Content"]  # your Templates use 'Message'
     tmpl_map: Dict[str, str] = {}
     try:
-        for r in tmpl_tbl.all():
+        for r in iter_records(tmpl_tbl, fields=["Record ID", *TEMPLATE_BODY_FIELDS]):
             f = r.get("fields", {})
             rid = f.get("Record ID")
             if not rid:
@@ -320,12 +316,7 @@ def conversations_to_templates() -> Tuple[int, int]:
     # a body/message column exists in Conversations.
     BODY_FIELDS_GUESS = ["Body", "body", "Message", "text", "message"]
     linked = scanned = 0
-    try:
-        convs = conv_tbl.all()
-    except Exception as e:
-        print(f"⚠️  Conversations read error: {e}")
-        return (0, 0)
-
+    convs = iter_records(conv_tbl, fields=["direction", "Direction", "Template", *BODY_FIELDS_GUESS], prefetch=True)
     for c in convs:
         scanned += 1
         f = c.get("fields", {})
@@ -364,7 +355,7 @@ def conversations_to_prospects() -> Tuple[int, int]:
     PROSPECT_PHONE_FIELDS = ["phone", "Phone", "Phone (Raw)", "Phone E164", "Primary Phone", "Mobile"]
     pros_map: Dict[str, str] = {}
     try:
-        for r in pros_tbl.all():
+        for r in iter_records(pros_tbl, fields=["Record ID", *PROSPECT_PHONE_FIELDS]):
             f = r.get("fields", {})
             rid = f.get("Record ID")
             if not rid:
@@ -382,12 +373,8 @@ def conversations_to_prospects() -> Tuple[int, int]:
         return (0, 0)
 
     linked = scanned = 0
-    try:
-        convs = conv_tbl.all()
-    except Exception as e:
-        print(f"⚠️  Conversations read error: {e}")
-        return (0, 0)
-    for c in convs:
+    conv_columns = ["Prospect", *CONV_DIRECTION_FIELDS, *CONV_TO_FIELDS, *CONV_FROM_FIELDS]
+    for c in iter_records(conv_tbl, fields=conv_columns, prefetch=True):
         scanned += 1  # link if we can match phone
         f = c.get("fields", {})
         if f.get("Prospect"):
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the shared intent engine (sms.intent).
+
+Runs a corpus of real-shaped seller replies through:
+  • scan       — one compiled pass per reply (classify_many, cache bypassed)
+  • linear     — the per-list `any(p in text)` scans the engine replaced, over the same lexicon
+  • consumers  — the full per-reply path: inbound stage/opt-out, autoresponder base intent,
+                 price / condition / timeline extraction
+
+Prints per-message latency and messages/sec for each, so throughput can be tracked over time.
+Offline: touches no Airtable / TextGrid.
+
+Usage:
+  python -m scripts.bench_intent
+  python -m scripts.bench_intent --repeat 50 --rounds 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+from typing import Callable, List
+
+CORPUS: List[str] = [
+    "Yes",
+    "yes this is me",
+    "Who is this?",
+    "who dis",
+    "How did you get my number??",
+    "STOP",
+    "Stop texting me",
+    "stopall",
+    "please remove me from your list",
+    "Unsubscribe",
+    "Wrong number",
+    "wrong number buddy",
+    "Not mine, sorry",
+    "I sold that house 2 years ago",
+    "I'm not the owner, my mom is",
+    "No longer own it",
+    "No",
+    "nope",
+    "Not interested",
+    "not selling, keeping it for my kids",
+    "We're holding for now, maybe next year",
+    "What's your offer?",
+    "what can you offer me",
+    "How much are you offering?",
+    "Depends on the price",
+    "I'd take 250k",
+    "Asking $245,000 firm",
+    "around 180k, it needs a new roof",
+    "asking price is 275000",
+    "$1.2M",
+    "Maybe. What's the number you have in mind?",
+    "Roof is 3 years old, kitchen is original, hvac needs work",
+    "It's vacant, needs some repairs but it's livable",
+    "Tenant occupied until March, lease is month to month",
+    "House is in great condition, fully renovated in 2019",
+    "Needs a new foundation and plumbing",
+    "We need to sell by the end of the month because of a divorce",
+    "Moving out of state for a job transfer in 2 months",
+    "Behind on payments, foreclosure date is coming up",
+    "Inherited it from my dad, estate is in probate",
+    "Call me later, busy at work",
+    "Can you call me tomorrow at 3?",
+    "Let's talk. When can we meet?",
+    "Sounds good, send me the paperwork",
+    "Already under contract, sorry",
+    "we signed with an agent last week",
+    "This is a scam",
+    "Lose my number",
+    "lol",
+    "ok",
+    "👍",
+    "Idk, thinking about it",
+    "Not sure yet, depends on my wife",
+    "Who's this and why do you have my number",
+    "Yeah I'd consider selling if the price is right. 3 bed 2 bath, 1,450 sq ft",
+    "nah",
+    "I am the owner. It's a duplex, both units rented. What's your cash offer?",
+    "Text me at 312-555-0123 instead",
+    "Sure, the best time is after 5pm on weekdays",
+    "Yes it's for sale. Roof was replaced last year, needs paint and carpet. Want to close in 30 days.",
+]
+
+
+def _timeit(fn: Callable[[List[str]], object], bodies: List[str], rounds: int) -> float:
+    """Best-of-rounds wall time (seconds) for one call over `bodies`."""
+    best = float("inf")
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn(bodies)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Intent engine throughput benchmark")
+    ap.add_argument("--repeat", type=int, default=20, help="corpus copies per round")
+    ap.add_argument("--rounds", type=int, default=5, help="timed rounds (best is reported)")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    from sms import intent
+    from sms.autoresponder import _base_intent
+    from sms.inbound_webhook import (
+        _classify_message,
+        _extract_condition_info,
+        _extract_price_from_message,
+        _extract_timeline_motivation,
+        _is_opt_out,
+    )
+    import_s = time.perf_counter() - t0
+
+    # Distinct strings per copy so classify()'s cache doesn't turn the benchmark into dict lookups
+    bodies = [f"{body} " + " " * (i % 7) for i in range(args.repeat) for body in CORPUS]
+    lists = [(category, tuple(intent._phrase_key(p) for p in phrases)) for category, (phrases, _b) in intent.LEXICON.items()]
+
+    def scan(batch: List[str]) -> object:
+        return [intent.MATCHER.match(intent.normalize(b)) for b in batch]
+
+    def linear(batch: List[str]) -> object:
+        out = []
+        for b in batch:
+            text = intent.normalize(b)
+            out.append({category for category, phrases in lists if any(p in text for p in phrases)})
+        return out
+
+    def consumers(batch: List[str]) -> object:
+        intent.classify.cache_clear()
+        for b in batch:
+            _classify_message(b)
+            _is_opt_out(b)
+            _base_intent(b)
+            _extract_price_from_message(b)
+            _extract_condition_info(b)
+            _extract_timeline_motivation(b)
+        return None
+
+    print(f"corpus={len(CORPUS)} replies × {args.repeat} = {len(bodies)} messages | "
+          f"phrases={len(intent.MATCHER.vocabulary)} categories={len(intent.LEXICON)} | import={import_s:.3f}s")
+    for name, fn in (("scan", scan), ("linear", linear), ("consumers", consumers)):
+        seconds = _timeit(fn, bodies, args.rounds)
+        per_msg_us = seconds / len(bodies) * 1e6
+        print(f"{name:>10}: {per_msg_us:8.2f} µs/msg  {len(bodies) / seconds:>10,.0f} msg/s")
+
+    # Sanity: the engine and the linear scan agree on substring categories
+    bounded = {c for c, (_p, b) in intent.LEXICON.items() if b}
+    mismatches = [
+        b for b, (cats, _ph), lin in zip(bodies, scan(bodies), linear(bodies)) if (set(cats) - bounded) != (lin - bounded)
+    ]
+    print(f"category parity (substring lexicons): {len(bodies) - len(mismatches)}/{len(bodies)}")
+    if mismatches:
+        print("  e.g.", statistics.mode(mismatches)[:80])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the template engine (sms.template_engine).
+
+Renders N messages (default 100k) from real-shaped campaign / autoresponder templates through:
+  • legacy      — what the callers did per message: alias `str.replace`s + `str.format` (autoresponder)
+                  or the `{First}/{Address}/{Property City}` replace chain (campaign queueing)
+  • compiled    — TEMPLATE_CACHE lookup by template id + Template.render() per message (autoresponder)
+  • render      — Template.render() per message on an already-resolved template
+  • render_many — one vectorized pass per template (bulk campaign queueing)
+
+Prints per-message latency and messages/sec for each, plus an output parity check.
+Offline: touches no Airtable / TextGrid.
+
+Usage:
+  python -m scripts.bench_templates
+  python -m scripts.bench_templates --messages 250000 --rounds 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Callable, Dict, List, Tuple
+
+TEMPLATES: List[str] = [
+    "Hi {First}, this is Ryan with Everline. Quick check — are you the owner of {Address}? Reply STOP to opt out.",
+    "Hey {First} — Ryan here. Can you confirm if you still own {Address} in {Property City}? Reply STOP to opt out.",
+    "{Owner First Name}, this is Ryan reaching out. Do you still own {Address}? If not, let me know. Reply STOP to opt out.",
+    "Hi {First}, would you consider a cash offer on {Address} ({Property City})? 100% as-is, no fees. Reply STOP to opt out.",
+    "Thanks {First}! Are you open to an offer on {Address} in {Property_City}?",
+    "Got it — what price were you hoping to get for {Address}?",
+]
+
+FIRST = ["Ann", "Bob", "Carlos", "Dee", "Eun-ji", "Fatima", "Greg", "Hao"]
+CITIES = ["Tulsa", "Waco", "Dayton", "Macon", "Boise", "Fresno", ""]
+
+
+def _rows(n: int) -> List[Dict[str, str]]:
+    return [
+        {
+            "First": FIRST[i % len(FIRST)],
+            "Address": f"{100 + i % 9000} Oak St",
+            "Property_City": CITIES[i % len(CITIES)],
+            "Property City": CITIES[i % len(CITIES)],
+        }
+        for i in range(n)
+    ]
+
+
+def _timeit(fn: Callable[[], object], rounds: int) -> float:
+    """Best-of-rounds wall time (seconds)."""
+    best = float("inf")
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Template render throughput benchmark")
+    ap.add_argument("--messages", type=int, default=100_000, help="messages rendered per round")
+    ap.add_argument("--rounds", type=int, default=3, help="timed rounds (best is reported)")
+    args = ap.parse_args()
+
+    from sms.campaign_runner import TEMPLATE_SLOTS
+    from sms.template_engine import TEMPLATE_CACHE, compile_template, render_many
+
+    rows = _rows(args.messages)
+    records = [{"id": f"tpl{k}", "fields": {"Message": body}} for k, body in enumerate(TEMPLATES)]
+    # Deterministic template pick per row, grouped the way campaign queueing groups them
+    groups: List[Tuple[Dict, List[Dict[str, str]]]] = [(rec, rows[k::len(records)]) for k, rec in enumerate(records)]
+
+    def legacy_format() -> List[str]:
+        out = []
+        for i, row in enumerate(rows):
+            raw = TEMPLATES[i % len(TEMPLATES)].strip()
+            raw = raw.replace("{Property City}", "{Property_City}").replace("{Owner First Name}", "{First}")
+            out.append(raw.format(**row))
+        return out
+
+    def compiled_format() -> List[str]:
+        out = []
+        for i, row in enumerate(rows):
+            out.append(TEMPLATE_CACHE.for_record(records[i % len(records)], "Message").render(row))
+        return out
+
+    resolved = [TEMPLATE_CACHE.for_record(rec, "Message") for rec in records]
+
+    def render_only() -> List[str]:
+        return [resolved[i % len(resolved)].render(row) for i, row in enumerate(rows)]
+
+    def legacy_campaign() -> List[str]:
+        out = []
+        for i, row in enumerate(rows):
+            msg = TEMPLATES[i % len(TEMPLATES)]
+            msg = msg.replace("{First}", row["First"]).replace("{Address}", row["Address"])
+            out.append(msg.replace("{Property City}", row["Property_City"]).strip())
+        return out
+
+    def many_campaign() -> List[str]:
+        out = []
+        for rec, chunk in groups:
+            out.extend(render_many(TEMPLATE_CACHE.for_record(rec, "Message", names=TEMPLATE_SLOTS), chunk))
+        return out
+
+    print(f"templates={len(TEMPLATES)} messages={len(rows):,} rounds={args.rounds}")
+    for name, fn in (
+        ("legacy fmt", legacy_format),
+        ("compiled", compiled_format),
+        ("render", render_only),
+        ("legacy tok", legacy_campaign),
+        ("render_many", many_campaign),
+    ):
+        seconds = _timeit(fn, args.rounds)
+        print(f"{name:>11}: {seconds / len(rows) * 1e6:8.3f} µs/msg  {len(rows) / seconds:>12,.0f} msg/s")
+
+    # Sanity: compiled output is byte-identical to the legacy str.format path
+    same = sum(a == b for a, b in zip(legacy_format(), compiled_format()))
+    print(f"format parity: {same}/{len(rows)} | cache: {TEMPLATE_CACHE.status()}")
+    print(f"compiled slots: {[compile_template(t).slots for t in TEMPLATES[:2]]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -30,12 +30,17 @@ try:
     except Exception:
         _RealTable = None  # type: ignore
 
-    # Simple cache to avoid re-instantiating Api for same key
+    # One Api per key, all sharing the pooled api.airtable.com transport
     _api_cache = {}
 
     def _get_api(key: str):
         if key not in _api_cache:
-            _api_cache[key] = _Api(key)
+            try:
+                from .http_transport import airtable_api
+
+                _api_cache[key] = airtable_api(key)
+            except Exception:
+                _api_cache[key] = _Api(key)
         return _api_cache[key]
 
     class _CompatTable:
@@ -16,7 +16,7 @@ from __future__ import annotations
 import os, re, math, traceback
 from datetime import datetime, timezone, timedelta
 from collections import defaultdict
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 try:
     from zoneinfo import ZoneInfo  # py>=3.9
@@ -29,12 +29,15 @@ load_dotenv()
 
 from sms.config import DRIP_FIELD_MAP as DRIP_FIELDS, PROSPECT_FIELD_MAP as PROSPECT_FIELDS
 from sms.airtable_schema import DripStatus
+from sms.datastore import iter_records
 
 # Optional Airtable client (pyairtable v2)
 try:
     from pyairtable import Api as _Api
 except Exception:
     _Api = None  # type: ignore
+else:
+    from sms.http_transport import airtable_api as _Api  # pooled, cached per key
 
 
 # ==========================================================
@@ -54,6 +57,12 @@ QUIET_START_HOUR = int(os.getenv("QUIET_START_HOUR", "21"))
 QUIET_END_HOUR = int(os.getenv("QUIET_END_HOUR", "9"))
 DAILY_LIMIT_FALLBACK = int(os.getenv("DAILY_LIMIT", "750"))
 
+# Numbers columns the DID picker reads (projection pushed down to Airtable)
+NUMBER_COLUMNS = [
+    "Number", "A Number", "Phone", "E164", "Friendly Name", "Market", "Markets",
+    "Active", "Status", "Remaining", "Sent Today", "Daily Reset", "Last Used",
+]
+
 
 # ==========================================================
 # TIME HELPERS
@@ -126,14 +135,11 @@ def _tbl(base_id: Optional[str], name: str):
         return None
 
 
-def _safe_all(tbl, **kwargs) -> List[Dict[str, Any]]:
+def _iter_rows(tbl, **kwargs) -> Iterator[Dict[str, Any]]:
+    """Stream rows page by page (projection pushed down to Airtable); best-effort like the old all()."""
     if not tbl:
-        return []
-    try:
-        return list(tbl.all(**kwargs))
-    except Exception:
-        traceback.print_exc()
-        return []
+        return iter(())
+    return iter_records(tbl, strict=False, **kwargs)
 
 
 def _safe_update(tbl, rid: str, payload: Dict[str, Any]) -> None:
@@ -185,9 +191,8 @@ def _pick_number_for_market(market: Optional[str]) -> Tuple[Optional[str], Optio
     nums = _tbl(CAMPAIGN_CONTROL_BASE, NUMBERS_TABLE)
     if not nums:
         return None, None
-    rows = _safe_all(nums)
-    elig = []
-    for r in rows:
+    best: Optional[Tuple[Tuple[int, str], Dict[str, Any]]] = None
+    for r in _iter_rows(nums, fields=NUMBER_COLUMNS):
         f = r.get("fields", {})
         if not _supports_market(f, market):
             continue
@@ -196,12 +201,12 @@ def _pick_number_for_market(market: Optional[str]) -> Tuple[Optional[str], Optio
         rem = _remaining_calc(f)
         if rem <= 0:
             continue
-        last_used = str(f.get("Last Used") or "1970-01-01T00:00:00Z")
-        elig.append(((-rem, last_used), r))
-    if not elig:
+        rank = (-rem, str(f.get("Last Used") or "1970-01-01T00:00:00Z"))
+        if best is None or rank < best[0]:
+            best = (rank, r)
+    if best is None:
         return None, None
-    elig.sort(key=lambda x: x[0])
-    chosen = elig[0][1]
+    chosen = best[1]
     did = _to_e164(chosen.get("fields", {}))
     return (did, chosen.get("id")) if did else (None, None)
 
@@ -214,7 +219,7 @@ def backfill_numbers_for_existing_queue(per_number_rate: int = 20, respect_quiet
     if not drip:
         return {"scanned": 0, "updated": 0, "skipped": 0}
 
-    rows = _safe_all(drip)
+    rows = _iter_rows(drip, fields=[DRIP_FIELDS["STATUS"], DRIP_FIELDS["FROM_NUMBER"], DRIP_FIELDS["MARKET"]])
     now = utcnow()
     if respect_quiet_hours and _in_quiet_hours(now):
         now = _shift_to_window(now)
@@ -255,7 +260,7 @@ def resequence_next_send(per_number_rate: int = 20, respect_quiet_hours: bool =
     if not drip:
         return {"groups": 0, "updated": 0}
 
-    rows = _safe_all(drip)
+    rows = _iter_rows(drip, fields=[DRIP_FIELDS["STATUS"], DRIP_FIELDS["FROM_NUMBER"], "created_at"])
     now = utcnow()
     if respect_quiet_hours and _in_quiet_hours(now):
         now = _shift_to_window(now)
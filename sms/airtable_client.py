@@ -8,11 +8,12 @@
 
 from __future__ import annotations
 
-import os, re, traceback, time
+import os, traceback, time
 from functools import lru_cache
 from typing import Optional, Dict, Any, List
 
 from sms.runtime import get_logger
+from sms.field_registry import FIELD_REGISTRY
 
 logger = get_logger("airtable_client")
 
@@ -31,6 +32,8 @@ try:
     from pyairtable import Api as _Api  # v2 canonical
 except Exception:
     _Api = None  # type: ignore
+else:
+    from sms.http_transport import airtable_api as _Api  # pooled, cached per key
 
 
 # ---------------- internal helpers ----------------
@@ -145,40 +148,12 @@ def get_runs():
 
 
 # ---------------- field utilities ----------------
-_field_cache: Dict[str, Dict[str, str]] = {}
-
-
-def _norm(s: Any) -> str:
-    return re.sub(r"[^a-z0-9]+", "", str(s).strip().lower())
-
-
 def _auto_field_map(tbl) -> Dict[str, str]:
-    """Caches Airtable field maps per table ID for faster safe updates."""
-    tid = getattr(tbl, "name", None) or str(id(tbl))
-    if tid in _field_cache:
-        return _field_cache[tid]
-
-    try:
-        page = tbl.all(max_records=1)
-        fields = list((page[0] if page else {"fields": {}}).get("fields", {}).keys())
-        amap = {_norm(k): k for k in fields}
-        _field_cache[tid] = amap
-        return amap
-    except Exception:
-        traceback.print_exc()
-        return {}
+    return FIELD_REGISTRY.field_map(tbl)
 
 
 def remap_existing_only(tbl, payload: Dict[str, Any]) -> Dict[str, Any]:
-    amap = _auto_field_map(tbl)
-    if not amap:
-        return payload
-    out: Dict[str, Any] = {}
-    for k, v in payload.items():
-        ak = amap.get(_norm(k))
-        if ak:
-            out[ak] = v
-    return out
+    return FIELD_REGISTRY.remap(tbl, payload)
 
 
 # ---------------- safe CRUD with retry ----------------
@@ -245,5 +220,5 @@ def config_summary() -> Dict[str, Any]:
                 "PERFORMANCE_KEY",
             )
         ),
-        "cached_field_maps": len(_field_cache),
+        "field_registry": FIELD_REGISTRY.status()["stats"],
     }
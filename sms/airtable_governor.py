@@ -0,0 +1,398 @@
+"""
+🚦 Airtable Governor
+────────────────────
+Process-wide admission control for Airtable requests, keyed by base id (Airtable allows
+~5 requests/second per base).
+
+- Every pyairtable call goes through the shared api.airtable.com adapter (sms.http_transport),
+  which admits it here first; modules no longer pace themselves with fixed sleeps
+- Priority lanes: interactive (inbound / autoresponder) → send (drip send path, delivery
+  receipts) → default → bulk (metrics, KPIs, campaign queue backfill). Waiters are served
+  strictly by lane, then arrival; the lane comes from `airtable_lane()` (context manager or
+  decorator) or an explicit `base_bucket(base, lane)` handle
+- 429s are retried here: the base is paused for Retry-After (or AIRTABLE_429_PAUSE_SEC) and its
+  rate is halved, then climbs back by AIRTABLE_RECOVER_RPS_STEP per successful call
+- With REDIS_URL the per-second budget and 429 pauses are shared across processes (Lua,
+  one round-trip per admission); otherwise the budget is per process
+- `status()` → per base: current rate, pause, queue depth per lane, requests and wait times per lane
+"""
+
+from __future__ import annotations
+
+import contextvars
+import heapq
+import itertools
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from sms.runtime import get_logger
+
+try:
+    from requests.adapters import HTTPAdapter  # type: ignore
+except Exception:
+    HTTPAdapter = None  # type: ignore
+
+logger = get_logger("airtable_governor")
+
+# =========================
+# ENV / CONFIG
+# =========================
+AIRTABLE_BASE_RPS = float(os.getenv("AIRTABLE_BASE_RPS", "5"))
+AIRTABLE_MIN_RPS = float(os.getenv("AIRTABLE_MIN_RPS", "1"))
+AIRTABLE_RECOVER_RPS_STEP = float(os.getenv("AIRTABLE_RECOVER_RPS_STEP", "0.25"))
+AIRTABLE_429_PAUSE_SEC = float(os.getenv("AIRTABLE_429_PAUSE_SEC", "30"))
+AIRTABLE_429_RETRIES = int(os.getenv("AIRTABLE_429_RETRIES", "3"))
+AIRTABLE_GOVERNOR_SHARED = os.getenv("AIRTABLE_GOVERNOR_SHARED", "true").lower() in ("1", "true", "yes")
+AIRTABLE_GOVERNOR_KEY_PREFIX = os.getenv("AIRTABLE_GOVERNOR_KEY_PREFIX", "sms:at")
+
+LANES = ("interactive", "send", "default", "bulk")
+_RANK = {name: i for i, name in enumerate(LANES)}
+_MAX_IDLE_WAIT_SEC = 0.5  # re-check cadence for queued waiters (missed notify safety net)
+
+_BASE_RE = re.compile(r"/(app[A-Za-z0-9]{14})(?:/|$|\?)")
+
+# =========================
+# Lanes
+# =========================
+_LANE: contextvars.ContextVar[str] = contextvars.ContextVar("airtable_lane", default="default")
+
+
+def current_lane() -> str:
+    return _LANE.get()
+
+
+@contextmanager
+def airtable_lane(lane: str) -> Iterator[str]:
+    """Run Airtable calls in `lane` (also usable as a decorator). Unknown names fall back to default."""
+    token = _LANE.set(lane if lane in _RANK else "default")
+    try:
+        yield _LANE.get()
+    finally:
+        _LANE.reset(token)
+
+
+def base_of(url: str) -> str:
+    m = _BASE_RE.search(url or "")
+    return m.group(1) if m else "airtable"
+
+
+def retry_after_seconds(value: Optional[str], default: float = AIRTABLE_429_PAUSE_SEC) -> float:
+    """Retry-After as seconds (delta-seconds or HTTP date); `default` when absent or unparseable."""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return default
+
+
+# =========================
+# Shared (Redis) budget
+# =========================
+# KEYS[1] per-second counter, KEYS[2] pause flag. Returns 0 when admitted, else ms to wait.
+ADMIT_LUA = """
+local pause = redis.call('PTTL', KEYS[2])
+if pause > 0 then return pause end
+local n = redis.call('INCR', KEYS[1])
+if n == 1 then redis.call('PEXPIRE', KEYS[1], 2000) end
+if n <= tonumber(ARGV[1]) then return 0 end
+return math.max(1, 1000 - tonumber(ARGV[2]))
+"""
+
+
+class _SharedBudget:
+    """Cross-process per-second budget + 429 pause over Redis. Fails open: errors admit the request."""
+
+    def __init__(self, client: Any):
+        self.r = client
+        self.script = client.register_script(ADMIT_LUA)
+
+    def _keys(self, base: str, now: float) -> List[str]:
+        return [f"{AIRTABLE_GOVERNOR_KEY_PREFIX}:{base}:{int(now)}", f"{AIRTABLE_GOVERNOR_KEY_PREFIX}:{base}:pause"]
+
+    def admit(self, base: str, rate: float) -> float:
+        """0 when admitted, else seconds to wait before asking again."""
+        now = time.time()
+        try:
+            wait_ms = int(self.script(keys=self._keys(base, now), args=[max(1, int(rate)), int(now * 1000) % 1000]))
+        except Exception:
+            logger.warning("Shared Airtable budget unavailable; admitting locally", exc_info=True)
+            return 0.0
+        return wait_ms / 1000.0
+
+    def pause(self, base: str, seconds: float) -> None:
+        try:
+            self.r.set(self._keys(base, 0)[1], "1", px=max(1, int(seconds * 1000)))
+        except Exception:
+            logger.warning("Shared Airtable pause failed", exc_info=True)
+
+
+def _shared_budget() -> Optional[_SharedBudget]:
+    if not AIRTABLE_GOVERNOR_SHARED:
+        return None
+    try:
+        from sms.rt import _redis_tcp  # lazy: rt pulls in kpi_logger → datastore
+
+        client = _redis_tcp()
+        return _SharedBudget(client) if client is not None else None
+    except Exception:
+        logger.warning("Redis unavailable for the Airtable governor; budget is per process", exc_info=True)
+        return None
+
+
+# =========================
+# Per-base scheduler
+# =========================
+class _LaneStats:
+    __slots__ = ("requests", "wait_sum", "wait_max")
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.wait_sum = 0.0
+        self.wait_max = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        n = self.requests
+        return {
+            "requests": n,
+            "wait_avg_ms": round(self.wait_sum / n * 1000, 1) if n else None,
+            "wait_max_ms": round(self.wait_max * 1000, 1),
+        }
+
+
+class _BaseGate:
+    """Token bucket for one base with a priority queue of waiters and an adaptive rate."""
+
+    def __init__(self, base: str, ceiling: float) -> None:
+        self.base = base
+        self.ceiling = max(AIRTABLE_MIN_RPS, ceiling)
+        self.rate = self.ceiling
+        self.capacity = max(1.0, self.ceiling)
+        self.tokens = self.capacity
+        self.stamp = time.monotonic()
+        self.paused_until = 0.0
+        self.cond = threading.Condition()
+        self.queue: List[tuple] = []  # (lane rank, seq) heap
+        self.depth = [0] * len(LANES)
+        self.lanes = [_LaneStats() for _ in LANES]
+        self.throttled = 0
+        self.retried = 0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+
+class Governor:
+    """Process-wide Airtable request governor: one gate per base id."""
+
+    def __init__(self, rps: float = AIRTABLE_BASE_RPS, shared: Optional[_SharedBudget] = None, use_shared: bool = True):
+        self.rps = rps
+        self._gates: Dict[str, _BaseGate] = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._shared = shared
+        self._shared_ready = shared is not None or not use_shared
+        self._prepaid = threading.local()
+
+    def gate(self, base: Optional[str]) -> _BaseGate:
+        key = base or "memory"
+        gate = self._gates.get(key)
+        if gate is None:
+            with self._lock:
+                gate = self._gates.setdefault(key, _BaseGate(key, self.rps))
+        return gate
+
+    def _shared_budget(self) -> Optional[_SharedBudget]:
+        if not self._shared_ready:
+            with self._lock:
+                if not self._shared_ready:
+                    self._shared = _shared_budget()
+                    self._shared_ready = True
+        return self._shared
+
+    # ---------- admission ----------
+    def acquire(self, base: Optional[str], lane: Optional[str] = None) -> float:
+        """Block until `base` may take one more request in `lane`. Returns seconds waited."""
+        gate = self.gate(base)
+        rank = _RANK.get(lane or current_lane(), _RANK["default"])
+        shared = self._shared_budget()
+        started = time.monotonic()
+        with gate.cond:
+            ticket = (rank, next(self._seq))
+            heapq.heappush(gate.queue, ticket)
+            gate.depth[rank] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    if gate.queue[0] != ticket:
+                        gate.cond.wait(_MAX_IDLE_WAIT_SEC)
+                        continue
+                    gate._refill(now)
+                    if now < gate.paused_until:
+                        delay = gate.paused_until - now
+                    elif gate.tokens < 1.0:
+                        delay = (1.0 - gate.tokens) / gate.rate
+                    else:
+                        delay = shared.admit(gate.base, gate.rate) if shared is not None else 0.0
+                        if delay <= 0:
+                            gate.tokens -= 1.0
+                            heapq.heappop(gate.queue)
+                            break
+                    gate.cond.wait(delay)
+            except BaseException:
+                if ticket in gate.queue:
+                    gate.queue.remove(ticket)
+                    heapq.heapify(gate.queue)
+                raise
+            finally:
+                gate.depth[rank] -= 1
+                gate.cond.notify_all()
+            waited = time.monotonic() - started
+            stats = gate.lanes[rank]
+            stats.requests += 1
+            stats.wait_sum += waited
+            stats.wait_max = max(stats.wait_max, waited)
+        return waited
+
+    def handle(self, base: Optional[str], lane: Optional[str] = None) -> "LaneHandle":
+        return LaneHandle(self, base, lane)
+
+    def admit(self, base: str) -> float:
+        """Transport entry: consume a token prepaid by LaneHandle.sending() on this thread, else acquire."""
+        prepaid: Set[str] = getattr(self._prepaid, "bases", None) or set()
+        if base in prepaid:
+            prepaid.discard(base)
+            return 0.0
+        return self.acquire(base)
+
+    def _prepay(self, base: Optional[str]) -> None:
+        if not hasattr(self._prepaid, "bases"):
+            self._prepaid.bases = set()
+        self._prepaid.bases.add(base or "memory")
+
+    def _unprepay(self, base: Optional[str]) -> None:
+        getattr(self._prepaid, "bases", set()).discard(base or "memory")
+
+    # ---------- feedback ----------
+    def succeeded(self, base: str) -> None:
+        gate = self.gate(base)
+        if gate.rate < gate.ceiling:
+            with gate.cond:
+                gate.rate = min(gate.ceiling, gate.rate + AIRTABLE_RECOVER_RPS_STEP)
+
+    def throttled(self, base: str, retry_after: Optional[float] = None) -> float:
+        """A 429 for `base`: pause it for Retry-After and halve its rate. Returns the pause in seconds."""
+        pause = AIRTABLE_429_PAUSE_SEC if retry_after is None else retry_after
+        gate = self.gate(base)
+        with gate.cond:
+            gate.throttled += 1
+            gate.rate = max(AIRTABLE_MIN_RPS, gate.rate / 2)
+            gate.tokens = min(gate.tokens, 0.0)
+            gate.paused_until = max(gate.paused_until, time.monotonic() + pause)
+            gate.cond.notify_all()
+        shared = self._shared_budget()
+        if shared is not None:
+            shared.pause(base, pause)
+        logger.warning(f"🚦 Airtable 429 on {base}: pausing {pause:.1f}s, rate → {gate.rate:.2f}/s")
+        return pause
+
+    # ---------- metrics ----------
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            gates = list(self._gates.values())
+        now = time.monotonic()
+        bases: Dict[str, Any] = {}
+        for gate in gates:
+            with gate.cond:
+                bases[gate.base] = {
+                    "rate": round(gate.rate, 2),
+                    "ceiling": gate.ceiling,
+                    "paused_for_sec": round(max(0.0, gate.paused_until - now), 1),
+                    "queue_depth": dict(zip(LANES, gate.depth)),
+                    "lanes": {name: st.snapshot() for name, st in zip(LANES, gate.lanes)},
+                    "throttled_429": gate.throttled,
+                    "retried_429": gate.retried,
+                }
+        return {
+            "backend": "redis" if self._shared is not None else "local",
+            "base_rps": self.rps,
+            "lanes": list(LANES),
+            "bases": bases,
+        }
+
+
+class LaneHandle:
+    """TokenBucket-style handle for callers that pace their own batches (`with handle.sending(): write()`)."""
+
+    def __init__(self, governor: Governor, base: Optional[str], lane: Optional[str]):
+        self.governor = governor
+        self.base = base
+        self.lane = lane
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        waited = 0.0
+        for _ in range(max(1, int(tokens))):
+            waited += self.governor.acquire(self.base, self.lane)
+        return waited
+
+    @contextmanager
+    def sending(self, tokens: float = 1.0) -> Iterator[float]:
+        """Acquire, then let the first request made inside the block through without charging it twice.
+
+        The prepaid token is dropped on exit, so a block that never sent can't hand it to an
+        unrelated request later on this thread.
+        """
+        waited = self.acquire(tokens)
+        self.governor._prepay(self.base)
+        try:
+            yield waited
+        finally:
+            self.governor._unprepay(self.base)
+
+
+GOVERNOR = Governor()
+
+
+# =========================
+# Transport adapter
+# =========================
+if HTTPAdapter is not None:
+
+    class GovernedAdapter(HTTPAdapter):
+        """requests adapter for api.airtable.com: admission per base, 429 / Retry-After handled here."""
+
+        def __init__(self, *args: Any, governor: Optional[Governor] = None, **kwargs: Any):
+            self.governor = governor or GOVERNOR
+            super().__init__(*args, **kwargs)
+
+        def send(self, request, **kwargs):  # type: ignore[override]
+            base = base_of(request.url)
+            for attempt in range(AIRTABLE_429_RETRIES + 1):
+                self.governor.admit(base)
+                resp = super().send(request, **kwargs)
+                if resp.status_code != 429:
+                    self.governor.succeeded(base)
+                    return resp
+                self.governor.throttled(base, retry_after_seconds(resp.headers.get("Retry-After")))
+                if attempt == AIRTABLE_429_RETRIES:
+                    return resp
+                self.governor.gate(base).retried += 1
+                resp.close()
+            return resp
+
+else:  # pragma: no cover - requests missing
+    GovernedAdapter = None  # type: ignore
+
+
+def status() -> Dict[str, Any]:
+    return GOVERNOR.status()
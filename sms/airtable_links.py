@@ -18,6 +18,7 @@ from datetime import datetime, timezone
 from functools import lru_cache
 from pyairtable import Table
 from sms.runtime import get_logger
+from sms.field_registry import FIELD_REGISTRY
 
 logger = get_logger("airtable_links")
 
@@ -78,22 +79,9 @@ def _safe_tbl(base_id: str, table_name: str) -> Optional[Table]:
         return None
 
 
-_field_cache: Dict[str, List[str]] = {}
-
-
 def _existing_cols(tbl: Table) -> List[str]:
-    """Cached Airtable field list to prevent repeated .all() calls."""
-    tid = getattr(tbl, "name", None) or str(id(tbl))
-    if tid in _field_cache:
-        return _field_cache[tid]
-    try:
-        rows = tbl.all(max_records=1) or []
-        cols = list((rows[0] or {}).get("fields", {}).keys()) if rows else []
-        _field_cache[tid] = cols
-        return cols
-    except Exception:
-        traceback.print_exc()
-        return []
+    """Known Airtable columns for a table (from the shared field registry)."""
+    return list(FIELD_REGISTRY.field_map(tbl).values())
 
 
 # ==========================================================
@@ -118,8 +106,7 @@ def _safe_create(tbl: Table, fields: Dict) -> Optional[Dict]:
     if not (tbl and fields):
         return None
     try:
-        existing = set(_existing_cols(tbl))
-        payload = {k: v for k, v in fields.items() if k in existing}
+        payload = FIELD_REGISTRY.remap(tbl, fields)
         return _with_retry(tbl.create, payload if payload else {})
     except Exception:
         traceback.print_exc()
@@ -130,8 +117,7 @@ def _safe_update(tbl: Table, rec_id: str, fields: Dict) -> Optional[Dict]:
     if not (tbl and rec_id and fields):
         return None
     try:
-        existing = set(_existing_cols(tbl))
-        payload = {k: v for k, v in fields.items() if k in existing}
+        payload = FIELD_REGISTRY.remap(tbl, fields)
         return _with_retry(tbl.update, rec_id, payload if payload else {})
     except Exception:
         traceback.print_exc()
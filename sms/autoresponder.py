@@ -76,7 +76,27 @@ logger = get_logger(__name__)
 # ---------------------------------------------------------------------------
 # Airtable/datastore facades (CONNECTOR-compatible, with safe fallbacks)
 # ---------------------------------------------------------------------------
+from sms.airtable_governor import airtable_lane
 from sms.datastore import CONNECTOR, list_records, update_record
+from sms.phone_index import PHONE_INDEX
+from sms.replica import REPLICA
+from sms.template_engine import TEMPLATE_CACHE, compile_template
+from sms.field_registry import FIELD_REGISTRY
+from sms.intent import (
+    ASK_OFFER_PHRASES,
+    COND_WORDS,
+    INTEREST_NO_PHRASES,
+    NOT_OWNER_PHRASES,
+    NO_RE,
+    OPTOUT_RE,
+    WRONG_NUM_WORDS,
+    YES_RE,
+    classify,
+    extract_condition,
+    extract_price,
+    extract_timeline,
+    looks_like_price as _looks_like_price,
+)
 
 # Hardening: bring in guaranteed logging fallbacks
 try:
@@ -256,61 +276,16 @@ FALLBACK_TEMPLATES: Dict[str, str] = {
 # Intent lexicon
 # ---------------------------------------------------------------------------
 
-OPTOUT_RE = re.compile(r"\b(stop(all)?|unsubscribe|quit|cancel|end|opt\s*out|remove\s*me)\b", re.I)
-WRONG_NUM_WORDS = {"wrong number", "not mine"}
-NOT_OWNER_PHRASES = {"not the owner", "i sold", "no longer own", "dont own", "do not own", "sold this", "wrong person"}
-INTEREST_NO_PHRASES = {
-    "not interested",
-    "not selling",
-    "dont want to sell",
-    "don't want to sell",
-    "no interest",
-    "keep for now",
-    "holding for now",
-    "keeping it",
-    "not looking to sell",
-}
-ASK_OFFER_PHRASES = {"your offer", "what's your offer", "whats your offer", "what is your offer", "what can you offer"}
-COND_WORDS = {"condition", "repairs", "needs work", "renovated", "updated", "tenant", "vacant", "occupied", "as-is", "roof", "hvac"}
-YES_RE = re.compile(r"\b(yes|yep|yeah|sure|affirmative|correct|that's me|that is me|i am)\b", re.I)
-NO_RE = re.compile(r"\b(no|nope|nah)\b", re.I)
-
+# Phrase lists and the word-bounded regexes live in sms.intent (shared with the inbound
+# webhook); _base_intent reads every category from one compiled scan of the reply.
 PRICE_REGEX = re.compile(r"(\$?\s?\d{2,3}(?:,\d{3})*(?:\.\d{1,2})?\b)|(\b\d+\s?k\b)|(\b\d{2,3}k\b)", re.IGNORECASE)
 
-def _looks_like_price(text: str) -> bool:
-    """Enhanced price detection that avoids false-triggers on phone numbers"""
-    t = text.lower()
-    if re.search(r'\$\s*\d', t) or re.search(r'\b\d+\s*k\b', t):
-        return True
-    if any(w in t for w in ("ask", "price", "offer", "how much")):
-        return bool(re.search(r'\b(?:\d{1,3}(?:,\d{3})+|\d{4,6})(?:\.\d{1,2})?\b', t))
-    return False
-
 # ---------------------------------------------------------------------------
 # Local schema helpers for resilient create() if datastore safe_create is absent
 # ---------------------------------------------------------------------------
 
-def _norm_key(s: Any) -> str:
-    return re.sub(r"[^a-z0-9]+", "", str(s or "").strip().lower())
-
-def _auto_field_map_tbl(tbl: Any) -> Dict[str, str]:
-    try:
-        probe = tbl.all(max_records=1)
-        keys = list(probe[0].get("fields", {}).keys()) if probe else []
-    except Exception:
-        keys = []
-    return {_norm_key(k): k for k in keys}
-
 def _remap_existing_only_tbl(tbl: Any, payload: Dict[str, Any]) -> Dict[str, Any]:
-    amap = _auto_field_map_tbl(tbl)
-    if not amap:
-        return dict(payload or {})
-    out: Dict[str, Any] = {}
-    for k, v in (payload or {}).items():
-        mk = amap.get(_norm_key(k))
-        if mk:
-            out[mk] = v
-    return out
+    return FIELD_REGISTRY.remap(tbl, payload)
 
 # ---------------------------------------------------------------------------
 # Airtable TableFacade with hardened create()
@@ -492,30 +467,30 @@ STAGE_OPTOUT = ConversationStage.OPT_OUT.value
 # ---------------------------------------------------------------------------
 
 def _base_intent(body: str) -> str:
-    text = (body or "").lower().strip()
-    if not text:
+    hit = classify(body)
+    if not hit.text:
         return "neutral"
 
-    if any(p in text for p in ["who is this", "how did you get", "why are you", "what is this about"]):
+    if hit.has("INQUIRY_PHRASES"):
         return "inquiry"
 
-    if OPTOUT_RE.search(text):
+    if hit.has("OPTOUT_WORDS"):
         return "optout"
-    if any(w in text for w in WRONG_NUM_WORDS) or any(w in text for w in NOT_OWNER_PHRASES):
+    if hit.has("WRONG_NUM_WORDS", "NOT_OWNER_PHRASES"):
         return "ownership_no"
-    if any(w in text for w in INTEREST_NO_PHRASES):
+    if hit.has("INTEREST_NO_PHRASES"):
         return "interest_no"
 
-    if YES_RE.search(text):
+    if hit.has("YES_WORDS"):
         return "affirm"
-    if NO_RE.search(text):
+    if hit.has("NO_WORDS"):
         return "deny"
 
-    if _looks_like_price(text):
+    if _looks_like_price(body):
         return "price_provided"
-    if any(w in text for w in ASK_OFFER_PHRASES):
+    if hit.has("ASK_OFFER_PHRASES"):
         return "ask_offer"
-    if any(w in text for w in COND_WORDS):
+    if hit.has("COND_WORDS"):
         return "condition_info"
 
     return "neutral"
@@ -641,7 +616,9 @@ class Autoresponder:
     def _index_templates(self) -> Dict[str, List[Dict[str, Any]]]:
         pools: Dict[str, List[Dict[str, Any]]] = {}
         try:
-            records = self.templates.all()
+            records = REPLICA.select(self.templates)
+            if records is None:
+                records = self.templates.all()
         except Exception:
             records = []
         for rec in records:
@@ -661,25 +638,19 @@ class Autoresponder:
                 chosen = _det_rand_choice(rand_key + "::" + pool, items)
                 if not chosen:
                     continue
-                fields = chosen.get("fields", {}) or {}
-                raw = str(fields.get(TEMPLATE_MESSAGE_FIELD) or "").strip()
-                if not raw and local_templates:
+                # Compiled once per template id ({Property City} / {Owner First Name} aliases resolved)
+                tpl = TEMPLATE_CACHE.for_record(chosen, TEMPLATE_MESSAGE_FIELD)
+                if tpl is None and local_templates:
                     try:
-                        raw = local_templates.get_template(pool, personalization)
+                        tpl = compile_template(local_templates.get_template(pool, personalization).strip())
                     except Exception:
-                        raw = ""
-                
-                # Normalize common spaced placeholders to underscore variants for str.format()
-                raw = raw.replace("{Property City}", "{Property_City}")
-                raw = raw.replace("{Owner First Name}", "{First}")  # safety: legacy alias
+                        tpl = None
                 
                 try:
-                    msg = raw.format(**personalization) if raw else ""
-                    msg = _squish(msg)
+                    msg = _squish(tpl.render(personalization)) if tpl else ""
                 except Exception as e:
                     logger.debug(f"Template format fallback (missing keys?): {e}; raw kept.")
-                    msg = raw
-                    msg = _squish(msg)
+                    msg = _squish(tpl.text)
                 return (msg or "Thanks for the reply.", chosen.get("id"), pool)
         
         # If no Airtable/local template found, use hard fallback for critical stages
@@ -687,8 +658,7 @@ class Autoresponder:
             fallback_raw = FALLBACK_TEMPLATES.get(pool)
             if fallback_raw:
                 try:
-                    fallback_msg = fallback_raw.format(**personalization)
-                    fallback_msg = _squish(fallback_msg)
+                    fallback_msg = _squish(compile_template(fallback_raw).render(personalization))
                     if fallback_msg:
                         return (fallback_msg, None, pool)
                 except Exception as e:
@@ -762,20 +732,13 @@ class Autoresponder:
                 pass
 
     def _find_record_by_phone(self, table, candidates: List[Optional[str]], phone: str) -> Optional[Dict[str, Any]]:
-        digits = last_10_digits(phone)
-        if not digits:
+        if not last_10_digits(phone):
             return None
-        clean_fields = [c for c in candidates if c]
         try:
-            rows = table.all()
+            return PHONE_INDEX.find(table, phone, [c for c in candidates if c])
         except Exception:
-            rows = []
-        for record in rows:
-            fields = record.get("fields", {}) or {}
-            for field in clean_fields:
-                if last_10_digits(fields.get(field)) == digits:
-                    return record
-        return None
+            logger.warning("Phone index lookup failed for %s", phone, exc_info=True)
+            return None
 
     def _find_prospect(self, phone: str) -> Optional[Dict[str, Any]]:
         return self._find_record_by_phone(self.prospects, self.prospect_phone_fields, phone)
@@ -783,203 +746,15 @@ class Autoresponder:
     # -------------------------- Prospect comprehensive updates
     def _extract_price_from_message(self, body: str) -> Optional[str]:
         """Extract price information from message text with enhanced pattern matching"""
-        if not body:
-            return None
-        
-        text = body.lower()
-        
-        # Enhanced price patterns including more variations
-        
-        # Pattern 1: Standard price formats ($250,000 or $250000)
-        standard_pattern = r'\$\s*(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)'
-        
-        # Pattern 2: 'k' notation (250k, 250K)
-        k_pattern = r'(\d{1,4})\s*k(?:\s|$|[^\w])'
-        
-        # Pattern 3: Around/about patterns (around 250k, about $250,000)
-        around_pattern = r'(?:around|about|approximately|roughly)\s*[\$]?\s*(\d{1,3}(?:,\d{3})*|\d{1,4}k)'
-        
-        # Try standard pattern first
-        standard_matches = re.findall(standard_pattern, text)
-        if standard_matches:
-            price = standard_matches[0].replace(',', '').strip()
-            # Validate reasonable price range (25k to 10M)
-            try:
-                price_val = float(price)
-                if 25000 <= price_val <= 10000000:
-                    return price
-            except ValueError:
-                pass
-        
-        # Try 'k' notation
-        k_matches = re.findall(k_pattern, text)
-        if k_matches:
-            try:
-                k_value = float(k_matches[0])
-                if 25 <= k_value <= 10000:  # 25k to 10Mk
-                    return str(int(k_value * 1000))
-            except ValueError:
-                pass
-        
-        # Try around/about patterns
-        around_matches = re.findall(around_pattern, text)
-        if around_matches:
-            price_text = around_matches[0].replace('$', '').replace(',', '').strip()
-            if price_text.endswith('k'):
-                try:
-                    k_value = float(price_text[:-1])
-                    if 25 <= k_value <= 10000:
-                        return str(int(k_value * 1000))
-                except ValueError:
-                    pass
-            else:
-                try:
-                    price_val = float(price_text)
-                    if 25000 <= price_val <= 10000000:
-                        return price_text
-                except ValueError:
-                    pass
-        
-        # Fallback to original PRICE_REGEX
-        price_matches = PRICE_REGEX.findall(text)
-        if price_matches:
-            for match in price_matches:
-                if match[0]:  # Full price format
-                    raw = match[0]
-                    price = re.sub(r'[^\d.]', '', raw)  # strip $ and commas
-                    return price
-                elif match[1] or match[2]:  # 'k' format
-                    k_value = (match[1] or match[2]).replace('k', '').strip()
-                    try:
-                        return str(int(float(k_value)) * 1000)
-                    except ValueError:
-                        continue
-        
-        return None
+        return extract_price(body, PRICE_REGEX)
 
     def _extract_condition_info(self, body: str) -> Optional[str]:
         """Extract condition information from message text with enhanced analysis"""
-        if not body:
-            return None
-        
-        text = body.lower()
-        condition_indicators = []
-        
-        # Enhanced condition keywords
-        enhanced_cond_words = list(COND_WORDS) + [
-            "renovated", "updated", "new", "old", "vintage", "remodeled", "restored",
-            "needs work", "fixer upper", "handyman special", "as-is", "move-in ready",
-            "turnkey", "cosmetic", "structural", "foundation", "electrical", "plumbing",
-            "hvac", "roof", "flooring", "kitchen", "bathroom", "paint", "carpet",
-            "appliances", "windows", "siding", "landscaping", "pool", "deck", "garage"
-        ]
-        
-        # Check for condition-related keywords with enhanced context
-        for word in enhanced_cond_words:
-            if word in text:
-                # Extract surrounding context (up to 15 words around the keyword)
-                words = body.split()
-                for i, w in enumerate(words):
-                    if word in w.lower():
-                        start = max(0, i - 7)
-                        end = min(len(words), i + 8)
-                        context = ' '.join(words[start:end])
-                        condition_indicators.append(context.strip())
-                        break
-        
-        # Look for specific condition patterns
-        
-        # Pattern for "needs X" statements
-        needs_pattern = r'needs?\s+(?:a\s+)?(?:new\s+)?(\w+(?:\s+\w+){0,2})'
-        needs_matches = re.findall(needs_pattern, text)
-        for match in needs_matches:
-            condition_indicators.append(f"needs {match}")
-        
-        # Pattern for "X is/are Y" statements about condition
-        condition_statement_pattern = r'(roof|foundation|kitchen|bathroom|flooring|hvac|plumbing|electrical|windows)\s+(?:is|are)\s+(\w+(?:\s+\w+){0,2})'
-        condition_matches = re.findall(condition_statement_pattern, text)
-        for item, condition in condition_matches:
-            condition_indicators.append(f"{item} is {condition}")
-        
-        # Remove duplicates while preserving order
-        unique_indicators = []
-        for indicator in condition_indicators:
-            if indicator not in unique_indicators:
-                unique_indicators.append(indicator)
-        
-        return '; '.join(unique_indicators[:3]) if unique_indicators else None  # Limit to top 3 most relevant
+        return extract_condition(body)
 
     def _extract_timeline_motivation(self, body: str) -> Optional[str]:
         """Extract timeline and motivation information from message text with enhanced patterns"""
-        if not body:
-            return None
-        
-        text = body.lower()
-        
-        # Enhanced timeline and motivation keywords
-        timeline_words = {
-            "urgent", "asap", "soon", "immediately", "quickly", "fast", "rush",
-            "month", "months", "week", "weeks", "year", "years", "day", "days",
-            "deadline", "date", "timeline", "schedule", "time frame",
-            "move", "moving", "relocate", "relocating", "relocation",
-            "divorce", "divorcing", "separated", "separation",
-            "financial", "finances", "money", "cash", "debt", "bills", "mortgage",
-            "foreclosure", "foreclosing", "behind", "payments",
-            "inheritance", "inherited", "estate", "probate",
-            "job", "work", "employment", "transfer", "promotion",
-            "health", "medical", "illness", "sick", "hospital",
-            "family", "children", "kids", "school", "education",
-            "retirement", "retiring", "downsize", "downsizing",
-            "upgrade", "upgrading", "bigger", "smaller", "expand"
-        }
-        
-        timeline_indicators = []
-        
-        # Check for timeline/motivation keywords with enhanced context
-        for word in timeline_words:
-            if word in text:
-                words = body.split()
-                for i, w in enumerate(words):
-                    if word in w.lower():
-                        start = max(0, i - 6)
-                        end = min(len(words), i + 7)
-                        context = ' '.join(words[start:end])
-                        timeline_indicators.append(context.strip())
-                        break
-        
-        # Look for specific timeline patterns
-        
-        # Pattern for "need to sell by/before X"
-        deadline_pattern = r'(?:need|have|must)\s+to\s+sell\s+(?:by|before|within)\s+(\w+(?:\s+\w+){0,3})'
-        deadline_matches = re.findall(deadline_pattern, text)
-        for match in deadline_matches:
-            timeline_indicators.append(f"deadline: {match}")
-        
-        # Pattern for "because of X" motivation
-        motivation_pattern = r'because\s+(?:of\s+)?(\w+(?:\s+\w+){0,4})'
-        motivation_matches = re.findall(motivation_pattern, text)
-        for match in motivation_matches:
-            timeline_indicators.append(f"motivation: {match}")
-        
-        # Pattern for "due to X" motivation
-        due_to_pattern = r'due\s+to\s+(\w+(?:\s+\w+){0,4})'
-        due_to_matches = re.findall(due_to_pattern, text)
-        for match in due_to_matches:
-            timeline_indicators.append(f"due to: {match}")
-        
-        # Pattern for time expressions (in X months, within X weeks)
-        time_expression_pattern = r'(?:in|within|by)\s+(\d+\s+(?:day|week|month|year)s?)'
-        time_matches = re.findall(time_expression_pattern, text)
-        for match in time_matches:
-            timeline_indicators.append(f"timeframe: {match}")
-        
-        # Remove duplicates while preserving order
-        unique_indicators = []
-        for indicator in timeline_indicators:
-            if indicator not in unique_indicators:
-                unique_indicators.append(indicator)
-        
-        return '; '.join(unique_indicators[:3]) if unique_indicators else None  # Limit to top 3 most relevant
+        return extract_timeline(body)
 
     def _determine_active_phone_slot(self, prospect_record: Optional[Dict[str, Any]], used_phone: str) -> str:
         """Determine which phone slot (1 or 2) is active based on the phone used"""
@@ -1940,6 +1715,7 @@ class Autoresponder:
                 (LEAD_SOURCE_FIELD or "Source"): self.processed_by,
             })
             if isinstance(created, dict):
+                PHONE_INDEX.remember(self.leads, from_number, created.get("id"))
                 return created.get("id"), property_id
 
         return None, property_id
@@ -1948,6 +1724,7 @@ class Autoresponder:
 # Entrypoint
 # ---------------------------------------------------------------------------
 
+@airtable_lane("interactive")
 def run_autoresponder(limit: int = 50) -> Dict[str, Any]:
     service = Autoresponder()
     return service.process(limit)
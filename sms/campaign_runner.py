@@ -5,29 +5,39 @@ Campaign Runner vHARDENED+FINAL
 ✓ Campaigns: only Active or (Scheduled AND start<=now, flips to Active)
 ✓ Prospects: uses Campaigns.[Prospects] linked records
 ✓ Templates: random template per message + link Template -> Drip Queue
-✓ Placeholders: {First}, {Address}, {Property City}
+✓ Placeholders: {First}, {Address}, {Property City} — templates compiled once per id (sms.template_engine),
+  fetched once per run_campaigns call, rendered per template in bulk
 ✓ First name parsing: robust
 ✓ Market: copied from Prospect
 ✓ TextGrid rotation: round-robin per Market (Numbers table), persisted to .tg_state.json
 ✓ Next Send Date: staggered 5–20 seconds between rows
-✓ Quiet Hours: 9pm–9am America/Chicago → skip writes
+✓ Quiet Hours: 9pm–9am in each seller's timezone → skip writes only when every zone is quiet
 ✓ Dry-run: TEST_MODE=true env OR --dryrun flag
 ✓ Logging: clear per-step logs
 ✓ Resilience: retry without Market on INVALID_MULTIPLE_CHOICE_OPTIONS
+✓ Bulk writes: Drip Queue rows created 10 per batch_create, paced by the per-base Airtable governor (bulk lane)
 ✓ Loop guard: skip if campaign already has QUEUED/Retry/Sending… rows
 ✓ Dedupe: per-run phone set + Airtable check (Campaign+Phone) + optional global phone dedupe
+✓ Dedupe sets: one paged Drip Queue load per run_campaigns call, O(1) checks per prospect
+✓ Read replica (REPLICA_ENABLED): Campaigns / Numbers / Templates / Prospects / Drip Queue reads served
+  locally within each table's staleness bound; own writes mirrored into it
 """
 
 from __future__ import annotations
-import argparse, os, random, re, json
+import argparse, os, random, re, json, time
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, List, Optional, Tuple
 from zoneinfo import ZoneInfo
 
-from sms.runtime import get_logger, normalize_phone
-from sms.datastore import CONNECTOR
+from sms.runtime import get_logger, last_10_digits, normalize_phone
+from sms.airtable_governor import airtable_lane
+from sms.datastore import CONNECTOR, base_bucket
+from sms.replica import REPLICA
+from sms.template_engine import TEMPLATE_CACHE, Template, compile_template, render_many
 from sms.airtable_schema import DripStatus
+from sms.send_window import SendWindow
 
 log = get_logger("campaign_runner")
 
@@ -67,6 +77,7 @@ DRIP_UI_F = "UI"
 DRIP_PROPERTY_ID_F = "Property ID"
 
 TEMPLATE_MESSAGE_F = "Message"
+TEMPLATE_SLOTS = frozenset({"First", "Address", "Property_City"})  # {Property City} is an alias
 
 NUMBERS_TABLE_NAME = "Numbers"
 NUMBERS_MARKET_F = "Market"
@@ -90,6 +101,11 @@ SEND_AFTER_QUEUE_DEFAULT = os.getenv("RUNNER_SEND_AFTER_QUEUE", "true").lower()
 
 GLOBAL_MAX_DRIPS = int(os.getenv("GLOBAL_MAX_DRIPS", "1000"))  # hard cap per campaign run
 GLOBAL_PHONE_DEDUPE = os.getenv("GLOBAL_PHONE_DEDUPE", "true").lower() in ("1","true","yes")
+CAMPAIGN_PAUSE_CHECK_SEC = float(os.getenv("CAMPAIGN_PAUSE_CHECK_SEC", "10"))  # pause re-check interval
+
+DRIP_CREATE_CHUNK = 10                                                # Airtable max records per create
+DRIP_CREATE_WORKERS = int(os.getenv("DRIP_CREATE_WORKERS", "4"))        # concurrent chunk creates
+DRIP_CREATE_FLUSH_ROWS = int(os.getenv("DRIP_CREATE_FLUSH_ROWS", "100"))  # rows buffered before a flush
 
 JITTER_MIN_S = 5
 JITTER_MAX_S = 20
@@ -111,10 +127,8 @@ def now_ct() -> datetime:
     return datetime.now(QUIET_TZ)
 
 def is_quiet_hours() -> bool:
-    if not QUIET_ENFORCED:
-        return False
-    h = now_ct().hour
-    return (h >= QUIET_START) or (h < QUIET_END)
+    """Quiet for every recipient timezone (per-row windows are applied by the batcher)."""
+    return not SendWindow(QUIET_START, QUIET_END, QUIET_ENFORCED, QUIET_TZ.key).any_open()
 
 def _escape_quotes(s: str) -> str:
     return str(s).replace("'", "\\'")
@@ -133,6 +147,7 @@ def _update_campaign_progress(camp_tbl, campaign_id: str, queued_count: int, cam
         }
         
         camp_tbl.update(campaign_id, updates)
+        REPLICA.patch_local(camp_tbl, campaign_id, updates)
         log.info(f"📊 Updated campaign '{campaign_name}' metrics: {queued_count} queued")
         
     except Exception as e:
@@ -161,6 +176,7 @@ def _mark_campaign_completed(camp_tbl, campaign_id: str, campaign_name: str, tot
         }
         
         camp_tbl.update(campaign_id, updates)
+        REPLICA.patch_local(camp_tbl, campaign_id, updates)
         log.info(f"✅ Campaign '{campaign_name}' marked as Completed ({total_processed} prospects processed)")
         
     except Exception as e:
@@ -251,7 +267,7 @@ def _first_name_from(raw: str) -> str:
     m = re.match(r"[A-Za-z]+", str(raw))
     return m.group(0) if m else ""
 
-def _render_message(tpl: str, pf: Dict[str, Any]) -> str:
+def _render_values(pf: Dict[str, Any]) -> Dict[str, str]:
     name = ""
     for k in PROSPECT_NAME_KEYS:
         raw = pf.get(k)
@@ -259,13 +275,29 @@ def _render_message(tpl: str, pf: Dict[str, Any]) -> str:
             name = _first_name_from(str(raw))
             if name:
                 break
-    addr = _first_text(pf.get(PROSPECT_ADDR_F))
-    city = _first_text(pf.get(PROSPECT_CITY_F))
-    msg = (tpl or "")
-    msg = msg.replace("{First}", name)
-    msg = msg.replace("{Address}", addr)
-    msg = msg.replace("{Property City}", city)
-    return msg.strip()
+    return {
+        "First": name,
+        "Address": _first_text(pf.get(PROSPECT_ADDR_F)),
+        "Property_City": _first_text(pf.get(PROSPECT_CITY_F)),
+    }
+
+def _render_message(tpl: str, pf: Dict[str, Any]) -> str:
+    return compile_template(tpl or "", TEMPLATE_SLOTS).render(_render_values(pf)).strip()
+
+def _render_batch(templates: List[Tuple[str, Template]], prospects: List[Dict[str, Any]]) -> List[Tuple[Optional[str], str]]:
+    """Random template per prospect, then one render_many pass per template. Returns (template id, text)."""
+    out: List[Tuple[Optional[str], str]] = [(None, "")] * len(prospects)
+    if not templates:
+        return out
+    groups: Dict[int, List[int]] = defaultdict(list)
+    for i in range(len(prospects)):
+        groups[random.randrange(len(templates))].append(i)
+    for k, rows in groups.items():
+        tid, tpl = templates[k]
+        texts = render_many(tpl, [_render_values((prospects[i] or {}).get("fields", {}) or {}) for i in rows])
+        for i, text in zip(rows, texts):
+            out[i] = (tid, text.strip())
+    return out
 
 def _ct_future_iso_naive(min_s: int = JITTER_MIN_S, max_s: int = JITTER_MAX_S) -> str:
     dt = now_ct() + timedelta(seconds=random.randint(min_s, max_s))
@@ -328,11 +360,13 @@ def _extract_number(fields: Dict[str, Any]) -> Optional[str]:
 
 def _get_numbers_for_market(numbers_tbl, market: str) -> List[str]:
     formula = f"LOWER({{{NUMBERS_MARKET_F}}})=LOWER('{_escape_quotes(market)}')"
-    try:
-        recs = numbers_tbl.all(formula=formula, page_size=100) or []
-    except Exception as e:
-        log.debug(f"Numbers .all(formula=Market) failed, fallback to client-side: {e}")
-        recs = numbers_tbl.all(page_size=100) or []
+    recs = REPLICA.select(numbers_tbl, where=lambda f: str(f.get(NUMBERS_MARKET_F) or "").lower() == market.lower())
+    if recs is None:
+        try:
+            recs = numbers_tbl.all(formula=formula, page_size=100) or []
+        except Exception as e:
+            log.debug(f"Numbers .all(formula=Market) failed, fallback to client-side: {e}")
+            recs = numbers_tbl.all(page_size=100) or []
     pool: List[str] = []
     for r in recs:
         f = r.get("fields", {}) or {}
@@ -364,11 +398,29 @@ def _choose_from_number(numbers_tbl, campaign_market: Optional[str], state: Dict
 
 # ---------- Data fetch ----------
 def _fetch_campaign_by_name(tbl, name: str) -> List[Dict[str, Any]]:
+    local = REPLICA.select(tbl, where=lambda f: f.get(CAMPAIGN_NAME_F) == name)
+    if local is not None:
+        return local
     formula = f"{{{CAMPAIGN_NAME_F}}}='{_escape_quotes(name)}'"
     return tbl.all(formula=formula, page_size=100) or []
 
+def _started(value: Any, now: datetime) -> bool:
+    try:
+        start = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return False
+    return (start if start.tzinfo else start.replace(tzinfo=timezone.utc)) <= now
+
 def _fetch_due_campaigns(tbl) -> List[Dict[str, Any]]:
     # Scheduled & Start <= NOW or Active (exclude Paused/Completed)
+    now = datetime.now(timezone.utc)
+    local = REPLICA.select(
+        tbl,
+        where=lambda f: f.get(CAMPAIGN_STATUS_F) == "Active"
+        or (f.get(CAMPAIGN_STATUS_F) == "Scheduled" and bool(f.get(CAMPAIGN_START_F)) and _started(f[CAMPAIGN_START_F], now)),
+    )
+    if local is not None:
+        return local
     formula = (
         f"AND("
         f"OR({{{CAMPAIGN_STATUS_F}}}='Scheduled',{{{CAMPAIGN_STATUS_F}}}='Active'),"
@@ -378,6 +430,9 @@ def _fetch_due_campaigns(tbl) -> List[Dict[str, Any]]:
     return tbl.all(formula=formula, page_size=100) or []
 
 def _fetch_records_by_ids(tbl, ids: List[str]) -> List[Dict[str, Any]]:
+    local = REPLICA.select(tbl, ids=ids)
+    if local is not None and len(local) == len(set(ids)):
+        return local  # a miss (e.g. created since the last pull) → ask Airtable
     out: List[Dict[str, Any]] = []
     for i in range(0, len(ids), 90):
         chunk = ids[i:i+90]
@@ -386,19 +441,38 @@ def _fetch_records_by_ids(tbl, ids: List[str]) -> List[Dict[str, Any]]:
         out.extend(recs)
     return out
 
-def _fetch_template_messages(templates_tbl, ids: List[str]) -> List[Tuple[str, str]]:
-    pairs: List[Tuple[str, str]] = []
+def _fetch_template_messages(
+    templates_tbl, ids: List[str], known: Optional[Dict[str, Dict[str, Any]]] = None
+) -> List[Tuple[str, Template]]:
+    """(template id, compiled template) for the linked ids; `known` = records already fetched this run."""
+    pairs: List[Tuple[str, Template]] = []
     if not ids:
         return pairs
-    recs = _fetch_records_by_ids(templates_tbl, ids)
+    known = known or {}
+    missing = [rid for rid in ids if rid not in known]
+    recs = [known[rid] for rid in ids if rid in known]
+    if missing:
+        recs += _fetch_records_by_ids(templates_tbl, missing)
     for r in recs:
         tid = r.get("id")
-        f = r.get("fields", {}) or {}
-        msg = f.get(TEMPLATE_MESSAGE_F)
-        if tid and isinstance(msg, str) and msg.strip():
-            pairs.append((tid, msg.strip()))
+        tpl = TEMPLATE_CACHE.for_record(r, TEMPLATE_MESSAGE_F, names=TEMPLATE_SLOTS)
+        if tid and tpl is not None:
+            pairs.append((tid, tpl))
     return pairs
 
+def _prefetch_templates(camps: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """One Templates read for every campaign in this run (instead of one per campaign)."""
+    ids = list(dict.fromkeys(
+        tid for c in camps for tid in (((c or {}).get("fields", {}) or {}).get(CAMPAIGN_TEMPLATES_LINK_F) or [])
+    ))
+    if not ids:
+        return {}
+    try:
+        return {r["id"]: r for r in _fetch_records_by_ids(CONNECTOR.templates().table, ids) if r.get("id")}
+    except Exception as e:
+        log.warning(f"⚠️ Template prefetch failed, fetching per campaign: {e}")
+        return {}
+
 # ---------- Duplicate guards ----------
 def _already_in_drip_campaign_phone(drip_tbl, campaign_name: str, phone: str) -> bool:
     """Airtable dedupe for (Campaign + Seller Phone) with non-Failed status; robust for linked field."""
@@ -431,6 +505,66 @@ def _any_active_for_phone(drip_tbl, phone: str) -> bool:
     except Exception:
         return False
 
+class DripDedupeIndex:
+    """
+    Non-Failed Drip Queue rows loaded once (phone / campaign / status only) into hash sets.
+    Shared by every campaign in a run; rows queued during the run are added as they go.
+    If the preload fails, `loaded` stays False and callers use the per-prospect queries.
+    """
+
+    def __init__(self) -> None:
+        self.loaded = False
+        self.rows = 0
+        self.active_phones: set[str] = set()              # last-10 digits
+        self.campaign_phones: set[Tuple[str, str]] = set()  # (campaign record id, last-10 digits)
+
+    @classmethod
+    def load(cls, drip_handle) -> "DripDedupeIndex":
+        idx = cls()
+        tbl = drip_handle.table
+        started = time.perf_counter()
+        try:
+            local = REPLICA.select(drip_handle, where=lambda f: str(f.get(DRIP_STATUS_F) or "") != "Failed")
+            iterate = getattr(tbl, "iterate", None)
+            if local is not None:
+                pages = [local]
+            elif callable(iterate):
+                pages = iterate(
+                    page_size=100,
+                    fields=[DRIP_SELLER_PHONE_F, DRIP_CAMPAIGN_LINK_F, DRIP_STATUS_F],
+                    formula=f"NOT({{{DRIP_STATUS_F}}}='Failed')",
+                )
+            else:  # in-memory tables
+                pages = [tbl.all() or []]
+            for page in pages:
+                for rec in page or []:
+                    f = rec.get("fields", {}) or {}
+                    if str(f.get(DRIP_STATUS_F) or "") == "Failed":
+                        continue
+                    links = f.get(DRIP_CAMPAIGN_LINK_F) or []
+                    idx.add(links if isinstance(links, list) else [links], f.get(DRIP_SELLER_PHONE_F))
+                    idx.rows += 1
+            idx.loaded = True
+            log.info(f"📥 Drip dedupe preload: {idx.rows} rows, {len(idx.active_phones)} phones in {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            log.warning(f"⚠️ Drip dedupe preload failed, falling back to per-prospect queries: {e}")
+        return idx
+
+    def add(self, campaign_ids: List[Any], phone: Optional[str]) -> None:
+        d = last_10_digits(phone)
+        if not d:
+            return
+        self.active_phones.add(d)
+        for cid in campaign_ids:
+            if cid:
+                self.campaign_phones.add((str(cid), d))
+
+    def in_campaign(self, campaign_id: Optional[str], phone: str) -> bool:
+        return bool(campaign_id) and (str(campaign_id), last_10_digits(phone) or "") in self.campaign_phones
+
+    def active_for_phone(self, phone: str) -> bool:
+        return GLOBAL_PHONE_DEDUPE and (last_10_digits(phone) or "") in self.active_phones
+
 def _campaign_has_queued_rows(drip_tbl, campaign_name: str) -> bool:
     """Loop guard: if campaign already has QUEUED/Retry/Sending… rows, skip run."""
     # broaden pending statuses; avoid the ellipsis glyph
@@ -448,6 +582,58 @@ def _campaign_has_queued_rows(drip_tbl, campaign_name: str) -> bool:
     except Exception:
         return False
 
+# ---------- Bulk Drip Queue creates ----------
+def _batch_create(drip_tbl, bucket, rows: List[Dict[str, Any]]) -> None:
+    batch_create = getattr(drip_tbl, "batch_create", None)
+    if callable(batch_create):
+        with bucket.sending():
+            created = batch_create(rows)
+    else:  # in-memory / legacy tables
+        created = [drip_tbl.create(row) for row in rows]
+    REPLICA.upsert_local(drip_tbl, created or [])  # next run's dedupe sees them before the delta pull
+
+def _create_chunk(drip_tbl, bucket, rows: List[Dict[str, Any]]) -> Tuple[int, int]:
+    """Create ≤10 rows. Returns (created, failed)."""
+    try:
+        _batch_create(drip_tbl, bucket, rows)
+        return len(rows), 0
+    except Exception as e:
+        msg = str(e)
+        if "INVALID_MULTIPLE_CHOICE_OPTIONS" in msg and any(DRIP_MARKET_F in r for r in rows):
+            retry = [{k: v for k, v in r.items() if k != DRIP_MARKET_F} for r in rows]
+            try:
+                _batch_create(drip_tbl, bucket, retry)
+                log.warning(f"⚠️ Market select rejected; queued {len(rows)} rows without Market.")
+                return len(rows), 0
+            except Exception as e2:
+                e, msg = e2, str(e2)
+        if len(rows) > 1:
+            # One bad row fails the whole chunk → isolate it
+            log.warning(f"Batch create failed [Drip Queue] ({len(rows)} rows), retrying per row: {msg}")
+            created = failed = 0
+            for row in rows:
+                c, f = _create_chunk(drip_tbl, bucket, [row])
+                created += c
+                failed += f
+            return created, failed
+        log.error(f"Airtable create failed [Drip Queue]: {e}")
+        return 0, 1
+
+def _bulk_create_drips(drip_handle, payloads: List[Dict[str, Any]]) -> Tuple[int, int]:
+    """Create Drip Queue rows in 10-row chunks, a few chunks in flight, paced per base."""
+    if not payloads:
+        return 0, 0
+    drip_tbl = drip_handle.table
+    bucket = base_bucket(drip_handle.base_id, "bulk")  # pool threads don't inherit the lane
+    chunks = [payloads[i:i + DRIP_CREATE_CHUNK] for i in range(0, len(payloads), DRIP_CREATE_CHUNK)]
+    workers = max(1, min(DRIP_CREATE_WORKERS, len(chunks)))
+    if workers == 1:
+        results = [_create_chunk(drip_tbl, bucket, c) for c in chunks]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="drip-create") as pool:
+            results = list(pool.map(lambda c: _create_chunk(drip_tbl, bucket, c), chunks))
+    return sum(c for c, _ in results), sum(f for _, f in results)
+
 # ---------- Core queueing ----------
 def _queue_one_campaign(
     camp_tbl,
@@ -455,6 +641,8 @@ def _queue_one_campaign(
     limit: Optional[int],
     dryrun: bool,
     preview_limit: int = 5,
+    dedupe: Optional[DripDedupeIndex] = None,
+    template_records: Optional[Dict[str, Dict[str, Any]]] = None,
 ) -> Dict[str, Any]:
     cf = (campaign or {}).get("fields", {}) or {}
     cid = campaign.get("id")
@@ -468,6 +656,7 @@ def _queue_one_campaign(
         if cstart:
             try:
                 camp_tbl.update(cid, {CAMPAIGN_STATUS_F: "Active"})
+                REPLICA.patch_local(camp_tbl, cid, {CAMPAIGN_STATUS_F: "Active"})
                 cstatus = "active"
                 log.info(f"▶️ Campaign '{cname}' is now Active (start time reached).")
             except Exception as e:
@@ -479,7 +668,8 @@ def _queue_one_campaign(
         return {"campaign": cname, "queued": 0, "skipped": "status"}
 
     # Loop guard: don't requeue if this campaign already has pending rows
-    drip_tbl = CONNECTOR.drip_queue().table
+    drip_handle = CONNECTOR.drip_queue()
+    drip_tbl = drip_handle.table
     if cname and _campaign_has_queued_rows(drip_tbl, cname):
         log.warning(f"⚠️ Campaign {cname} already has pending drips — skipping duplicate run.")
         return {"campaign": cname, "queued": 0, "skipped": "already_pending"}
@@ -501,7 +691,7 @@ def _queue_one_campaign(
 
     # Templates (rotate per message). If none, messages will be blank.
     tmpl_ids = cf.get(CAMPAIGN_TEMPLATES_LINK_F) or []
-    templates = _fetch_template_messages(templates_tbl, tmpl_ids)
+    templates = _fetch_template_messages(templates_tbl, tmpl_ids, template_records)
     if not templates:
         log.warning(f"⚠️ Campaign {cname} has no valid templates; messages will be blank.")
         templates = []
@@ -520,10 +710,26 @@ def _queue_one_campaign(
     reasons = defaultdict(int)
     seen_phones: set[str] = set()  # per-run dedupe
     total_prospects = len(prospects[:take])
+    pending: List[Dict[str, Any]] = []  # buffered creates
+    if dedupe is None:
+        dedupe = DripDedupeIndex.load(drip_handle)
+    last_status_check = float("-inf")
+    messages = _render_batch(templates, prospects[:take])
+
+    def _flush_pending(report: bool = True) -> None:
+        nonlocal queued
+        created, failed = _bulk_create_drips(drip_handle, pending)
+        pending.clear()
+        queued += created
+        if failed:
+            reasons["create_failed"] += failed
+        if report:  # real-time progress tracking
+            _update_campaign_progress(camp_tbl, cid, queued, cname)
 
     for i, pr in enumerate(prospects[:take]):
-        # Check for pause during execution (every 10 prospects for efficiency)
-        if i % 10 == 0:
+        # Check for pause during execution (time-throttled; the loop itself is local now)
+        if time.monotonic() - last_status_check >= CAMPAIGN_PAUSE_CHECK_SEC:
+            last_status_check = time.monotonic()
             current_status = _check_campaign_status(camp_tbl, cid)
             if current_status == "paused":
                 log.info(f"🛑 Campaign '{cname}' was paused during execution - stopping at prospect {i+1}/{total_prospects}")
@@ -544,21 +750,25 @@ def _queue_one_campaign(
         seen_phones.add(phone)
 
         # Airtable dedupe (Campaign + Seller Phone)
-        if cname and _already_in_drip_campaign_phone(drip_tbl, cname, phone):
+        if dedupe.loaded:
+            dup_campaign = dedupe.in_campaign(cid, phone)
+        else:
+            dup_campaign = bool(cname) and _already_in_drip_campaign_phone(drip_tbl, cname, phone)
+        if dup_campaign:
             reasons["dup_in_airtable"] += 1
             continue
 
         # Optional global phone dedupe (any campaign, not Failed)
-        if _any_active_for_phone(drip_tbl, phone):
+        if dedupe.loaded:
+            dup_global = dedupe.active_for_phone(phone)
+        else:
+            dup_global = _any_active_for_phone(drip_tbl, phone)
+        if dup_global:
             reasons["dup_global_phone"] += 1
             continue
 
-        # Template & message render
-        if templates:
-            tmpl_id, body = random.choice(templates)
-        else:
-            tmpl_id, body = None, ""
-        rendered = _render_message(body, pf)
+        # Template & message (rendered up front, one pass per template)
+        tmpl_id, rendered = messages[i]
 
         # Don't queue empty messages
         if not rendered.strip():
@@ -574,7 +784,9 @@ def _queue_one_campaign(
             # fallback: any active number
             pool_any = _get_numbers_for_market(numbers_tbl, cmarket or drip_market)
             if not pool_any:
-                all_numbers = numbers_tbl.all(page_size=100) or []
+                all_numbers = REPLICA.select(numbers_tbl)
+                if all_numbers is None:
+                    all_numbers = numbers_tbl.all(page_size=100) or []
                 from_number = next((
                     _extract_number(r.get("fields", {})) 
                     for r in all_numbers 
@@ -621,29 +833,14 @@ def _queue_one_campaign(
                 })
             continue
 
-        # Real write
-        try:
-            CONNECTOR.drip_queue().table.create(payload)
-            queued += 1
-        except Exception as e:
-            msg = str(e)
-            if "INVALID_MULTIPLE_CHOICE_OPTIONS" in msg and DRIP_MARKET_F in payload:
-                retry = dict(payload)
-                retry.pop(DRIP_MARKET_F, None)
-                try:
-                    CONNECTOR.drip_queue().table.create(retry)
-                    queued += 1
-                    log.warning(f"⚠️ Market select rejected ({drip_market}); queued without Market.")
-                except Exception as e2:
-                    reasons["create_failed"] += 1
-                    log.error(f"Airtable create failed [Drip Queue] after Market retry: {e2}")
-            else:
-                reasons["create_failed"] += 1
-                log.error(f"Airtable create failed [Drip Queue]: {e}")
+        # Real write (buffered; flushed in bulk)
+        pending.append(payload)
+        dedupe.add([cid], phone)
+        if len(pending) >= DRIP_CREATE_FLUSH_ROWS:
+            _flush_pending()
 
-        # Update campaign progress every 25 prospects (for real-time tracking)
-        if not dryrun and (i + 1) % 25 == 0:
-            _update_campaign_progress(camp_tbl, cid, queued, cname)
+    if pending:
+        _flush_pending(report=False)
 
     # Final progress update and completion check
     if not dryrun:
@@ -678,6 +875,7 @@ def _queue_one_campaign(
     return out
 
 # ---------- Orchestrator ----------
+@airtable_lane("bulk")
 def run_campaigns(limit: Optional[str] = "ALL", send_after_queue: bool = SEND_AFTER_QUEUE_DEFAULT,
                   campaign_name: Optional[str] = None, dryrun: bool = False) -> Dict[str, Any]:
     per_camp_limit = None if (limit is None or str(limit).upper() == "ALL") else max(int(limit), 1)
@@ -689,7 +887,7 @@ def run_campaigns(limit: Optional[str] = "ALL", send_after_queue: bool = SEND_AF
 
     # Quiet hours: allow dry-run, block real writes
     if not dryrun and is_quiet_hours():
-        log.warning(f"⏸️ Quiet hours ({QUIET_START:02d}:00–{QUIET_END:02d}:00 CT). Skipping queueing.")
+        log.warning(f"⏸️ Quiet hours ({QUIET_START:02d}:00–{QUIET_END:02d}:00 local, all zones). Skipping queueing.")
         return {"ok": True, "queued": 0, "quiet_hours": True}
 
     camp_tbl = CONNECTOR.campaigns().table
@@ -707,8 +905,10 @@ def run_campaigns(limit: Optional[str] = "ALL", send_after_queue: bool = SEND_AF
 
     results = []
     total = 0
+    dedupe = DripDedupeIndex.load(CONNECTOR.drip_queue()) if camps else None
+    template_records = _prefetch_templates(camps)
     for camp in camps:
-        r = _queue_one_campaign(camp_tbl, camp, per_camp_limit, dryrun)
+        r = _queue_one_campaign(camp_tbl, camp, per_camp_limit, dryrun, dedupe=dedupe, template_records=template_records)
         results.append(r)
         total += int(r.get("queued", 0))
 
@@ -357,23 +357,33 @@ except Exception:
     Api = None  # type: ignore
 
 
+def _api(key: str):
+    """Cached Api sharing the pooled Airtable transport (imported lazily: config loads first)."""
+    try:
+        from sms.http_transport import airtable_api
+
+        return airtable_api(key)
+    except Exception:
+        return Api(key)
+
+
 @lru_cache(maxsize=1)
 def api_main():
     s = settings()
-    return Api(s.AIRTABLE_API_KEY) if (Api and s.AIRTABLE_API_KEY and s.LEADS_CONVOS_BASE) else None
+    return _api(s.AIRTABLE_API_KEY) if (Api and s.AIRTABLE_API_KEY and s.LEADS_CONVOS_BASE) else None
 
 
 @lru_cache(maxsize=1)
 def api_control():
     s = settings()
-    return Api(s.AIRTABLE_API_KEY) if (Api and s.AIRTABLE_API_KEY and s.CAMPAIGN_CONTROL_BASE) else None
+    return _api(s.AIRTABLE_API_KEY) if (Api and s.AIRTABLE_API_KEY and s.CAMPAIGN_CONTROL_BASE) else None
 
 
 @lru_cache(maxsize=1)
 def api_perf():
     s = settings()
     key = s.AIRTABLE_REPORTING_KEY or s.AIRTABLE_API_KEY
-    return Api(key) if (Api and key and s.PERFORMANCE_BASE) else None
+    return _api(key) if (Api and key and s.PERFORMANCE_BASE) else None
 
 
 def table_main(table_name: str):
@@ -0,0 +1,287 @@
+"""
+🗒️ Conversation Journal
+───────────────────────
+The one write path for Conversations rows: outbound sends, inbound replies, trail entries.
+
+- `append()` queues a row; a background flusher writes 10-record batches every
+  JOURNAL_FLUSH_SEC, or as soon as a batch fills, paced by the per-base governor
+- Rows carrying a TextGrid SID are upserts keyed on the SID column (Airtable performUpsert),
+  so each message ends up as exactly one row however many paths report it. A second append
+  for a queued SID merges into that row; one for a SID already written becomes an update
+- `write()` is the synchronous form for callers that need the record id (e.g. failed sends → retry queue)
+- `on_written` callbacks get the record id once the row lands (SID index, per-phone rollup)
+- A failed row is retried with exponential backoff (JOURNAL_RETRY_BASE_SEC, capped at
+  JOURNAL_RETRY_MAX_SEC) and dropped after JOURNAL_MAX_ATTEMPTS, so an outage of about a minute doesn't lose rows
+- JOURNAL_BUFFERED=false writes every append inline with the same upsert semantics
+- The queue lives in memory; `drain()` runs at exit
+"""
+
+from __future__ import annotations
+
+import atexit
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sms.airtable_governor import airtable_lane
+from sms.config import CONV_FIELDS
+from sms.field_registry import FIELD_REGISTRY, FIELD_REGISTRY_MAX_RETRIES, _identify
+from sms.runtime import get_logger
+
+logger = get_logger("conversation_journal")
+
+# =========================
+# ENV / CONFIG
+# =========================
+JOURNAL_BUFFERED = os.getenv("JOURNAL_BUFFERED", "true").lower() in ("1", "true", "yes")
+JOURNAL_FLUSH_SEC = float(os.getenv("JOURNAL_FLUSH_SEC", "1"))
+JOURNAL_MAX_ATTEMPTS = max(1, int(os.getenv("JOURNAL_MAX_ATTEMPTS", "6")))
+JOURNAL_RETRY_BASE_SEC = float(os.getenv("JOURNAL_RETRY_BASE_SEC", "2"))
+JOURNAL_RETRY_MAX_SEC = float(os.getenv("JOURNAL_RETRY_MAX_SEC", "60"))
+JOURNAL_SID_CACHE = int(os.getenv("JOURNAL_SID_CACHE", "5000"))
+BATCH_SIZE = 10  # Airtable max records per batch call
+
+SID_FIELD = CONV_FIELDS.get("TEXTGRID_ID", "TextGrid ID")
+
+Callback = Callable[[Optional[str]], None]
+
+
+def _table_key(table: Any) -> Any:
+    """(base id, table name) so different Table objects for one table share a SID index; id() otherwise."""
+    base, name, _ = _identify(table)
+    return (base, name) if base and name else id(table)
+
+
+class JournalEntry:
+    """One queued Conversations row; `record_id` is set once it has been written, `retry_at` after a failure."""
+
+    __slots__ = ("key", "table", "fields", "sid", "callbacks", "record_id", "attempts", "retry_at", "done")
+
+    def __init__(self, key: Tuple[Any, ...], table: Any, fields: Dict[str, Any], sid: Optional[str]):
+        self.key = key
+        self.table = table
+        self.fields = fields
+        self.sid = sid
+        self.callbacks: List[Callback] = []
+        self.record_id: Optional[str] = None
+        self.attempts = 0
+        self.retry_at = 0.0
+        self.done = threading.Event()
+
+
+class ConversationJournal:
+    """SID-keyed, batched Conversations writer."""
+
+    def __init__(self, buffered: Optional[bool] = None):
+        self.buffered = JOURNAL_BUFFERED if buffered is None else buffered
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: "OrderedDict[Tuple[Any, ...], JournalEntry]" = OrderedDict()
+        self._written: "OrderedDict[Tuple[Any, str], str]" = OrderedDict()  # (table key, SID) → record id
+        self._seq = itertools.count()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats: Dict[str, int] = {
+            "appended": 0, "merged": 0, "records_written": 0, "batch_calls": 0,
+            "upserts": 0, "updates": 0, "creates": 0, "retried": 0, "dropped": 0,
+        }
+
+    # ---------- producer ----------
+    def append(
+        self, table: Any, fields: Dict[str, Any], *, sid: Optional[str] = None, on_written: Optional[Callback] = None
+    ) -> JournalEntry:
+        """Queue a row (merged into a queued row with the same SID). Returns its entry."""
+        sid = str(sid).strip() if sid else None
+        fields = dict(fields or {})
+        if sid:
+            fields.setdefault(SID_FIELD, sid)
+        with self._lock:
+            key = (_table_key(table), sid) if sid else (_table_key(table), next(self._seq))
+            entry = self._pending.get(key)
+            if entry is None:
+                entry = self._pending[key] = JournalEntry(key, table, fields, sid)
+            else:
+                entry.fields.update(fields)
+                self.stats["merged"] += 1
+            if on_written is not None:
+                entry.callbacks.append(on_written)
+            self.stats["appended"] += 1
+            full = len(self._pending) >= BATCH_SIZE
+        if not self.buffered:
+            self.flush()
+        else:
+            self.start()
+            if full:
+                self._wake.set()
+        return entry
+
+    def write(
+        self, table: Any, fields: Dict[str, Any], *, sid: Optional[str] = None,
+        on_written: Optional[Callback] = None, timeout: float = 10.0,
+    ) -> Optional[str]:
+        """Append and flush now; returns the record id (None if the write failed)."""
+        entry = self.append(table, fields, sid=sid, on_written=on_written)
+        if self.buffered:
+            self.flush()
+        entry.done.wait(timeout)  # the flusher thread may have taken it first
+        return entry.record_id
+
+    # ---------- flusher ----------
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="journal-flush", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(JOURNAL_FLUSH_SEC)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.warning("⚠️ Journal flush error", exc_info=True)
+
+    def flush(self) -> int:
+        """Write everything queued and not backing off after a failure. Returns rows written."""
+        with self._flush_lock:
+            now = time.time()
+            with self._lock:
+                batch = [e for e in self._pending.values() if e.retry_at <= now]
+                for entry in batch:
+                    del self._pending[entry.key]
+            groups: "OrderedDict[Any, List[JournalEntry]]" = OrderedDict()
+            for entry in batch:
+                groups.setdefault(entry.key[0], []).append(entry)
+            return sum(self._write_table(entries[0].table, entries) for entries in groups.values())
+
+    @airtable_lane("send")
+    def _write_table(self, table: Any, entries: List[JournalEntry]) -> int:
+        by_mode: Dict[str, List[JournalEntry]] = {"update": [], "upsert": [], "create": []}
+        for entry in entries:
+            known = self._written.get((entry.key[0], entry.sid)) if entry.sid else None
+            if known:
+                entry.record_id = known
+            by_mode["update" if known else "upsert" if entry.sid else "create"].append(entry)
+        written = 0
+        for mode, items in by_mode.items():
+            for i in range(0, len(items), BATCH_SIZE):
+                written += self._write_chunk(table, mode, items[i:i + BATCH_SIZE])
+        return written
+
+    def _write_chunk(self, table: Any, mode: str, chunk: List[JournalEntry]) -> int:
+        for _ in range(1 + FIELD_REGISTRY_MAX_RETRIES):
+            records = [FIELD_REGISTRY.remap(table, e.fields) for e in chunk]
+            try:
+                landed = self._send(table, mode, chunk, records)
+                break
+            except Exception as exc:
+                if FIELD_REGISTRY.note_error(table, exc, records):
+                    continue  # column Airtable rejected is dropped from now on → retry
+                logger.error(f"🗒️ Conversations {mode} failed ({len(chunk)} rows): {exc}")
+                self._requeue(chunk)
+                return 0
+        else:
+            self._requeue(chunk)
+            return 0
+        for entry, rec in zip(chunk, landed):
+            self._landed(table, entry, (rec or {}).get("id") or entry.record_id)
+        self.stats["records_written"] += len(chunk)
+        return len(chunk)
+
+    def _send(self, table: Any, mode: str, chunk: List[JournalEntry], records: List[Dict[str, Any]]) -> List[Any]:
+        """One Airtable call (or per-row calls for tables without batch methods)."""
+        if mode == "update":
+            batch_update = getattr(table, "batch_update", None)
+            self.stats["updates"] += len(chunk)
+            if callable(batch_update):
+                self.stats["batch_calls"] += 1
+                return list(batch_update([{"id": e.record_id, "fields": r} for e, r in zip(chunk, records)]) or [])
+            return [table.update(e.record_id, r) for e, r in zip(chunk, records)]
+
+        if mode == "upsert":
+            key_field = next(iter(FIELD_REGISTRY.remap(table, {SID_FIELD: "x"})), None)
+            batch_upsert = getattr(table, "batch_upsert", None)
+            if key_field and callable(batch_upsert) and all(r.get(key_field) for r in records):
+                self.stats["upserts"] += len(chunk)
+                self.stats["batch_calls"] += 1
+                result = batch_upsert([{"fields": r} for r in records], key_fields=[key_field])
+                landed = result.get("records", []) if isinstance(result, dict) else list(result or [])
+                by_sid = {str((rec.get("fields") or {}).get(key_field)): rec for rec in landed}
+                return [by_sid.get(str(r.get(key_field))) for r in records]
+
+        batch_create = getattr(table, "batch_create", None)
+        self.stats["creates"] += len(chunk)
+        if callable(batch_create) and len(records) > 1:
+            self.stats["batch_calls"] += 1
+            return list(batch_create(records) or [])
+        return [table.create(r) for r in records]
+
+    def _landed(self, table: Any, entry: JournalEntry, record_id: Optional[str]) -> None:
+        entry.record_id = record_id
+        if entry.sid and record_id:
+            with self._lock:
+                self._written[(entry.key[0], entry.sid)] = record_id
+                self._written.move_to_end((entry.key[0], entry.sid))
+                while len(self._written) > JOURNAL_SID_CACHE:
+                    self._written.popitem(last=False)
+        entry.done.set()
+        for callback in entry.callbacks:
+            try:
+                callback(record_id)
+            except Exception as e:
+                logger.warning(f"Journal callback failed for {entry.sid or 'row'}: {e}")
+
+    def _requeue(self, chunk: List[JournalEntry]) -> None:
+        now = time.time()
+        with self._lock:
+            for entry in chunk:
+                entry.attempts += 1
+                entry.retry_at = now + min(JOURNAL_RETRY_MAX_SEC, JOURNAL_RETRY_BASE_SEC * 2 ** (entry.attempts - 1))
+                entry.done.set()  # a synchronous write() returns (record id None) instead of waiting
+                if entry.attempts >= JOURNAL_MAX_ATTEMPTS:
+                    self.stats["dropped"] += 1
+                    logger.warning(f"🗒️ Dropped Conversations row {entry.sid or ''} after {entry.attempts} attempts")
+                    continue
+                queued = self._pending.get(entry.key)
+                if queued is not None:  # a newer append for the same SID arrived meanwhile
+                    entry.fields.update(queued.fields)
+                    entry.callbacks.extend(queued.callbacks)
+                self._pending[entry.key] = entry
+                self.stats["retried"] += 1
+
+    # ---------- maintenance ----------
+    def backlog(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def drain(self, timeout: float = 30.0) -> bool:
+        """Flush until nothing is queued (shutdown, tests); waits out retry backoffs up to `timeout`."""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            self.flush()
+            if not self.backlog():
+                return True
+            time.sleep(0.05)
+        return False
+
+    def status(self) -> Dict[str, Any]:
+        return {"buffered": self.buffered, "pending": self.backlog(), "known_sids": len(self._written), **self.stats}
+
+
+JOURNAL = ConversationJournal()
+atexit.register(JOURNAL.drain, 5.0)
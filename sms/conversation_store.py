@@ -15,6 +15,7 @@ from sms.airtable_schema import (
     ensure_processed_by,
     ensure_stage,
 )
+from sms.datastore import iter_records
 from sms.tables import get_convos, get_leads, get_prospects
 
 
@@ -115,19 +116,21 @@ def _find_record_by_phone(tbl, phone: Optional[str]) -> Optional[Dict[str, Any]]
     want = last10(phone)
     if not want:
         return None
+    candidates = (
+        "Seller Phone Number",
+        "Phone",
+        "phone",
+        "Mobile",
+        "Cell",
+        "Primary Phone",
+        "Phone 1 (from Linked Owner)",
+        "Phone 2 (from Linked Owner)",
+    )
     try:
-        for record in tbl.all():
+        # Streams page by page and stops downloading at the first match
+        for record in iter_records(tbl):
             fields = record.get("fields", {}) or {}
-            for candidate in (
-                "Seller Phone Number",
-                "Phone",
-                "phone",
-                "Mobile",
-                "Cell",
-                "Primary Phone",
-                "Phone 1 (from Linked Owner)",
-                "Phone 2 (from Linked Owner)",
-            ):
+            for candidate in candidates:
                 if last10(fields.get(candidate)) == want:
                     return record
     except Exception as exc:
@@ -140,13 +143,14 @@ def _find_conversation_by_sid(sid: Optional[str]) -> Optional[Dict[str, Any]]:
     tbl = _conversation_table()
     if not tbl or not sid:
         return None
-    try:
-        for record in tbl.all():
-            fields = record.get("fields", {}) or {}
-            if str(fields.get(CONVERSATIONS.textgrid_id) or "") == sid or str(fields.get("TextGrid ID") or "") == sid:
-                return record
-    except Exception as exc:
-        print(f"⚠️ Failed to scan Conversations for SID {sid}: {exc}")
+    safe = str(sid).replace("'", "\\'")
+    columns = dict.fromkeys([CONVERSATIONS.textgrid_id, "TextGrid ID"])
+    formula = "OR(" + ",".join(f"{{{c}}}='{safe}'" for c in columns) + ")"
+    # Read errors propagate: "lookup failed" must not look like "no such SID"
+    for record in iter_records(tbl, formula=formula):
+        fields = record.get("fields", {}) or {}
+        if any(str(fields.get(c) or "") == sid for c in columns):
+            return record
     return None
 
 
@@ -161,7 +165,11 @@ def upsert_conversation(payload: Dict[str, Any], textgrid_id: Optional[str]) ->
     """Create or update a Conversations row, enforcing idempotency on TextGrid ID."""
     tbl = _conversation_table()
     if tbl:
-        existing = _find_conversation_by_sid(textgrid_id)
+        try:
+            existing = _find_conversation_by_sid(textgrid_id)
+        except Exception as exc:
+            print(f"⚠️ SID lookup failed for {textgrid_id}; not writing to avoid a duplicate: {exc}")
+            return None
         if existing:
             print(f"↩️ Updating existing conversation for TextGrid ID {textgrid_id}")
             _safe_update(tbl, existing["id"], payload)
@@ -0,0 +1,418 @@
+"""
+📒 Conversation Summary
+───────────────────────
+Per-phone rollup of the Conversations table (last-10-digits key).
+
+- sent / reply counts, last outbound / inbound timestamps, current stage, linked lead id
+- Warmed from one paged Conversations sweep (projected columns only) on a background thread
+  (startup warm or first use); callers keep their legacy paths until it completes
+- The sweep checkpoints its Airtable page offset after every page, so an interrupted sweep resumes
+- Updated in place on every logged send / inbound → no per-message history scans
+- New rows written elsewhere are picked up by a throttled CREATED_TIME() delta pull
+- Counted record ids are remembered, so sweeps, deltas and local writes never double count; ids
+  counted before the delta high-water mark can't come back and are pruned on each refresh
+- Stored in SQLite (WAL) under SMS_STATE_DIR; tables without a base id fall back to callers' legacy paths
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sms.config import CONV_FIELDS
+from sms.phone_index import _resolve_table, _table_key
+from sms.runtime import get_logger, last_10_digits, state_path
+
+logger = get_logger("conversation_summary")
+
+# =========================
+# ENV / CONFIG
+# =========================
+CONVO_SUMMARY_PATH = os.getenv("CONVO_SUMMARY_PATH") or ""
+CONVO_SUMMARY_REFRESH_SEC = float(os.getenv("CONVO_SUMMARY_REFRESH_SEC", "300"))
+CONVO_SUMMARY_SKEW_SEC = int(os.getenv("CONVO_SUMMARY_SKEW_SEC", "60"))
+CONVO_SUMMARY_SWEEP_RETRY_SEC = float(os.getenv("CONVO_SUMMARY_SWEEP_RETRY_SEC", "30"))
+PAGE_SIZE = 100
+
+FROM_FIELD = CONV_FIELDS["FROM"]
+DIR_FIELD = CONV_FIELDS["DIRECTION"]
+RECEIVED_AT_FIELD = CONV_FIELDS["RECEIVED_AT"]
+SENT_AT_FIELD = CONV_FIELDS["SENT_AT"]
+STAGE_FIELD = CONV_FIELDS["STAGE"]
+LEAD_LINK_FIELD = CONV_FIELDS.get("LEAD", "Lead")
+LEAD_ID_FIELD = "Lead Record ID"
+
+SWEEP_COLUMNS: List[str] = list(
+    dict.fromkeys([FROM_FIELD, DIR_FIELD, RECEIVED_AT_FIELD, SENT_AT_FIELD, STAGE_FIELD, LEAD_LINK_FIELD, LEAD_ID_FIELD])
+)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS summary ("
+    " tbl TEXT NOT NULL, digits TEXT NOT NULL,"
+    " sent INTEGER NOT NULL DEFAULT 0, replies INTEGER NOT NULL DEFAULT 0,"
+    " last_outbound TEXT, last_inbound TEXT, stage TEXT, stage_at TEXT, lead_id TEXT,"
+    " PRIMARY KEY (tbl, digits))",
+    "CREATE TABLE IF NOT EXISTS counted ("
+    " tbl TEXT NOT NULL, record_id TEXT NOT NULL, counted_at TEXT, PRIMARY KEY (tbl, record_id))",
+    "CREATE TABLE IF NOT EXISTS sync_state ("
+    " tbl TEXT PRIMARY KEY, high_water TEXT, swept_at TEXT, sweep_started TEXT, sweep_offset TEXT)",
+)
+
+# Columns added after the first release: (table, column)
+_MIGRATIONS = (
+    ("counted", "counted_at"),
+    ("sync_state", "sweep_started"),
+    ("sync_state", "sweep_offset"),
+)
+
+_EMPTY: Dict[str, Any] = {
+    "sent": 0,
+    "replies": 0,
+    "last_outbound": None,
+    "last_inbound": None,
+    "stage": None,
+    "lead_id": None,
+}
+
+
+# =========================
+# Helpers
+# =========================
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _iso(dt: datetime) -> str:
+    return dt.replace(microsecond=0).isoformat().replace("+00:00", "Z")
+
+
+def _is_outbound(direction: Any) -> Optional[bool]:
+    d = str(direction or "").strip().upper()
+    if d.startswith("OUT"):
+        return True
+    if d.startswith("IN"):
+        return False
+    return None
+
+
+def _later(a: Optional[str], b: Optional[str]) -> Optional[str]:
+    # ISO-8601 UTC strings compare chronologically
+    if not a:
+        return b
+    if not b:
+        return a
+    return max(a, b)
+
+
+def _first_link(value: Any) -> Optional[str]:
+    if isinstance(value, (list, tuple)):
+        return str(value[0]) if value else None
+    return str(value) if value else None
+
+
+# =========================
+# Store
+# =========================
+class ConversationSummary:
+    """SQLite-backed per-phone conversation rollup shared by senders and inbound handlers."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or CONVO_SUMMARY_PATH
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._last_refresh: Dict[str, float] = {}
+        self._sweepers: Dict[str, threading.Thread] = {}
+        self._sweep_retry_at: Dict[str, float] = {}
+        self.stats: Dict[str, int] = {
+            "reads": 0, "records": 0, "sweeps": 0, "sweep_errors": 0,
+            "refreshes": 0, "rows_synced": 0, "pruned": 0,
+        }
+
+    # ---------- storage ----------
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path = self.path or state_path("conversation_summary.sqlite3")
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for stmt in _SCHEMA:
+                conn.execute(stmt)
+            for table, col in _MIGRATIONS:
+                if col not in {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} TEXT")
+            # Ids counted before counted_at existed age out from now, like freshly counted ones
+            conn.execute("UPDATE counted SET counted_at=? WHERE counted_at IS NULL", (_iso(_utcnow()),))
+            conn.execute("CREATE INDEX IF NOT EXISTS counted_at_idx ON counted (tbl, counted_at)")
+            self._conn = conn
+        return self._conn
+
+    def _apply(
+        self,
+        key: str,
+        digits: str,
+        outbound: bool,
+        at: Optional[str],
+        *,
+        stage: Optional[str] = None,
+        lead_id: Optional[str] = None,
+        record_id: Optional[str] = None,
+    ) -> bool:
+        """Fold one conversation row into the rollup. Caller holds the lock + transaction."""
+        db = self._db()
+        if record_id:
+            cur = db.execute(
+                "INSERT OR IGNORE INTO counted (tbl, record_id, counted_at) VALUES (?,?,?)",
+                (key, record_id, _iso(_utcnow())),
+            )
+            if cur.rowcount == 0:
+                return False
+        row = db.execute(
+            "SELECT sent, replies, last_outbound, last_inbound, stage, stage_at, lead_id FROM summary WHERE tbl=? AND digits=?",
+            (key, digits),
+        ).fetchone()
+        sent, replies, last_out, last_in, cur_stage, stage_at, cur_lead = row or (0, 0, None, None, None, None, None)
+        if outbound:
+            sent, last_out = sent + 1, _later(last_out, at)
+        else:
+            replies, last_in = replies + 1, _later(last_in, at)
+        if stage and (not stage_at or not at or at >= stage_at):
+            cur_stage, stage_at = stage, at or stage_at
+        db.execute(
+            "INSERT OR REPLACE INTO summary (tbl, digits, sent, replies, last_outbound, last_inbound, stage, stage_at, lead_id)"
+            " VALUES (?,?,?,?,?,?,?,?,?)",
+            (key, digits, sent, replies, last_out, last_in, cur_stage, stage_at, lead_id or cur_lead),
+        )
+        return True
+
+    def _store(self, key: str, records: Iterable[Dict[str, Any]]) -> int:
+        n = 0
+        db = self._db()
+        db.execute("BEGIN")
+        try:
+            for rec in records:
+                fields = rec.get("fields", {}) or {}
+                digits = last_10_digits(fields.get(FROM_FIELD))
+                outbound = _is_outbound(fields.get(DIR_FIELD))
+                if not digits or outbound is None:
+                    continue
+                at = (fields.get(SENT_AT_FIELD) if outbound else fields.get(RECEIVED_AT_FIELD)) or rec.get("createdTime")
+                lead = _first_link(fields.get(LEAD_LINK_FIELD)) or _first_link(fields.get(LEAD_ID_FIELD))
+                if self._apply(key, digits, outbound, at, stage=fields.get(STAGE_FIELD), lead_id=lead, record_id=rec.get("id")):
+                    n += 1
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return n
+
+    # ---------- sync ----------
+    def _pages(self, tbl: Any, formula: Optional[str]) -> Iterator[List[Dict[str, Any]]]:
+        opts: Dict[str, Any] = {"page_size": PAGE_SIZE, "fields": SWEEP_COLUMNS}
+        if formula:
+            opts["formula"] = formula
+        try:
+            yield from tbl.iterate(**opts)
+        except Exception as exc:
+            # Unknown projected columns → retry without projection
+            if "UNKNOWN_FIELD_NAME" not in str(exc):
+                raise
+            opts.pop("fields", None)
+            yield from tbl.iterate(**opts)
+
+    def _sweep_pages(self, tbl: Any, offset: Optional[str]) -> Iterator[Tuple[List[Dict[str, Any]], Optional[str]]]:
+        """Full-sweep pages, each paired with the offset that resumes right after it."""
+        api, url = getattr(tbl, "api", None), getattr(tbl, "url", None)
+        if not (callable(getattr(api, "iterate_requests", None)) and isinstance(url, str)):
+            # Table-likes without raw paging: plain iterate(), no checkpoint
+            for page in self._pages(tbl, None):
+                yield page, None
+            return
+        options: Dict[str, Any] = {"page_size": PAGE_SIZE, "fields": SWEEP_COLUMNS}
+        while True:
+            try:
+                for resp in api.iterate_requests(
+                    method="get",
+                    url=url,
+                    fallback=("post", f"{url}/listRecords"),
+                    options=options,
+                    params={"offset": offset} if offset else None,
+                ):
+                    offset = resp.get("offset")
+                    yield resp.get("records", []), offset
+                return
+            except Exception as exc:
+                msg = str(exc)
+                if "UNKNOWN_FIELD_NAME" in msg and "fields" in options:
+                    options.pop("fields")  # unknown projected column → sweep unprojected from the top
+                elif "LIST_RECORDS_ITERATOR_NOT_AVAILABLE" not in msg or not offset:
+                    raise
+                offset = None  # checkpoint expired on Airtable's side → start over (counted rows are skipped)
+
+    def _sweep(self, tbl: Any, key: str) -> int:
+        """First full sweep, checkpointed per page. Runs on a sweeper thread, never under a send."""
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT sweep_started, sweep_offset FROM sync_state WHERE tbl=?", (key,)).fetchone()
+            started, offset = row if row and row[0] else (_iso(_utcnow()), None)
+            db.execute(
+                "INSERT INTO sync_state (tbl, sweep_started) VALUES (?,?) "
+                "ON CONFLICT(tbl) DO UPDATE SET sweep_started=excluded.sweep_started",
+                (key, started),
+            )
+        if offset:
+            logger.info(f"📒 Resuming sweep {key} from checkpoint")
+        total = 0
+        for page, next_offset in self._sweep_pages(tbl, offset):
+            with self._lock:
+                total += self._store(key, page)
+                self._db().execute("UPDATE sync_state SET sweep_offset=? WHERE tbl=?", (next_offset, key))
+        # Rows created while the sweep ran (however long, across restarts) are caught by the delta pulls
+        mark = _iso(datetime.fromisoformat(started.replace("Z", "+00:00")) - timedelta(seconds=CONVO_SUMMARY_SKEW_SEC))
+        with self._lock:
+            self._db().execute(
+                "UPDATE sync_state SET high_water=?, swept_at=?, sweep_started=NULL, sweep_offset=NULL WHERE tbl=?",
+                (mark, _iso(_utcnow()), key),
+            )
+            self._last_refresh[key] = time.time()
+            self.stats["sweeps"] += 1
+            self.stats["rows_synced"] += total
+        logger.info(f"📒 Sweep {key}: {total} new rows")
+        return total
+
+    def _run_sweep(self, tbl: Any, key: str) -> None:
+        try:
+            self._sweep(tbl, key)
+        except Exception as exc:
+            with self._lock:
+                self.stats["sweep_errors"] += 1
+                self._sweep_retry_at[key] = time.time() + CONVO_SUMMARY_SWEEP_RETRY_SEC
+            logger.warning(f"📒 Sweep {key} interrupted, resumes from its checkpoint: {exc}")
+
+    def _sync(self, tbl: Any, key: str) -> int:
+        """Delta pull: rows created since the high-water mark. Caller holds the lock."""
+        started = _utcnow()
+        formula = f"IS_AFTER(CREATED_TIME(), DATETIME_PARSE('{self._state(key)}'))"
+        total = 0
+        for page in self._pages(tbl, formula):
+            total += self._store(key, page)
+        mark = started - timedelta(seconds=CONVO_SUMMARY_SKEW_SEC)
+        db = self._db()
+        db.execute("UPDATE sync_state SET high_water=? WHERE tbl=?", (_iso(mark), key))
+        # Ids counted before the new mark (less skew) were created before it, so no later pull returns them
+        cutoff = _iso(mark - timedelta(seconds=CONVO_SUMMARY_SKEW_SEC))
+        pruned = db.execute("DELETE FROM counted WHERE tbl=? AND counted_at < ?", (key, cutoff)).rowcount
+        self._last_refresh[key] = time.time()
+        self.stats["refreshes"] += 1
+        self.stats["rows_synced"] += total
+        self.stats["pruned"] += pruned
+        logger.info(f"📒 Refresh {key}: {total} new rows, {pruned} counted ids pruned")
+        return total
+
+    def _state(self, key: str) -> Optional[str]:
+        """High-water mark once the first sweep has completed, else None."""
+        row = self._db().execute("SELECT high_water FROM sync_state WHERE tbl=?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def warm(self, obj: Any, *, wait: bool = False) -> bool:
+        """Start (or resume) the first sweep in the background. True once the table is fully summarized."""
+        tbl = _resolve_table(obj)
+        key = _table_key(tbl)
+        if not key:
+            return False
+        with self._lock:
+            if self._state(key) is not None:
+                return True
+            sweeper = self._sweepers.get(key)
+            if not (sweeper and sweeper.is_alive()) and time.time() >= self._sweep_retry_at.get(key, 0.0):
+                sweeper = threading.Thread(target=self._run_sweep, args=(tbl, key), name=f"convo-summary-sweep:{key}", daemon=True)
+                self._sweepers[key] = sweeper
+                sweeper.start()
+        if wait and sweeper:
+            sweeper.join()
+        with self._lock:
+            return self._state(key) is not None
+
+    def ensure(self, obj: Any, *, max_age: float = CONVO_SUMMARY_REFRESH_SEC) -> Optional[str]:
+        """Delta-refresh a swept table's rollup. Returns its key, or None if unsummarizable or still sweeping."""
+        tbl = _resolve_table(obj)
+        key = _table_key(tbl)
+        if not key or not self.warm(tbl):
+            return None
+        with self._lock:
+            if time.time() - self._last_refresh.get(key, 0.0) >= max_age:
+                try:
+                    self._sync(tbl, key)
+                except Exception as exc:
+                    # Serve what we have; the next call retries the pull
+                    self._last_refresh[key] = time.time()
+                    logger.warning(f"⚠️ Conversation summary sync failed for {key}: {exc}")
+        return key
+
+    # ---------- public API ----------
+    def get(self, obj: Any, phone: str) -> Optional[Dict[str, Any]]:
+        """Rollup for `phone` (zeros if never seen), or None if the table can't be summarized (yet)."""
+        digits = last_10_digits(phone)
+        key = self.ensure(obj) if digits else None
+        if not key:
+            return None
+        with self._lock:
+            row = self._db().execute(
+                "SELECT sent, replies, last_outbound, last_inbound, stage, lead_id FROM summary WHERE tbl=? AND digits=?",
+                (key, digits),
+            ).fetchone()
+        self.stats["reads"] += 1
+        if not row:
+            return dict(_EMPTY)
+        return dict(zip(("sent", "replies", "last_outbound", "last_inbound", "stage", "lead_id"), row))
+
+    def counts(self, obj: Any, phone: str) -> Optional[Tuple[int, int]]:
+        summary = self.get(obj, phone)
+        return (summary["sent"], summary["replies"]) if summary is not None else None
+
+    def record(
+        self,
+        obj: Any,
+        phone: str,
+        direction: str,
+        *,
+        at: Optional[str] = None,
+        stage: Optional[str] = None,
+        lead_id: Optional[str] = None,
+        record_id: Optional[str] = None,
+    ) -> None:
+        """Fold a just-written conversation into the rollup (no Airtable calls)."""
+        key = _table_key(_resolve_table(obj))
+        digits = last_10_digits(phone)
+        outbound = _is_outbound(direction)
+        if not (key and digits) or outbound is None:
+            return
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN")
+            try:
+                self._apply(key, digits, outbound, at or _iso(_utcnow()), stage=stage, lead_id=lead_id, record_id=record_id)
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        self.stats["records"] += 1
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT s.tbl, s.high_water, s.swept_at, COUNT(m.digits) FROM sync_state s "
+                "LEFT JOIN summary m ON m.tbl = s.tbl GROUP BY s.tbl"
+            ).fetchall()
+        return {
+            "path": self.path,
+            "tables": {t: {"high_water": hw, "swept_at": sw, "phones": n} for t, hw, sw, n in rows},
+            "sweeping": sorted(k for k, t in self._sweepers.items() if t.is_alive()),
+            **self.stats,
+        }
+
+
+CONVO_SUMMARY = ConversationSummary()
@@ -2,19 +2,24 @@
 
 from __future__ import annotations
 
+import contextvars
 import itertools
 import os
 import re
 import time
 import traceback
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field as dataclass_field
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
 
 import requests
 
+from sms.airtable_governor import GOVERNOR, LaneHandle
+from sms.conversation_journal import JOURNAL
 from sms.runtime import get_logger, iso_now, last_10_digits, normalize_phone, retry
+from sms.field_registry import FIELD_REGISTRY, FIELD_REGISTRY_MAX_RETRIES
 from sms.config import (
     CONV_STATUS_FIELD,
     CONV_STAGE_FIELD,
@@ -46,6 +51,7 @@ except Exception:
 
 logger = get_logger(__name__)
 DEBUG = os.getenv("DEBUG", "").lower() in {"1", "true", "yes"}
+AIRTABLE_PREFETCH = os.getenv("AIRTABLE_PREFETCH", "false").lower() in {"1", "true", "yes"}
 
 CONV_FIELDS = conversations_field_map()
 LEAD_FIELDS = leads_field_map()
@@ -67,8 +73,6 @@ LEGACY_PHONE_COLUMNS = (
     "Primary Phone",
 )
 
-_FIELD_NORMALISER = re.compile(r"[^a-z0-9]+")
-_field_map_cache: Dict[str, Dict[str, str]] = {}
 _MESSAGE_LOG_BUFFER: List[Dict[str, Any]] = []
 
 
@@ -107,10 +111,6 @@ _TABLE_BASE_PRIORITY: Dict[str, Tuple[str, ...]] = {
 }
 
 
-def _normalise(name: str | None) -> str:
-    return _FIELD_NORMALISER.sub("", (name or "").lower())
-
-
 class InMemoryTable:
     """Minimal Airtable drop-in replacement used for local tests."""
 
@@ -316,6 +316,16 @@ class DataConnector:
 CONNECTOR = DataConnector()
 
 
+# ============================================================
+# PER-BASE RATE LIMITS
+# ============================================================
+
+
+def base_bucket(base_id: Optional[str], lane: Optional[str] = None) -> LaneHandle:
+    """Admission handle on the shared Airtable governor for a base (~5 req/s), in `lane`."""
+    return GOVERNOR.handle(base_id, lane)
+
+
 # ============================================================
 # LOW LEVEL HELPERS
 # ============================================================
@@ -352,32 +362,14 @@ def _normalize_fields(payload: Dict[str, Any]) -> Dict[str, Any]:
 
 
 def _auto_field_map(handle: TableHandle) -> Dict[str, str]:
-    cache_key = f"{handle.base_id or 'mem'}::{handle.table_name}"
-    if cache_key in _field_map_cache:
-        return _field_map_cache[cache_key]
-
-    try:
-        sample = handle.table.all(max_records=1)
-    except TypeError:
-        sample = handle.table.all()
-    except Exception:
-        sample = []
-    record = sample[0] if sample else {}
-    fields = record.get("fields", {}) if isinstance(record, dict) else {}
-    mapping = {_normalise(name): name for name in fields.keys()}
+    mapping = FIELD_REGISTRY.field_map(handle)
     handle.field_cache = mapping
-    _field_map_cache[cache_key] = mapping
     return mapping
 
 
 def _remap_existing_only(handle: TableHandle, payload: Dict[str, Any]) -> Dict[str, Any]:
-    mapping = _auto_field_map(handle)
-    if not mapping:
-        return dict(payload)
-    result: Dict[str, Any] = {}
-    for k, v in payload.items():
-        result[mapping.get(_normalise(k), k)] = v
-    return result
+    # Renames to real column names; unknown keys are kept (only known-missing ones dropped)
+    return FIELD_REGISTRY.remap(handle, payload, existing_only=False)
 
 
 def _log_airtable_exception(handle: TableHandle, exc: Exception, action: str) -> None:
@@ -405,64 +397,6 @@ def _log_airtable_exception(handle: TableHandle, exc: Exception, action: str) ->
     if DEBUG:
         traceback.print_exc()
 
-    # --- Schema-safe remap (case/space insensitive) -----------------------------
-import re
-from functools import lru_cache
-from typing import Any, Dict
-
-def _norm_key(s: str) -> str:
-    return re.sub(r"[^a-z0-9]+", "", (s or "").strip().lower())
-
-@lru_cache(maxsize=128)
-def _field_map_for_table(base_id: str, table_name: str, sample_key: str = "::_") -> Dict[str, str]:
-    """
-    Probe columns once per table and cache a normalized->actual map.
-    The 'sample_key' keeps the cache distinct across processes even if base changes.
-    """
-    try:
-        # We only need 1 record to inspect headers; if empty, Airtable returns [] and we map nothing.
-        # `Table` is already initialized for this handle.
-        from pyairtable.api.table import Table  # type: ignore
-    except Exception:
-        Table = None  # type: ignore
-
-    # We can't probe without a Table instance; return empty → no remap
-    if not Table:
-        return {}
-
-    # We rely on the handle in the callsite to pass base_id/table_name
-    # Actual probing happens in _remap_payload below using handle.table
-    return {}  # real map is built on demand (see _remap_payload)
-    
-
-def _remap_payload(handle: Any, fields: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Map incoming keys (e.g. 'status') to real Airtable columns (e.g. 'Status').
-    Falls back to original keys if probing fails.
-    """
-    try:
-        table = handle.table  # pyairtable.Table
-        base_id = getattr(table, "base_id", None) or getattr(handle, "base_id", "")
-        table_name = getattr(table, "table_name", None) or getattr(handle, "name", "")
-        # Build a map by probing header keys once
-        try:
-            probe = table.all(max_records=1)
-            keys = list(probe[0].get("fields", {}).keys()) if probe else []
-        except Exception:
-            # If table is empty or call fails, try schema endpoint (optional), else no remap
-            keys = []
-        amap = {_norm_key(k): k for k in keys}
-        if not amap:
-            # No map → return original payload untouched
-            return dict(fields or {})
-        out: Dict[str, Any] = {}
-        for k, v in (fields or {}).items():
-            mk = amap.get(_norm_key(str(k)))
-            out[mk or k] = v
-        return out
-    except Exception:
-        return dict(fields or {})
-
 
 # ============================================================
 # SAFE WRAPPERS
@@ -470,6 +404,7 @@ def _remap_payload(handle: Any, fields: Dict[str, Any]) -> Dict[str, Any]:
 
 
 def _safe_all(handle: TableHandle, **kwargs) -> List[Dict[str, Any]]:
+    # Pacing and 429 / Retry-After handling live in the Airtable governor (transport adapter)
     if "page_size" not in kwargs:
         kwargs["page_size"] = 100
     if "max_records" not in kwargs:
@@ -483,15 +418,139 @@ def _safe_all(handle: TableHandle, **kwargs) -> List[Dict[str, Any]]:
             continue
         except Exception as exc:
             _log_airtable_exception(handle, exc, "all")
-            if "429" in str(exc) and attempt < 2:
-                time.sleep((2**attempt) * 0.5)
-                continue
             break
-        finally:
-            time.sleep(0.25)
     return []
 
 
+def _safe_iter_pages(handle: TableHandle, *, strict: bool = False, **kwargs) -> Iterator[List[Dict[str, Any]]]:
+    """Yield every page of a table (no max_records cap unless given); stops quietly on errors unless `strict`."""
+    kwargs.setdefault("page_size", 100)
+    table = handle.table
+    iterate = getattr(table, "iterate", None)
+    if not callable(iterate):
+        kwargs.pop("page_size", None)
+        limit = kwargs.get("max_records")
+        try:
+            rows = list(table.all(**kwargs) or [])
+        except TypeError:  # legacy table-likes whose all() takes no options
+            rows = list(table.all() or [])
+        yield rows[:limit] if limit else rows
+        return
+    last_exc: Optional[Exception] = None
+    for attempt in range(3):
+        yielded = False
+        try:
+            for page in iterate(**kwargs):
+                yielded = True
+                yield page
+            return
+        except (requests.exceptions.ConnectionError, ConnectionResetError) as exc:
+            last_exc = exc
+            logger.warning("Airtable connection reset [%s] retry %s: %s", handle.table_name, attempt + 1, exc)
+        except Exception as exc:
+            if "UNKNOWN_FIELD_NAME" in str(exc) and kwargs.pop("fields", None) is not None and not yielded:
+                continue  # projection named a missing column → retry unprojected
+            _log_airtable_exception(handle, exc, "iterate")
+            if strict:
+                raise
+            return
+        if yielded:
+            # Restarting would duplicate pages already handed to the caller
+            break
+        time.sleep((2**attempt) * 0.5)
+    if strict and last_exc is not None:
+        raise last_exc
+
+
+def _as_handle(obj: Any) -> TableHandle:
+    """Accept a TableHandle, a TableFacade or a bare pyairtable Table."""
+    obj = getattr(obj, "handle", None) or obj
+    if isinstance(obj, TableHandle):
+        return obj
+    name = getattr(obj, "name", None)
+    base = getattr(getattr(obj, "base", None), "id", None)
+    return TableHandle(
+        table=obj,
+        in_memory=False,
+        base_id=base if isinstance(base, str) else None,
+        table_name=name if isinstance(name, str) and name else type(obj).__name__,
+    )
+
+
+def _prefetched(pages: Iterator[List[Dict[str, Any]]]) -> Iterator[List[Dict[str, Any]]]:
+    """Download page N+1 on a worker while the caller works through page N."""
+    ctx = contextvars.copy_context()  # keeps the caller's governor lane on the worker
+    pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="airtable-prefetch")
+    try:
+        ahead = pool.submit(ctx.run, next, pages, None)
+        while True:
+            page = ahead.result()
+            if page is None:
+                return
+            ahead = pool.submit(ctx.run, next, pages, None)
+            yield page
+    finally:
+        pool.shutdown(wait=True)  # at most one page in flight when the caller stops early
+        pages.close()
+
+
+def iter_pages(
+    handle: Any,
+    *,
+    formula: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+    page_size: int = 100,
+    max_records: Optional[int] = None,
+    sort: Optional[List[str]] = None,
+    view: Optional[str] = None,
+    prefetch: Optional[bool] = None,
+    strict: bool = True,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Stream a table page by page (≤100 records each) instead of materialising `all()`.
+
+    `fields` is pushed down to Airtable as a projection (mapped to real column names; a
+    column Airtable rejects drops the projection). Stopping early stops the download.
+    `prefetch` overlaps the next page's request with the caller's work (AIRTABLE_PREFETCH).
+    A failed page raises, so a transient error is never mistaken for "no more rows";
+    `strict=False` ends the stream quietly instead (best-effort scans).
+    """
+    h = _as_handle(handle)
+    opts: Dict[str, Any] = {"page_size": max(1, min(100, int(page_size)))}
+    if formula:
+        opts["formula"] = formula
+    if fields:
+        projected = list(FIELD_REGISTRY.remap(h, dict.fromkeys(fields)))
+        if projected:
+            opts["fields"] = projected
+    for key, value in (("max_records", max_records), ("sort", sort), ("view", view)):
+        if value:
+            opts[key] = value
+    pages = _safe_iter_pages(h, strict=strict, **opts)
+    if AIRTABLE_PREFETCH if prefetch is None else prefetch:
+        pages = _prefetched(pages)
+    try:
+        yield from pages
+    finally:
+        pages.close()
+
+
+def iter_records(handle: Any, **opts: Any) -> Iterator[Dict[str, Any]]:
+    """Record-at-a-time view of `iter_pages` (same options); `break` ends the download."""
+    pages = iter_pages(handle, **opts)
+    try:
+        for page in pages:
+            yield from page
+    finally:
+        pages.close()
+
+
+def first_record(handle: Any, **opts: Any) -> Optional[Dict[str, Any]]:
+    """First record matching `formula` (one request, `max_records=1`), or None. Raises on read errors."""
+    opts.setdefault("max_records", 1)
+    return next(iter_records(handle, **opts), None)
+
+
 def _safe_get(handle: TableHandle, record_id: str):
     if not record_id:
         return None
@@ -502,7 +561,7 @@ def _safe_get(handle: TableHandle, record_id: str):
         return None
 
 
-def _safe_create(handle: TableHandle, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+def _safe_create(handle: TableHandle, fields: Dict[str, Any], _attempt: int = 0) -> Optional[Dict[str, Any]]:
     body = _compact(fields)
     if not body:
         return None
@@ -512,11 +571,13 @@ def _safe_create(handle: TableHandle, fields: Dict[str, Any]) -> Optional[Dict[s
     except Exception as exc:
         if handle.in_memory:
             return handle.table.create(payload)
+        if _attempt < FIELD_REGISTRY_MAX_RETRIES and FIELD_REGISTRY.note_error(handle, exc, payload):
+            return _safe_create(handle, fields, _attempt + 1)
         _log_airtable_exception(handle, exc, "create")
         return None
 
 
-def _safe_update(handle: TableHandle, record_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+def _safe_update(handle: TableHandle, record_id: str, fields: Dict[str, Any], _attempt: int = 0) -> Optional[Dict[str, Any]]:
     if not record_id:
         return None
     body = _compact(fields)
@@ -528,6 +589,8 @@ def _safe_update(handle: TableHandle, record_id: str, fields: Dict[str, Any]) ->
     except Exception as exc:
         if handle.in_memory:
             return handle.table.update(record_id, payload)
+        if _attempt < FIELD_REGISTRY_MAX_RETRIES and FIELD_REGISTRY.note_error(handle, exc, payload):
+            return _safe_update(handle, record_id, fields, _attempt + 1)
         _log_airtable_exception(handle, exc, "update")
         return None
 
@@ -536,6 +599,11 @@ def _safe_update(handle: TableHandle, record_id: str, fields: Dict[str, Any]) ->
 # REPOSITORY
 # ============================================================
 
+REPOSITORY_INDEX_TTL_SEC = float(os.getenv("REPOSITORY_INDEX_TTL_SEC", "300"))
+REPOSITORY_NEGATIVE_TTL_SEC = float(os.getenv("REPOSITORY_NEGATIVE_TTL_SEC", "120"))
+REPOSITORY_INDEX_RETRY_SEC = float(os.getenv("REPOSITORY_INDEX_RETRY_SEC", "60"))
+
+
 class Repository:
     """In-memory caching layer for faster lookups."""
 
@@ -544,6 +612,11 @@ class Repository:
         self._prospect_phone_index: Dict[str, str] = {}
         self._lead_phone_index: Dict[str, str] = {}
         self._number_counters: Dict[str, Dict[str, Any]] = defaultdict(dict)
+        self._index_loaded_at: Dict[str, float] = {}
+        self._index_failed: Set[str] = set()  # kinds whose last refresh failed (index may be stale/partial)
+        self._index_retry_at: Dict[str, float] = {}  # failed kinds: no new sweep before this time
+        self._negative: Dict[Tuple[str, str], float] = {}
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "negative_hits": 0, "refreshes": 0, "refresh_errors": 0}
 
     # Conversations
     def find_conversation_by_sid(self, sid: str) -> Optional[Dict[str, Any]]:
@@ -576,48 +649,98 @@ class Repository:
     # Leads & Prospects
     def _refresh_lead_index(self):
         h = CONNECTOR.leads()
-        for r in _safe_all(h):
-            f = r.get("fields", {}) or {}
-            d = last_10_digits(f.get(LEAD_FIELDS["PHONE"]))
+        phone_col = LEAD_FIELDS["PHONE"]
+        index: Dict[str, str] = {}
+        for r in iter_records(h, fields=[phone_col], strict=True):
+            d = last_10_digits((r.get("fields", {}) or {}).get(phone_col))
             if d:
-                self._lead_phone_index[d] = r["id"]
+                index[d] = r["id"]
+        self._swap_index("lead", self._lead_phone_index, index)
 
     def _refresh_prospect_index(self):
         h = CONNECTOR.prospects()
-        for r in _safe_all(h):
+        index: Dict[str, str] = {}
+        columns = [*PROSPECT_PHONE_COLUMNS, *LEGACY_PHONE_COLUMNS]
+        for r in iter_records(h, fields=columns, strict=True):
             f = r.get("fields", {}) or {}
-            for c in (*PROSPECT_PHONE_COLUMNS, *LEGACY_PHONE_COLUMNS):
+            for c in columns:
                 d = last_10_digits(f.get(c))
-                if d and d not in self._prospect_phone_index:
-                    self._prospect_phone_index[d] = r["id"]
+                if d and d not in index:
+                    index[d] = r["id"]
+        self._swap_index("prospect", self._prospect_phone_index, index)
+
+    def _swap_index(self, kind: str, target: Dict[str, str], fresh: Dict[str, str]) -> None:
+        target.clear()
+        target.update(fresh)
+        self._index_loaded_at[kind] = time.time()
+        self._index_failed.discard(kind)
+        self._index_retry_at.pop(kind, None)
+        self._negative = {k: exp for k, exp in self._negative.items() if k[0] != kind}
+        self.stats["refreshes"] += 1
+
+    def _try_refresh(self, kind: str, refresh) -> None:
+        """Run a full index refresh; on failure keep the old index and retry after REPOSITORY_INDEX_RETRY_SEC."""
+        try:
+            refresh()
+        except Exception as exc:
+            self._index_failed.add(kind)
+            self._index_retry_at[kind] = time.time() + REPOSITORY_INDEX_RETRY_SEC
+            self.stats["refresh_errors"] += 1
+            logger.warning(f"Repository {kind} index refresh failed; keeping previous index: {exc}")
 
-    def find_lead_by_phone(self, phone: str) -> Optional[Dict[str, Any]]:
+    def _find_by_phone(self, kind: str, phone: str) -> Optional[Dict[str, Any]]:
         d = last_10_digits(phone)
         if not d:
             return None
-        h = CONNECTOR.leads()
-        rid = self._lead_phone_index.get(d)
+        if kind == "lead":
+            h, index, refresh = CONNECTOR.leads(), self._lead_phone_index, self._refresh_lead_index
+        else:
+            h, index, refresh = CONNECTOR.prospects(), self._prospect_phone_index, self._refresh_prospect_index
+
+        now = time.time()
+        if now - self._index_loaded_at.get(kind, 0.0) >= REPOSITORY_INDEX_TTL_SEC and now >= self._index_retry_at.get(kind, 0.0):
+            self._try_refresh(kind, refresh)
+
+        rid = index.get(d)
         if rid:
             r = _safe_get(h, rid)
             if r:
+                self.stats["hits"] += 1
                 return r
-        self._refresh_lead_index()
-        rid = self._lead_phone_index.get(d)
-        return _safe_get(h, rid) if rid else None
+            index.pop(d, None)
 
-    def find_prospect_by_phone(self, phone: str) -> Optional[Dict[str, Any]]:
-        d = last_10_digits(phone)
-        if not d:
+        # Known miss → zero Airtable calls until the negative entry expires
+        if self._negative.get((kind, d), 0.0) > now:
+            self.stats["negative_hits"] += 1
             return None
-        h = CONNECTOR.prospects()
-        rid = self._prospect_phone_index.get(d)
-        if rid:
-            r = _safe_get(h, rid)
-            if r:
-                return r
-        self._refresh_prospect_index()
-        rid = self._prospect_phone_index.get(d)
-        return _safe_get(h, rid) if rid else None
+        if kind not in self._index_failed:  # an incomplete index can't prove a miss
+            self._negative[(kind, d)] = now + REPOSITORY_NEGATIVE_TTL_SEC
+        self.stats["misses"] += 1
+        return None
+
+    def _remember(self, kind: str, phone: str, record_id: str) -> None:
+        d = last_10_digits(phone)
+        if not (d and record_id):
+            return
+        (self._lead_phone_index if kind == "lead" else self._prospect_phone_index)[d] = record_id
+        self._negative.pop((kind, d), None)
+
+    def find_lead_by_phone(self, phone: str) -> Optional[Dict[str, Any]]:
+        return self._find_by_phone("lead", phone)
+
+    def find_prospect_by_phone(self, phone: str) -> Optional[Dict[str, Any]]:
+        return self._find_by_phone("prospect", phone)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            **self.stats,
+            "lead_index_size": len(self._lead_phone_index),
+            "prospect_index_size": len(self._prospect_phone_index),
+            "negative_entries": sum(1 for exp in self._negative.values() if exp > now),
+            "refresh_failed": sorted(self._index_failed),
+            "index_age_sec": {k: round(now - t, 1) for k, t in self._index_loaded_at.items()},
+        }
 
     def ensure_prospect(self, phone: str) -> Optional[Dict[str, Any]]:
         if not phone:
@@ -632,9 +755,8 @@ class Repository:
             PROSPECT_FIELDS.get("LAST_ACTIVITY", "Last Activity"): iso_now(),
         }
         rec = _safe_create(CONNECTOR.prospects(), payload)
-        d = last_10_digits(normalized)
-        if rec and d:
-            self._prospect_phone_index[d] = rec["id"]
+        if rec:
+            self._remember("prospect", normalized, rec["id"])
         return rec
 
     def ensure_lead(self, phone: str, *, source: str, initial_fields: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
@@ -661,9 +783,8 @@ class Repository:
         if initial_fields:
             payload.update(initial_fields)
         rec = _safe_create(CONNECTOR.leads(), payload)
-        d = last_10_digits(normalized)
-        if rec and d:
-            self._lead_phone_index[d] = rec["id"]
+        if rec:
+            self._remember("lead", normalized, rec["id"])
         return rec
 
 
@@ -681,7 +802,12 @@ def reset_state():
     REPOSITORY._prospect_phone_index.clear()
     REPOSITORY._lead_phone_index.clear()
     REPOSITORY._number_counters.clear()
-    _field_map_cache.clear()
+    REPOSITORY._index_loaded_at.clear()
+    REPOSITORY._index_failed.clear()
+    REPOSITORY._index_retry_at.clear()
+    REPOSITORY._negative.clear()
+    for k in REPOSITORY.stats:
+        REPOSITORY.stats[k] = 0
     logger.info("🧹 Datastore state and caches cleared.")
 
 
@@ -726,9 +852,11 @@ def safe_create_conversation(fields: dict) -> dict | None:
 
         # Title-case keys so Airtable accepts them even if cache is empty
         fixed = {k.title() if " " not in k else k: v for k, v in (fields or {}).items()}
-        rec = tbl.create({"fields": fixed})
-        logger.info(f"🗒️ Conversation row created {rec.get('id')}")
-        return rec
+        rid = JOURNAL.write(tbl, fixed, sid=fixed.get("TextGrid ID"))
+        if not rid:
+            return None
+        logger.info(f"🗒️ Conversation row written {rid}")
+        return {"id": rid, "fields": fixed}
     except Exception as e:
         logger.error(f"⚠️ safe_create_conversation failed: {e}", exc_info=True)
         return None
@@ -736,11 +864,11 @@ def safe_create_conversation(fields: dict) -> dict | None:
 
 def safe_log_message(direction: str, to: str, from_: str, body: str, status="SENT", sid=None, error=None):
     """
-    Lightweight message trail writer (optional secondary table).
+    Lightweight message trail row, queued on the conversation journal (upserted on `sid` when given).
     """
     try:
         tbl = CONNECTOR.conversations().table  # reuse same table if no separate Messages table
-        rec = tbl.create({
+        entry = JOURNAL.append(tbl, {
             "Direction": direction,
             "TextGrid Phone Number": to,
             "Seller Phone Number": from_,
@@ -749,9 +877,9 @@ def safe_log_message(direction: str, to: str, from_: str, body: str, status="SEN
             "TextGrid ID": sid or "",
             # "Error": error or "",  # Removed: not in valid schema
             "Received Time": datetime.now(timezone.utc).isoformat(),
-        })
+        }, sid=sid)
         logger.info(f"📩 Logged {direction} message → {to}")
-        return rec
+        return entry
     except Exception as e:
         logger.error(f"⚠️ safe_log_message failed: {e}", exc_info=True)
         return None
\ No newline at end of file
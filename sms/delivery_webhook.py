@@ -3,22 +3,26 @@
 Optimized Delivery Webhook
 --------------------------
 • Accepts TextGrid/Twilio-like DLRs (JSON or form)
-• Updates Drip Queue + Conversations via datastore CONNECTOR
+• Updates Drip Queue + Conversations through the DLR pipeline (SID index → coalesced
+  10-record batch updates on a background flusher; no lookups on the event loop)
 • Increments Numbers counters
-• Idempotent (Redis / Upstash / in-memory)
+• Idempotent per (SID, status) (Redis / Upstash / in-memory)
 • Schema-safe (uses airtable_schema maps + unknown-field filtering)
 • Routes: POST /delivery  and POST /status  (both return 200 quickly)
 """
 
 from __future__ import annotations
 
-import os, re, json, traceback, asyncio
+import os, re, json, traceback
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional, Iterable, List
+from typing import Any, Dict, Optional, Iterable, List, Tuple
 
 from fastapi import APIRouter, Request, Header, HTTPException, Query
 from sms.datastore import CONNECTOR, update_record, list_records
 from sms.runtime import get_logger
+from sms.http_transport import TRANSPORT
+from sms.field_registry import FIELD_REGISTRY
+from sms.dlr_pipeline import DLR_PIPELINE
 from sms.inbound_webhook import normalize_e164
 
 # Schema maps (avoid hard-coded Airtable column names)
@@ -128,13 +132,13 @@ class IdemStore:
         # Upstash REST
         if self.rest:
             try:
-                resp = requests.post(
+                resp = TRANSPORT.post(
                     UPSTASH_REST_URL,
                     headers={"Authorization": f"Bearer {UPSTASH_REST_TOKEN}"},
                     json={"command": ["SET", key, "1", "EX", "21600", "NX"]},
                     timeout=5,
                 )
-                data = resp.json() if resp.ok else {}
+                data = resp.json() if resp.status_code < 400 else {}
                 return data.get("result") != "OK"
             except Exception:
                 traceback.print_exc()
@@ -185,24 +189,11 @@ def _bump_numbers(did: str, delivered: bool):
 # AIRTABLE UTILS
 # ---------------------------------------------------------------------------
 
-def _existing_fields(handle) -> List[str]:
-    try:
-        rs = list_records(handle, max_records=1)
-        if rs:
-            return list((rs[0].get("fields") or {}).keys())
-    except Exception:
-        pass
-    return []
-
 def _filter_known(handle, payload: Dict[str, Any]) -> Dict[str, Any]:
     """Keep only columns that exist in this table."""
     if not payload:
         return {}
-    keys = set(_existing_fields(handle))
-    if not keys:
-        # If we can't probe, send raw; connector may ignore unknowns
-        return dict(payload)
-    return {k: v for k, v in payload.items() if k in keys}
+    return FIELD_REGISTRY.remap(handle, payload)
 
 def _find_by_sid(handle, sid: str) -> Optional[Dict[str, Any]]:
     """Find the record by trying multiple SID field names."""
@@ -216,11 +207,12 @@ def _find_by_sid(handle, sid: str) -> Optional[Dict[str, Any]]:
             continue
     return None
 
-async def _update_airtable_status(sid: str, status: str, error: Optional[str], from_did: str, to_phone: str, raw_status: Optional[str] = None, provider: Optional[str] = None):
-    """Update Drip Queue + Conversations via datastore with schema-safe patches."""
-    dq_handle = CONNECTOR.drip_queue()
-    conv_handle = CONNECTOR.conversations()
+# Later provider states win when receipts for one SID are coalesced
+STATUS_RANK = {"queued": 0, "sent": 1, "delivered": 2, "failed": 2, "undelivered": 2, "optout": 3}
 
+
+def _status_patches(status: str, error: Optional[str], raw_status: Optional[str] = None, provider: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """Conversations / Drip Queue patches for one receipt (filtered to known columns at flush time)."""
     now = utcnow_iso()
     # Base patches (we'll filter to each table's known columns)
     if status == "delivered":
@@ -247,22 +239,22 @@ async def _update_airtable_status(sid: str, status: str, error: Optional[str], f
     if provider:
         conv_patch["Provider"] = provider
         dq_patch["Provider"] = provider
+    return {"conversations": conv_patch, "drip": dq_patch}
 
-    # Conversations
-    try:
-        conv_rec = _find_by_sid(conv_handle, sid)
-        if conv_rec:
-            update_record(conv_handle, conv_rec["id"], _filter_known(conv_handle, conv_patch))
-    except Exception:
-        traceback.print_exc()
 
-    # Drip Queue
-    try:
-        dq_rec = _find_by_sid(dq_handle, sid)
-        if dq_rec:
-            update_record(dq_handle, dq_rec["id"], _filter_known(dq_handle, dq_patch))
-    except Exception:
-        traceback.print_exc()
+def _resolve_sid(sid: str) -> Tuple[Optional[str], Optional[str]]:
+    """Legacy SID → (conversation id, drip id) lookup for receipts the SID index never saw."""
+    conv_rec = _find_by_sid(CONNECTOR.conversations(), sid)
+    dq_rec = _find_by_sid(CONNECTOR.drip_queue(), sid)
+    return (conv_rec or {}).get("id"), (dq_rec or {}).get("id")
+
+
+DLR_PIPELINE.resolver = _resolve_sid
+
+
+def _queue_status_update(sid: str, status: str, error: Optional[str], raw_status: Optional[str] = None, provider: Optional[str] = None) -> bool:
+    """Hand the receipt to the DLR pipeline (local SQLite write; Airtable happens on the flusher)."""
+    return DLR_PIPELINE.submit(sid, _status_patches(status, error, raw_status, provider), STATUS_RANK.get(status, 1))
 
 # ---------------------------------------------------------------------------
 # PAYLOAD PARSER
@@ -290,8 +282,8 @@ def _extract_payload(req_body: Any, headers: Dict[str, str]) -> Dict[str, Any]:
         data = dict(req_body or {})
 
     d = lower(data)
-    sid = pick(d, "message_sid", "sid", "id", "messageid")
-    status_raw = (pick(d, "message_status", "status", "delivery_status", "eventtype") or "").lower()
+    sid = pick(d, "message_sid", "messagesid", "sid", "id", "messageid")
+    status_raw = (pick(d, "message_status", "messagestatus", "status", "delivery_status", "eventtype") or "").lower()
     from_n = pick(d, "from", "sender", "source", "sourceaddress")
     to_n = pick(d, "to", "recipient", "destination", "destinationaddress")
     error = pick(d, "error_message", "error", "reason")
@@ -352,8 +344,8 @@ async def _handle_delivery(request: Request, header_token: Optional[str], conten
     to_norm = normalize_e164(to_p, field="To")
     logger.info(f"📡 Delivery webhook | {status.upper()} | SID={sid} | from={from_norm} → {to_norm}")
 
-    # Idempotency
-    if IDEM.seen(sid):
+    # Idempotency (per status: SENT and DELIVERED for one SID are different events)
+    if IDEM.seen(f"{sid}:{status}"):
         return {"status": "ok", "sid": sid, "note": "duplicate"}
 
     # Numbers counters
@@ -365,8 +357,11 @@ async def _handle_delivery(request: Request, header_token: Optional[str], conten
     except Exception:
         traceback.print_exc()
 
-    # Async Airtable updates (so we ack 200 immediately)
-    asyncio.create_task(_update_airtable_status(sid, status, err, from_norm, to_norm, raw_status, provider))
+    # Coalesced, batched Airtable updates happen off the event loop
+    try:
+        _queue_status_update(sid, status, err, raw_status, provider)
+    except Exception:
+        traceback.print_exc()
 
     return {"status": "ok", "sid": sid, "normalized": status}
 
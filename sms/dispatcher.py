@@ -13,6 +13,7 @@ from dataclasses import dataclass
 from typing import Any, Dict, Optional, TYPE_CHECKING
 
 from sms.runtime import get_logger
+from sms.send_window import quiet_at
 
 if TYPE_CHECKING:
     from zoneinfo import ZoneInfo
@@ -60,7 +61,7 @@ class DispatchPolicy:
         if not self.quiet_enforced:
             return False
         ref = when or self.now_local()
-        return (ref.hour >= self.quiet_start_hour) or (ref.hour < self.quiet_end_hour)
+        return quiet_at(ref.hour, self.quiet_start_hour, self.quiet_end_hour)
 
     def next_quiet_end(self, when: Optional[datetime] = None) -> Optional[datetime]:
         if not self.quiet_enforced:
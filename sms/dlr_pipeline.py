@@ -0,0 +1,308 @@
+"""
+📬 DLR Pipeline
+───────────────
+Delivery receipts without per-receipt lookups or per-receipt writes.
+
+- MessageProcessor.send records TextGrid SID → (conversation id, drip id, DID) at send time
+- The webhook only enqueues: receipts are kept per SID in SQLite, so SENT → DELIVERED bursts
+  for one message collapse to the final (highest-rank) status
+- A background flusher joins pending receipts with the SID index and writes them as
+  10-record batch_update calls per table, paced by the per-base governor
+- The send side declares which tables a SID will have rows in; a receipt waits until every one
+  of those ids is indexed (the Conversations id lands later, via the journal)
+- SIDs (or tables) still missing from the index after DLR_RESOLVE_GRACE_SEC (sent before the index
+  existed, or by another path) go through the legacy column lookup — on the flusher thread, never the event loop
+- Stored in SQLite (WAL) under SMS_STATE_DIR; index entries expire after DLR_SID_RETENTION_DAYS
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sms.airtable_governor import airtable_lane
+from sms.datastore import CONNECTOR, base_bucket, update_record
+from sms.field_registry import FIELD_REGISTRY, FIELD_REGISTRY_MAX_RETRIES
+from sms.runtime import get_logger, state_path
+
+logger = get_logger("dlr_pipeline")
+
+# =========================
+# ENV / CONFIG
+# =========================
+DLR_PIPELINE_PATH = os.getenv("DLR_PIPELINE_PATH") or ""
+DLR_FLUSH_SEC = float(os.getenv("DLR_FLUSH_SEC", "2"))
+DLR_MAX_PER_FLUSH = int(os.getenv("DLR_MAX_PER_FLUSH", "500"))
+DLR_RESOLVE_GRACE_SEC = float(os.getenv("DLR_RESOLVE_GRACE_SEC", "15"))
+DLR_MAX_ATTEMPTS = max(1, int(os.getenv("DLR_MAX_ATTEMPTS", "5")))
+DLR_SID_RETENTION_DAYS = float(os.getenv("DLR_SID_RETENTION_DAYS", "14"))
+BATCH_SIZE = 10  # Airtable max records per batch update
+
+TABLES: Tuple[str, ...] = ("conversations", "drip")
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS sids ("
+    " sid TEXT PRIMARY KEY, convo_id TEXT, drip_id TEXT, did TEXT, created_at REAL NOT NULL, expect TEXT)",
+    "CREATE INDEX IF NOT EXISTS sids_created ON sids (created_at)",
+    "CREATE TABLE IF NOT EXISTS pending ("
+    " sid TEXT PRIMARY KEY, patches TEXT NOT NULL, rank INTEGER NOT NULL DEFAULT 0,"
+    " attempts INTEGER NOT NULL DEFAULT 0, received_at REAL NOT NULL, updated_at REAL NOT NULL)",
+)
+
+Resolver = Callable[[str], Tuple[Optional[str], Optional[str]]]
+
+
+class DlrPipeline:
+    """SID index + coalescing receipt queue with a batched background flusher."""
+
+    def __init__(self, path: Optional[str] = None, handles: Optional[Dict[str, Callable[[], Any]]] = None):
+        self.path = path or DLR_PIPELINE_PATH
+        self.handles = handles or {"conversations": CONNECTOR.conversations, "drip": CONNECTOR.drip_queue}
+        self.resolver: Optional[Resolver] = None
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats: Dict[str, int] = {
+            "indexed": 0, "receipts": 0, "coalesced": 0, "resolved_by_lookup": 0,
+            "records_written": 0, "batch_calls": 0, "dropped": 0,
+        }
+
+    # ---------- storage ----------
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path = self.path or state_path("dlr_pipeline.sqlite3")
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for stmt in _SCHEMA:
+                conn.execute(stmt)
+            if "expect" not in {row[1] for row in conn.execute("PRAGMA table_info(sids)")}:
+                conn.execute("ALTER TABLE sids ADD COLUMN expect TEXT")  # indexes created before `expect`
+            self._conn = conn
+        return self._conn
+
+    # ---------- SID index ----------
+    def remember(
+        self,
+        sid: Optional[str],
+        *,
+        convo_id: Optional[str] = None,
+        drip_id: Optional[str] = None,
+        did: Optional[str] = None,
+        expect: Optional[Tuple[str, ...]] = None,
+    ) -> None:
+        """
+        Record (or complete) the SID → rows mapping. Called at send time.
+
+        `expect` names the TABLES this SID will have rows in, so receipts wait for ids that
+        are indexed later (e.g. the journaled Conversations row) instead of skipping that table.
+        """
+        if not sid:
+            return
+        expect_csv = ",".join(t for t in TABLES if t in expect) if expect else None
+        with self._lock:
+            self._db().execute(
+                "INSERT INTO sids (sid, convo_id, drip_id, did, created_at, expect) VALUES (?,?,?,?,?,?) "
+                "ON CONFLICT(sid) DO UPDATE SET convo_id=COALESCE(excluded.convo_id, sids.convo_id),"
+                " drip_id=COALESCE(excluded.drip_id, sids.drip_id), did=COALESCE(excluded.did, sids.did),"
+                " expect=COALESCE(excluded.expect, sids.expect)",
+                (sid, convo_id, drip_id, did, time.time(), expect_csv),
+            )
+        self.stats["indexed"] += 1
+
+    def lookup(self, sid: str) -> Optional[Dict[str, Optional[str]]]:
+        with self._lock:
+            row = self._db().execute("SELECT convo_id, drip_id, did FROM sids WHERE sid=?", (sid,)).fetchone()
+        return {"conversations": row[0], "drip": row[1], "did": row[2]} if row else None
+
+    # ---------- producer ----------
+    def submit(self, sid: str, patches: Dict[str, Dict[str, Any]], rank: int) -> bool:
+        """Queue one receipt; a lower-ranked status never overwrites a higher one. Returns True if queued."""
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            existed = db.execute("SELECT 1 FROM pending WHERE sid=?", (sid,)).fetchone() is not None
+            cur = db.execute(
+                "INSERT INTO pending (sid, patches, rank, received_at, updated_at) VALUES (?,?,?,?,?) "
+                "ON CONFLICT(sid) DO UPDATE SET patches=excluded.patches, rank=excluded.rank,"
+                " updated_at=excluded.updated_at, attempts=0 WHERE excluded.rank >= pending.rank",
+                (sid, json.dumps(patches, default=str), int(rank), now, now),
+            )
+        self.stats["receipts"] += 1
+        self.stats["coalesced"] += int(existed)
+        self.start()
+        self._wake.set()
+        return cur.rowcount > 0
+
+    # ---------- flusher ----------
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="dlr-flush", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _loop(self) -> None:
+        last_prune = 0.0
+        while not self._stop.is_set():
+            # Let a burst accumulate for DLR_FLUSH_SEC so batches fill up
+            self._stop.wait(DLR_FLUSH_SEC)
+            try:
+                self.flush()
+                if time.time() - last_prune > 3600:
+                    self.prune()
+                    last_prune = time.time()
+            except Exception:
+                logger.warning("⚠️ DLR flush error", exc_info=True)
+            if not self.backlog():
+                self._wake.wait(60)
+                self._wake.clear()
+
+    def _resolve(self, sid: str) -> Optional[Dict[str, Optional[str]]]:
+        """Legacy lookup for SIDs (or tables) the index has never seen."""
+        if self.resolver is None:
+            return None
+        try:
+            convo_id, drip_id = self.resolver(sid)
+        except Exception as e:
+            logger.warning(f"⚠️ DLR lookup failed for {sid}: {e}")
+            return None
+        if not (convo_id or drip_id):
+            return None
+        self.remember(sid, convo_id=convo_id, drip_id=drip_id)
+        self.stats["resolved_by_lookup"] += 1
+        return {"conversations": convo_id, "drip": drip_id}
+
+    @airtable_lane("send")
+    def _write(self, name: str, items: List[Tuple[str, str, Dict[str, Any]]]) -> set:
+        """Batch-update (sid, record_id, fields) items on one table. Returns the SIDs written."""
+        handle = self.handles[name]()
+        ok: set = set()
+        if handle is None:
+            return ok
+        tbl = getattr(handle, "table", handle)
+        bucket = base_bucket(getattr(handle, "base_id", None))
+        batch_update = None if getattr(handle, "in_memory", False) else getattr(tbl, "batch_update", None)
+        for i in range(0, len(items), BATCH_SIZE):
+            chunk = items[i:i + BATCH_SIZE]
+            if not callable(batch_update):
+                for sid, rid, fields in chunk:
+                    if update_record(handle, rid, fields) is not None:
+                        ok.add(sid)
+                continue
+            records = [{"id": rid, "fields": FIELD_REGISTRY.remap(handle, fields)} for _, rid, fields in chunk]
+            records = [r for r in records if r["fields"]]
+            for _ in range(1 + FIELD_REGISTRY_MAX_RETRIES):
+                try:
+                    if records:
+                        with bucket.sending():
+                            batch_update(records)
+                        self.stats["batch_calls"] += 1
+                        self.stats["records_written"] += len(records)
+                    ok.update(sid for sid, _, _ in chunk)
+                    break
+                except Exception as e:
+                    if not FIELD_REGISTRY.note_error(handle, e, records):
+                        logger.error(f"DLR batch update failed on {name} ({len(chunk)} rows): {e}")
+                        break
+                    records = [{"id": r["id"], "fields": FIELD_REGISTRY.remap(handle, r["fields"])} for r in records]
+        return ok
+
+    def flush(self) -> Dict[str, int]:
+        """Write every pending receipt whose rows are known. Returns per-pass counters."""
+        with self._flush_lock:
+            now = time.time()
+            with self._lock:
+                rows = self._db().execute(
+                    "SELECT p.sid, p.patches, p.received_at, p.updated_at, s.convo_id, s.drip_id, s.expect "
+                    "FROM pending p LEFT JOIN sids s ON s.sid = p.sid ORDER BY p.updated_at LIMIT ?",
+                    (DLR_MAX_PER_FLUSH,),
+                ).fetchall()
+
+            per_table: Dict[str, List[Tuple[str, str, Dict[str, Any]]]] = {t: [] for t in TABLES}
+            versions: Dict[str, Tuple[float, List[str]]] = {}
+            waiting = 0
+            for sid, patches_json, received_at, updated_at, convo_id, drip_id, expect in rows:
+                ids = {"conversations": convo_id, "drip": drip_id}
+                patches = json.loads(patches_json)
+                # Unindexed SIDs expect every table; indexed ones what the send side declared
+                expected = set(expect.split(",")) if expect else {n for n in TABLES if ids[n]} or set(TABLES)
+                missing = [n for n in TABLES if n in expected and patches.get(n) and not ids[n]]
+                if missing:
+                    if now - received_at < DLR_RESOLVE_GRACE_SEC:
+                        waiting += 1  # send-side index write (or the journaled row) may still be in flight
+                        continue
+                    found = self._resolve(sid) or {}
+                    ids = {n: ids[n] or found.get(n) for n in TABLES}
+                    if not any(ids.values()):
+                        self._fail(sid, updated_at, "sid not found")
+                        continue
+                targets = [name for name in TABLES if ids.get(name) and patches.get(name)]
+                versions[sid] = (updated_at, targets)
+                for name in targets:
+                    per_table[name].append((sid, ids[name], patches[name]))
+
+            written: Dict[str, set] = {name: self._write(name, items) for name, items in per_table.items() if items}
+            done = 0
+            for sid, (version, targets) in versions.items():
+                if all(sid in written.get(name, ()) for name in targets):
+                    with self._lock:
+                        # A newer receipt that landed mid-flush stays queued
+                        self._db().execute("DELETE FROM pending WHERE sid=? AND updated_at=?", (sid, version))
+                    done += 1
+                else:
+                    self._fail(sid, version, "write failed")
+            return {"flushed": done, "waiting": waiting, "calls": self.stats["batch_calls"]}
+
+    def _fail(self, sid: str, version: float, reason: str) -> None:
+        with self._lock:
+            db = self._db()
+            db.execute("UPDATE pending SET attempts=attempts+1 WHERE sid=? AND updated_at=?", (sid, version))
+            cur = db.execute("DELETE FROM pending WHERE sid=? AND attempts>=?", (sid, DLR_MAX_ATTEMPTS))
+        if cur.rowcount:
+            self.stats["dropped"] += 1
+            logger.warning(f"📬 Dropped receipt for {sid} after {DLR_MAX_ATTEMPTS} attempts ({reason})")
+
+    # ---------- maintenance ----------
+    def backlog(self) -> int:
+        with self._lock:
+            return self._db().execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+    def prune(self) -> int:
+        cutoff = time.time() - DLR_SID_RETENTION_DAYS * 86400
+        with self._lock:
+            return self._db().execute("DELETE FROM sids WHERE created_at<?", (cutoff,)).rowcount
+
+    def drain(self, timeout: float = 30.0) -> bool:
+        """Flush until nothing is pending (tests, graceful shutdown)."""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            self.flush()
+            if not self.backlog():
+                return True
+            time.sleep(0.05)
+        return False
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            indexed = self._db().execute("SELECT COUNT(*) FROM sids").fetchone()[0]
+        return {"path": self.path, "sids": indexed, "pending": self.backlog(), **self.stats}
+
+
+DLR_PIPELINE = DlrPipeline()
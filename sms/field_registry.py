@@ -0,0 +1,347 @@
+"""
+🗂️ Field Registry
+─────────────────
+Process-wide Airtable column map — the one remap path every module writes through.
+
+- Seeded from the static table definitions in `sms.airtable_schema` (no network)
+- Optionally refreshed from the Airtable metadata API on a TTL, in the background
+- Persisted to a JSON snapshot under SMS_STATE_DIR so cold starts skip the fetch
+- Columns rejected with UNKNOWN_FIELD_NAME are dropped from later writes until a metadata
+  refresh or FIELD_REGISTRY_MISSING_TTL_SEC, whichever comes first (a column added later is picked up again)
+- Never probes records: a write costs zero extra reads
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sms import airtable_schema
+from sms.runtime import get_logger, state_path
+
+logger = get_logger("field_registry")
+
+# =========================
+# ENV / CONFIG
+# =========================
+FIELD_REGISTRY_PATH = os.getenv("FIELD_REGISTRY_PATH") or ""
+FIELD_REGISTRY_TTL_SEC = float(os.getenv("FIELD_REGISTRY_TTL_SEC", "21600"))
+FIELD_REGISTRY_MISSING_TTL_SEC = float(os.getenv("FIELD_REGISTRY_MISSING_TTL_SEC", str(FIELD_REGISTRY_TTL_SEC)))
+FIELD_REGISTRY_RETRY_SEC = float(os.getenv("FIELD_REGISTRY_RETRY_SEC", "300"))
+FIELD_REGISTRY_METADATA = os.getenv("FIELD_REGISTRY_METADATA", "true").lower() in ("1", "true", "yes")
+# Write retries after learning a rejected column (each retry drops one more column)
+FIELD_REGISTRY_MAX_RETRIES = int(os.getenv("FIELD_REGISTRY_MAX_RETRIES", "3"))
+
+# Quoted name up to the matching closing quote, so "Owner's Name" survives intact
+_UNKNOWN_FIELD_RE = re.compile(r'Unknown field name:\s*\\?(["\'])(.+?)\\?\1')
+
+
+# =========================
+# Helpers
+# =========================
+def _norm(s: Any) -> str:
+    return re.sub(r"[^a-z0-9]+", "", str(s or "").strip().lower())
+
+
+def _identify(obj: Any) -> Tuple[Optional[str], Optional[str], Any]:
+    """(base_id, table_name, raw table) for a pyairtable Table, datastore TableHandle or TableFacade."""
+    handle = getattr(obj, "handle", None)
+    if handle is not None:
+        obj = handle
+    tbl = getattr(obj, "table", obj)
+    base = getattr(obj, "base_id", None) or getattr(getattr(tbl, "base", None), "id", None)
+    name = getattr(obj, "table_name", None) or getattr(tbl, "name", None)
+    return (
+        base if isinstance(base, str) and base else None,
+        name if isinstance(name, str) and name else None,
+        tbl,
+    )
+
+
+def _static_definitions() -> List[airtable_schema.TableDefinition]:
+    return [v for v in vars(airtable_schema).values() if isinstance(v, airtable_schema.TableDefinition)]
+
+
+def unknown_field(exc: Any) -> Optional[str]:
+    """Column name from an Airtable UNKNOWN_FIELD_NAME error, if that's what `exc` is."""
+    msg = str(exc)
+    if "UNKNOWN_FIELD_NAME" not in msg:
+        return None
+    m = _UNKNOWN_FIELD_RE.search(msg)
+    return m.group(2) if m else None
+
+
+def _payload_keys(payload: Any) -> Set[str]:
+    """Normalized column names in a fields dict, or a list of fields / {"id", "fields"} records."""
+    rows = [payload] if isinstance(payload, dict) else list(payload or [])
+    keys: Set[str] = set()
+    for row in rows:
+        if isinstance(row, dict):
+            fields = row.get("fields") if isinstance(row.get("fields"), dict) else row
+            keys.update(_norm(k) for k in fields)
+    return keys
+
+
+# =========================
+# Registry
+# =========================
+class FieldRegistry:
+    def __init__(self, path: Optional[str] = None, ttl_sec: Optional[float] = None) -> None:
+        self.path = path or FIELD_REGISTRY_PATH or state_path("field_map.json")
+        self.ttl_sec = FIELD_REGISTRY_TTL_SEC if ttl_sec is None else ttl_sec
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._static: Dict[str, Dict[str, str]] = {}
+        # base_id → {"fetched_at": ts, "tables": {name|id → [columns]}}
+        self._bases: Dict[str, Dict[str, Any]] = {}
+        # "base/table" (or "table" when base-less) → {column Airtable rejected: learned at}
+        self._missing: Dict[str, Dict[str, float]] = {}
+        self._refreshing: Set[str] = set()
+        self._retry_at: Dict[str, float] = {}
+        self.stats: Dict[str, int] = {"remaps": 0, "dropped": 0, "refreshes": 0, "refresh_errors": 0, "learned_missing": 0}
+
+    # ---------- snapshot ----------
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.path, "r", encoding="utf-8") as fh:
+                snap = json.load(fh)
+        except FileNotFoundError:
+            return
+        except Exception as exc:
+            logger.warning(f"Field map snapshot unreadable ({exc}); starting from static schema")
+            return
+        self._bases = {b: e for b, e in (snap.get("bases") or {}).items() if isinstance(e, dict)}
+        now = time.time()
+        self._missing = {
+            k: dict(v) if isinstance(v, dict) else dict.fromkeys(v, now)  # older snapshots stored bare lists
+            for k, v in (snap.get("missing") or {}).items()
+        }
+
+    def _save(self) -> None:
+        snap = {"bases": self._bases, "missing": self._missing}
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump(snap, fh)
+            os.replace(tmp, self.path)
+        except Exception as exc:
+            logger.warning(f"Field map snapshot write failed: {exc}")
+
+    # ---------- sources ----------
+    def _static_map(self, name: str) -> Dict[str, str]:
+        amap = self._static.get(name)
+        if amap is None:
+            amap = {}
+            want = name.lower()
+            for d in _static_definitions():
+                if want not in (d.name().lower(), d.default.lower()):
+                    continue
+                for cands in d.field_candidates().values():
+                    for col in cands:
+                        amap.setdefault(_norm(col), col)
+            self._static[name] = amap
+        return amap
+
+    def _live_columns(self, base: Optional[str], name: str, tbl: Any) -> Optional[List[str]]:
+        if not base:
+            return None
+        entry = self._bases.get(base)
+        if FIELD_REGISTRY_METADATA and (entry is None or time.time() - float(entry.get("fetched_at") or 0) >= self.ttl_sec):
+            self._refresh_async(base, tbl)
+        if entry is None:
+            return None
+        tables = entry.get("tables") or {}
+        cols = tables.get(name)
+        if cols is None:
+            cols = next((c for t, c in tables.items() if t.lower() == name.lower()), None)
+        return cols
+
+    def _view(self, obj: Any) -> Tuple[Optional[str], Dict[str, str], bool, Set[str]]:
+        """(key, normalized → actual map, authoritative?, normalized missing columns)."""
+        base, name, tbl = _identify(obj)
+        if not name:
+            return None, {}, False, set()
+        key = f"{base}/{name}" if base else name
+        with self._lock:
+            self._load()
+            live = self._live_columns(base, name, tbl)
+            missing = {_norm(c) for c in self._missing_columns(key)}
+            if live is not None:
+                return key, {_norm(c): c for c in live}, True, missing
+            return key, dict(self._static_map(name)), False, missing
+
+    def _missing_columns(self, key: str) -> List[str]:
+        """Rejected columns for `key` still within FIELD_REGISTRY_MISSING_TTL_SEC; expired ones are forgotten."""
+        learned = self._missing.get(key)
+        if not learned:
+            return []
+        cutoff = time.time() - FIELD_REGISTRY_MISSING_TTL_SEC
+        for col in [c for c, at in learned.items() if at < cutoff]:
+            del learned[col]
+            logger.info(f"Retrying column '{col}' in {key}: its missing entry expired")
+        if not learned:
+            del self._missing[key]
+        return sorted(learned)
+
+    # ---------- metadata API ----------
+    def _refresh_async(self, base: str, tbl: Any = None) -> None:
+        if base in self._refreshing or time.time() < self._retry_at.get(base, 0.0):
+            return
+        self._refreshing.add(base)
+        threading.Thread(target=self.refresh, args=(base, tbl), name=f"field-registry-{base}", daemon=True).start()
+
+    def _fetch_schema(self, base: str, tbl: Any = None) -> Any:
+        schema = getattr(getattr(tbl, "base", None), "schema", None)
+        if not callable(schema):
+            key = os.getenv("AIRTABLE_API_KEY")
+            if not key:
+                raise RuntimeError("no Airtable key for metadata API")
+            from sms.http_transport import airtable_api
+
+            schema = airtable_api(key).base(base).schema
+        try:
+            return schema(force=True)
+        except TypeError:
+            return schema()
+
+    def refresh(self, base: str, tbl: Any = None) -> bool:
+        """Pull every table's columns for `base` from the metadata API. Best-effort."""
+        with self._lock:
+            self._refreshing.add(base)
+        try:
+            schema = self._fetch_schema(base, tbl)
+            tables: Dict[str, List[str]] = {}
+            for t in getattr(schema, "tables", None) or []:
+                cols = [f.name for f in (getattr(t, "fields", None) or []) if getattr(f, "name", None)]
+                tables[t.name] = cols
+                if getattr(t, "id", None):
+                    tables[t.id] = cols
+            with self._lock:
+                self._load()
+                self._bases[base] = {"fetched_at": time.time(), "tables": tables}
+                for k in [k for k in self._missing if k.startswith(f"{base}/")]:
+                    del self._missing[k]
+                self.stats["refreshes"] += 1
+                self._save()
+            return True
+        except Exception as exc:
+            with self._lock:
+                self.stats["refresh_errors"] += 1
+                self._retry_at[base] = time.time() + min(self.ttl_sec, FIELD_REGISTRY_RETRY_SEC)
+            logger.warning(f"Field metadata refresh failed for {base}: {exc}")
+            return False
+        finally:
+            with self._lock:
+                self._refreshing.discard(base)
+
+    def warm(self, bases: Optional[Iterable[str]] = None) -> Dict[str, bool]:
+        """Refresh stale bases up front (startup), so request paths only ever read the map."""
+        if bases is None:
+            from sms.config import settings
+
+            s = settings()
+            bases = [s.LEADS_CONVOS_BASE, s.CAMPAIGN_CONTROL_BASE, s.PERFORMANCE_BASE]
+        out: Dict[str, bool] = {}
+        with self._lock:
+            self._load()
+        for base in dict.fromkeys(b for b in bases if b):
+            entry = self._bases.get(base)
+            if entry and time.time() - float(entry.get("fetched_at") or 0) < self.ttl_sec:
+                out[base] = True
+            elif FIELD_REGISTRY_METADATA:
+                out[base] = self.refresh(base)
+        return out
+
+    # ---------- public API ----------
+    def field_map(self, obj: Any) -> Dict[str, str]:
+        """normalized → actual column map for a table (known-missing columns removed)."""
+        _, amap, _, missing = self._view(obj)
+        return {k: v for k, v in amap.items() if k not in missing}
+
+    def remap(self, obj: Any, payload: Optional[Dict[str, Any]], existing_only: bool = True) -> Dict[str, Any]:
+        """
+        Rename payload keys to the table's real column names (case/space-insensitive).
+
+        Keys Airtable already rejected are dropped. With `existing_only`, other unknown
+        keys are dropped too once the metadata API has confirmed the column set; until
+        then they pass through (the static schema isn't exhaustive).
+        """
+        payload = dict(payload or {})
+        key, amap, authoritative, missing = self._view(obj)
+        if key is None:
+            return payload
+        out: Dict[str, Any] = {}
+        for k, v in payload.items():
+            nk = _norm(k)
+            ak = amap.get(nk)
+            if nk in missing:
+                continue
+            if ak:
+                out[ak] = v
+            elif not (existing_only and authoritative):
+                out[k] = v
+        with self._lock:
+            self.stats["remaps"] += 1
+            self.stats["dropped"] += len(payload) - len(out)
+        return out
+
+    def note_error(self, obj: Any, exc: Any, payload: Any = None) -> Optional[str]:
+        """
+        Remember the column an UNKNOWN_FIELD_NAME error named.
+
+        Returns it only when a retry can make progress: the column was newly learned and
+        (if `payload` — the fields or records just sent — is given) it was actually in the
+        payload, so a remap now drops it. Otherwise None, and the caller should give up.
+        """
+        col = unknown_field(exc)
+        if not col:
+            return None
+        base, name, _ = _identify(obj)
+        if not name:
+            return None
+        key = f"{base}/{name}" if base else name
+        with self._lock:
+            self._load()
+            if col in self._missing_columns(key):
+                return None
+            self._missing.setdefault(key, {})[col] = time.time()
+            self.stats["learned_missing"] += 1
+            self._save()
+        logger.warning(f"Column '{col}' missing in {name}; dropping it from future writes")
+        if payload is not None and _norm(col) not in _payload_keys(payload):
+            return None
+        return col
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            self._load()
+            now = time.time()
+            return {
+                "path": self.path,
+                "ttl_sec": self.ttl_sec,
+                "metadata": FIELD_REGISTRY_METADATA,
+                "bases": {
+                    b: {"tables": len(e.get("tables") or {}), "age_sec": round(now - float(e.get("fetched_at") or 0), 1)}
+                    for b, e in self._bases.items()
+                },
+                "missing": {k: cols for k in list(self._missing) if (cols := self._missing_columns(k))},
+                "stats": dict(self.stats),
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._static.clear()
+            self._bases.clear()
+            self._missing.clear()
+            self._retry_at.clear()
+            self._loaded = True
+
+
+FIELD_REGISTRY = FieldRegistry()
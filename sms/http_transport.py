@@ -0,0 +1,272 @@
+"""
+🔌 HTTP Transport
+─────────────────
+Shared, connection-pooled HTTP layer for TextGrid sends and Airtable clients.
+
+- One keep-alive pool per host, shared by every caller (no TCP+TLS handshake per message)
+- httpx (HTTP/2 when `h2` is installed) for direct calls, requests as fallback
+- pyairtable `Api` objects are cached per key and mount the shared per-host adapter; the
+  api.airtable.com adapter admits each request through the per-base governor (sms.airtable_governor)
+- Pool sizes / timeouts are env-tunable
+- Per-host metrics: requests, errors, latency histogram, new connections → reuse ratio
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from sms.airtable_governor import GovernedAdapter
+from sms.runtime import get_logger
+
+logger = get_logger("http_transport")
+
+try:
+    import httpx  # type: ignore
+except Exception:
+    httpx = None
+try:
+    import requests  # type: ignore
+    from requests.adapters import HTTPAdapter  # type: ignore
+except Exception:
+    requests = None
+    HTTPAdapter = None
+try:
+    import h2  # type: ignore  # noqa: F401
+
+    _H2_AVAILABLE = True
+except Exception:
+    _H2_AVAILABLE = False
+
+# =========================
+# ENV / CONFIG
+# =========================
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "32"))
+HTTP_KEEPALIVE_SEC = float(os.getenv("HTTP_KEEPALIVE_SEC", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "15"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() in ("1", "true", "yes")
+AIRTABLE_HOST = "api.airtable.com"
+
+LATENCY_BUCKETS_MS: List[float] = [25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+
+# =========================
+# Metrics
+# =========================
+class HostStats:
+    """Counters + fixed-bucket latency histogram for one host."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.new_connections = 0
+        self.latency_sum_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def observe(self, latency_ms: float, *, error: bool = False, new_connection: bool = False) -> None:
+        idx = len(LATENCY_BUCKETS_MS)
+        for i, edge in enumerate(LATENCY_BUCKETS_MS):
+            if latency_ms <= edge:
+                idx = i
+                break
+        with self._lock:
+            self.requests += 1
+            self.errors += int(error)
+            self.new_connections += int(new_connection)
+            self.latency_sum_ms += latency_ms
+            self.buckets[idx] += 1
+
+    def snapshot(self, new_connections: Optional[int] = None) -> Dict[str, Any]:
+        with self._lock:
+            conns = self.new_connections if new_connections is None else new_connections
+            n = self.requests
+            hist = {f"le_{int(e)}ms": c for e, c in zip(LATENCY_BUCKETS_MS, self.buckets)}
+            hist["inf"] = self.buckets[-1]
+            return {
+                "requests": n,
+                "errors": self.errors,
+                "new_connections": conns,
+                "reuse_ratio": round(1 - conns / n, 3) if n else None,
+                "avg_latency_ms": round(self.latency_sum_ms / n, 1) if n else None,
+                "latency_histogram": hist,
+            }
+
+
+def _host_of(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+# =========================
+# Transport
+# =========================
+class HttpTransport:
+    """Process-wide pooled clients keyed by host."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._clients: Dict[str, Any] = {}
+        self._adapters: Dict[str, Any] = {}
+        self._sessions: Dict[str, Any] = {}
+        self._apis: Dict[str, Any] = {}
+        self._stats: Dict[str, HostStats] = {}
+
+    def stats_for(self, host: str) -> HostStats:
+        with self._lock:
+            st = self._stats.get(host)
+            if st is None:
+                st = self._stats[host] = HostStats()
+            return st
+
+    # ---------- httpx ----------
+    def _httpx_client(self, host: str):
+        client = self._clients.get(host)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get(host)
+            if client is None:
+                client = httpx.Client(
+                    http2=HTTP2_ENABLED and _H2_AVAILABLE,
+                    limits=httpx.Limits(
+                        max_connections=HTTP_POOL_MAXSIZE,
+                        max_keepalive_connections=HTTP_POOL_MAXSIZE,
+                        keepalive_expiry=HTTP_KEEPALIVE_SEC,
+                    ),
+                    timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+                )
+                self._clients[host] = client
+        return client
+
+    # ---------- requests ----------
+    def adapter(self, host: str, max_retries: Any = 0):
+        """Shared pooled HTTPAdapter for a host (one connection pool, many sessions)."""
+        adapter = self._adapters.get(host)
+        if adapter is not None:
+            return adapter
+        with self._lock:
+            adapter = self._adapters.get(host)
+            if adapter is None:
+                cls = GovernedAdapter if host == AIRTABLE_HOST and GovernedAdapter is not None else HTTPAdapter
+                adapter = cls(
+                    pool_connections=HTTP_POOL_CONNECTIONS,
+                    pool_maxsize=HTTP_POOL_MAXSIZE,
+                    max_retries=max_retries,
+                )
+                self._adapters[host] = adapter
+        return adapter
+
+    def bind_session(self, session: Any, host: str, max_retries: Any = 0) -> Any:
+        """Mount the shared adapter for `host` on a requests Session and record metrics."""
+        session.mount(f"https://{host}", self.adapter(host, max_retries))
+        stats = self.stats_for(host)
+
+        def _observe(resp, *_a, **_k):
+            try:
+                stats.observe(resp.elapsed.total_seconds() * 1000, error=resp.status_code >= 400)
+            except Exception:
+                pass
+
+        session.hooks.setdefault("response", []).append(_observe)
+        return session
+
+    def _requests_session(self, host: str):
+        session = self._sessions.get(host)
+        if session is None:
+            session = self.bind_session(requests.Session(), host)
+            self._sessions[host] = session
+        return session
+
+    # ---------- public ----------
+    def request(self, method: str, url: str, **kwargs: Any) -> Any:
+        """Send through the pooled client for the URL's host. Returns an httpx/requests Response."""
+        host = _host_of(url)
+        if httpx is not None:
+            stats = self.stats_for(host)
+            opened: List[bool] = []
+
+            def _trace(event: str, _info: Dict[str, Any]) -> None:
+                if event == "connection.connect_tcp.started":
+                    opened.append(True)
+
+            extensions = {**(kwargs.pop("extensions", None) or {}), "trace": _trace}
+            started = time.perf_counter()
+            try:
+                resp = self._httpx_client(host).request(method, url, extensions=extensions, **kwargs)
+            except Exception:
+                stats.observe((time.perf_counter() - started) * 1000, error=True, new_connection=bool(opened))
+                raise
+            stats.observe((time.perf_counter() - started) * 1000, error=resp.status_code >= 400, new_connection=bool(opened))
+            return resp
+        if requests is not None:
+            kwargs.setdefault("timeout", (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+            return self._requests_session(host).request(method, url, **kwargs)
+        raise RuntimeError("No HTTP client available (install httpx or requests).")
+
+    def post(self, url: str, **kwargs: Any) -> Any:
+        return self.request("POST", url, **kwargs)
+
+    def airtable_api(self, api_key: str) -> Any:
+        """Cached pyairtable Api for a key, sharing the api.airtable.com connection pool."""
+        api = self._apis.get(api_key)
+        if api is not None:
+            return api
+        from pyairtable import Api  # type: ignore
+
+        api = Api(api_key, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+        if HTTPAdapter is not None:
+            # Keep pyairtable's retry strategy on the shared adapter, minus 429: the governor
+            # retries those itself so every attempt is admitted and Retry-After is honoured
+            retries = getattr(api.session.get_adapter(f"https://{AIRTABLE_HOST}"), "max_retries", 0)
+            if getattr(retries, "status_forcelist", None):
+                retries = retries.new(status_forcelist=tuple(s for s in retries.status_forcelist if s != 429))
+            self.bind_session(api.session, AIRTABLE_HOST, retries)
+        with self._lock:
+            api = self._apis.setdefault(api_key, api)
+        return api
+
+    def _pool_connections(self, host: str) -> Optional[int]:
+        """New-connection count straight from urllib3's pools (requests path)."""
+        adapter = self._adapters.get(host)
+        pools = getattr(getattr(adapter, "poolmanager", None), "pools", None)
+        if pools is None:
+            return None
+        total = 0
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            total += getattr(pool, "num_connections", 0) if pool is not None else 0
+        return total
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            hosts = list(self._stats.items())
+        out: Dict[str, Any] = {}
+        for host, st in hosts:
+            conns = self._pool_connections(host) if host in self._adapters else None
+            out[host] = st.snapshot(conns)
+        return {
+            "http2": HTTP2_ENABLED and _H2_AVAILABLE and httpx is not None,
+            "pool_maxsize": HTTP_POOL_MAXSIZE,
+            "hosts": out,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            for client in self._clients.values():
+                try:
+                    client.close()
+                except Exception:
+                    pass
+            self._clients.clear()
+
+
+TRANSPORT = HttpTransport()
+
+
+def airtable_api(api_key: str) -> Any:
+    return TRANSPORT.airtable_api(api_key)
@@ -0,0 +1,279 @@
+"""
+📥 Inbound Queue
+────────────────
+Durable local queue for webhook payloads (inbound / opt-out / status).
+
+- Webhook handlers enqueue and return in a few ms; nothing touches Airtable on the event loop
+- SQLite (WAL) under SMS_STATE_DIR → payloads survive restarts; `running` rows are requeued on boot
+- (kind, message id) is unique → provider retries of the same webhook are dropped locally
+- A dispatcher thread feeds a bounded worker pool; the timeout clock starts when a task starts
+- A task past its timeout is flagged as abandoned and never retried while the original attempt
+  may still write (no double-handled inbounds); its outcome is recorded when the thread returns
+- Abandoned tasks move to spare threads (up to INBOUND_MAX_ABANDONED) so hung Airtable calls
+  don't take worker slots; past that cap they hold slots again and the queue logs an error
+- Failed tasks retry with backoff, then park as `failed` for inspection
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from sms.runtime import get_logger, state_path
+
+logger = get_logger("inbound_queue")
+
+# =========================
+# ENV / CONFIG
+# =========================
+INBOUND_QUEUE_PATH = os.getenv("INBOUND_QUEUE_PATH") or ""
+INBOUND_WORKERS = max(1, int(os.getenv("INBOUND_WORKERS", "4")))
+INBOUND_TASK_TIMEOUT_SEC = float(os.getenv("INBOUND_TASK_TIMEOUT_SEC", "30"))
+INBOUND_MAX_ABANDONED = max(0, int(os.getenv("INBOUND_MAX_ABANDONED", str(INBOUND_WORKERS))))
+INBOUND_MAX_ATTEMPTS = max(1, int(os.getenv("INBOUND_MAX_ATTEMPTS", "3")))
+INBOUND_RETRY_BASE_SEC = float(os.getenv("INBOUND_RETRY_BASE_SEC", "5"))
+INBOUND_DONE_RETENTION_SEC = float(os.getenv("INBOUND_DONE_RETENTION_SEC", str(24 * 3600)))
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS jobs ("
+    " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+    " kind TEXT NOT NULL, msg_id TEXT, payload TEXT NOT NULL,"
+    " status TEXT NOT NULL DEFAULT 'queued', attempts INTEGER NOT NULL DEFAULT 0,"
+    " available_at REAL NOT NULL, enqueued_at REAL NOT NULL, updated_at REAL NOT NULL,"
+    " last_error TEXT, result TEXT)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS jobs_msg ON jobs (kind, msg_id) WHERE msg_id IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, available_at)",
+)
+
+Handler = Callable[[Dict[str, Any]], Any]
+
+
+class InboundQueue:
+    """SQLite-backed job queue + in-process worker pool."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        workers: int = INBOUND_WORKERS,
+        timeout_sec: float = INBOUND_TASK_TIMEOUT_SEC,
+        max_abandoned: int = INBOUND_MAX_ABANDONED,
+    ):
+        self.path = path or INBOUND_QUEUE_PATH
+        self.workers = max(1, workers)
+        self.timeout_sec = timeout_sec
+        self.max_abandoned = max(0, max_abandoned)
+        self._handlers: Dict[str, Handler] = {}
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Spare threads carry abandoned tasks, so live jobs keep `workers` slots
+        self._pool = ThreadPoolExecutor(max_workers=self.workers + self.max_abandoned, thread_name_prefix="inbound")
+        # job id → (future, attempt); start times are stamped by the worker thread itself
+        self._running: Dict[int, Tuple[Future, int]] = {}
+        self._started: Dict[int, float] = {}
+        self._abandoned: Set[int] = set()
+        self.stats: Dict[str, int] = {"enqueued": 0, "duplicates": 0, "done": 0, "retried": 0, "failed": 0, "timeouts": 0}
+
+    # ---------- storage ----------
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path = self.path or state_path("inbound_queue.sqlite3")
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for stmt in _SCHEMA:
+                conn.execute(stmt)
+            # Crash recovery: anything mid-flight when we died goes back to the queue
+            conn.execute("UPDATE jobs SET status='queued' WHERE status='running'")
+            self._conn = conn
+        return self._conn
+
+    # ---------- producer ----------
+    def register(self, kind: str, handler: Handler) -> None:
+        self._handlers[kind] = handler
+
+    def enqueue(self, kind: str, payload: Dict[str, Any], msg_id: Optional[str] = None) -> Tuple[Optional[int], bool]:
+        """Persist a payload. Returns (job_id, duplicate)."""
+        now = time.time()
+        with self._lock:
+            cur = self._db().execute(
+                "INSERT OR IGNORE INTO jobs (kind, msg_id, payload, available_at, enqueued_at, updated_at) VALUES (?,?,?,?,?,?)",
+                (kind, msg_id or None, json.dumps(payload, default=str), now, now, now),
+            )
+            if cur.rowcount == 0:
+                self.stats["duplicates"] += 1
+                row = self._db().execute("SELECT id FROM jobs WHERE kind=? AND msg_id=?", (kind, msg_id)).fetchone()
+                return (row[0] if row else None), True
+            self.stats["enqueued"] += 1
+            job_id = cur.lastrowid
+        self.start()
+        self._wake.set()
+        return job_id, False
+
+    # ---------- consumer ----------
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="inbound-dispatch", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _claim(self) -> Optional[Tuple[int, str, Dict[str, Any], int]]:
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute(
+                    "SELECT id, kind, payload, attempts FROM jobs WHERE status='queued' AND available_at<=? ORDER BY id LIMIT 1",
+                    (time.time(),),
+                ).fetchone()
+                if row:
+                    db.execute("UPDATE jobs SET status='running', attempts=attempts+1, updated_at=? WHERE id=?", (time.time(), row[0]))
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        if not row:
+            return None
+        return row[0], row[1], json.loads(row[2]), row[3] + 1
+
+    def _finish(self, job_id: int, attempts: int, *, ok: bool, result: Any = None, error: Optional[str] = None) -> None:
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            if ok:
+                db.execute(
+                    "UPDATE jobs SET status='done', updated_at=?, result=?, last_error=NULL WHERE id=? AND status='running'",
+                    (now, json.dumps(result, default=str)[:2000], job_id),
+                )
+                self.stats["done"] += 1
+            elif attempts < INBOUND_MAX_ATTEMPTS:
+                delay = INBOUND_RETRY_BASE_SEC * (2 ** (attempts - 1))
+                db.execute(
+                    "UPDATE jobs SET status='queued', available_at=?, updated_at=?, last_error=? WHERE id=? AND status='running'",
+                    (now + delay, now, (error or "")[:2000], job_id),
+                )
+                self.stats["retried"] += 1
+            else:
+                db.execute(
+                    "UPDATE jobs SET status='failed', updated_at=?, last_error=? WHERE id=? AND status='running'",
+                    (now, (error or "")[:2000], job_id),
+                )
+                self.stats["failed"] += 1
+                logger.error(f"📥 Inbound job {job_id} failed permanently: {error}")
+
+    def _run_job(self, job_id: int, kind: str, payload: Dict[str, Any]) -> Any:
+        self._started[job_id] = time.time()
+        handler = self._handlers.get(kind)
+        if handler is None:
+            raise RuntimeError(f"no handler registered for {kind!r}")
+        return handler(payload)
+
+    def _reap(self) -> None:
+        now = time.time()
+        for job_id, (fut, attempts) in list(self._running.items()):
+            if fut.done():
+                self._running.pop(job_id, None)
+                self._started.pop(job_id, None)
+                self._abandoned.discard(job_id)
+                exc = fut.exception()
+                if exc is None:
+                    self._finish(job_id, attempts, ok=True, result=fut.result())
+                else:
+                    self._finish(job_id, attempts, ok=False, error=f"{type(exc).__name__}: {exc}")
+                continue
+            started = self._started.get(job_id)
+            if started is not None and job_id not in self._abandoned and now - started > self.timeout_sec:
+                # The thread can't be killed, so retrying now would run the job twice: flag it and
+                # move it onto a spare thread; its outcome is recorded when it returns.
+                self._abandoned.add(job_id)
+                self.stats["timeouts"] += 1
+                with self._lock:
+                    self._db().execute(
+                        "UPDATE jobs SET last_error=?, updated_at=? WHERE id=? AND status='running'",
+                        (f"timeout after {self.timeout_sec:.0f}s (still running)", now, job_id),
+                    )
+                if len(self._abandoned) > self.max_abandoned:
+                    logger.error(
+                        f"📥 {len(self._abandoned)} inbound jobs hung (spare threads: {self.max_abandoned}); "
+                        f"queue down to {self._free_slots()} of {self.workers} slots"
+                    )
+                else:
+                    logger.warning(f"📥 Inbound job {job_id} exceeded {self.timeout_sec:.0f}s; abandoned until it returns")
+
+    def _free_slots(self) -> int:
+        # Abandoned jobs beyond the spare threads hold worker slots
+        live = len(self._running) - min(len(self._abandoned), self.max_abandoned)
+        return max(0, self.workers - live)
+
+    def _prune(self) -> None:
+        with self._lock:
+            self._db().execute(
+                "DELETE FROM jobs WHERE status='done' AND updated_at<?", (time.time() - INBOUND_DONE_RETENTION_SEC,)
+            )
+
+    def _loop(self) -> None:
+        last_prune = 0.0
+        while not self._stop.is_set():
+            try:
+                self._reap()
+                while self._free_slots() > 0:
+                    job = self._claim()
+                    if not job:
+                        break
+                    job_id, kind, payload, attempts = job
+                    self._running[job_id] = (self._pool.submit(self._run_job, job_id, kind, payload), attempts)
+                if time.time() - last_prune > 3600:
+                    self._prune()
+                    last_prune = time.time()
+            except Exception:
+                logger.warning("⚠️ Inbound dispatcher error", exc_info=True)
+            self._wake.wait(0.05 if self._running else 1.0)
+            self._wake.clear()
+
+    def drain(self, timeout: float = 30.0) -> bool:
+        """Block until no queued/running jobs remain (tests, graceful shutdown)."""
+        self.start()
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self._lock:
+                busy = self._db().execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status IN ('queued','running') AND available_at<=?", (time.time(),)
+                ).fetchone()[0]
+            if not busy and not self._running:
+                return True
+            self._wake.set()
+            time.sleep(0.02)
+        return False
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._db().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {
+            "path": self.path,
+            "workers": self.workers,
+            "in_flight": len(self._running),
+            "abandoned": len(self._abandoned),
+            "free_slots": self._free_slots(),
+            "jobs": counts,
+            **self.stats,
+        }
+
+
+INBOUND_QUEUE = InboundQueue()
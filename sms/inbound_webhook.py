@@ -1,7 +1,11 @@
+import asyncio
+import contextvars
 import os
 import re
+import threading
 import traceback
 import signal
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from contextlib import contextmanager
 from datetime import datetime, timezone
 from typing import Any, Dict, Optional, Tuple
@@ -10,7 +14,24 @@ from fastapi import APIRouter, HTTPException, Request, Header, Query
 from pyairtable import Table
 
 from sms.number_pools import increment_delivered, increment_failed, increment_opt_out
+from sms.airtable_governor import airtable_lane
 from sms.datastore import CONNECTOR
+from sms.phone_index import PHONE_INDEX
+from sms.conversation_summary import CONVO_SUMMARY
+from sms.conversation_journal import JOURNAL
+from sms.inbound_queue import INBOUND_QUEUE
+from sms.http_transport import TRANSPORT
+from sms.intent import (  # reply lexicons + shared compiled classifier
+    CONTRACT_KEYWORDS,
+    POSITIVE_KEYWORDS,
+    PRICE_KEYWORDS,
+    STOP_WORDS,
+    TIMELINE_KEYWORDS,
+    classify,
+    extract_condition,
+    extract_price,
+    extract_timeline,
+)
 
 router = APIRouter()
 
@@ -31,6 +52,17 @@ REDIS_URL = os.getenv("REDIS_URL") or os.getenv("redis_url")
 REDIS_TLS = str(os.getenv("REDIS_TLS", "true")).lower() in ("true", "1", "yes")
 UPSTASH_REST_URL = os.getenv("UPSTASH_REDIS_REST_URL") or os.getenv("upstash_redis_rest_url")
 UPSTASH_REST_TOKEN = os.getenv("UPSTASH_REDIS_REST_TOKEN") or os.getenv("upstash_redis_rest_token")
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "2"))
+
+# === INBOUND QUEUE MODE ===
+# When on, routes validate + enqueue to the durable local queue and ack immediately;
+# classification, lookups and Airtable writes run in the inbound worker pool.
+# The paths disabled as EMERGENCY MODE measures (idempotency, opt-out counters/lookups/logging,
+# lead/prospect activity updates) only run in queue mode. Off it, the handlers run on
+# asyncio.to_thread and the response is bounded by INBOUND_HANDLER_TIMEOUT_SEC.
+INBOUND_QUEUE_MODE = str(os.getenv("INBOUND_QUEUE_MODE", "false")).lower() in ("true", "1", "yes")
+INBOUND_HANDLER_TIMEOUT_SEC = float(os.getenv("INBOUND_HANDLER_TIMEOUT_SEC", "10"))
+INBOUND_LOOKUP_WORKERS = int(os.getenv("INBOUND_LOOKUP_WORKERS", "8"))
 
 # Optional Redis / Upstash
 try:
@@ -93,7 +125,13 @@ class IdempotencyStore:
         self.rest = bool(UPSTASH_REST_URL and UPSTASH_REST_TOKEN and requests)
         if REDIS_URL and _redis:
             try:
-                self.r = _redis.from_url(REDIS_URL, ssl=REDIS_TLS, decode_responses=True)
+                self.r = _redis.from_url(
+                    REDIS_URL,
+                    ssl=REDIS_TLS,
+                    decode_responses=True,
+                    socket_timeout=REDIS_SOCKET_TIMEOUT,
+                    socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+                )
             except Exception:
                 traceback.print_exc()
         self._mem = set()
@@ -118,13 +156,13 @@ class IdempotencyStore:
         # Upstash REST
         if self.rest:
             try:
-                resp = requests.post(
+                resp = TRANSPORT.post(
                     UPSTASH_REST_URL,
                     headers={"Authorization": f"Bearer {UPSTASH_REST_TOKEN}"},
                     json=["SET", key, "1", "EX", "86400", "NX"],  # Fixed: direct array format
                     timeout=5,
                 )
-                data = resp.json() if resp.ok else {}
+                data = resp.json() if resp.status_code < 400 else {}
                 return data.get("result") != "OK"  # True if key already existed
             except Exception:
                 traceback.print_exc()
@@ -206,23 +244,6 @@ STAGE_SEQUENCE = [
 PROMOTION_INTENTS = {"positive"}
 PROMOTION_AI_INTENTS = {"interest_detected", "offer_discussion", "ask_price"}
 
-POSITIVE_KEYWORDS = {
-    "yes",
-    "interested",
-    "offer",
-    "ready",
-    "let's talk",
-    "lets talk",
-    "sure",
-    "sounds good",
-}
-
-PRICE_KEYWORDS = {"price", "ask", "number", "how much", "offer"}
-CONTRACT_KEYWORDS = {"contract", "paperwork", "agreement"}
-TIMELINE_KEYWORDS = {"timeline", "move", "closing", "close"}
-
-STOP_WORDS = {"stop", "unsubscribe", "remove", "opt out", "quit"}
-
 # === PROSPECT FIELD MAPPING ===
 PROSPECT_FIELD_MAP = {
     "SELLER_ASKING_PRICE": "Seller Asking Price",
@@ -254,15 +275,7 @@ PRICE_REGEX = re.compile(
     re.IGNORECASE
 )
 
-# Enhanced condition keywords
-ENHANCED_COND_WORDS = [
-    "repair", "fix", "renovation", "remodel", "update", "condition", "shape",
-    "needs work", "fixer upper", "handyman special", "as-is", "move-in ready",
-    "turnkey", "cosmetic", "structural", "foundation", "electrical", "plumbing",
-    "hvac", "roof", "flooring", "kitchen", "bathroom", "paint", "carpet",
-    "appliances", "windows", "siding", "landscaping", "pool", "deck", "garage",
-    "renovated", "updated", "new", "old", "vintage", "restored", "tenant"
-]
+
 
 
 def iso_timestamp() -> str:
@@ -375,29 +388,14 @@ def normalize_e164(phone: str, field: str = "phone") -> str:
     return f"+{digits}"
 
 
-def _first_existing_fields(tbl, candidates):
-    try:
-        probe = tbl.all(max_records=1) or []
-        keys = list((probe[0] or {}).get("fields", {}).keys()) if probe else []
-    except Exception:
-        keys = []
-    return [c for c in candidates if c in keys]
-
-
 def _find_by_phone_last10(tbl, phone):
-    """Return first record whose phone-like field matches last10 digits."""
+    """Return the record whose phone-like field matches last10 digits (via the shared phone index)."""
     if not tbl or not phone:
         return None
-    want = _last10(phone)
-    if not want:
+    if not _last10(phone):
         return None
-    fields = _first_existing_fields(tbl, PHONE_CANDIDATES)
     try:
-        for r in tbl.all():
-            f = r.get("fields", {})
-            for col in fields:
-                if _last10(f.get(col)) == want:
-                    return r
+        return PHONE_INDEX.find(tbl, phone, PHONE_CANDIDATES)
     except Exception:
         traceback.print_exc()
     return None
@@ -478,6 +476,7 @@ def promote_prospect_to_lead(phone_number: str, source: str = "Inbound"):
             "Reply Count": 0,
             "Last Inbound": iso_timestamp(),
         })
+        PHONE_INDEX.remember(leads, phone_number, new_lead["id"])
         
         # Update prospect with lead promotion date
         if prospects and prospect:
@@ -534,25 +533,25 @@ def _classify_message(body: str, overrides: Optional[Dict[str, str]] = None) ->
         ai_intent = ai_intent_override or ("interest_detected" if intent.lower() == "positive" else "neutral")
         return stage, intent, ai_intent
 
-    text = (body or "").strip().lower()
+    hit = classify(body)
 
     stage = STAGE_SEQUENCE[0]
     intent = "Neutral"
     ai_intent = "neutral"
 
-    if any(token in text for token in POSITIVE_KEYWORDS):
+    if hit.has("POSITIVE_KEYWORDS"):
         intent = "Positive"
         ai_intent = "interest_detected"
         stage = STAGE_SEQUENCE[2]
-    elif any(token in text for token in PRICE_KEYWORDS):
+    elif hit.has("PRICE_KEYWORDS"):
         intent = "Positive"
         ai_intent = "ask_price"
         stage = STAGE_SEQUENCE[2]
-    elif any(token in text for token in CONTRACT_KEYWORDS):
+    elif hit.has("CONTRACT_KEYWORDS"):
         intent = "Positive"
         ai_intent = "offer_discussion"
         stage = STAGE_SEQUENCE[6]
-    elif any(token in text for token in TIMELINE_KEYWORDS):
+    elif hit.has("TIMELINE_KEYWORDS"):
         intent = "Delay"
         ai_intent = "timeline_question"
         stage = STAGE_SEQUENCE[4]
@@ -569,198 +568,23 @@ def _should_promote(intent: str, ai_intent: str, stage: str) -> bool:
 
 
 def _is_opt_out(body: str) -> bool:
-    body_lower = (body or "").lower()
-    return any(token in body_lower for token in STOP_WORDS)
+    return classify(body).has("STOP_WORDS")
 
 
 # === COMPREHENSIVE PROSPECT DATA EXTRACTION ===
 def _extract_price_from_message(body: str) -> Optional[str]:
     """Extract price information from message text with enhanced pattern matching"""
-    if not body:
-        return None
-    
-    text = body.lower()
-    
-    # Enhanced price patterns including more variations
-    # Pattern 1: Standard price formats ($250,000 or $250000)
-    standard_pattern = r'\$\s*(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)'
-    
-    # Pattern 2: 'k' notation (250k, 250K)
-    k_pattern = r'(\d{1,4})\s*k(?:\s|$|[^\w])'
-    
-    # Pattern 3: Around/about patterns (around 250k, about $250,000)
-    around_pattern = r'(?:around|about|approximately|roughly)\s*[\$]?\s*(\d{1,3}(?:,\d{3})*|\d{1,4}k)'
-    
-    # Try standard pattern first
-    standard_matches = re.findall(standard_pattern, text)
-    if standard_matches:
-        price = standard_matches[0].replace(',', '').strip()
-        # Validate reasonable price range (25k to 10M)
-        try:
-            price_val = float(price)
-            if 25000 <= price_val <= 10000000:
-                return price
-        except ValueError:
-            pass
-    
-    # Try 'k' notation
-    k_matches = re.findall(k_pattern, text)
-    if k_matches:
-        try:
-            k_value = float(k_matches[0])
-            if 25 <= k_value <= 10000:  # 25k to 10Mk
-                return str(int(k_value * 1000))
-        except ValueError:
-            pass
-    
-    # Try around/about patterns
-    around_matches = re.findall(around_pattern, text)
-    if around_matches:
-        price_text = around_matches[0].replace('$', '').replace(',', '').strip()
-        if price_text.endswith('k'):
-            try:
-                k_value = float(price_text[:-1])
-                if 25 <= k_value <= 10000:
-                    return str(int(k_value * 1000))
-            except ValueError:
-                pass
-        else:
-            try:
-                price_val = float(price_text)
-                if 25000 <= price_val <= 10000000:
-                    return price_text
-            except ValueError:
-                pass
-    
-    # Fallback to original PRICE_REGEX
-    price_matches = PRICE_REGEX.findall(text)
-    if price_matches:
-        for match in price_matches:
-            if match[0]:  # Full price format
-                return match[0].replace(',', '').strip()
-            elif match[1] or match[2]:  # 'k' format
-                k_value = (match[1] or match[2]).replace('k', '').strip()
-                try:
-                    return str(int(float(k_value)) * 1000)
-                except ValueError:
-                    continue
-    
-    return None
+    return extract_price(body, PRICE_REGEX)
 
 
 def _extract_condition_info(body: str) -> Optional[str]:
     """Extract condition information from message text with enhanced analysis"""
-    if not body:
-        return None
-    
-    text = body.lower()
-    condition_indicators = []
-    
-    # Check for condition-related keywords with enhanced context
-    for word in ENHANCED_COND_WORDS:
-        if word in text:
-            # Extract surrounding context (up to 15 words around the keyword)
-            words = body.split()
-            for i, w in enumerate(words):
-                if word in w.lower():
-                    start = max(0, i - 7)
-                    end = min(len(words), i + 8)
-                    context = ' '.join(words[start:end])
-                    condition_indicators.append(context.strip())
-                    break
-    
-    # Look for specific condition patterns
-    # Pattern for "needs X" statements
-    needs_pattern = r'needs?\s+(?:a\s+)?(?:new\s+)?(\w+(?:\s+\w+){0,2})'
-    needs_matches = re.findall(needs_pattern, text)
-    for match in needs_matches:
-        condition_indicators.append(f"needs {match}")
-    
-    # Pattern for "X is/are Y" statements about condition
-    condition_statement_pattern = r'(roof|foundation|kitchen|bathroom|flooring|hvac|plumbing|electrical|windows)\s+(?:is|are)\s+(\w+(?:\s+\w+){0,2})'
-    condition_matches = re.findall(condition_statement_pattern, text)
-    for item, condition in condition_matches:
-        condition_indicators.append(f"{item} is {condition}")
-    
-    # Remove duplicates while preserving order
-    unique_indicators = []
-    for indicator in condition_indicators:
-        if indicator not in unique_indicators:
-            unique_indicators.append(indicator)
-    
-    return '; '.join(unique_indicators[:3]) if unique_indicators else None  # Limit to top 3 most relevant
+    return extract_condition(body)
 
 
 def _extract_timeline_motivation(body: str) -> Optional[str]:
     """Extract timeline and motivation information from message text with enhanced patterns"""
-    if not body:
-        return None
-    
-    text = body.lower()
-    
-    # Enhanced timeline and motivation keywords
-    timeline_words = {
-        "urgent", "asap", "soon", "immediately", "quickly", "fast", "rush",
-        "month", "months", "week", "weeks", "year", "years", "day", "days",
-        "deadline", "date", "timeline", "schedule", "time frame",
-        "move", "moving", "relocate", "relocating", "relocation",
-        "divorce", "divorcing", "separated", "separation",
-        "financial", "finances", "money", "cash", "debt", "bills", "mortgage",
-        "foreclosure", "foreclosing", "behind", "payments",
-        "inheritance", "inherited", "estate", "probate",
-        "job", "work", "employment", "transfer", "promotion",
-        "health", "medical", "illness", "sick", "hospital",
-        "family", "children", "kids", "school", "education",
-        "retirement", "retiring", "downsize", "downsizing",
-        "upgrade", "upgrading", "bigger", "smaller", "expand"
-    }
-    
-    timeline_indicators = []
-    
-    # Check for timeline/motivation keywords with enhanced context
-    for word in timeline_words:
-        if word in text:
-            words = body.split()
-            for i, w in enumerate(words):
-                if word in w.lower():
-                    start = max(0, i - 6)
-                    end = min(len(words), i + 7)
-                    context = ' '.join(words[start:end])
-                    timeline_indicators.append(context.strip())
-                    break
-    
-    # Look for specific timeline patterns
-    # Pattern for "need to sell by/before X"
-    deadline_pattern = r'(?:need|have|must)\s+to\s+sell\s+(?:by|before|within)\s+(\w+(?:\s+\w+){0,3})'
-    deadline_matches = re.findall(deadline_pattern, text)
-    for match in deadline_matches:
-        timeline_indicators.append(f"deadline: {match}")
-    
-    # Pattern for "because of X" motivation
-    motivation_pattern = r'because\s+(?:of\s+)?(\w+(?:\s+\w+){0,4})'
-    motivation_matches = re.findall(motivation_pattern, text)
-    for match in motivation_matches:
-        timeline_indicators.append(f"motivation: {match}")
-    
-    # Pattern for "due to X" motivation
-    due_to_pattern = r'due\s+to\s+(\w+(?:\s+\w+){0,4})'
-    due_to_matches = re.findall(due_to_pattern, text)
-    for match in due_to_matches:
-        timeline_indicators.append(f"due to: {match}")
-    
-    # Pattern for time expressions (in X months, within X weeks)
-    time_expression_pattern = r'(?:in|within|by)\s+(\d+\s+(?:day|week|month|year)s?)'
-    time_matches = re.findall(time_expression_pattern, text)
-    for match in time_matches:
-        timeline_indicators.append(f"timeframe: {match}")
-    
-    # Remove duplicates while preserving order
-    unique_indicators = []
-    for indicator in timeline_indicators:
-        if indicator not in unique_indicators:
-            unique_indicators.append(indicator)
-    
-    return '; '.join(unique_indicators[:3]) if unique_indicators else None  # Limit to top 3 most relevant
+    return extract_timeline(body)
 
 
 def _determine_active_phone_slot(prospect_record: Optional[Dict[str, Any]], used_phone: str) -> str:
@@ -1132,18 +956,41 @@ def log_conversation(payload: dict):
             print(f"⚠️ Skipping field '{key}' - not in Airtable schema")
     
     try:
-        print(f"📝 Creating conversation record with {len(filtered_payload)} valid fields: {list(filtered_payload.keys())}")
-        result = convos.create(filtered_payload)
-        print(f"✅ Successfully logged conversation to Airtable: {result.get('id', 'unknown ID')}")
+        print(f"📝 Journaling conversation record with {len(filtered_payload)} valid fields: {list(filtered_payload.keys())}")
+        JOURNAL.append(
+            convos, filtered_payload, sid=filtered_payload.get("TextGrid ID"),
+            on_written=lambda rid: _record_summary(filtered_payload, {"id": rid}),
+        )
     except Exception as e:
         print(f"⚠️ Failed to log to Conversations: {e}")
         print(f"🔍 Filtered payload keys: {list(filtered_payload.keys())}")
         traceback.print_exc()
 
 
+def _record_summary(fields: Dict[str, Any], result: Optional[Dict[str, Any]]) -> None:
+    """Fold a logged conversation into the per-phone rollup (local only, never raises)."""
+    try:
+        lead = fields.get("Lead Record ID") or fields.get("Lead")
+        CONVO_SUMMARY.record(
+            convos,
+            fields.get(FROM_FIELD),
+            fields.get(DIR_FIELD) or "",
+            at=fields.get(RECEIVED_AT) if str(fields.get(DIR_FIELD, "")).upper().startswith("IN") else fields.get(SENT_AT),
+            stage=fields.get(STAGE_FIELD),
+            lead_id=lead[0] if isinstance(lead, list) and lead else lead,
+            record_id=(result or {}).get("id"),
+        )
+    except Exception as e:
+        print(f"⚠️ Conversation summary update failed: {e}")
+
+
 @contextmanager
 def timeout_context(seconds):
-    """Context manager for timing out operations."""
+    """Context manager for timing out operations (SIGALRM: main thread only, no-op elsewhere; see call_with_timeout)."""
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
     def timeout_handler(signum, frame):
         raise TimeoutError(f"Operation timed out after {seconds} seconds")
     
@@ -1159,16 +1006,31 @@ def timeout_context(seconds):
         signal.signal(signal.SIGALRM, old_handler)
 
 
+_LOOKUP_POOL = ThreadPoolExecutor(max_workers=INBOUND_LOOKUP_WORKERS, thread_name_prefix="inbound-lookup")
+
+
+def call_with_timeout(seconds: float, fn, *args):
+    """Run fn on the lookup pool and wait at most `seconds` (works from any thread, unlike SIGALRM).
+
+    A call that overruns keeps its pool thread until it returns; the caller gets TimeoutError.
+    """
+    future = _LOOKUP_POOL.submit(contextvars.copy_context().run, fn, *args)
+    try:
+        return future.result(timeout=seconds)
+    except FutureTimeout:
+        raise TimeoutError(f"Operation timed out after {seconds} seconds") from None
+
+
 def safe_log_conversation(payload: dict, timeout_seconds: int = 3):
     """
     Safely log conversation to Airtable with timeout protection and comprehensive field mapping.
     
     Args:
         payload: Conversation data to log
-        timeout_seconds: Maximum time to wait for Airtable operation
+        timeout_seconds: Kept for callers; the row is queued on the conversation journal
     
     Returns:
-        bool: True if successfully logged, False otherwise
+        bool: True if the row was queued, False otherwise
     """
     if not convos:
         print(f"⚠️ Conversations table not initialized. AIRTABLE_API_KEY: {'SET' if AIRTABLE_API_KEY else 'NOT SET'}, BASE_ID: {'SET' if BASE_ID else 'NOT SET'}")
@@ -1230,17 +1092,13 @@ def safe_log_conversation(payload: dict, timeout_seconds: int = 3):
             print(f"⚠️ Skipping field '{key}' - not in Airtable schema")
 
     try:
-        print(f"📝 Creating conversation record with {len(filtered_payload)} valid fields: {list(filtered_payload.keys())}")
-        
-        # Use timeout context to prevent hanging
-        with timeout_context(timeout_seconds):
-            result = convos.create(filtered_payload)
-            print(f"✅ Successfully logged conversation to Airtable: {result.get('id', 'unknown ID')}")
-            return True
-            
-    except TimeoutError:
-        print(f"⏱️ Airtable operation timed out after {timeout_seconds} seconds - continuing without logging")
-        return False
+        print(f"📝 Journaling conversation record with {len(filtered_payload)} valid fields: {list(filtered_payload.keys())}")
+        # Queued, not written inline: the webhook never waits on Airtable for the log row
+        JOURNAL.append(
+            convos, filtered_payload, sid=filtered_payload.get("TextGrid ID"),
+            on_written=lambda rid: _record_summary(filtered_payload, {"id": rid}),
+        )
+        return True
     except Exception as e:
         print(f"⚠️ Failed to log to Conversations: {e}")
         print(f"🔍 Filtered payload keys: {list(filtered_payload.keys())}")
@@ -1371,9 +1229,18 @@ def calculate_response_time(seller_phone: str, received_time: str) -> Optional[i
         if not convos:
             return None
             
-        # Get the most recent outbound message to this prospect
         from datetime import datetime
-        
+
+        summary = CONVO_SUMMARY.get(convos, seller_phone)
+        if summary is not None:
+            last_sent_time = summary.get("last_outbound")
+            if not last_sent_time:
+                return None
+            received_dt = datetime.fromisoformat(received_time.replace('Z', '+00:00'))
+            sent_dt = datetime.fromisoformat(last_sent_time.replace('Z', '+00:00'))
+            return max(0, int((received_dt - sent_dt).total_seconds() / 60))
+
+        # Unindexable table → query the most recent outbound message to this prospect
         recent_outbound = convos.all(
             formula=f"AND({{Seller Phone Number}} = '{seller_phone}', {{Direction}} = 'OUTBOUND')",
             sort=["-Last Sent Time"],
@@ -1412,8 +1279,12 @@ def get_prospect_message_counts(seller_phone: str) -> tuple[int, int]:
     try:
         if not convos:
             return (0, 0)
-        
-        # Get all messages for this prospect
+
+        counts = CONVO_SUMMARY.counts(convos, seller_phone)
+        if counts is not None:
+            return counts
+
+        # Unindexable table → scan all messages for this prospect
         all_messages = convos.all(
             formula=f"{{Seller Phone Number}} = '{seller_phone}'",
             fields=["Direction"]
@@ -1432,9 +1303,10 @@ def get_prospect_message_counts(seller_phone: str) -> tuple[int, int]:
 
 
 # === TESTABLE HANDLER (used by CI) ===
-def handle_inbound(payload: dict):
-    """Non-async inbound handler used by tests."""
-    print(f"🔄 Processing inbound message from {payload.get('From', 'unknown')}: {payload.get('Body', '')[:50]}...")
+@airtable_lane("interactive")
+def handle_inbound(payload: dict, check_idempotency: bool = True):
+    """Synchronous inbound handler (tests, thread offload and the inbound queue workers)."""
+    print(f"🔄 Processing inbound message from {payload.get('From', 'unknown')}: {str(payload.get('Body') or '')[:50]}...")
     
     from_number = payload.get("From")
     to_number = payload.get("To")
@@ -1446,15 +1318,12 @@ def handle_inbound(payload: dict):
         raise HTTPException(status_code=422, detail="Missing From or Body")
 
     if _is_opt_out(body):
-        return process_optout(payload)
+        return process_optout(payload, check_idempotency=check_idempotency)
 
-    # TEMPORARILY DISABLED: Skip idempotency check due to Redis hanging issues
-    print("⚠️ EMERGENCY MODE: Skipping idempotency check")
-    
-    # TODO: Re-enable once Redis/Upstash hanging issue resolved:
-    # Enhanced idempotency check
-    # if msg_id and IDEM.seen(msg_id):
-    #     return {"status": "duplicate", "msg_id": msg_id}
+    if not INBOUND_QUEUE_MODE:
+        print("⚠️ EMERGENCY MODE: Skipping idempotency check (INBOUND_QUEUE_MODE off)")
+    elif check_idempotency and msg_id and IDEM.seen(msg_id):
+        return {"status": "duplicate", "msg_id": msg_id}
 
     overrides: Dict[str, str] = {}
     for key in ("Intent", "Intent Detected", "intent"):
@@ -1470,43 +1339,39 @@ def handle_inbound(payload: dict):
             overrides["stage"] = str(payload[key])
             break
 
-    # TEMPORARILY DISABLED: Simplify everything to minimal processing
-    print("⚠️ EMERGENCY MODE: Using absolute minimal processing")
-    stage, intent, ai_intent = "Contact Attempt", "Neutral", "neutral"
-    
-    # TODO: Re-enable once stability restored:
-    # stage, intent, ai_intent = _classify_message(body, overrides)
-
     stage, intent, ai_intent = _classify_message(body, overrides)
 
     # Re-enable prospect lookups with timeout protection for proper linking
     print("🔍 Looking up prospect and lead information...")
+    def _lookups():
+        # Lookup prospect information for linking
+        prospect_id, prospect_property_id = _lookup_prospect_info(from_number)
+        print(f"Found prospect: {prospect_id}, property: {prospect_property_id}")
+
+        # Lookup existing lead
+        lead_id, property_id = _lookup_existing_lead(from_number)
+        print(f"Found lead: {lead_id}, property: {property_id}")
+
+        # Use prospect property if we don't have lead property
+        if not property_id and prospect_property_id:
+            property_id = prospect_property_id
+
+        # Check if we should promote to lead
+        promoted = False
+        if not lead_id and _should_promote(intent, ai_intent, stage):
+            try:
+                lead_id, property_id = promote_prospect_to_lead(from_number)
+                promoted = bool(lead_id)
+                print(f"Promoted to lead: {lead_id}")
+            except Exception as promote_err:
+                print(f"Promotion failed: {promote_err}")
+        elif lead_id:
+            promoted = _should_promote(intent, ai_intent, stage)
+        return lead_id, property_id, promoted, prospect_id, prospect_property_id
+
     try:
-        with timeout_context(5):  # 5 second timeout for lookups
-            # Lookup prospect information for linking
-            prospect_id, prospect_property_id = _lookup_prospect_info(from_number)
-            print(f"Found prospect: {prospect_id}, property: {prospect_property_id}")
-            
-            # Lookup existing lead
-            lead_id, property_id = _lookup_existing_lead(from_number)
-            print(f"Found lead: {lead_id}, property: {property_id}")
-            
-            # Use prospect property if we don't have lead property
-            if not property_id and prospect_property_id:
-                property_id = prospect_property_id
-                
-            # Check if we should promote to lead
-            promoted = False
-            if not lead_id and _should_promote(intent, ai_intent, stage):
-                try:
-                    lead_id, property_id = promote_prospect_to_lead(from_number)
-                    promoted = bool(lead_id)
-                    print(f"Promoted to lead: {lead_id}")
-                except Exception as promote_err:
-                    print(f"Promotion failed: {promote_err}")
-            elif lead_id:
-                promoted = _should_promote(intent, ai_intent, stage)
-                
+        # 5 second timeout for lookups
+        lead_id, property_id, promoted, prospect_id, prospect_property_id = call_with_timeout(5, _lookups)
     except Exception as lookup_err:
         print(f"⚠️ Lookup failed with timeout/error: {lookup_err}")
         lead_id, property_id = None, None
@@ -1551,42 +1416,47 @@ def handle_inbound(payload: dict):
         record["Prospect"] = [prospect_id]  # Linked field format
         
         # Try to get additional prospect data for county, campaign, template, drip queue
+        def _prospect_links() -> Dict[str, Any]:
+            links: Dict[str, Any] = {}
+            prospects_tbl = CONNECTOR.prospects().table
+            if not prospects_tbl or CONNECTOR.prospects().in_memory:
+                return links
+            prospect_data = prospects_tbl.get(prospect_id)
+            if not prospect_data:
+                return links
+            fields = prospect_data.get('fields', {})
+
+            # Add county if available
+            if fields.get('County'):
+                links["County"] = fields['County']
+
+            # Add campaign linking if available
+            if fields.get('Campaign'):
+                campaigns = fields['Campaign']
+                if isinstance(campaigns, list) and campaigns:
+                    links["Bulk Campaign"] = campaigns
+                elif campaigns:
+                    links["Bulk Campaign"] = [campaigns]
+
+            # Add template linking if available
+            if fields.get('Template'):
+                templates = fields['Template']
+                if isinstance(templates, list) and templates:
+                    links["Template"] = templates
+                elif templates:
+                    links["Template"] = [templates]
+
+            # Add drip queue linking if available
+            if fields.get('Drip Queue'):
+                drip_queues = fields['Drip Queue']
+                if isinstance(drip_queues, list) and drip_queues:
+                    links["Drip Queue"] = drip_queues
+                elif drip_queues:
+                    links["Drip Queue"] = [drip_queues]
+            return links
+
         try:
-            with timeout_context(3):
-                prospects_tbl = CONNECTOR.prospects().table
-                if prospects_tbl and not CONNECTOR.prospects().in_memory:
-                    prospect_data = prospects_tbl.get(prospect_id)
-                    if prospect_data:
-                        fields = prospect_data.get('fields', {})
-                        
-                        # Add county if available
-                        if fields.get('County'):
-                            record["County"] = fields['County']
-                            
-                        # Add campaign linking if available
-                        if fields.get('Campaign'):
-                            campaigns = fields['Campaign']
-                            if isinstance(campaigns, list) and campaigns:
-                                record["Bulk Campaign"] = campaigns
-                            elif campaigns:
-                                record["Bulk Campaign"] = [campaigns]
-                                
-                        # Add template linking if available  
-                        if fields.get('Template'):
-                            templates = fields['Template']
-                            if isinstance(templates, list) and templates:
-                                record["Template"] = templates
-                            elif templates:
-                                record["Template"] = [templates]
-                                
-                        # Add drip queue linking if available
-                        if fields.get('Drip Queue'):
-                            drip_queues = fields['Drip Queue']
-                            if isinstance(drip_queues, list) and drip_queues:
-                                record["Drip Queue"] = drip_queues
-                            elif drip_queues:
-                                record["Drip Queue"] = [drip_queues]
-                                
+            record.update(call_with_timeout(3, _prospect_links))
         except Exception as prospect_err:
             print(f"⚠️ Failed to get additional prospect data: {prospect_err}")
 
@@ -1600,30 +1470,34 @@ def handle_inbound(payload: dict):
         print("✅ Conversation logged successfully")
     else:
         print("⚠️ Conversation logging failed or timed out - continuing processing")
-    
-    # TODO: Re-enable once other Airtable performance issues resolved:
-    # log_conversation(record)
-    # if lead_id:
-    #     update_lead_activity(lead_id, body, "IN", reply_increment=True)
-
-    # # Comprehensive prospect update for ALL inbound messages
-    # update_prospect_comprehensive(
-    #     phone_number=from_number,
-    #     body=body,
-    #     intent=intent,
-    #     ai_intent=ai_intent,
-    #     stage=stage,
-    #     direction="IN",
-    #     to_number=to_number
-    # )
+
+    if not INBOUND_QUEUE_MODE:
+        print("⚠️ EMERGENCY MODE: Skipping update_lead_activity and update_prospect_comprehensive (INBOUND_QUEUE_MODE off)")
+        return {"status": "ok", "stage": stage, "intent": intent, "promoted": promoted}
+
+    if lead_id:
+        update_lead_activity(lead_id, body, "IN", reply_increment=True)
+
+    # Comprehensive prospect update for ALL inbound messages
+    update_prospect_comprehensive(
+        phone_number=from_number,
+        body=body,
+        intent=intent,
+        ai_intent=ai_intent,
+        stage=stage,
+        direction="IN",
+        to_number=to_number,
+    )
 
     return {"status": "ok", "stage": stage, "intent": intent, "promoted": promoted}
 
 
 # === TESTABLE OPTOUT HANDLER ===
-def process_optout(payload: dict):
+@airtable_lane("interactive")
+def process_optout(payload: dict, check_idempotency: bool = True):
     """Handles STOP/unsubscribe messages for tests + webhook."""
     from_number = payload.get("From")
+    to_number = payload.get("To")
     raw_body = payload.get("Body")
     msg_id = payload.get("MessageSid") or payload.get("TextGridId")
     body = "" if raw_body is None else str(raw_body)
@@ -1634,30 +1508,25 @@ def process_optout(payload: dict):
     if not _is_opt_out(body):
         return {"status": "ignored"}
 
-    # TEMPORARILY DISABLED: Skip idempotency check due to Redis hanging issues
-    print("⚠️ EMERGENCY MODE: Skipping idempotency check in optout")
-    
-    # TODO: Re-enable once Redis/Upstash hanging issue resolved:
-    # Enhanced idempotency check
-    # if msg_id and IDEM.seen(msg_id):
-    #     return {"status": "duplicate", "msg_id": msg_id}
+    print(f"🚫 Opt-out from {from_number}")
+    if not INBOUND_QUEUE_MODE:
+        # No idempotency off queue mode, so provider retries of the STOP would log duplicate rows
+        print("⚠️ EMERGENCY MODE: Skipping idempotency, increment_opt_out, lookups, log_conversation and activity updates in optout (INBOUND_QUEUE_MODE off)")
+        return {"status": "optout"}
 
-    print(f"🚫 [TEST] Opt-out from {from_number}")
-    # TEMPORARILY DISABLED: Skip number pool updates due to potential Airtable hanging
-    print("⚠️ EMERGENCY MODE: Skipping increment_opt_out due to potential Airtable delays")
-    # TODO: Re-enable once stable:
-    # increment_opt_out(from_number)
+    if check_idempotency and msg_id and IDEM.seen(msg_id):
+        return {"status": "duplicate", "msg_id": msg_id}
 
-    # TEMPORARILY DISABLED: Skip lookups in optout to avoid hanging
-    print("⚠️ EMERGENCY MODE: Skipping lead/prospect lookups in optout")
-    lead_id, property_id = None, None
-    prospect_id, prospect_property_id = None, None
-    
-    # TODO: Re-enable:
-    # lead_id, property_id = _lookup_existing_lead(from_number)
-    # prospect_id, prospect_property_id = _lookup_prospect_info(from_number)
-    # if not property_id and prospect_property_id:
-    #     property_id = prospect_property_id
+    # Opt-outs count against the DID that received them (sender as legacy fallback)
+    try:
+        increment_opt_out(to_number or from_number)
+    except Exception as e:
+        print(f"⚠️ increment_opt_out failed: {e}")
+
+    lead_id, property_id = _lookup_existing_lead(from_number)
+    prospect_id, prospect_property_id = _lookup_prospect_info(from_number)
+    if not property_id and prospect_property_id:
+        property_id = prospect_property_id
 
     # Create comprehensive opt-out conversation record
     now_timestamp = iso_timestamp()
@@ -1665,6 +1534,7 @@ def process_optout(payload: dict):
     record = {
         # Core message data
         FROM_FIELD: from_number,  # "Seller Phone Number"
+        TO_FIELD: to_number,  # "TextGrid Phone Number"
         MSG_FIELD: body,  # "Message"
         DIR_FIELD: "INBOUND",  # "Direction"
         TG_ID_FIELD: msg_id,  # "TextGrid ID"
@@ -1685,35 +1555,28 @@ def process_optout(payload: dict):
         record["Prospect Record ID"] = prospect_id
         record["Prospect"] = [prospect_id]  # Linked field format
 
-    # TEMPORARILY DISABLED: Skip conversation logging in optout to avoid hanging
-    print("⚠️ EMERGENCY MODE: Skipping log_conversation in optout")
-    print(f"📊 Would log optout record: {record}")
-    
-    # TODO: Re-enable:
-    # log_conversation(record)
-    
-    # TEMPORARILY DISABLED: Skip all Airtable updates in optout to avoid hanging
-    print("⚠️ EMERGENCY MODE: Skipping update_lead_activity and update_prospect_comprehensive in optout")
-    
-    # TODO: Re-enable:
-    # if lead_id:
-    #     update_lead_activity(lead_id, body, "IN")
+    if not safe_log_conversation(record):
+        print("⚠️ Opt-out conversation logging failed or timed out - continuing processing")
 
-    # # Comprehensive prospect update for opt-out
-    # update_prospect_comprehensive(
-    #     phone_number=from_number,
-    #     body=body,
-    #     intent="DNC",
-    #     ai_intent="not_interested",
-    #     stage="OPT OUT",
-    #     direction="IN",
-    #     to_number=None
-    # )
+    if lead_id:
+        update_lead_activity(lead_id, body, "IN")
+
+    # Comprehensive prospect update for opt-out
+    update_prospect_comprehensive(
+        phone_number=from_number,
+        body=body,
+        intent="DNC",
+        ai_intent="not_interested",
+        stage="OPT OUT",
+        direction="IN",
+        to_number=to_number,
+    )
 
     return {"status": "optout"}
 
 
 # === TESTABLE STATUS HANDLER ===
+@airtable_lane("interactive")
 def process_status(payload: dict):
     """Testable delivery status handler used by CI and webhook."""
     msg_id = payload.get("MessageSid")
@@ -1734,6 +1597,46 @@ def process_status(payload: dict):
     return {"ok": True, "status": status or "unknown"}
 
 
+# === INBOUND QUEUE DISPATCH ===
+# Idempotency is checked once at enqueue time, so retries of a queued job must not re-check it.
+INBOUND_QUEUE.register("inbound", lambda p: handle_inbound(p, check_idempotency=False))
+INBOUND_QUEUE.register("optout", lambda p: process_optout(p, check_idempotency=False))
+INBOUND_QUEUE.register("status", process_status)
+
+
+def _queue_key(kind: str, data: Dict[str, Any]) -> Optional[str]:
+    msg_id = data.get("MessageSid") or data.get("TextGridId")
+    if not msg_id:
+        return None
+    # Status callbacks repeat the same SID once per state transition
+    return f"{msg_id}:{(data.get('MessageStatus') or '').lower()}" if kind == "status" else str(msg_id)
+
+
+async def _dispatch(kind: str, data: Dict[str, Any], handler):
+    """Queue mode: validate → idempotency → durable enqueue → ack. Otherwise run the handler off the event loop."""
+    if not INBOUND_QUEUE_MODE:
+        try:
+            return await asyncio.wait_for(asyncio.to_thread(handler, data), INBOUND_HANDLER_TIMEOUT_SEC)
+        except asyncio.TimeoutError:
+            # The handler keeps running on its thread; ack so the provider doesn't redeliver
+            msg_id = data.get("MessageSid") or data.get("TextGridId")
+            print(f"⚠️ {kind} handler exceeded {INBOUND_HANDLER_TIMEOUT_SEC}s for {msg_id} - still running in background")
+            return {"status": "timeout", "msg_id": msg_id}
+
+    if kind == "status":
+        if not data.get("To") or not data.get("From"):
+            raise HTTPException(status_code=422, detail="Missing To or From")
+    elif not data.get("From") or not data.get("Body"):
+        raise HTTPException(status_code=422, detail="Missing From or Body")
+
+    msg_id = data.get("MessageSid") or data.get("TextGridId")
+    if kind != "status" and msg_id and await asyncio.to_thread(IDEM.seen, msg_id):
+        return {"status": "duplicate", "msg_id": msg_id}
+
+    job_id, duplicate = INBOUND_QUEUE.enqueue(kind, data, _queue_key(kind, data))
+    return {"status": "duplicate" if duplicate else "queued", "job_id": job_id, "msg_id": msg_id}
+
+
 # === FASTAPI ROUTES ===
 @router.post("/inbound")
 async def inbound_handler(
@@ -1747,7 +1650,8 @@ async def inbound_handler(
     
     try:
         data = await _parse_body(request)
-        return handle_inbound(data)
+        kind = "optout" if _is_opt_out(str(data.get("Body") or "")) else "inbound"
+        return await _dispatch(kind, data, handle_inbound)
     except HTTPException:
         raise
     except Exception as e:
@@ -1768,7 +1672,7 @@ async def optout_handler(
     
     try:
         data = await _parse_body(request)
-        return process_optout(data)
+        return await _dispatch("optout", data, process_optout)
     except HTTPException:
         raise
     except Exception as e:
@@ -1797,8 +1701,11 @@ async def debug_handler(
             "conversations": CONVERSATIONS_TABLE,
             "leads": LEADS_TABLE,
             "prospects": PROSPECTS_TABLE
-        }
+        },
+        "inbound_queue_mode": INBOUND_QUEUE_MODE,
     }
+    if INBOUND_QUEUE_MODE:
+        debug_info["inbound_queue"] = INBOUND_QUEUE.status()
     
     # Test a simple Airtable connection
     if convos:
@@ -1825,7 +1732,7 @@ async def status_handler(
     
     try:
         data = await _parse_body(request)
-        return process_status(data)
+        return await _dispatch("status", data, process_status)
     except HTTPException:
         raise
     except Exception as e:
@@ -2,17 +2,67 @@
 """
 Intent Classifier
 -----------------
-Rule-based text intent detection for inbound SMS replies.
-Optimized for autoresponder + followup scheduling pipeline.
+Shared reply-classification engine for the inbound webhook, the autoresponder and
+follow-up labelling.
+
+- Every phrase lexicon compiles at import into one trie-shaped regex, scanned once per
+  reply with a lookahead so overlapping phrases ("not interested" / "interested") all hit
+- A hit also credits every shorter phrase it starts with (precomputed prefix closure),
+  so one pass yields every matched category — no per-list `any(p in text)` scans
+- Word-bounded lexicons (yes / no / opt-out) check their boundaries per hit
+- Text is normalised once: lowercase, apostrophes dropped ("don't" ≡ "dont"), whitespace collapsed
+- `classify()` / `classify_many()` return an `Intent` (categories + phrases); each consumer
+  keeps its own decision order on top of it
+- Price / condition / timeline extractors share pre-compiled patterns
 """
 
 from __future__ import annotations
+
 import re
 import string
-from typing import Iterable
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Pattern, Set, Tuple
+
+# -----------------------------
+# Lexicons — inbound webhook
+# -----------------------------
+POSITIVE_KEYWORDS = {"yes", "interested", "offer", "ready", "let's talk", "lets talk", "sure", "sounds good"}
+PRICE_KEYWORDS = {"price", "ask", "number", "how much", "offer"}
+CONTRACT_KEYWORDS = {"contract", "paperwork", "agreement"}
+TIMELINE_KEYWORDS = {"timeline", "move", "closing", "close"}
+STOP_WORDS = {"stop", "unsubscribe", "remove", "opt out", "quit"}
+
+# -----------------------------
+# Lexicons — autoresponder
+# -----------------------------
+INQUIRY_PHRASES = {"who is this", "how did you get", "why are you", "what is this about"}
+OPTOUT_WORDS = {"stop", "stopall", "unsubscribe", "quit", "cancel", "end", "opt out", "optout", "remove me", "removeme"}
+WRONG_NUM_WORDS = {"wrong number", "not mine"}
+NOT_OWNER_PHRASES = {"not the owner", "i sold", "no longer own", "dont own", "do not own", "sold this", "wrong person"}
+INTEREST_NO_PHRASES = {
+    "not interested",
+    "not selling",
+    "dont want to sell",
+    "don't want to sell",
+    "no interest",
+    "keep for now",
+    "holding for now",
+    "keeping it",
+    "not looking to sell",
+}
+ASK_OFFER_PHRASES = {"your offer", "what's your offer", "whats your offer", "what is your offer", "what can you offer"}
+COND_WORDS = {"condition", "repairs", "needs work", "renovated", "updated", "tenant", "vacant", "occupied", "as-is", "roof", "hvac"}
+YES_WORDS = {"yes", "yep", "yeah", "sure", "affirmative", "correct", "that's me", "that is me", "i am"}
+NO_WORDS = {"no", "nope", "nah"}
+PRICE_CONTEXT_WORDS = {"ask", "price", "offer", "how much"}
+
+OPTOUT_RE = re.compile(r"\b(stop(all)?|unsubscribe|quit|cancel|end|opt\s*out|remove\s*me)\b", re.I)
+YES_RE = re.compile(r"\b(yes|yep|yeah|sure|affirmative|correct|that's me|that is me|i am)\b", re.I)
+NO_RE = re.compile(r"\b(no|nope|nah)\b", re.I)
 
 # -----------------------------
-# Lexicons
+# Lexicons — follow-up labels
 # -----------------------------
 STOP = {"stop", "unsubscribe", "remove", "quit", "cancel", "end"}
 YES = {"yes", "yeah", "yep", "sure", "correct", "that's me", "that is me", "affirmative", "of course", "i am"}
@@ -28,54 +78,360 @@ HOW_NUM = {"how did you get my number", "why do you have my number", "where did
 NOT_OWNER = {"not the owner", "i sold", "no longer own", "sold this", "wrong person", "new owner"}
 APPT = {"appointment", "schedule", "set up", "meet", "meeting", "tomorrow at", "see you"}
 CONTRACT = {"under contract", "signed", "in escrow", "closing", "executed"}
+NEUTRAL = {"maybe", "not sure", "thinking", "depends", "idk", "i don't know", "i dont know"}
+
+# -----------------------------
+# Lexicons — extractor context words (ordered: first hits win the top-3)
+# -----------------------------
+CONDITION_CONTEXT_WORDS: Tuple[str, ...] = (
+    "repair", "fix", "renovation", "remodel", "update", "condition", "shape",
+    "needs work", "fixer upper", "handyman special", "as-is", "move-in ready",
+    "turnkey", "cosmetic", "structural", "foundation", "electrical", "plumbing",
+    "hvac", "roof", "flooring", "kitchen", "bathroom", "paint", "carpet",
+    "appliances", "windows", "siding", "landscaping", "pool", "deck", "garage",
+    "renovated", "updated", "new", "old", "vintage", "restored", "tenant",
+    "repairs", "vacant", "occupied", "remodeled",
+)
+TIMELINE_CONTEXT_WORDS: Tuple[str, ...] = (
+    "urgent", "asap", "soon", "immediately", "quickly", "fast", "rush",
+    "month", "months", "week", "weeks", "year", "years", "day", "days",
+    "deadline", "date", "timeline", "schedule", "time frame",
+    "move", "moving", "relocate", "relocating", "relocation",
+    "divorce", "divorcing", "separated", "separation",
+    "financial", "finances", "money", "cash", "debt", "bills", "mortgage",
+    "foreclosure", "foreclosing", "behind", "payments",
+    "inheritance", "inherited", "estate", "probate",
+    "job", "work", "employment", "transfer", "promotion",
+    "health", "medical", "illness", "sick", "hospital",
+    "family", "children", "kids", "school", "education",
+    "retirement", "retiring", "downsize", "downsizing",
+    "upgrade", "upgrading", "bigger", "smaller", "expand",
+)
 
+# category → (phrases, word-bounded?)
+LEXICON: Dict[str, Tuple[Iterable[str], bool]] = {
+    "POSITIVE_KEYWORDS": (POSITIVE_KEYWORDS, False),
+    "PRICE_KEYWORDS": (PRICE_KEYWORDS, False),
+    "CONTRACT_KEYWORDS": (CONTRACT_KEYWORDS, False),
+    "TIMELINE_KEYWORDS": (TIMELINE_KEYWORDS, False),
+    "STOP_WORDS": (STOP_WORDS, False),
+    "INQUIRY_PHRASES": (INQUIRY_PHRASES, False),
+    "OPTOUT_WORDS": (OPTOUT_WORDS, True),
+    "WRONG_NUM_WORDS": (WRONG_NUM_WORDS, False),
+    "NOT_OWNER_PHRASES": (NOT_OWNER_PHRASES, False),
+    "INTEREST_NO_PHRASES": (INTEREST_NO_PHRASES, False),
+    "ASK_OFFER_PHRASES": (ASK_OFFER_PHRASES, False),
+    "COND_WORDS": (COND_WORDS, False),
+    "YES_WORDS": (YES_WORDS, True),
+    "NO_WORDS": (NO_WORDS, True),
+    "PRICE_CONTEXT_WORDS": (PRICE_CONTEXT_WORDS, False),
+    "STOP": (STOP, False),
+    "YES": (YES, True),
+    "NO": (NO, True),
+    "WRONG": (WRONG, False),
+    "INTEREST": (INTEREST, False),
+    "PRICE": (PRICE, False),
+    "COND": (COND, False),
+    "DELAY": (DELAY, False),
+    "NEG": (NEG, False),
+    "WHO": (WHO, False),
+    "HOW_NUM": (HOW_NUM, False),
+    "NOT_OWNER": (NOT_OWNER, False),
+    "APPT": (APPT, False),
+    "CONTRACT": (CONTRACT, False),
+    "NEUTRAL": (NEUTRAL, False),
+    "CONDITION_CONTEXT_WORDS": (CONDITION_CONTEXT_WORDS, False),
+    "TIMELINE_CONTEXT_WORDS": (TIMELINE_CONTEXT_WORDS, False),
+}
 
 # -----------------------------
-# Utils
+# Extractor patterns (compiled once)
 # -----------------------------
-def _norm(text: str) -> str:
-    return text.lower().translate(str.maketrans("", "", string.punctuation)).strip()
+PRICE_DOLLAR_RE = re.compile(r"\$\s*(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)")
+PRICE_K_RE = re.compile(r"(\d{1,4})\s*k(?:\s|$|[^\w])")
+PRICE_AROUND_RE = re.compile(r"(?:around|about|approximately|roughly)\s*[\$]?\s*(\d{1,3}(?:,\d{3})*|\d{1,4}k)")
+PRICE_STRONG_RE = re.compile(r"\$\s*\d|\b\d+\s*k\b")
+PRICE_PLAIN_NUMBER_RE = re.compile(r"\b(?:\d{1,3}(?:,\d{3})+|\d{4,6})(?:\.\d{1,2})?\b")
+NEEDS_RE = re.compile(r"needs?\s+(?:a\s+)?(?:new\s+)?(\w+(?:\s+\w+){0,2})")
+CONDITION_STATEMENT_RE = re.compile(
+    r"(roof|foundation|kitchen|bathroom|flooring|hvac|plumbing|electrical|windows)\s+(?:is|are)\s+(\w+(?:\s+\w+){0,2})"
+)
+DEADLINE_RE = re.compile(r"(?:need|have|must)\s+to\s+sell\s+(?:by|before|within)\s+(\w+(?:\s+\w+){0,3})")
+MOTIVATION_RE = re.compile(r"because\s+(?:of\s+)?(\w+(?:\s+\w+){0,4})")
+DUE_TO_RE = re.compile(r"due\s+to\s+(\w+(?:\s+\w+){0,4})")
+TIME_EXPRESSION_RE = re.compile(r"(?:in|within|by)\s+(\d+\s+(?:day|week|month|year)s?)")
+_NON_PRICE_CHARS_RE = re.compile(r"[^\d.]")
+
+
+# -----------------------------
+# Engine
+# -----------------------------
+_APOSTROPHES = str.maketrans("", "", "'’")
+_SPACES_RE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=4096)
+def _phrase_key(text: Optional[str]) -> str:
+    return _SPACES_RE.sub(" ", (text or "").lower().translate(_APOSTROPHES))
+
+
+def normalize(text: Optional[str]) -> str:
+    return _SPACES_RE.sub(" ", (text or "").lower().translate(_APOSTROPHES)).strip()
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+def _trie_pattern(phrases: Iterable[str]) -> str:
+    """Alternation shaped as a character trie, so the scan cost tracks the text, not the phrase count."""
+    trie: Dict[str, dict] = {}
+    for phrase in phrases:
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class PhraseMatcher:
+    """Every category's phrases in one compiled scan; returns all matched categories and phrases."""
+
+    def __init__(self, lexicon: Dict[str, Tuple[Iterable[str], bool]]):
+        owners: Dict[str, Tuple[Set[str], Set[str]]] = {}  # phrase → (substring categories, bounded categories)
+        for category, (phrases, bounded) in lexicon.items():
+            for raw in phrases:
+                phrase = _phrase_key(raw)  # edge spaces are significant (" k")
+                if phrase:
+                    owners.setdefault(phrase, (set(), set()))[1 if bounded else 0].add(category)
+        self.vocabulary: FrozenSet[str] = frozenset(owners)
+        longest_first = sorted(owners, key=len, reverse=True)
+        self._scan: Pattern[str] = re.compile("(?=(" + _trie_pattern(longest_first) + "))")
+        # A hit on `phrase` also matches every shorter phrase it starts with
+        self._closure: Dict[str, List[Tuple[str, FrozenSet[str], FrozenSet[str]]]] = {
+            phrase: [(p, frozenset(owners[p][0]), frozenset(owners[p][1])) for p in owners if phrase.startswith(p)]
+            for phrase in owners
+        }
 
+    def match(self, text: str) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+        """(categories, phrases) present in already-normalised `text`."""
+        categories: Set[str] = set()
+        phrases: Set[str] = set()
+        n = len(text)
+        for m in self._scan.finditer(text):
+            start = m.start()
+            left_ok = start == 0 or not _is_word_char(text[start - 1])
+            for phrase, loose, bounded in self._closure[m.group(1)]:
+                hit = False
+                if loose:
+                    categories.update(loose)
+                    hit = True
+                if bounded and left_ok:
+                    end = start + len(phrase)
+                    if end == n or not _is_word_char(text[end]):
+                        categories.update(bounded)
+                        hit = True
+                if hit:
+                    phrases.add(phrase)
+        return frozenset(categories), frozenset(phrases)
 
-def _has_any(text: str, phrases: Iterable[str]) -> bool:
-    return any(p in text for p in phrases)
 
+MATCHER = PhraseMatcher(LEXICON)
 
-def _match_words(text: str, words: Iterable[str]) -> bool:
-    pattern = r"\b(" + "|".join(map(re.escape, words)) + r")\b"
-    return bool(re.search(pattern, text))
+
+@dataclass(frozen=True)
+class Intent:
+    text: str
+    categories: FrozenSet[str]
+    phrases: FrozenSet[str]
+
+    def has(self, *categories: str) -> bool:
+        return not self.categories.isdisjoint(categories)
+
+    def contains(self, phrase: str) -> bool:
+        """Substring test for a single phrase, answered from the scan when the phrase is in the lexicon."""
+        key = _phrase_key(phrase)
+        return key in self.phrases if key in MATCHER.vocabulary else key in self.text
+
+
+@lru_cache(maxsize=2048)
+def classify(body: Optional[str]) -> Intent:
+    """One scan of the reply → every matched lexicon category (cached: a webhook asks several times)."""
+    text = normalize(body)
+    categories, phrases = MATCHER.match(text)
+    return Intent(text, categories, phrases)
+
+
+def classify_many(bodies: Iterable[Optional[str]]) -> List[Intent]:
+    """Batch form of classify(); repeated bodies are scanned once."""
+    seen: Dict[Optional[str], Intent] = {}
+    out: List[Intent] = []
+    for body in bodies:
+        if body not in seen:
+            text = normalize(body)
+            categories, phrases = MATCHER.match(text)
+            seen[body] = Intent(text, categories, phrases)
+        out.append(seen[body])
+    return out
 
 
 # -----------------------------
-# Main classifier
+# Extractors
 # -----------------------------
+def looks_like_price(text: str) -> bool:
+    """Price detection that avoids false-triggers on phone numbers."""
+    t = text.lower()
+    if PRICE_STRONG_RE.search(t):
+        return True
+    if classify(text).has("PRICE_CONTEXT_WORDS"):
+        return bool(PRICE_PLAIN_NUMBER_RE.search(t))
+    return False
+
+
+def extract_price(body: str, fallback: Pattern[str]) -> Optional[str]:
+    """Asking price from a reply ($250,000 / 250k / around 250k), else the caller's fallback regex."""
+    if not body:
+        return None
+    text = body.lower()
+
+    standard = PRICE_DOLLAR_RE.findall(text)
+    if standard:
+        try:
+            price = standard[0].replace(",", "").strip()
+            if 25000 <= float(price) <= 10000000:
+                return price
+        except ValueError:
+            pass
+
+    k_matches = PRICE_K_RE.findall(text)
+    if k_matches:
+        try:
+            k_value = float(k_matches[0])
+            if 25 <= k_value <= 10000:
+                return str(int(k_value * 1000))
+        except ValueError:
+            pass
+
+    around = PRICE_AROUND_RE.findall(text)
+    if around:
+        price_text = around[0].replace("$", "").replace(",", "").strip()
+        try:
+            if price_text.endswith("k"):
+                k_value = float(price_text[:-1])
+                if 25 <= k_value <= 10000:
+                    return str(int(k_value * 1000))
+            elif 25000 <= float(price_text) <= 10000000:
+                return price_text
+        except ValueError:
+            pass
+
+    for match in fallback.findall(text):
+        if match[0]:
+            return _NON_PRICE_CHARS_RE.sub("", match[0])
+        if match[1] or match[2]:
+            try:
+                return str(int(float((match[1] or match[2]).replace("k", "").strip())) * 1000)
+            except ValueError:
+                continue
+    return None
+
+
+@lru_cache(maxsize=16)
+def _word_order(words: Tuple[str, ...]) -> Tuple[Dict[str, Tuple[int, str]], Tuple[str, ...]]:
+    """Lexicon key → (position, word) for the words the scan covers, plus the ones it doesn't."""
+    order = {_phrase_key(w): (i, w) for i, w in enumerate(words) if _phrase_key(w) in MATCHER.vocabulary}
+    return order, tuple(w for w in words if _phrase_key(w) not in order)
+
+
+def _keyword_contexts(body: str, words: Iterable[str], before: int, after: int) -> List[str]:
+    found = classify(body)
+    order, unscanned = _word_order(tuple(words))
+    present = [order[p] for p in found.phrases if p in order]
+    present.sort()
+    tokens = body.split()
+    out: List[str] = []
+    for word in [w for _i, w in present] + [w for w in unscanned if found.contains(w)]:
+        for i, w in enumerate(tokens):
+            if word in w.lower():
+                out.append(" ".join(tokens[max(0, i - before): min(len(tokens), i + after)]).strip())
+                break
+    return out
+
+
+def _top3(indicators: List[str]) -> Optional[str]:
+    unique: List[str] = []
+    for indicator in indicators:
+        if indicator not in unique:
+            unique.append(indicator)
+    return "; ".join(unique[:3]) if unique else None
+
+
+def extract_condition(body: str, words: Iterable[str] = CONDITION_CONTEXT_WORDS) -> Optional[str]:
+    """Property-condition notes: keyword context, "needs X" and "roof is Y" statements (top 3)."""
+    if not body:
+        return None
+    text = body.lower()
+    indicators = _keyword_contexts(body, words, 7, 8)
+    indicators += [f"needs {m}" for m in NEEDS_RE.findall(text)]
+    indicators += [f"{item} is {cond}" for item, cond in CONDITION_STATEMENT_RE.findall(text)]
+    return _top3(indicators)
+
+
+def extract_timeline(body: str, words: Iterable[str] = TIMELINE_CONTEXT_WORDS) -> Optional[str]:
+    """Timeline / motivation notes: keyword context, deadlines, "because of", "due to", time frames (top 3)."""
+    if not body:
+        return None
+    text = body.lower()
+    indicators = _keyword_contexts(body, words, 6, 7)
+    indicators += [f"deadline: {m}" for m in DEADLINE_RE.findall(text)]
+    indicators += [f"motivation: {m}" for m in MOTIVATION_RE.findall(text)]
+    indicators += [f"due to: {m}" for m in DUE_TO_RE.findall(text)]
+    indicators += [f"timeframe: {m}" for m in TIME_EXPRESSION_RE.findall(text)]
+    return _top3(indicators)
+
+
+# -----------------------------
+# Follow-up labels
+# -----------------------------
+def _norm(text: str) -> str:
+    return text.lower().translate(str.maketrans("", "", string.punctuation)).strip()
+
+
 def classify_intent(body: str) -> str:
     """Return standardized intent label for inbound SMS body."""
-    text = _norm(body or "")
-    if not text:
+    if not _norm(body or ""):
         return "blank"
+    hit = classify(body)
 
-    if _has_any(text, STOP):
+    if hit.has("STOP"):
         return "optout"
-    if _has_any(text, CONTRACT):
+    if hit.has("CONTRACT"):
         return "under_contract"
-    if _has_any(text, APPT):
+    if hit.has("APPT"):
         return "appointment"
-    if _has_any(text, NOT_OWNER) or _has_any(text, WRONG):
+    if hit.has("NOT_OWNER", "WRONG"):
         return "wrong_number"
-    if _match_words(text, NO) or _has_any(text, NEG):
+    if hit.has("NO", "NEG"):
         return "followup_no"
-    if _has_any(text, DELAY):
+    if hit.has("DELAY"):
         return "delay"
-    if _has_any(text, WHO) or _has_any(text, HOW_NUM):
+    if hit.has("WHO", "HOW_NUM"):
         return "inquiry"
-    if _has_any(text, PRICE) or _has_any(text, COND):
+    if hit.has("PRICE", "COND"):
         return "price_response"
-    if _match_words(text, YES) or _has_any(text, INTEREST):
+    if hit.has("YES", "INTEREST"):
         return "followup_yes"
-    if any(t in text for t in ["maybe", "not sure", "thinking", "depends", "idk", "i don't know", "i dont know"]):
+    if hit.has("NEUTRAL"):
         return "neutral"
     return "intro"
 
 
-__all__ = ["classify_intent"]
+__all__ = ["classify_intent", "classify", "classify_many", "Intent", "PhraseMatcher"]
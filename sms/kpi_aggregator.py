@@ -5,14 +5,21 @@ KPI Aggregator
 Rolls up raw KPI records (Value, Metric, Date)
 into *_DAILY_TOTAL, *_WEEKLY_TOTAL, *_MONTHLY_TOTAL metrics.
 Timezone-aware, idempotent, and datastore-safe.
+
+Raw rows are folded into per-metric daily buckets (sms.kpi_buckets) from a
+CREATED_TIME checkpoint, so a run reads only new rows; windows are summed
+locally and changed totals are written with batched creates/updates.
 """
 
 from __future__ import annotations
-import os, re, time, traceback
+import os, time
 from datetime import datetime, timedelta, timezone
-from typing import Dict, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 from sms.runtime import get_logger
-from sms.datastore import CONNECTOR
+from sms.airtable_governor import airtable_lane
+from sms.datastore import CONNECTOR, base_bucket
+from sms.field_registry import FIELD_REGISTRY
+from sms.kpi_buckets import KPI_BUCKETS, KPI_TZ, KpiBuckets
 
 try:
     from zoneinfo import ZoneInfo
@@ -28,8 +35,8 @@ AIRTABLE_KEY = os.getenv("AIRTABLE_REPORTING_KEY") or os.getenv("AIRTABLE_API_KE
 PERF_BASE = os.getenv("PERFORMANCE_BASE")
 KPI_TABLE = os.getenv("KPI_TABLE_NAME", "KPIs")
 TEST_MODE = os.getenv("TEST_MODE", "false").lower() in {"1", "true"}
-KPI_TZ = os.getenv("KPI_TZ", "America/Chicago")
 MAX_SCAN = int(os.getenv("KPI_MAX_SCAN", "10000"))
+BATCH_SIZE = 10  # Airtable batch create/update limit
 
 
 # ---------------------
@@ -42,41 +49,15 @@ def _tz_now():
         return datetime.now(timezone.utc)
 
 
-def _to_date_local(s: str) -> Optional[datetime.date]:
-    if not s:
-        return None
-    try:
-        dt = datetime.fromisoformat(str(s).replace("Z", "+00:00"))
-        if ZoneInfo:
-            dt = dt.astimezone(ZoneInfo(KPI_TZ))
-        return dt.date()
-    except Exception:
-        return None
-
-
-def _norm(s: str) -> str:
-    return re.sub(r"[^a-z0-9]+", "", s.lower().strip())
-
-
-def _auto_map(tbl) -> Dict[str, str]:
-    try:
-        one = tbl.all(max_records=1)
-        keys = list(one[0].get("fields", {}).keys()) if one else []
-    except Exception:
-        keys = []
-    return {_norm(k): k for k in keys}
-
-
 def _remap(tbl, data: Dict) -> Dict:
-    amap = _auto_map(tbl)
-    return {amap.get(_norm(k), k): v for k, v in data.items() if amap.get(_norm(k))}
+    return FIELD_REGISTRY.remap(tbl, data)
 
 
 def _fetch(tbl) -> Tuple[list, Optional[str]]:
-    """Fetch KPI rows safely with retries."""
+    """Fetch KPI rows safely with retries (tables the bucket store can't key)."""
     for i in range(3):
         try:
-            rows = tbl.all(page_size=100, max_records=min(100, MAX_SCAN))
+            rows = tbl.all(page_size=100, max_records=MAX_SCAN)
             return rows, None
         except Exception as e:
             logger.error(f"KPI fetch attempt {i + 1} failed: {e}")
@@ -84,9 +65,41 @@ def _fetch(tbl) -> Tuple[list, Optional[str]]:
     return [], "Fetch failed after retries"
 
 
+def _write_batches(tbl, bucket, updates: List[tuple], creates: List[tuple]) -> List[Tuple[str, str, float]]:
+    """Batched upserts. Items are (metric_name, record_id, value, payload); returns what was written."""
+    done: List[Tuple[str, str, float]] = []
+    batch_update = getattr(tbl, "batch_update", None)
+    batch_create = getattr(tbl, "batch_create", None)
+    for i in range(0, len(updates), BATCH_SIZE):
+        chunk = updates[i:i + BATCH_SIZE]
+        try:
+            with bucket.sending():
+                if callable(batch_update):
+                    batch_update([{"id": rid, "fields": payload} for _, rid, _, payload in chunk])
+                else:
+                    for _, rid, _, payload in chunk:
+                        tbl.update(rid, payload)
+            done.extend((m, rid, v) for m, rid, v, _ in chunk)
+        except Exception as e:
+            logger.error(f"KPI batch update failed ({len(chunk)} totals): {e}", exc_info=True)
+    for i in range(0, len(creates), BATCH_SIZE):
+        chunk = creates[i:i + BATCH_SIZE]
+        try:
+            with bucket.sending():
+                if callable(batch_create):
+                    created = batch_create([payload for *_, payload in chunk]) or []
+                else:
+                    created = [tbl.create(payload) for *_, payload in chunk]
+            done.extend((m, (rec or {}).get("id"), v) for (m, _, v, _), rec in zip(chunk, created) if (rec or {}).get("id"))
+        except Exception as e:
+            logger.error(f"KPI batch create failed ({len(chunk)} totals): {e}", exc_info=True)
+    return done
+
+
 # ---------------------
 # Core Aggregator
 # ---------------------
+@airtable_lane("bulk")
 def aggregate_kpis() -> Dict:
     logger.info("Starting KPI aggregation...")
     if TEST_MODE:
@@ -98,82 +111,60 @@ def aggregate_kpis() -> Dict:
     if not tbl:
         return {"ok": False, "error": "No performance table configured"}
 
-    rows, fetch_err = _fetch(tbl)
     today = _tz_now().date()
     start_week = today - timedelta(days=7)
     start_month = today.replace(day=1)
     now_iso = datetime.now(timezone.utc).isoformat()
 
-    raw, daily_exist, weekly_exist, monthly_exist = [], {}, {}, {}
-    for r in rows:
-        f = r.get("fields", {})
-        metric = str(f.get("Metric", "")).strip()
-        d = _to_date_local(str(f.get("Date", "")))
-        if not metric or not d:
-            continue
-        if metric.endswith("_DAILY_TOTAL") and d == today:
-            daily_exist[metric] = r
-            continue
-        if metric.endswith("_WEEKLY_TOTAL") and d == today:
-            weekly_exist[metric] = r
-            continue
-        if metric.endswith("_MONTHLY_TOTAL") and d == today:
-            monthly_exist[metric] = r
-            continue
-        raw.append(r)
-
-    # Aggregate
-    agg = {"daily": {}, "weekly": {}, "monthly": {}}
-    for r in raw:
-        f = r["fields"]
-        m = f.get("Metric")
-        d = _to_date_local(str(f.get("Date")))
-        v = f.get("Value") or 0
-        try:
-            val = float(str(v).replace(",", ""))
-        except Exception:
-            val = 0
-        if not (m and d):
-            continue
-        if d == today:
-            agg["daily"][m] = agg["daily"].get(m, 0) + val
-        if d >= start_week:
-            agg["weekly"][m] = agg["weekly"].get(m, 0) + val
-        if d >= start_month:
-            agg["monthly"][m] = agg["monthly"].get(m, 0) + val
-
-    def _upsert(suffix: str, data: Dict[str, float], existing: Dict[str, dict]):
-        written = 0
-        for base, val in data.items():
+    # Only rows created since the last checkpoint are read
+    store, fetch_err = KPI_BUCKETS, None
+    key = store.refresh(tbl_handle)
+    if not key:
+        # Unkeyed (in-memory) table → one-shot scan into a throwaway store
+        rows, fetch_err = _fetch(tbl)
+        store, key = KpiBuckets(path=":memory:"), "memory"
+        store.ingest(key, rows)
+
+    windows = store.windows(key, today)
+    existing = store.written_totals(key, today)
+
+    updates, creates, skipped = [], [], 0
+    suffix_of: Dict[str, str] = {}
+    for window, suffix, start in (
+        ("daily", "DAILY_TOTAL", today),
+        ("weekly", "WEEKLY_TOTAL", start_week),
+        ("monthly", "MONTHLY_TOTAL", start_month),
+    ):
+        for base, val in windows[window].items():
             metric_name = f"{base}_{suffix}"
-            payload = {
+            prev = existing.get(metric_name)
+            if prev and prev[1] == val:
+                skipped += 1
+                continue
+            payload: Dict[str, Any] = _remap(tbl, {
                 "Campaign": "ALL",
                 "Metric": metric_name,
                 "Value": val,
                 "Date": str(today),
                 "Timestamp": now_iso,
-                "Date Start": str(start_month if "MONTHLY" in suffix else (start_week if "WEEKLY" in suffix else today)),
+                "Date Start": str(start),
                 "Date End": str(today),
-            }
-            try:
-                if metric_name in existing:
-                    tbl.update(existing[metric_name]["id"], _remap(tbl, payload))
-                else:
-                    tbl.create(_remap(tbl, payload))
-                written += 1
-                time.sleep(0.2)
-            except Exception as e:
-                logger.error(f"Upsert fail {metric_name}: {e}", exc_info=True)
-        return written
-
-    written = {
-        "daily": _upsert("DAILY_TOTAL", agg["daily"], daily_exist),
-        "weekly": _upsert("WEEKLY_TOTAL", agg["weekly"], weekly_exist),
-        "monthly": _upsert("MONTHLY_TOTAL", agg["monthly"], monthly_exist),
-    }
-
-    out = {"ok": True, "written": written, "errors": []}
+            })
+            suffix_of[metric_name] = window
+            (updates if prev else creates).append((metric_name, prev[0] if prev else None, val, payload))
+
+    done = _write_batches(tbl, base_bucket(getattr(tbl_handle, "base_id", None)), updates, creates)
+    store.mark_written(key, today, done)
+    store.prune(key, today)
+
+    written = {"daily": 0, "weekly": 0, "monthly": 0}
+    for metric_name, _, _ in done:
+        written[suffix_of[metric_name]] += 1
+
+    out = {"ok": True, "written": written, "unchanged": skipped, "errors": []}
     if fetch_err:
         out["errors"].append(fetch_err)
+    if len(done) < len(updates) + len(creates):
+        out["errors"].append(f"{len(updates) + len(creates) - len(done)} totals failed to write")
     logger.info("✅ KPI aggregation complete: %s", written)
     return out
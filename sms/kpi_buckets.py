@@ -0,0 +1,256 @@
+"""
+🪣 KPI Buckets
+──────────────
+Per-metric daily partial sums of the Performance › KPIs table, for windowed totals.
+
+- Seeded from one projected sweep of recent rows (KPI_SEED_DAYS of CREATED_TIME)
+- Afterwards only rows created past the checkpoint are read → cost tracks new rows, not table size
+- Rolling 7-day / month-to-date windows are summed from the local day buckets
+- *_DAILY/WEEKLY/MONTHLY_TOTAL rows seen in the stream are remembered (id + value), so
+  upserts need no lookup reads and unchanged totals are not rewritten
+- Raw row ids and buckets older than KPI_BUCKET_RETENTION_DAYS are pruned
+- Stored in SQLite (WAL) under SMS_STATE_DIR
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sms.phone_index import _resolve_table, _table_key
+from sms.runtime import get_logger, state_path
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:
+    ZoneInfo = None
+
+logger = get_logger("kpi_buckets")
+
+# =========================
+# ENV / CONFIG
+# =========================
+KPI_BUCKETS_PATH = os.getenv("KPI_BUCKETS_PATH") or ""
+KPI_TZ = os.getenv("KPI_TZ", "America/Chicago")
+KPI_SEED_DAYS = int(os.getenv("KPI_SEED_DAYS", "40"))
+KPI_BUCKET_RETENTION_DAYS = int(os.getenv("KPI_BUCKET_RETENTION_DAYS", "62"))
+KPI_SKEW_SEC = int(os.getenv("KPI_SKEW_SEC", "60"))
+PAGE_SIZE = 100
+
+METRIC_FIELD = "Metric"
+VALUE_FIELD = "Value"
+DATE_FIELD = "Date"
+SWEEP_COLUMNS: List[str] = [METRIC_FIELD, VALUE_FIELD, DATE_FIELD]
+TOTAL_SUFFIXES: Tuple[str, ...] = ("_DAILY_TOTAL", "_WEEKLY_TOTAL", "_MONTHLY_TOTAL")
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS raw (tbl TEXT NOT NULL, record_id TEXT NOT NULL, day TEXT NOT NULL,"
+    " PRIMARY KEY (tbl, record_id))",
+    "CREATE TABLE IF NOT EXISTS buckets (tbl TEXT NOT NULL, metric TEXT NOT NULL, day TEXT NOT NULL,"
+    " total REAL NOT NULL DEFAULT 0, PRIMARY KEY (tbl, metric, day))",
+    "CREATE TABLE IF NOT EXISTS totals (tbl TEXT NOT NULL, metric TEXT NOT NULL, day TEXT NOT NULL,"
+    " record_id TEXT NOT NULL, value REAL, PRIMARY KEY (tbl, metric, day))",
+    "CREATE TABLE IF NOT EXISTS sync_state (tbl TEXT PRIMARY KEY, high_water TEXT, swept_at TEXT)",
+)
+
+
+# =========================
+# Helpers
+# =========================
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _iso(dt: datetime) -> str:
+    return dt.replace(microsecond=0).isoformat().replace("+00:00", "Z")
+
+
+def local_day(s: Any) -> Optional[date]:
+    """KPI `Date` → calendar day in KPI_TZ."""
+    if not s:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(s).replace("Z", "+00:00"))
+        if ZoneInfo and dt.tzinfo is not None:
+            dt = dt.astimezone(ZoneInfo(KPI_TZ))
+        return dt.date()
+    except Exception:
+        return None
+
+
+def _num(v: Any) -> float:
+    try:
+        return float(str(v if v is not None else 0).replace(",", ""))
+    except Exception:
+        return 0.0
+
+
+# =========================
+# Store
+# =========================
+class KpiBuckets:
+    """SQLite-backed daily KPI sums, fed incrementally from the KPIs table."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or KPI_BUCKETS_PATH
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.stats: Dict[str, int] = {"sweeps": 0, "refreshes": 0, "rows_ingested": 0, "pruned": 0}
+
+    # ---------- storage ----------
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path = self.path or state_path("kpi_buckets.sqlite3")
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for stmt in _SCHEMA:
+                conn.execute(stmt)
+            self._conn = conn
+        return self._conn
+
+    def _ingest_one(self, key: str, rec: Dict[str, Any]) -> bool:
+        """Caller holds the lock + transaction."""
+        rid = rec.get("id")
+        fields = rec.get("fields", {}) or {}
+        metric = str(fields.get(METRIC_FIELD) or "").strip()
+        day = local_day(fields.get(DATE_FIELD))
+        if not (rid and metric and day):
+            return False
+        db = self._db()
+        if metric.endswith(TOTAL_SUFFIXES):
+            db.execute(
+                "INSERT OR REPLACE INTO totals (tbl, metric, day, record_id, value) VALUES (?,?,?,?,?)",
+                (key, metric, day.isoformat(), rid, _num(fields.get(VALUE_FIELD))),
+            )
+            return False
+        cur = db.execute("INSERT OR IGNORE INTO raw (tbl, record_id, day) VALUES (?,?,?)", (key, rid, day.isoformat()))
+        if cur.rowcount == 0:
+            return False
+        db.execute(
+            "INSERT INTO buckets (tbl, metric, day, total) VALUES (?,?,?,?) "
+            "ON CONFLICT(tbl, metric, day) DO UPDATE SET total = total + excluded.total",
+            (key, metric, day.isoformat(), _num(fields.get(VALUE_FIELD))),
+        )
+        return True
+
+    def ingest(self, key: str, records: Iterable[Dict[str, Any]]) -> int:
+        """Fold raw KPI rows into day buckets (each record id counted once)."""
+        n = 0
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN")
+            try:
+                for rec in records:
+                    n += int(self._ingest_one(key, rec))
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        self.stats["rows_ingested"] += n
+        return n
+
+    # ---------- sync ----------
+    def _pages(self, tbl: Any, formula: str) -> Iterator[List[Dict[str, Any]]]:
+        opts: Dict[str, Any] = {"page_size": PAGE_SIZE, "fields": SWEEP_COLUMNS, "formula": formula}
+        try:
+            yield from tbl.iterate(**opts)
+        except Exception as exc:
+            # Unknown projected columns → retry without projection
+            if "UNKNOWN_FIELD_NAME" not in str(exc):
+                raise
+            opts.pop("fields", None)
+            yield from tbl.iterate(**opts)
+
+    def _state(self, key: str) -> Optional[str]:
+        row = self._db().execute("SELECT high_water FROM sync_state WHERE tbl=?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def refresh(self, obj: Any) -> Optional[str]:
+        """Read KPI rows created since the checkpoint into the buckets. Returns the table key, or None."""
+        tbl = _resolve_table(obj)
+        key = _table_key(tbl)
+        if not key:
+            return None
+        with self._lock:
+            started = _utcnow()
+            high_water = self._state(key)
+            since = high_water or _iso(started - timedelta(days=KPI_SEED_DAYS))
+            try:
+                total = 0
+                for page in self._pages(tbl, f"IS_AFTER(CREATED_TIME(), DATETIME_PARSE('{since}'))"):
+                    total += self.ingest(key, page)
+            except Exception as exc:
+                # Keep the checkpoint; the next run re-reads (ingest is idempotent per record id)
+                logger.warning(f"⚠️ KPI bucket refresh failed for {key}: {exc}")
+                return key if high_water else None
+            self._db().execute(
+                "INSERT INTO sync_state (tbl, high_water, swept_at) VALUES (?,?,?) "
+                "ON CONFLICT(tbl) DO UPDATE SET high_water=excluded.high_water, swept_at=COALESCE(excluded.swept_at, sync_state.swept_at)",
+                (key, _iso(started - timedelta(seconds=KPI_SKEW_SEC)), None if high_water else _iso(started)),
+            )
+        self.stats["refreshes" if high_water else "sweeps"] += 1
+        logger.info(f"🪣 KPI {'refresh' if high_water else 'seed'} {key}: {total} new rows")
+        return key
+
+    # ---------- public API ----------
+    def windows(self, key: str, today: date) -> Dict[str, Dict[str, float]]:
+        """daily (today), weekly (today-7 … today) and monthly (month-to-date) sums per metric."""
+        start_week = (today - timedelta(days=7)).isoformat()
+        start_month = today.replace(day=1).isoformat()
+        lo = min(start_week, start_month)
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT metric, day, total FROM buckets WHERE tbl=? AND day>=? AND day<=?", (key, lo, today.isoformat())
+            ).fetchall()
+        out: Dict[str, Dict[str, float]] = {"daily": {}, "weekly": {}, "monthly": {}}
+        for metric, day, total in rows:
+            if day == today.isoformat():
+                out["daily"][metric] = out["daily"].get(metric, 0) + total
+            if day >= start_week:
+                out["weekly"][metric] = out["weekly"].get(metric, 0) + total
+            if day >= start_month:
+                out["monthly"][metric] = out["monthly"].get(metric, 0) + total
+        return out
+
+    def written_totals(self, key: str, day: date) -> Dict[str, Tuple[str, Optional[float]]]:
+        """metric_name → (record_id, last value) for totals rows dated `day`."""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT metric, record_id, value FROM totals WHERE tbl=? AND day=?", (key, day.isoformat())
+            ).fetchall()
+        return {m: (rid, v) for m, rid, v in rows}
+
+    def mark_written(self, key: str, day: date, items: Iterable[Tuple[str, str, float]]) -> None:
+        with self._lock:
+            self._db().executemany(
+                "INSERT OR REPLACE INTO totals (tbl, metric, day, record_id, value) VALUES (?,?,?,?,?)",
+                [(key, metric, day.isoformat(), rid, value) for metric, rid, value in items],
+            )
+
+    def prune(self, key: str, today: date) -> int:
+        cutoff = (today - timedelta(days=KPI_BUCKET_RETENTION_DAYS)).isoformat()
+        with self._lock:
+            db = self._db()
+            n = 0
+            for table in ("raw", "buckets", "totals"):
+                n += db.execute(f"DELETE FROM {table} WHERE tbl=? AND day<?", (key, cutoff)).rowcount
+        self.stats["pruned"] += n
+        return n
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT s.tbl, s.high_water, s.swept_at, (SELECT COUNT(*) FROM buckets b WHERE b.tbl = s.tbl) FROM sync_state s"
+            ).fetchall()
+        return {
+            "path": self.path,
+            "tables": {t: {"high_water": hw, "swept_at": sw, "buckets": n} for t, hw, sw, n in rows},
+            **self.stats,
+        }
+
+
+KPI_BUCKETS = KpiBuckets()
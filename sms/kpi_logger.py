@@ -4,14 +4,22 @@ KPI Logger
 ----------
 Lightweight utility to upsert individual KPI metrics to Airtable.
 Integrates with datastore + logger.
+
+Buffered mode (default, KPI_BUFFERED=true):
+ - log_kpi() only enqueues (bounded queue, drops counted under backpressure)
+ - a background thread pre-aggregates integer counters by (event, campaign, day, extras)
+ - flushes as 10-row batch creates every KPI_FLUSH_SEC or KPI_FLUSH_EVENTS events
+ - drain_kpis() flushes everything on shutdown (worker + atexit)
 """
 
 from __future__ import annotations
-import os, traceback, re
+import atexit, json, os, queue, threading, time, traceback
 from datetime import datetime, timezone
-from typing import Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from sms.runtime import get_logger
-from sms.datastore import CONNECTOR
+from sms.airtable_governor import airtable_lane
+from sms.datastore import CONNECTOR, base_bucket
+from sms.field_registry import FIELD_REGISTRY, FIELD_REGISTRY_MAX_RETRIES
 
 try:
     from zoneinfo import ZoneInfo
@@ -24,6 +32,10 @@ logger = get_logger("kpi_logger")
 # Config
 # -----------------------------
 KPI_TZ = os.getenv("KPI_TZ", "America/Chicago")
+KPI_BUFFERED = os.getenv("KPI_BUFFERED", "true").lower() in ("1", "true", "yes")
+KPI_FLUSH_SEC = float(os.getenv("KPI_FLUSH_SEC", "10"))
+KPI_FLUSH_EVENTS = int(os.getenv("KPI_FLUSH_EVENTS", "200"))
+KPI_QUEUE_MAX = int(os.getenv("KPI_QUEUE_MAX", "10000"))
 
 
 # -----------------------------
@@ -47,22 +59,8 @@ def _utcnow_iso() -> str:
 # -----------------------------
 # Airtable field normalization
 # -----------------------------
-def _norm(s: str) -> str:
-    return re.sub(r"[^a-z0-9]+", "", s.lower().strip())
-
-
-def _auto_map(tbl) -> Dict[str, str]:
-    try:
-        one = tbl.all(max_records=1)
-        keys = list(one[0].get("fields", {}).keys()) if one else []
-    except Exception:
-        keys = []
-    return {_norm(k): k for k in keys}
-
-
 def _remap(tbl, data: Dict) -> Dict:
-    amap = _auto_map(tbl)
-    return {amap.get(_norm(k), k): v for k, v in data.items() if amap.get(_norm(k))}
+    return FIELD_REGISTRY.remap(tbl, data)
 
 
 def _fquote(s: str) -> str:
@@ -70,16 +68,19 @@ def _fquote(s: str) -> str:
 
 
 # -----------------------------
-# Public API
+# Direct write (unbuffered path)
 # -----------------------------
-def log_kpi(event_name: str, value: int = 1, **kwargs):
-    """Safely log KPI events without interrupting workers."""
-    try:
-        tbl_handle = CONNECTOR.performance()
-        tbl = getattr(tbl_handle, "table", tbl_handle)
-        if not hasattr(tbl, "create"):
-            raise AttributeError("Performance table is not writable")
+def _performance_table():
+    tbl_handle = CONNECTOR.performance()
+    tbl = getattr(tbl_handle, "table", tbl_handle)
+    if not hasattr(tbl, "create"):
+        raise AttributeError("Performance table is not writable")
+    return tbl_handle, tbl
+
 
+def _write_kpi_now(event_name: str, value: Any, **kwargs):
+    try:
+        _, tbl = _performance_table()
         payload = {"Event": event_name, "Value": value, **kwargs}
 
         try:
@@ -95,3 +96,198 @@ def log_kpi(event_name: str, value: int = 1, **kwargs):
     except Exception as exc:
         logger.warning(f"⚠️ KPI logger suppressed: {exc}")
         return None
+
+
+# -----------------------------
+# Buffered sink
+# -----------------------------
+class KpiBuffer:
+    """Bounded queue → background aggregation → batched Performance creates."""
+
+    def __init__(self, maxsize: int = KPI_QUEUE_MAX):
+        self._q: "queue.Queue[Tuple[str, Any, Dict[str, Any]]]" = queue.Queue(maxsize=max(1, maxsize))
+        self._counters: Dict[Tuple[str, str, str, str], int] = {}
+        self._samples: List[Dict[str, Any]] = []  # non-counter values (rates, durations) kept as-is
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._requeued: List[Dict[str, Any]] = []  # rows from a failed chunk, retried once on the next flush
+        self.stats: Dict[str, int] = {
+            "enqueued": 0, "dropped": 0, "aggregated": 0, "rows_written": 0,
+            "api_calls": 0, "write_errors": 0, "requeued": 0,
+        }
+
+    # ---------- producer ----------
+    def put(self, event_name: str, value: Any, kwargs: Dict[str, Any]) -> bool:
+        try:
+            self._q.put_nowait((event_name, value, kwargs))
+        except queue.Full:
+            self.stats["dropped"] += 1
+            return False
+        self.stats["enqueued"] += 1
+        self._ensure_thread()
+        if self._q.qsize() >= KPI_FLUSH_EVENTS:
+            self._wake.set()
+        return True
+
+    # ---------- consumer ----------
+    def _ensure_thread(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="kpi-flusher", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(KPI_FLUSH_SEC)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.warning("⚠️ KPI flush crashed", exc_info=True)
+
+    def _aggregate(self) -> None:
+        while True:
+            try:
+                event_name, value, kwargs = self._q.get_nowait()
+            except queue.Empty:
+                return
+            if isinstance(value, int) and not isinstance(value, bool):
+                extras = {k: v for k, v in kwargs.items() if k != "campaign"}
+                key = (
+                    event_name,
+                    str(kwargs.get("campaign", "")),
+                    _today_local_str(),
+                    json.dumps(extras, sort_keys=True, default=str),
+                )
+                with self._lock:
+                    self._counters[key] = self._counters.get(key, 0) + value
+                self.stats["aggregated"] += 1
+            else:
+                with self._lock:
+                    self._samples.append({"Event": event_name, "Value": value, **kwargs})
+
+    def flush(self) -> int:
+        """Aggregate everything queued and write it. Returns rows written."""
+        self._aggregate()
+        with self._lock:
+            counters, self._counters = self._counters, {}
+            samples, self._samples = self._samples, []
+            retry, self._requeued = self._requeued, []
+        rows: List[Dict[str, Any]] = []
+        for (event_name, campaign, _day, extras), total in counters.items():
+            row: Dict[str, Any] = {"Event": event_name, "Value": total, **json.loads(extras)}
+            if campaign:
+                row["campaign"] = campaign
+            rows.append(row)
+        rows.extend(samples)
+        written = self._write(retry, requeue=False) if retry else 0
+        if rows:
+            written += self._write(rows)
+        return written
+
+    def _lose(self, rows: List[Dict[str, Any]], reason: str) -> None:
+        self.stats["dropped"] += len(rows)
+        logger.error(f"❌ KPI rows lost ({reason}): {json.dumps(rows, default=str)}")
+
+    @airtable_lane("bulk")
+    def _write(self, rows: List[Dict[str, Any]], requeue: bool = True) -> int:
+        """Write rows in 10-row chunks. A failed chunk is requeued once, then counted as dropped."""
+        try:
+            handle, tbl = _performance_table()
+        except Exception as exc:
+            logger.warning(f"⚠️ KPI logger suppressed: {exc}")
+            return 0
+        bucket = base_bucket(getattr(handle, "base_id", None))
+        batch_create = getattr(tbl, "batch_create", None)
+        written = 0
+        for i in range(0, len(rows), 10):
+            chunk = [r for r in (_remap(tbl, r) for r in rows[i:i + 10]) if r]
+            try:
+                if callable(batch_create):
+                    for _ in range(1 + FIELD_REGISTRY_MAX_RETRIES):
+                        if not chunk:
+                            break
+                        self.stats["api_calls"] += 1
+                        try:
+                            with bucket.sending():
+                                batch_create(chunk)
+                            break
+                        except Exception as exc:
+                            # Extra kwargs that aren't Performance columns → registry drops them from now on
+                            if not FIELD_REGISTRY.note_error(tbl, exc, chunk):
+                                raise
+                            chunk = [r for r in (_remap(tbl, r) for r in chunk) if r]
+                    else:
+                        raise RuntimeError("KPI batch create kept rejecting columns")
+                else:
+                    for r in chunk:
+                        self.stats["api_calls"] += 1
+                        tbl.create(r)
+                written += len(chunk)
+            except Exception as exc:
+                message = str(exc)
+                self.stats["write_errors"] += 1
+                if "INVALID_PERMISSIONS_OR_MODEL_NOT_FOUND" in message or "403" in message:
+                    logger.warning(f"⚠️ KPI base not accessible — dropping {len(rows) - i} KPI rows")
+                    self.stats["dropped"] += len(rows) - i
+                    break
+                if requeue:
+                    logger.warning(f"⚠️ KPI batch write failed ({len(chunk)} rows), requeued: {exc}")
+                    with self._lock:
+                        self._requeued.extend(chunk)
+                    self.stats["requeued"] += len(chunk)
+                else:
+                    self._lose(chunk, str(exc))
+        self.stats["rows_written"] += written
+        if written:
+            logger.info(f"📈 KPI flush → {written} rows")
+        return written
+
+    def drain(self, timeout: float = 10.0) -> int:
+        """Flush everything now (shutdown hook). Bounded by `timeout` seconds."""
+        done: Dict[str, int] = {}
+
+        def _drain() -> None:
+            rows = self.flush()
+            if self._requeued:  # last chance for rows requeued by this flush
+                rows += self.flush()
+            done["rows"] = rows
+
+        t = threading.Thread(target=_drain, name="kpi-drain", daemon=True)
+        t.start()
+        t.join(timeout)
+        return done.get("rows", 0)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._counters) + len(self._samples) + len(self._requeued)
+        return {"queued": self._q.qsize(), "pending_rows": pending, **self.stats}
+
+
+KPI_BUFFER = KpiBuffer()
+
+
+def drain_kpis(timeout: float = 10.0) -> int:
+    """Flush buffered KPIs — call on worker/app shutdown."""
+    return KPI_BUFFER.drain(timeout)
+
+
+atexit.register(drain_kpis)
+
+
+# -----------------------------
+# Public API
+# -----------------------------
+def log_kpi(event_name: str, value: int = 1, **kwargs):
+    """Safely log KPI events without interrupting workers."""
+    if not KPI_BUFFERED:
+        return _write_kpi_now(event_name, value, **kwargs)
+    try:
+        KPI_BUFFER.put(event_name, value, kwargs)
+    except Exception as exc:
+        logger.warning(f"⚠️ KPI logger suppressed: {exc}")
+    return None
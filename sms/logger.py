@@ -12,6 +12,7 @@ from datetime import datetime, timezone
 from typing import Dict, Optional
 from sms.runtime import get_logger
 from sms.datastore import CONNECTOR
+from sms.field_registry import FIELD_REGISTRY
 
 logger = get_logger("run_logger")
 
@@ -23,22 +24,8 @@ def _utcnow_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-def _norm(s: str) -> str:
-    return "".join(ch for ch in s.lower() if ch.isalnum())
-
-
-def _auto_map(tbl) -> Dict[str, str]:
-    try:
-        one = tbl.all(max_records=1)
-        keys = list(one[0].get("fields", {}).keys()) if one else []
-    except Exception:
-        keys = []
-    return {_norm(k): k for k in keys}
-
-
 def _remap(tbl, data: Dict) -> Dict:
-    amap = _auto_map(tbl)
-    return {amap.get(_norm(k), k): v for k, v in data.items() if amap.get(_norm(k))}
+    return FIELD_REGISTRY.remap(tbl, data)
 
 
 # -----------------------------
@@ -17,6 +17,7 @@ import json
 import traceback
 from datetime import datetime, timezone, date
 from typing import Optional, Dict, Any, Callable, Tuple
+from sms import inbound_webhook
 from sms.inbound_webhook import router as inbound_router
 from sms.delivery_webhook import router as delivery_router, router_root as delivery_router_root
 
@@ -31,6 +32,16 @@ load_dotenv(dotenv_path=ENV_PATH, override=True)
 
 # ─────────────────────────── Project policy (quiet hours) ───────────────────
 from sms.dispatcher import get_policy
+from sms.airtable_governor import GOVERNOR
+from sms.conversation_journal import JOURNAL
+from sms.field_registry import FIELD_REGISTRY
+from sms.http_transport import TRANSPORT
+from sms.outbox import OUTBOX
+from sms.conversation_summary import CONVO_SUMMARY
+from sms.phone_index import PHONE_INDEX
+from sms.replica import REPLICA
+from sms.template_engine import TEMPLATE_CACHE
+from sms.send_window import SendWindow, quiet_at
 
 _POLICY = get_policy()
 
@@ -180,8 +191,13 @@ def central_now() -> datetime:
 def is_quiet_hours_local() -> bool:
     if not QUIET_HOURS_ENFORCED:
         return False
-    h = central_now().hour
-    return (h >= QUIET_START) or (h < QUIET_END)
+    return quiet_at(central_now().hour, QUIET_START, QUIET_END)
+
+
+def send_window_closed() -> bool:
+    """Quiet in every recipient timezone (outbound applies the window per seller)."""
+    tz = getattr(_POLICY.quiet_tz, "key", None) or "America/Chicago"
+    return not SendWindow(QUIET_START, QUIET_END, QUIET_HOURS_ENFORCED, tz).any_open()
 
 
 # ─────────────────────────── Auth helpers ───────────────────────────
@@ -301,6 +317,14 @@ async def startup_checks():
         # Smoke checks (non-fatal)
         _ = get_templates()
         _ = get_leads()
+        # Column maps from snapshot / metadata API, so write paths never probe
+        warmed = await asyncio.to_thread(FIELD_REGISTRY.warm)
+        print(f"   Field registry: {warmed or 'static schema only'}")
+        # Phone index sweeps run in the background; lookups scan until they finish
+        for tbl in (inbound_webhook.leads, inbound_webhook.prospects):
+            await asyncio.to_thread(PHONE_INDEX.warm, tbl)
+        # Same for the conversation rollup; senders keep their legacy count paths until it's swept
+        await asyncio.to_thread(CONVO_SUMMARY.warm, inbound_webhook.convos)
         print("✅ Startup checks passed")
     except Exception as e:
         _log_error("Startup exception", e)
@@ -361,6 +385,42 @@ async def health_strict_endpoint(mode: str = Query("prospects", description="pro
         return {"ok": False, "error": str(e), "mode": mode}
 
 
+@app.get("/health/transport")
+async def health_transport():
+    """Per-host HTTP pool metrics (requests, latency histogram, connection reuse)."""
+    return {"ok": True, **TRANSPORT.status()}
+
+
+@app.get("/health/airtable")
+async def health_airtable():
+    """Airtable governor per base: adaptive rate, 429 pauses, queue depth and wait times per priority lane."""
+    return {"ok": True, **GOVERNOR.status()}
+
+
+@app.get("/health/journal")
+async def health_journal():
+    """Conversation journal: queued rows, SID upserts vs creates, batch calls, retries and drops."""
+    return {"ok": True, **JOURNAL.status()}
+
+
+@app.get("/health/templates")
+async def health_templates():
+    """Template engine: compiled templates cached by id, hits vs compiles, last-modified invalidations."""
+    return {"ok": True, **TEMPLATE_CACHE.status()}
+
+
+@app.get("/health/fields")
+async def health_fields():
+    """Field registry state: metadata snapshot age per base, learned missing columns, remap counters."""
+    return {"ok": True, **FIELD_REGISTRY.status()}
+
+
+@app.get("/health/outbox")
+async def health_outbox():
+    """Send outbox: entries per state, unacknowledged backlog age, reconcile counters."""
+    return {"ok": True, **OUTBOX.status()}
+
+
 # ─────────────────────── Outbound / Send now ────────────────────────
 @app.post("/send")
 async def send_endpoint(
@@ -374,8 +434,8 @@ async def send_endpoint(
     _require_token(request, token, x_webhook_token, x_cron_token)
     if TEST_MODE:
         return {"ok": True, "status": "mock_send", "campaign": campaign_id}
-    if is_quiet_hours_local():
-        return {"ok": False, "error": "Quiet hours (Central). Sending blocked.", "quiet_hours": True}
+    if send_window_closed():
+        return {"ok": False, "error": "Quiet hours in every recipient timezone. Sending blocked.", "quiet_hours": True}
     if not _send_batch:
         return {"ok": False, "error": "send_batch unavailable"}
     return await asyncio.to_thread(_send_batch, campaign_id, limit)
@@ -608,7 +668,7 @@ async def cron_all_endpoint(
       - STRICT health: prospects, leads, inbounds
       - Quiet hours:
           * Autoresponder (if allowed), Metrics, Aggregate KPIs, Campaign queue-only
-          * Skip send/retry
+          * Send only to sellers inside their local window; skip retry
       - Normal hours:
           * Send, Autoresponder, Followups, Metrics, Retry, Aggregate KPIs, Campaigns
     Immediate Airtable Run logs per step; KPIs at end.
@@ -683,8 +743,16 @@ async def cron_all_endpoint(
         results["campaign_runner"] = r
         await _log_run_async(runs_tbl, "CAMPAIGN_RUNNER", r)
 
-        # outbound + retry skipped
-        results["outbound"] = {"ok": True, "skipped": "quiet_hours"}
+        # outbound only for sellers still inside their local window; retry skipped
+        if _send_batch and not TEST_MODE and not send_window_closed():
+            try:
+                r = await asyncio.to_thread(_send_batch, limit=limit)
+            except Exception as e:
+                r = {"ok": False, "error": str(e)}
+            totals["processed"] += int(r.get("total_sent", 0) or 0)
+        else:
+            r = {"ok": True, "skipped": "quiet_hours"}
+        results["outbound"] = r
         results["retry"] = {"ok": True, "skipped": "quiet_hours"}
         await _log_run_async(runs_tbl, "OUTBOUND", results["outbound"])
         await _log_run_async(runs_tbl, "RETRY", results["retry"])
@@ -786,6 +854,19 @@ async def drip_force_now(
     return await asyncio.to_thread(_normalize_next_send_dates, False, True, limit)
 
 
+# ─────────────────────── Read replica ───────────────────────
+@app.get("/admin/replica/status")
+async def replica_status(
+    request: Request,
+    x_cron_token: Optional[str] = Header(None),
+    x_webhook_token: Optional[str] = Header(None),
+    token: Optional[str] = Query(None),
+):
+    """Per-table row counts, last delta/sweep times, age vs staleness bound, local hits vs fallbacks."""
+    _require_token(request, token, x_webhook_token, x_cron_token)
+    return {"ok": True, **REPLICA.status()}
+
+
 # ─────────────── Numbers Admin (from_number + quotas) ───────────────
 @app.post("/admin/numbers/backfill")
 async def numbers_backfill_endpoint(
@@ -45,6 +45,14 @@ from sms.runtime import get_logger
 # ✅ Add failsafe datastore imports
 from sms.datastore import safe_create_conversation, safe_log_message
 
+# Per-phone rollup (counts / stage / lead) + phone → record index
+from sms.conversation_summary import CONVO_SUMMARY
+from sms.phone_index import PHONE_INDEX
+from sms.field_registry import FIELD_REGISTRY
+# TextGrid SID → (conversation, drip, DID) index read by delivery receipts
+from sms.dlr_pipeline import DLR_PIPELINE
+from sms.conversation_journal import JOURNAL
+
 logger = get_logger("message_processor")
 
 # Best-effort telemetry imports (won't crash if missing)
@@ -110,51 +118,8 @@ def _norm(s: Any) -> str:
     return re.sub(r"[^a-z0-9]+", "", str(s).strip().lower()) if s else ""
 
 
-def _auto_field_map(tbl: Any) -> Dict[str, str]:
-    # Get comprehensive field mapping from schema instead of just sampling existing records
-    from sms.config import CONV_FIELDS
-    
-    # Start with schema-based field mappings  
-    schema_fields = dict(CONV_FIELDS)
-    
-    # Add common linking fields that might be present
-    common_fields = {
-        "Campaign": "Campaign",
-        "Template": "Template", 
-        "Prospect": "Prospect",
-        "Lead": "Lead",
-        "Lead Record ID": "Lead Record ID",
-        "Prospect Record ID": "Prospect Record ID",
-        "County": "County",
-        # Remove Drip Queue as it doesn't exist in conversations table
-    }
-    
-    # Try to get existing fields from sample record as fallback
-    try:
-        probe = tbl.all(max_records=1)
-        existing_keys = list(probe[0].get("fields", {}).keys()) if probe else []
-        for key in existing_keys:
-            common_fields[key] = key
-    except Exception:
-        pass
-    
-    # Combine schema fields with common/existing fields
-    all_fields = {**schema_fields, **common_fields}
-    
-    # Create normalized mapping
-    return {_norm(k): k for k in all_fields.values()}
-
-
 def _remap_existing_only(tbl: Any, payload: Dict) -> Dict:
-    amap = _auto_field_map(tbl)
-    if not amap:
-        return dict(payload)
-    out = {}
-    for k, v in payload.items():
-        mk = amap.get(_norm(k))
-        if mk:
-            out[mk] = v
-    return out
+    return FIELD_REGISTRY.remap(tbl, payload)
 
 
 def _compact(d: Dict[str, Any]) -> Dict[str, Any]:
@@ -227,7 +192,7 @@ class MessageProcessor:
 
         # --- 1) Send via TextGrid
         try:
-            send_result = send_message(from_number=from_number, to=phone, message=body)
+            send_result = send_message(from_number=from_number, to=phone, message=body, journal=False)
         except Exception as e:
             err = str(e)
             logger.error(f"Transport error sending to {phone}: {err}", exc_info=True)
@@ -254,6 +219,9 @@ class MessageProcessor:
         sid = send_result.get("sid") or send_result.get("message_sid") or send_result.get("id")
         provider_status = (send_result.get("status") or "sent").lower()
         ok = provider_status in {"sent", "queued", "accepted", "submitted", "enroute", "delivered"}
+        # The Conversations id is indexed when the journal lands the row (see _log_conversation)
+        expect = ("conversations", "drip") if drip_queue_id else ("conversations",)
+        MessageProcessor._index_sid(sid, drip_id=drip_queue_id, did=from_number, expect=expect)
 
         # --- 3) Log Conversations
         convo_status = ConversationDeliveryStatus.SENT.value if ok else ConversationDeliveryStatus.FAILED.value
@@ -292,6 +260,14 @@ class MessageProcessor:
         logger.info(f"📤 Outbound → {phone} | {result['status'].upper()} | sid={sid} | provider={provider_status}")
         return result
 
+    @staticmethod
+    def _index_sid(sid: Optional[str], **ids: Optional[str]) -> None:
+        """Record where this SID's rows live, so delivery receipts need no lookups."""
+        try:
+            DLR_PIPELINE.remember(sid, **ids)
+        except Exception as e:
+            logger.warning(f"SID index write failed for {sid}: {e}")
+
     @staticmethod
     def _conversation_metadata(
         meta: Dict[str, Any],
@@ -352,7 +328,7 @@ class MessageProcessor:
         template_id: Optional[str], drip_queue_id: Optional[str],
         metadata: Optional[Dict[str, Any]],
     ) -> Optional[str]:
-        """Logs outbound message to Conversations (with failsafe)."""
+        """Journals the message's Conversations row; returns its record id when written synchronously."""
         convos = get_convos()
         canonical_dir = (
             ConversationDirection.OUTBOUND.value
@@ -374,6 +350,15 @@ class MessageProcessor:
         # Get current timestamp for multiple time fields
         now_iso = utcnow_iso()
 
+        # Local per-phone rollup replaces the per-message Conversations history scans
+        summary = None
+        if convos:
+            try:
+                summary = CONVO_SUMMARY.get(convos, phone)
+            except Exception as e:
+                logger.warning(f"Conversation summary unavailable for {phone}: {e}")
+        counts = (summary["sent"], summary["replies"]) if summary else None
+
         payload = _compact({
             FROM_FIELD: phone,
             TO_FIELD: from_number,
@@ -398,7 +383,7 @@ class MessageProcessor:
             **MessageProcessor._get_enhanced_counts(phone, canonical_dir),
             
             # Stage management based on message content and direction
-            CONV_FIELDS.get("STAGE", "Stage"): MessageProcessor._determine_stage(phone, canonical_dir, metadata),
+            CONV_FIELDS.get("STAGE", "Stage"): MessageProcessor._determine_stage(phone, canonical_dir, metadata, counts),
             
             # Add metadata fields with proper field mapping
             **(metadata or {}),
@@ -418,19 +403,24 @@ class MessageProcessor:
         if meta.get("stage"):
             payload[CONV_FIELDS.get("STAGE", "Stage")] = meta["stage"]
 
-        # Link to Lead record
+        # Link to Lead record (rollup → local phone index → legacy query for unindexable tables)
+        linked_lead = summary.get("lead_id") if summary else None
         try:
             from sms.airtable_client import get_leads
             leads = get_leads()
-            if leads:
+            if leads and not linked_lead:
+                linked_lead = PHONE_INDEX.lookup_id(leads, phone)
+            if leads and not linked_lead and summary is None:
                 lead_matches = leads.all(
                     formula=f"{{Seller Phone Number}} = '{phone}'",
                     max_records=1,
                     fields=["Record ID"]
                 )
                 if lead_matches:
-                    payload[CONV_FIELDS.get("LEAD", "Lead")] = [lead_matches[0]["id"]]
-                    logger.info(f"Linked conversation to lead: {lead_matches[0]['id']}")
+                    linked_lead = lead_matches[0]["id"]
+            if linked_lead:
+                payload[CONV_FIELDS.get("LEAD", "Lead")] = [linked_lead]
+                logger.info(f"Linked conversation to lead: {linked_lead}")
         except Exception as e:
             logger.warning(f"Error linking to lead: {e}")
 
@@ -438,49 +428,50 @@ class MessageProcessor:
         if drip_queue_id:
             payload[CONV_FIELDS.get("DRIP_QUEUE", "Drip Queue")] = [drip_queue_id]
 
-        # ✅ Conversation logging handled by main convos.create() below - no need for duplicate safe_log_message
-        # safe_log_message("OUTBOUND", phone, from_number or "", body, status=canonical_status, sid=sid)
-
         if not convos:
             logger.info(f"[MOCK] Conversations ← {payload}")
             return "mock_convo"
 
-        try:
-            record = convos.create(_remap_existing_only(convos, payload))
-            rid = record.get("id")
+        def _written(rid: Optional[str]) -> None:
+            if not rid:
+                return
             logger.info(f"🗒️ Conversations[{rid}] {canonical_dir} → {phone} | {canonical_status}")
-            return rid
+            if sid:
+                MessageProcessor._index_sid(sid, convo_id=rid)
+            try:
+                CONVO_SUMMARY.record(
+                    convos, phone, canonical_dir,
+                    at=now_iso, stage=payload.get(CONV_FIELDS.get("STAGE", "Stage")),
+                    lead_id=linked_lead, record_id=rid,
+                )
+            except Exception as e:
+                logger.warning(f"Conversation summary update failed for {phone}: {e}")
+
+        # One row per message, upserted on the TextGrid SID. Successful sends go through the
+        # batched journal; failures write now because the retry queue needs the record id.
+        try:
+            if sid and canonical_status != ConversationDeliveryStatus.FAILED.value:
+                JOURNAL.append(convos, payload, sid=sid, on_written=_written)
+                return None
+            return JOURNAL.write(convos, payload, sid=sid, on_written=_written)
         except Exception as e:
-            logger.error(f"Failed to create Conversations row: {e}")
+            logger.error(f"Failed to journal Conversations row: {e}")
             # 🔥 Failsafe: Continue without conversation logging to avoid blocking SMS sends
             logger.warning(f"⚠️ SMS sent successfully but conversation logging failed - continuing")
             return None
 
     @staticmethod
     def _get_enhanced_counts(phone: str, direction: str) -> Dict[str, int]:
-        """Get enhanced message counts for this prospect."""
-        try:
-            sent_count, reply_count = get_prospect_total_counts(phone)
-            
-            # Include the current message in counts
-            if direction == "OUTBOUND":
-                sent_count += 1
-            else:
-                reply_count += 1
-                
-            return {
-                CONV_FIELDS.get("SENT_COUNT", "Sent Count"): 1 if direction == "OUTBOUND" else 0,
-                CONV_FIELDS.get("REPLY_COUNT", "Reply Count"): 1 if direction == "INBOUND" else 0,
-            }
-        except Exception as e:
-            logger.warning(f"Error getting enhanced counts for {phone}: {e}")
-            return {
-                CONV_FIELDS.get("SENT_COUNT", "Sent Count"): 1 if direction == "OUTBOUND" else 0,
-                CONV_FIELDS.get("REPLY_COUNT", "Reply Count"): 1 if direction == "INBOUND" else 0,
-            }
+        """Per-row counters: this conversation row counts as one send or one reply."""
+        return {
+            CONV_FIELDS.get("SENT_COUNT", "Sent Count"): 1 if direction == "OUTBOUND" else 0,
+            CONV_FIELDS.get("REPLY_COUNT", "Reply Count"): 1 if direction == "INBOUND" else 0,
+        }
 
     @staticmethod
-    def _determine_stage(phone: str, direction: str, metadata: Optional[Dict[str, Any]]) -> str:
+    def _determine_stage(
+        phone: str, direction: str, metadata: Optional[Dict[str, Any]], counts: Optional[tuple] = None
+    ) -> str:
         """Determine conversation stage based on message history and content."""
         try:
             # Check metadata first for explicit stage
@@ -489,7 +480,7 @@ class MessageProcessor:
                 return meta["stage"]
             
             # Get total counts to determine stage
-            sent_count, reply_count = get_prospect_total_counts(phone)
+            sent_count, reply_count = counts if counts is not None else get_prospect_total_counts(phone)
             
             # Include current message in counts
             if direction == "OUTBOUND":
@@ -568,8 +559,12 @@ def get_prospect_total_counts(phone: str) -> tuple[int, int]:
         convos = get_convos()
         if not convos:
             return (0, 0)
-        
-        # Get all messages for this prospect
+
+        counts = CONVO_SUMMARY.counts(convos, phone)
+        if counts is not None:
+            return counts
+
+        # Unindexable table → legacy scan of all messages for this prospect
         all_messages = convos.all(
             formula=f"{{Seller Phone Number}} = '{phone}'",
             fields=["Direction"]
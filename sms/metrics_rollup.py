@@ -0,0 +1,256 @@
+"""
+📈 Metrics Rollup
+─────────────────
+Incremental per-campaign delivery / reply / opt-out counters over the Conversations table.
+
+- One paged sweep seeds the rollup (projected columns only); afterwards each cycle folds in
+  only rows whose LAST_MODIFIED_TIME() is past the high-water mark → O(changed rows)
+- Each row's last contribution is remembered, so a status change (SENT → DELIVERED) moves
+  the row between buckets instead of double counting
+- A periodic full re-sweep (METRICS_FULL_SWEEP_SEC) reconciles deleted rows
+- Remembers what was last pushed per campaign, so unchanged campaigns aren't rewritten
+- Stored in SQLite (WAL) under SMS_STATE_DIR; tables without a base id aren't rolled up
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sms.config import CONV_FIELDS, CONVERSATIONS_FIELDS
+from sms.phone_index import _resolve_table, _table_key
+from sms.runtime import get_logger, state_path
+
+logger = get_logger("metrics_rollup")
+
+# =========================
+# ENV / CONFIG
+# =========================
+METRICS_ROLLUP_PATH = os.getenv("METRICS_ROLLUP_PATH") or ""
+METRICS_FULL_SWEEP_SEC = float(os.getenv("METRICS_FULL_SWEEP_SEC", "86400"))
+METRICS_SKEW_SEC = int(os.getenv("METRICS_SKEW_SEC", "60"))
+PAGE_SIZE = 100
+
+CAMPAIGN_FIELD = CONVERSATIONS_FIELDS.get("CAMPAIGN_LINK", "Campaign")
+DIR_FIELD = CONV_FIELDS["DIRECTION"]
+STATUS_FIELD = CONV_FIELDS["STATUS"]
+BODY_FIELD = CONV_FIELDS["BODY"]
+
+SWEEP_COLUMNS: List[str] = list(dict.fromkeys([CAMPAIGN_FIELD, DIR_FIELD, STATUS_FIELD, BODY_FIELD]))
+
+DELIVERED_STATES = {"DELIVERED"}
+FAILED_STATES = {"FAILED", "UNDELIVERED", "UNDELIVERABLE"}
+
+COUNTERS: Tuple[str, ...] = ("sent", "delivered", "failed", "replies", "optouts")
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS rows ("
+    " tbl TEXT NOT NULL, record_id TEXT NOT NULL, campaigns TEXT NOT NULL, contrib TEXT NOT NULL,"
+    " PRIMARY KEY (tbl, record_id))",
+    "CREATE TABLE IF NOT EXISTS rollup ("
+    " tbl TEXT NOT NULL, campaign TEXT NOT NULL,"
+    " sent INTEGER NOT NULL DEFAULT 0, delivered INTEGER NOT NULL DEFAULT 0, failed INTEGER NOT NULL DEFAULT 0,"
+    " replies INTEGER NOT NULL DEFAULT 0, optouts INTEGER NOT NULL DEFAULT 0,"
+    " PRIMARY KEY (tbl, campaign))",
+    "CREATE TABLE IF NOT EXISTS pushed (campaign_id TEXT PRIMARY KEY, digest TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS sync_state (tbl TEXT PRIMARY KEY, high_water TEXT, swept_at TEXT)",
+)
+
+
+# =========================
+# Helpers
+# =========================
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _iso(dt: datetime) -> str:
+    return dt.replace(microsecond=0).isoformat().replace("+00:00", "Z")
+
+
+def _campaigns_of(value: Any) -> List[str]:
+    """Linked-record ids (list) or a plain campaign name (text column)."""
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value if v]
+    return [str(value)] if value else []
+
+
+def contribution(fields: Dict[str, Any]) -> Optional[List[int]]:
+    """(sent, delivered, failed, replies, optouts) one Conversations row adds to its campaign."""
+    direction = str(fields.get(DIR_FIELD) or "").strip().upper()
+    if direction.startswith("OUT"):
+        status = str(fields.get(STATUS_FIELD) or "").upper()
+        return [1, int(status in DELIVERED_STATES), int(status in FAILED_STATES), 0, 0]
+    if direction.startswith("IN"):
+        return [0, 0, 0, 1, int("stop" in str(fields.get(BODY_FIELD) or "").lower())]
+    return None
+
+
+# =========================
+# Store
+# =========================
+class MetricsRollup:
+    """SQLite-backed campaign counters kept current from Conversations deltas."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or METRICS_ROLLUP_PATH
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.stats: Dict[str, int] = {"sweeps": 0, "refreshes": 0, "rows_folded": 0, "pushes_skipped": 0}
+
+    # ---------- storage ----------
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path = self.path or state_path("metrics_rollup.sqlite3")
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for stmt in _SCHEMA:
+                conn.execute(stmt)
+            self._conn = conn
+        return self._conn
+
+    def _bump(self, key: str, campaigns: Iterable[str], delta: List[int], sign: int) -> None:
+        db = self._db()
+        for camp in campaigns:
+            db.execute("INSERT OR IGNORE INTO rollup (tbl, campaign) VALUES (?,?)", (key, camp))
+            db.execute(
+                "UPDATE rollup SET sent=sent+?, delivered=delivered+?, failed=failed+?, replies=replies+?, optouts=optouts+?"
+                " WHERE tbl=? AND campaign=?",
+                (*[sign * d for d in delta], key, camp),
+            )
+
+    def _fold(self, key: str, rec: Dict[str, Any]) -> bool:
+        """Replace one row's previous contribution with its current one. Caller holds the transaction."""
+        rid = rec.get("id")
+        if not rid:
+            return False
+        fields = rec.get("fields", {}) or {}
+        campaigns = _campaigns_of(fields.get(CAMPAIGN_FIELD))
+        contrib = contribution(fields) if campaigns else None
+        db = self._db()
+        prev = db.execute("SELECT campaigns, contrib FROM rows WHERE tbl=? AND record_id=?", (key, rid)).fetchone()
+        if prev:
+            self._bump(key, json.loads(prev[0]), json.loads(prev[1]), -1)
+        if contrib is None:
+            if prev:
+                db.execute("DELETE FROM rows WHERE tbl=? AND record_id=?", (key, rid))
+            return bool(prev)
+        self._bump(key, campaigns, contrib, +1)
+        db.execute(
+            "INSERT OR REPLACE INTO rows (tbl, record_id, campaigns, contrib) VALUES (?,?,?,?)",
+            (key, rid, json.dumps(campaigns), json.dumps(contrib)),
+        )
+        return True
+
+    # ---------- sync ----------
+    def _pages(self, tbl: Any, formula: Optional[str]) -> Iterator[List[Dict[str, Any]]]:
+        opts: Dict[str, Any] = {"page_size": PAGE_SIZE, "fields": SWEEP_COLUMNS}
+        if formula:
+            opts["formula"] = formula
+        try:
+            yield from tbl.iterate(**opts)
+        except Exception as exc:
+            # Unknown projected columns → retry without projection
+            if "UNKNOWN_FIELD_NAME" not in str(exc):
+                raise
+            opts.pop("fields", None)
+            yield from tbl.iterate(**opts)
+
+    def _state(self, key: str) -> Tuple[Optional[str], Optional[str]]:
+        row = self._db().execute("SELECT high_water, swept_at FROM sync_state WHERE tbl=?", (key,)).fetchone()
+        return (row[0], row[1]) if row else (None, None)
+
+    def _sync(self, tbl: Any, key: str, *, full: bool) -> int:
+        started = _utcnow()
+        high_water = None if full else self._state(key)[0]
+        formula = f"IS_AFTER(LAST_MODIFIED_TIME(), DATETIME_PARSE('{high_water}'))" if high_water else None
+        db = self._db()
+        total = 0
+        db.execute("BEGIN")
+        try:
+            if not formula:
+                db.execute("DELETE FROM rows WHERE tbl=?", (key,))
+                db.execute("DELETE FROM rollup WHERE tbl=?", (key,))
+            for page in self._pages(tbl, formula):
+                total += sum(1 for rec in page if self._fold(key, rec))
+            mark = _iso(started - timedelta(seconds=METRICS_SKEW_SEC))
+            swept = _iso(started) if not formula else None
+            db.execute(
+                "INSERT INTO sync_state (tbl, high_water, swept_at) VALUES (?,?,?) "
+                "ON CONFLICT(tbl) DO UPDATE SET high_water=excluded.high_water, swept_at=COALESCE(excluded.swept_at, sync_state.swept_at)",
+                (key, mark, swept),
+            )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        self.stats["sweeps" if not formula else "refreshes"] += 1
+        self.stats["rows_folded"] += total
+        logger.info(f"📈 {'Sweep' if not formula else 'Refresh'} {key}: {total} rows folded")
+        return total
+
+    def refresh(self, obj: Any) -> Optional[str]:
+        """Fold Conversations changes since the last call into the rollup. Returns the table key, or None."""
+        tbl = _resolve_table(obj)
+        key = _table_key(tbl)
+        if not key:
+            return None
+        with self._lock:
+            high_water, swept_at = self._state(key)
+            full = high_water is None
+            if not full and swept_at:
+                swept = datetime.fromisoformat(swept_at.replace("Z", "+00:00"))
+                full = (_utcnow() - swept).total_seconds() >= METRICS_FULL_SWEEP_SEC
+            try:
+                self._sync(tbl, key, full=full)
+            except Exception as exc:
+                # Serve the last rollup; the next cycle retries the pull
+                logger.warning(f"⚠️ Metrics rollup sync failed for {key}: {exc}")
+                if high_water is None:
+                    return None
+        return key
+
+    # ---------- public API ----------
+    def totals(self, key: str) -> Dict[str, Dict[str, int]]:
+        """campaign (record id or name) → counters."""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT campaign, sent, delivered, failed, replies, optouts FROM rollup WHERE tbl=?", (key,)
+            ).fetchall()
+        return {r[0]: dict(zip(COUNTERS, r[1:])) for r in rows}
+
+    def needs_push(self, campaign_id: str, counters: Dict[str, Any]) -> bool:
+        digest = json.dumps([counters.get(c, 0) for c in COUNTERS])
+        with self._lock:
+            row = self._db().execute("SELECT digest FROM pushed WHERE campaign_id=?", (campaign_id,)).fetchone()
+        if row and row[0] == digest:
+            self.stats["pushes_skipped"] += 1
+            return False
+        return True
+
+    def mark_pushed(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        with self._lock:
+            self._db().executemany(
+                "INSERT OR REPLACE INTO pushed (campaign_id, digest) VALUES (?,?)",
+                [(cid, json.dumps([c.get(k, 0) for k in COUNTERS])) for cid, c in items],
+            )
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT s.tbl, s.high_water, s.swept_at, COUNT(r.record_id) FROM sync_state s "
+                "LEFT JOIN rows r ON r.tbl = s.tbl GROUP BY s.tbl"
+            ).fetchall()
+        return {
+            "path": self.path,
+            "tables": {t: {"high_water": hw, "swept_at": sw, "rows": n} for t, hw, sw, n in rows},
+            **self.stats,
+        }
+
+
+METRICS_ROLLUP = MetricsRollup()
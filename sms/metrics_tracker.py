@@ -20,7 +20,11 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+from sms.airtable_governor import airtable_lane
 from sms.config import CONV_FIELDS, CONVERSATIONS_FIELDS
+from sms.field_registry import FIELD_REGISTRY, FIELD_REGISTRY_MAX_RETRIES
+from sms.metrics_rollup import COUNTERS, METRICS_ROLLUP, SWEEP_COLUMNS, contribution
+from sms.replica import REPLICA
 from sms.runtime import get_logger
 
 logger = get_logger("metrics_tracker")
@@ -42,7 +46,8 @@ def _sync_to_campaign_control_base(campaign_name: str, metrics_data: Dict[str, A
         control_campaigns = control_handle.table
         
         # Search for existing campaign in control base
-        formula = f"{{Campaign Name}}='{campaign_name.replace("'", "\\'")}'"
+        safe_name = campaign_name.replace("'", "\\'")
+        formula = f"{{Campaign Name}}='{safe_name}'"
         
         try:
             existing = control_campaigns.all(formula=formula, max_records=1)
@@ -83,6 +88,8 @@ try:
     from pyairtable import Api as _ATApi
 except Exception:
     _ATApi = None
+else:
+    from sms.http_transport import airtable_api as _ATApi  # pooled, cached per key
 
 try:
     from pyairtable import Table as _ATTable
@@ -136,9 +143,6 @@ CONV_DIRECTION_FIELD = CONV_FIELDS["DIRECTION"]
 CONV_MESSAGE_FIELD = CONV_FIELDS["BODY"]
 CONV_CAMPAIGN_FIELD = CONVERSATIONS_FIELDS.get("CAMPAIGN_LINK", "Campaign")
 
-DELIVERED_STATES = {"DELIVERED"}
-FAILED_STATES = {"FAILED", "UNDELIVERED", "UNDELIVERABLE"}
-
 
 # ─────────────────────────── Airtable factories ───────────────────────────
 def _make_table(api_key: Optional[str], base_id: Optional[str], table_name: str):
@@ -191,24 +195,43 @@ def _campaign_formula(name: str) -> str:
     return f"{_field(CONV_CAMPAIGN_FIELD)}='{safe}'"
 
 
-def _try_fetch(table, formula: str) -> list:
-    try:
-        return table.all(formula=formula)
-    except Exception as e:
-        logger.warning(f"⚠️ Fetch failed for formula {formula[:40]}...: {e}")
-        return []
-
+def _scan_counts(convos, camp_name: str) -> Dict[str, int]:
+    """Legacy per-campaign scan, for Conversations tables the rollup can't key (no base id)."""
+    from sms.datastore import iter_records
 
-def _status(rec):
-    return str(rec.get("fields", {}).get(CONV_STATUS_FIELD, "")).upper()
+    counts = dict.fromkeys(COUNTERS, 0)
+    for rec in iter_records(convos, formula=_campaign_formula(camp_name), fields=SWEEP_COLUMNS):
+        contrib = contribution(rec.get("fields", {}) or {})
+        for k, v in zip(COUNTERS, contrib or ()):
+            counts[k] += v
+    return counts
 
 
-def _body(rec):
-    return str(rec.get("fields", {}).get(CONV_MESSAGE_FIELD, "")).lower()
+def _sum_counts(*parts: Optional[Dict[str, int]]) -> Dict[str, int]:
+    return {k: sum((p or {}).get(k, 0) for p in parts) for k in COUNTERS}
 
 
-def _direction(rec):
-    return str(rec.get("fields", {}).get(CONV_DIRECTION_FIELD, "")).upper()
+def _batch_update(table, updates: List[tuple]) -> bool:
+    """Write all campaign patches in batches of 10 (one call per batch, not per campaign)."""
+    records = [{"id": rid, "fields": FIELD_REGISTRY.remap(table, patch)} for rid, patch in updates]
+    batch_update = getattr(table, "batch_update", None)
+    for _ in range(1 + FIELD_REGISTRY_MAX_RETRIES):
+        if not records:
+            break
+        try:
+            if callable(batch_update):
+                batch_update(records)
+            else:
+                for r in records:
+                    table.update(r["id"], r["fields"])
+            return True
+        except Exception as e:
+            if not FIELD_REGISTRY.note_error(table, e, records):
+                logger.warning(f"⚠️ Campaign batch update failed ({len(records)} campaigns): {e}")
+                return False
+            records = [{"id": r["id"], "fields": FIELD_REGISTRY.remap(table, r["fields"])} for r in records]
+            records = [r for r in records if r["fields"]]
+    return not records
 
 
 def _notify(msg: str):
@@ -239,6 +262,7 @@ def _should_alert(last_alert_at, rate: float, threshold: float) -> bool:
 
 
 # ─────────────────────────── Core ───────────────────────────
+@airtable_lane("bulk")
 def update_metrics() -> dict:
     """
     Compute per-campaign & global SMS metrics:
@@ -258,51 +282,49 @@ def update_metrics() -> dict:
     logger.info("📊 Starting metrics update...")
 
     try:
-        all_campaigns = campaigns.all()
+        all_campaigns = REPLICA.select(campaigns)
+        if all_campaigns is None:
+            all_campaigns = campaigns.all()
     except Exception as e:
         logger.error(f"Failed to fetch Campaigns: {e}", exc_info=True)
         return {"ok": False, "error": "Failed to fetch Campaigns"}
 
+    # O(changed rows): fold Conversations deltas into the persistent rollup
+    rollup_key = METRICS_ROLLUP.refresh(convos)
+    totals = METRICS_ROLLUP.totals(rollup_key) if rollup_key else {}
+    updates, pushed, synced = [], [], []
+
     for camp in all_campaigns:
         cf = camp.get("fields", {}) or {}
         camp_id = camp.get("id")
         camp_name = cf.get("Name") or cf.get("name") or "Unknown"
 
         try:
-            fbf = _campaign_formula(camp_name)
-            dirf = _field(CONV_DIRECTION_FIELD)
-            sent = _try_fetch(convos, f"AND(LOWER({dirf})='out', {fbf})")
-            inbound = _try_fetch(convos, f"AND(LOWER({dirf})='in', {fbf})")
-
-            total_sent = len(sent)
-            delivered = [r for r in sent if _status(r) in DELIVERED_STATES]
-            failed = [r for r in sent if _status(r) in FAILED_STATES]
-            responses = len(inbound)
-            optouts = [r for r in inbound if "stop" in _body(r)]
-            total_optouts = len(optouts)
-
-            delivery_rate = round(len(delivered) / total_sent * 100, 2) if total_sent else 0
+            if rollup_key:
+                # Linked campaign column → keyed by record id; text column → by name
+                counts = _sum_counts(totals.get(camp_id), totals.get(camp_name))
+            else:
+                counts = _scan_counts(convos, camp_name)
+
+            total_sent = counts["sent"]
+            delivered = counts["delivered"]
+            failed = counts["failed"]
+            responses = counts["replies"]
+            total_optouts = counts["optouts"]
+
+            delivery_rate = round(delivered / total_sent * 100, 2) if total_sent else 0
             optout_rate = round(total_optouts / total_sent * 100, 2) if total_sent else 0
 
-            # Update campaign counters safely
             patch = {
                 "total_sent": total_sent,
-                "total_delivered": len(delivered),
-                "total_failed": len(failed),
+                "total_delivered": delivered,
+                "total_failed": failed,
                 "total_replies": responses,
                 "total_opt_outs": total_optouts,
                 "delivery_rate": delivery_rate,
                 "opt_out_rate": optout_rate,
                 "last_run_at": _now_iso(),
             }
-            try:
-                campaigns.update(camp_id, patch)
-                
-                # Sync to Campaign Control Base
-                _sync_to_campaign_control_base(camp_name, patch)
-                
-            except Exception as e:
-                logger.warning(f"⚠️ Campaign update failed: {e}")
 
             # Alerts
             last_alert_at = cf.get("last_alert_at") or cf.get("Last Alert At")
@@ -315,16 +337,19 @@ def update_metrics() -> dict:
                 _notify(f"⚠️ Low delivery rate for {camp_name}: {delivery_rate}% (sent={total_sent})")
                 alerted = True
             if alerted:
-                try:
-                    campaigns.update(camp_id, {"last_alert_at": _now_iso()})
-                except Exception as e:
-                    logger.warning(f"⚠️ Alert timestamp update failed: {e}")
+                patch["last_alert_at"] = _now_iso()
+
+            # Only campaigns whose counters moved (or that alerted) are rewritten
+            if alerted or METRICS_ROLLUP.needs_push(camp_id, counts):
+                updates.append((camp_id, patch))
+                pushed.append((camp_id, counts))
+                synced.append((camp_name, patch))
 
             # KPI logs
             for metric, value in [
                 ("TOTAL_SENT", total_sent),
-                ("DELIVERED", len(delivered)),
-                ("FAILED", len(failed)),
+                ("DELIVERED", delivered),
+                ("FAILED", failed),
                 ("RESPONSES", responses),
                 ("OPTOUTS", total_optouts),
                 ("DELIVERY_RATE", delivery_rate),
@@ -336,8 +361,8 @@ def update_metrics() -> dict:
                 {
                     "campaign": camp_name,
                     "sent": total_sent,
-                    "delivered": len(delivered),
-                    "failed": len(failed),
+                    "delivered": delivered,
+                    "failed": failed,
                     "responses": responses,
                     "optouts": total_optouts,
                     "delivery_rate": delivery_rate,
@@ -347,14 +372,19 @@ def update_metrics() -> dict:
 
             # Global rollup
             global_stats["sent"] += total_sent
-            global_stats["delivered"] += len(delivered)
-            global_stats["failed"] += len(failed)
+            global_stats["delivered"] += delivered
+            global_stats["failed"] += failed
             global_stats["responses"] += responses
             global_stats["optouts"] += total_optouts
 
         except Exception as e:
             logger.warning(f"❌ Metrics update failed for {camp_name}: {e}", exc_info=True)
 
+    if updates and _batch_update(campaigns, updates):
+        METRICS_ROLLUP.mark_pushed(pushed)
+        for camp_name, patch in synced:
+            _sync_to_campaign_control_base(camp_name, patch)
+
     # Global KPI summary
     for metric, value in [
         ("TOTAL_SENT", global_stats["sent"]),
@@ -367,4 +397,4 @@ def update_metrics() -> dict:
 
     log_run("METRICS_UPDATE", processed=global_stats["sent"], breakdown=summary)
     logger.info(f"✅ Metrics update complete → {len(summary)} campaigns | sent={global_stats['sent']}")
-    return {"ok": True, "summary": summary, "global": global_stats}
+    return {"ok": True, "summary": summary, "global": global_stats, "campaigns_updated": len(updates)}
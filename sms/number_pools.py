@@ -1,19 +1,25 @@
 """
-📞 Number Pools v3.1
+📞 Number Pools v3.2
 ────────────────────────────
 Handles:
  - DID selection by market
  - Daily reset + usage counters
  - KPI + run telemetry integration
+ - Process-local pool: DIDs loaded once, counters bumped in memory,
+   deltas flushed to Airtable in batches (interval / shutdown / flush_number_pool())
+ - Interval flushes and reloads run on a background thread, so callers
+   (including async webhook handlers) never wait on Airtable after the first load
 """
 
 from __future__ import annotations
-import os, re, random, traceback
+import atexit, os, re, random, threading, time, traceback
 from datetime import datetime, timezone
 from functools import lru_cache
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 from sms.runtime import get_logger
+from sms.airtable_governor import airtable_lane
+from sms.field_registry import FIELD_REGISTRY
 
 logger = get_logger("number_pools")
 
@@ -27,6 +33,8 @@ try:
     from pyairtable import Api as _ATApi
 except Exception:
     _ATApi = None
+else:
+    from sms.http_transport import airtable_api as _ATApi  # pooled, cached per key
 
 try:
     from sms.kpi_logger import log_kpi
@@ -51,6 +59,8 @@ CONTROL_BASE_ID = os.getenv("CAMPAIGN_CONTROL_BASE")
 NUMBERS_TABLE = os.getenv("NUMBERS_TABLE", "Numbers")
 AIRTABLE_KEY = os.getenv("AIRTABLE_API_KEY")
 DAILY_LIMIT_FALLBACK = int(os.getenv("DAILY_LIMIT", "750"))
+NUMBER_POOL_FLUSH_SEC = float(os.getenv("NUMBER_POOL_FLUSH_SEC", "30"))    # push counter deltas
+NUMBER_POOL_RELOAD_SEC = float(os.getenv("NUMBER_POOL_RELOAD_SEC", "300"))  # pick up Active/Market edits
 
 # FIELD CONSTANTS
 F_NUMBER, F_FRIENDLY, F_MARKET, F_MARKETS_MULTI = "Number", "Friendly Name", "Market", "Markets"
@@ -58,6 +68,7 @@ F_ACTIVE, F_STATUS = "Active", "Status"
 F_SENT_TODAY, F_DELIV_TODAY, F_FAILED_TODAY, F_OPTOUT_TODAY = "Sent Today", "Delivered Today", "Failed Today", "Opt-Outs Today"
 F_SENT_TOTAL, F_DELIV_TOTAL, F_FAILED_TOTAL, F_OPTOUT_TOTAL = "Sent Total", "Delivered Total", "Failed Total", "Opt-Outs Total"
 F_REMAINING, F_DAILY_RESET, F_LAST_USED = "Remaining", "Daily Reset", "Last Used"
+DAY_FIELDS = (F_SENT_TODAY, F_DELIV_TODAY, F_FAILED_TODAY, F_OPTOUT_TODAY)
 
 
 # =========================
@@ -121,16 +132,12 @@ def _numbers_tbl():
 
 
 def _auto_field_map(tbl) -> Dict[str, str]:
-    try:
-        one = tbl.all(max_records=1)
-        keys = list(one[0].get("fields", {}).keys()) if one else []
-    except Exception:
-        keys = []
-    return {_norm(k): k for k in keys}
+    return FIELD_REGISTRY.field_map(tbl)
 
 
-def _remap_existing_only(tbl, payload: Dict) -> Dict:
-    amap = _auto_field_map(tbl)
+def _remap_existing_only(tbl, payload: Dict, amap: Optional[Dict[str, str]] = None) -> Dict:
+    if amap is None:
+        return FIELD_REGISTRY.remap(tbl, payload) or dict(payload)
     out = {}
     for k, v in payload.items():
         ak = amap.get(_norm(k))
@@ -194,6 +201,259 @@ def _supports_market(f: Dict, market: Optional[str]) -> bool:
     return isinstance(ms, list) and market in ms
 
 
+def _needs_daily_reset(f: Dict) -> bool:
+    last_used = _parse_dt(f.get(F_LAST_USED))
+    return (not last_used) or (last_used.date().isoformat() != _today_str())
+
+
+def _did_of(f: Dict) -> Optional[str]:
+    return f.get(F_NUMBER) or f.get(F_FRIENDLY)
+
+
+# =========================
+# In-memory pool
+# =========================
+class NumberPool:
+    """
+    All Numbers rows held in memory. Picks and counter bumps are local.
+    A flush writes the touched rows' cached values by record id without
+    scanning the table. Only the NUMBER_POOL_RELOAD_SEC reload reads Numbers
+    again; it re-applies still-pending deltas to the fresh values. Counter
+    edits other processes make to the same row between reloads are
+    overwritten by the next flush.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._rows: Dict[str, Dict[str, Any]] = {}      # rid -> fields (snapshot + local deltas)
+        self._by_digits: Dict[str, str] = {}            # last-10 -> rid
+        self._amap: Dict[str, str] = {}                 # normalized -> Airtable column name (from the last load)
+        self._pending: Dict[str, Dict[str, Any]] = {}   # rid -> {"deltas", "remaining", "reset", "last_used"}
+        self._loaded_at = 0.0
+        self._flushed_at = time.time()
+        self._tbl = None                                # last Numbers table seen by a caller
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats: Dict[str, int] = {"loads": 0, "flushes": 0, "rows_flushed": 0, "flush_errors": 0, "bumps": 0, "picks": 0}
+
+    # ---------- loading ----------
+    def _load(self, tbl) -> None:
+        fresh = {r["id"]: dict(r.get("fields", {}) or {}) for r in (tbl.all() or []) if r.get("id")}
+        amap = {_norm(k): k for f in fresh.values() for k in f}
+        with self._lock:
+            self._amap = amap
+            for rid, fields in fresh.items():
+                self._apply_local(fields, self._pending.get(rid))
+            self._rows = fresh
+            self._by_digits = {}
+            for rid, f in fresh.items():
+                for v in (f.get(F_NUMBER), f.get(F_FRIENDLY)):
+                    d = _digits_only(v)
+                    if d:
+                        self._by_digits.setdefault(d[-10:], rid)
+            self._loaded_at = time.time()
+            self.stats["loads"] += 1
+        logger.info(f"📞 Number pool loaded: {len(fresh)} DIDs")
+
+    def _ensure(self, tbl) -> None:
+        """First use loads inline (nothing to pick from yet); later reloads go to the flusher thread."""
+        self._tbl = tbl
+        if not self._rows:
+            try:
+                self._load(tbl)
+            except Exception as e:
+                logger.warning(f"⚠️ Number pool load failed: {e}")
+        elif time.time() - self._loaded_at >= NUMBER_POOL_RELOAD_SEC:
+            self._ensure_thread()
+            self._wake.set()
+
+    # ---------- background flusher ----------
+    def _ensure_thread(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="number-pool-flusher", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(NUMBER_POOL_FLUSH_SEC)
+            self._wake.clear()
+            try:
+                self._tick()
+            except Exception:
+                logger.warning("⚠️ Number pool flusher crashed", exc_info=True)
+
+    @airtable_lane("send")  # counters belong to the send path; the flusher thread has no lane of its own
+    def _tick(self) -> None:
+        """One flusher pass: push due deltas, then reload if the snapshot is stale."""
+        tbl = self._tbl or _numbers_tbl()
+        if not tbl:
+            return
+        if time.time() - self._flushed_at >= NUMBER_POOL_FLUSH_SEC:
+            self.flush(tbl)
+        if time.time() - self._loaded_at >= NUMBER_POOL_RELOAD_SEC:
+            try:
+                self._load(tbl)
+            except Exception as e:
+                logger.warning(f"⚠️ Number pool reload failed: {e}")
+
+    @staticmethod
+    def _apply_local(fields: Dict, pending: Optional[Dict[str, Any]]) -> None:
+        if not pending:
+            return
+        if pending["reset"] and _needs_daily_reset(fields):
+            for k in DAY_FIELDS:
+                fields[k] = 0
+            fields[F_REMAINING] = int(fields.get(F_DAILY_RESET) or DAILY_LIMIT_FALLBACK)
+        for k, d in pending["deltas"].items():
+            fields[k] = int(fields.get(k) or 0) + d
+        if pending["remaining"]:
+            fields[F_REMAINING] = max(0, _remaining_calc(fields) - pending["remaining"])
+        if pending["last_used"]:
+            fields[F_LAST_USED] = pending["last_used"]
+
+    def _pending_for(self, rid: str) -> Dict[str, Any]:
+        return self._pending.setdefault(rid, {"deltas": {}, "remaining": 0, "reset": False, "last_used": None})
+
+    def _touch(self, rid: str) -> Dict:
+        """Daily reset (local) + Last Used bump. Caller holds the lock."""
+        f = self._rows[rid]
+        pend = self._pending_for(rid)
+        if _needs_daily_reset(f):
+            for k in DAY_FIELDS:
+                f[k] = 0
+                pend["deltas"].pop(k, None)
+            f[F_REMAINING] = int(f.get(F_DAILY_RESET) or DAILY_LIMIT_FALLBACK)
+            pend["remaining"] = 0
+            pend["reset"] = True
+            logger.info(f"🔄 Daily reset for {f.get(F_NUMBER)}")
+        f[F_LAST_USED] = pend["last_used"] = _now().isoformat()
+        return f
+
+    # ---------- public ----------
+    def pick(self, tbl, market: Optional[str]) -> Optional[str]:
+        self._ensure(tbl)
+        with self._lock:
+            elig: List[Tuple[Tuple[int, datetime], str]] = []
+            for rid, f in self._rows.items():
+                if not _is_active(f) or not _supports_market(f, market):
+                    continue
+                remaining = int(f.get(F_DAILY_RESET) or DAILY_LIMIT_FALLBACK) if _needs_daily_reset(f) else _remaining_calc(f)
+                if remaining <= 0:
+                    continue
+                last_used = _parse_dt(f.get(F_LAST_USED)) or datetime(1970, 1, 1, tzinfo=timezone.utc)
+                elig.append(((-remaining, last_used), rid))
+            if not elig:
+                return None
+            elig.sort(key=lambda x: x[0])
+            rid = elig[0][1]
+            did = _did_of(self._rows[rid])
+            if did and _digits_only(did):
+                self._touch(rid)
+                self.stats["picks"] += 1
+        self.maybe_flush(tbl)
+        return did
+
+    def find(self, tbl, did: Optional[str]) -> Optional[Dict]:
+        d = _digits_only(did)
+        if not d:
+            return None
+        self._ensure(tbl)
+        with self._lock:
+            rid = self._by_digits.get(d[-10:])
+            return {"id": rid, "fields": dict(self._rows[rid])} if rid else None
+
+    def bump(self, tbl, rid: str, day_field: str, total_field: str, delta: int = 1, dec_remaining: bool = False) -> None:
+        with self._lock:
+            if rid not in self._rows:
+                return
+            f = self._touch(rid)
+            pend = self._pending_for(rid)
+            for k in (day_field, total_field):
+                f[k] = int(f.get(k) or 0) + delta
+                pend["deltas"][k] = pend["deltas"].get(k, 0) + delta
+            if dec_remaining:
+                f[F_REMAINING] = max(0, _remaining_calc(f) - delta)
+                pend["remaining"] += delta
+            self.stats["bumps"] += 1
+        self.maybe_flush(tbl)
+
+    def maybe_flush(self, tbl) -> None:
+        """Never writes inline: makes sure the flusher thread is running and nudges it when a flush is due."""
+        self._tbl = tbl
+        self._ensure_thread()
+        if time.time() - self._flushed_at >= NUMBER_POOL_FLUSH_SEC:
+            self._wake.set()
+
+    def flush(self, tbl=None) -> int:
+        """Push the touched rows' cached counters by record id in 10-row batch updates (no table scan)."""
+        with self._lock:
+            self._flushed_at = time.time()
+            if not self._pending:
+                return 0
+        tbl = tbl or _numbers_tbl()
+        if not tbl:
+            return 0
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            updates = []
+            for rid, pend in pending.items():
+                fields = self._rows.get(rid)
+                if fields is None:
+                    continue
+                keys = set(pend["deltas"]) | {F_LAST_USED}
+                if pend["remaining"] or pend["reset"]:
+                    keys.add(F_REMAINING)
+                if pend["reset"]:
+                    keys.update(DAY_FIELDS)
+                patch = {k: fields.get(k, 0) for k in keys if fields.get(k) is not None}
+                updates.append({"id": rid, "fields": _remap_existing_only(tbl, patch, self._amap or None)})
+        try:
+            batch_update = getattr(tbl, "batch_update", None)
+            for i in range(0, len(updates), 10):
+                chunk = updates[i:i + 10]
+                if callable(batch_update):
+                    batch_update(chunk)
+                else:
+                    for u in chunk:
+                        tbl.update(u["id"], u["fields"])
+            with self._lock:
+                self.stats["flushes"] += 1
+                self.stats["rows_flushed"] += len(updates)
+            return len(updates)
+        except Exception as e:
+            # Keep the deltas for the next attempt
+            with self._lock:
+                for rid, pend in pending.items():
+                    cur = self._pending_for(rid)
+                    for k, d in pend["deltas"].items():
+                        cur["deltas"][k] = cur["deltas"].get(k, 0) + d
+                    cur["remaining"] += pend["remaining"]
+                    cur["reset"] = cur["reset"] or pend["reset"]
+                    cur["last_used"] = cur["last_used"] or pend["last_used"]
+                self.stats["flush_errors"] += 1
+            logger.warning(f"⚠️ Number pool flush failed: {e}")
+            return 0
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"dids": len(self._rows), "pending_rows": len(self._pending), "loaded_at": self._loaded_at, **self.stats}
+
+
+POOL = NumberPool()
+
+
+def flush_number_pool() -> int:
+    """Drain pending counter deltas to Airtable (call at shutdown)."""
+    return POOL.flush()
+
+
+atexit.register(flush_number_pool)
+
+
 # =========================
 # Public API
 # =========================
@@ -204,33 +464,12 @@ def get_from_number(market: Optional[str] = None) -> str:
         logger.info(f"[MOCK] get_from_number({market!r}) → {dummy}")
         return dummy
 
-    elig: List[Tuple[Tuple[int, datetime], Dict]] = []
-    for r in tbl.all():
-        r = _reset_daily_if_needed(r)
-        f = r.get("fields", {})
-        if not _is_active(f) or not _supports_market(f, market):
-            continue
-        remaining = _remaining_calc(f)
-        if remaining <= 0:
-            continue
-        last_used = _parse_dt(f.get(F_LAST_USED)) or datetime(1970, 1, 1, tzinfo=timezone.utc)
-        elig.append(((-remaining, last_used), r))
-
-    if not elig:
+    did = POOL.pick(tbl, market)
+    if not did:
         raise RuntimeError(f"🚨 No available numbers for market='{market}'")
-
-    elig.sort(key=lambda x: x[0])
-    chosen = elig[0][1]
-    cf = chosen["fields"]
-    did = cf.get(F_NUMBER) or cf.get(F_FRIENDLY)
-    if not did or not _digits_only(did):
+    if not _digits_only(did):
         raise RuntimeError("🚨 Chosen number row has no valid DID")
 
-    try:
-        tbl.update(chosen["id"], _remap_existing_only(tbl, {F_LAST_USED: _now().isoformat()}))
-    except Exception as e:
-        logger.warning(f"⚠️ Failed to bump last_used: {e}")
-
     log_kpi("NUMBER_PICKED", 1, extra={"Market": market or "ALL"})
     return did
 
@@ -241,18 +480,7 @@ def _bump(row: Dict, day_field: str, total_field: str, delta: int = 1, dec_remai
         logger.info(f"[MOCK] bump({row.get('id')}, {day_field})")
         return
     try:
-        rec = tbl.get(row["id"])
-        rec = _reset_daily_if_needed(rec)
-        f = rec["fields"]
-        patch = {
-            day_field: int(f.get(day_field) or 0) + delta,
-            total_field: int(f.get(total_field) or 0) + delta,
-            F_LAST_USED: _now().isoformat(),
-        }
-        if dec_remaining:
-            cur_rem = _remaining_calc(f)
-            patch[F_REMAINING] = max(0, cur_rem - delta)
-        tbl.update(rec["id"], _remap_existing_only(tbl, patch))
+        POOL.bump(tbl, row["id"], day_field, total_field, delta=delta, dec_remaining=dec_remaining)
     except Exception as e:
         logger.warning(f"⚠️ bump failed: {e}")
 
@@ -262,11 +490,10 @@ def _get_row_or_none(did: Optional[str]) -> Optional[Dict]:
         logger.warning(f"⚠️ invalid DID: {did}")
         return None
     tbl = _numbers_tbl()
+    if not tbl:
+        return None
     try:
-        for r in tbl.all():
-            f = r.get("fields", {})
-            if _same_did(f.get(F_NUMBER), did) or _same_did(f.get(F_FRIENDLY), did):
-                return r
+        return POOL.find(tbl, did)
     except Exception as e:
         logger.warning(f"⚠️ fetch row failed: {e}")
     return None
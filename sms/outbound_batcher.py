@@ -5,25 +5,37 @@
 - Quiet hours via DispatchPolicy
 - Per-number + global rate limiting
 - Robust Airtable read/update with field whitelist
-- Campaign-status guard (skip Paused/Completed)
+- Drip Queue writes merged per record and flushed as 10-row batch updates
+- Campaign-status guard (skip Paused/Completed); campaign status + number picks read from the local
+  replica when enabled (drip selection/claims always go to Airtable)
 - Duplicate (phone, property) suppression in a single batch
+- Optional pipelined sends (SEND_WORKERS) with write-behind bookkeeping + stage timings
 - Optional integrations (KPI, run logs, number pools, message sender)
 """
 
 from __future__ import annotations
+import contextvars
 import os
 import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Logging / policy
 # ──────────────────────────────────────────────────────────────────────────────
 from sms.runtime import get_logger
+from sms.airtable_governor import airtable_lane
 log = get_logger("outbound")
 
 from sms.dispatcher import get_policy  # provides quiet hours + rate caps
+from sms import rt  # shared (Redis/Upstash) per-DID + global limiter
+from sms.send_window import SendWindow  # per-recipient quiet hours
+from sms.outbox import OUTBOX  # write-ahead send log (no double sends after a crash)
+from sms.replica import REPLICA  # opt-in local read replica (falls back to Airtable)
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Schema + config
@@ -101,6 +113,14 @@ RATE_LIMIT_REQUEUE_SECONDS = float(os.getenv("RATE_LIMIT_REQUEUE_SECONDS", "30")
 NO_NUMBER_REQUEUE_SECONDS = float(os.getenv("NO_NUMBER_REQUEUE_SECONDS", "300"))
 AUTO_BACKFILL_FROM_NUMBER = os.getenv("AUTO_BACKFILL_FROM_NUMBER", "true").lower() in {"1", "true", "yes"}
 
+# Pipelined send mode (SEND_WORKERS > 1): bounded send pool + write-behind bookkeeping
+SEND_WORKERS = max(1, int(os.getenv("SEND_WORKERS", "1")))
+SEND_INFLIGHT_PER_DID = max(1, int(os.getenv("SEND_INFLIGHT_PER_DID", "2")))
+
+# Drip Queue write-behind (Airtable PATCH takes ≤10 records)
+DRIP_WRITE_BATCH = max(1, min(10, int(os.getenv("DRIP_WRITE_BATCH", "10"))))
+DRIP_WRITE_FLUSH_SEC = float(os.getenv("DRIP_WRITE_FLUSH_SEC", "2"))
+
 # ──────────────────────────────────────────────────────────────────────────────
 # Utilities
 # ──────────────────────────────────────────────────────────────────────────────
@@ -258,33 +278,38 @@ def get_table(base_env_name: str, table_name: str):
         log.error(f"Failed to init Table({base_env_name}, {table_name}): {e}")
         return None
 
-def _safe_update(tbl, rid: str, payload: Dict[str, Any]) -> None:
+def _clean_drip_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
     """
     Only allow updates to known DRIP fields. Avoids 422 from unknown fields.
     Uses *mapped* field names for the whitelist.
     """
-    try:
-        allowed_keys = ["STATUS", "NEXT_SEND_DATE", "SENT_AT", "LAST_ERROR", "FROM_NUMBER", "UI"]
-        allowed_fields = {DRIP_FIELDS.get(k, k) for k in allowed_keys}
+    allowed_keys = ["STATUS", "NEXT_SEND_DATE", "SENT_AT", "LAST_ERROR", "FROM_NUMBER", "UI"]
+    allowed_fields = {DRIP_FIELDS.get(k, k) for k in allowed_keys}
 
-        status_field = DRIP_STATUS_F
-        ui_field = DRIP_UI_F
+    status_field = DRIP_STATUS_F
+    ui_field = DRIP_UI_F
+
+    clean: Dict[str, Any] = {}
+    for key, value in payload.items():
+        mapped = DRIP_FIELDS.get(key, key)  # map logical -> Airtable
+        if mapped in allowed_fields or mapped in {status_field, ui_field}:
+            if mapped == status_field and isinstance(value, (str, type(None))):
+                value = _sanitize_status(value)
+            clean[mapped] = value
+    return clean
 
-        clean: Dict[str, Any] = {}
-        for key, value in payload.items():
-            mapped = DRIP_FIELDS.get(key, key)  # map logical -> Airtable
-            if mapped in allowed_fields or mapped in {status_field, ui_field}:
-                if mapped == status_field and isinstance(value, (str, type(None))):
-                    value = _sanitize_status(value)
-                clean[mapped] = value
 
+def _safe_update(tbl, rid: str, payload: Dict[str, Any]) -> None:
+    """Single-record whitelisted update (drops Status on INVALID_MULTIPLE_CHOICE_OPTIONS)."""
+    try:
+        clean = _clean_drip_payload(payload)
         if clean:
             try:
                 tbl.update(rid, clean)
             except Exception as exc:
                 if "INVALID_MULTIPLE_CHOICE_OPTIONS" in str(exc):
                     retry = dict(clean)
-                    retry.pop(status_field, None)
+                    retry.pop(DRIP_STATUS_F, None)
                     if retry:
                         tbl.update(rid, retry)
                 else:
@@ -292,6 +317,146 @@ def _safe_update(tbl, rid: str, payload: Dict[str, Any]) -> None:
     except Exception as e:
         log.warning(f"⚠️ Update failed: {e}", exc_info=True)
 
+
+class DripWriteBuffer:
+    """
+    Write-behind buffer for Drip Queue updates.
+    Updates to the same record are merged while pending and flushed as
+    ≤10-record `batch_update` calls — when a batch fills, when the oldest pending
+    write is older than DRIP_WRITE_FLUSH_SEC, or on flush() at end of cycle.
+    update() never waits on Airtable: a writer thread pops chunks under the lock
+    and writes them outside it, on a timer as well as when a batch fills.
+    Writes are serialized (one writer at a time) so per-record order is preserved.
+    """
+
+    def __init__(self, tbl: Any, *, batch_size: int = DRIP_WRITE_BATCH, max_age_sec: float = DRIP_WRITE_FLUSH_SEC):
+        self.tbl = tbl
+        self.batch_size = max(1, min(10, int(batch_size)))
+        self.max_age_sec = max_age_sec
+        self._pending: Dict[str, Dict[str, Any]] = {}  # rid -> merged fields (insertion ordered)
+        self._oldest: Optional[float] = None
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()  # held from pop to write, so chunks land in pop order
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats: Dict[str, int] = {"updates": 0, "merged": 0, "records_written": 0, "api_calls": 0, "failed": 0}
+        self.failed_ids: set[str] = set()  # records whose write never reached Airtable
+
+    def update(self, rid: str, payload: Dict[str, Any]) -> None:
+        clean = _clean_drip_payload(payload)
+        if not rid or not clean:
+            return
+        with self._lock:
+            self.stats["updates"] += 1
+            if rid in self._pending:
+                self._pending[rid].update(clean)
+                self.stats["merged"] += 1
+            else:
+                self._pending[rid] = clean
+                if self._oldest is None:
+                    self._oldest = time.monotonic()
+            # Hold one extra row back so the newest record can still merge its next write
+            full = len(self._pending) > self.batch_size
+        self._ensure_thread()
+        if full:
+            self._wake.set()
+
+    def flush(self) -> Dict[str, int]:
+        """End of cycle: stop the writer thread and write everything still pending."""
+        self._stop.set()
+        self._wake.set()
+        thread = self._thread
+        if thread and thread is not threading.current_thread():
+            thread.join()
+        self._flush_ready(full_only=False)
+        with self._lock:
+            return dict(self.stats)
+
+    # ---------- internals ----------
+    def _ensure_thread(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="drip-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.max_age_sec)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            try:
+                with self._lock:
+                    aged = self._oldest is not None and time.monotonic() - self._oldest >= self.max_age_sec
+                self._flush_ready(full_only=not aged)
+            except Exception:
+                log.warning("⚠️ Drip writer crashed", exc_info=True)
+
+    def _pop_chunk(self, *, full_only: bool) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            if not self._pending or (full_only and len(self._pending) <= self.batch_size):
+                return None
+            rids = list(self._pending)[: self.batch_size]
+            chunk = [{"id": rid, "fields": self._pending.pop(rid)} for rid in rids]
+            self._oldest = time.monotonic() if self._pending else None
+            return chunk
+
+    @airtable_lane("send")  # also runs on the drip-writer thread, which has no lane of its own
+    def _flush_ready(self, *, full_only: bool) -> None:
+        with self._write_lock:
+            while True:
+                chunk = self._pop_chunk(full_only=full_only)
+                if not chunk:
+                    return
+                self._write(chunk)
+
+    def _write(self, chunk: List[Dict[str, Any]]) -> None:
+        batch_update = getattr(self.tbl, "batch_update", None)
+        if callable(batch_update):
+            try:
+                self.stats["api_calls"] += 1
+                batch_update(chunk)
+                self.stats["records_written"] += len(chunk)
+                return
+            except Exception as exc:
+                if "INVALID_MULTIPLE_CHOICE_OPTIONS" in str(exc):
+                    retry = [{"id": r["id"], "fields": {k: v for k, v in r["fields"].items() if k != DRIP_STATUS_F}} for r in chunk]
+                    retry = [r for r in retry if r["fields"]]
+                    try:
+                        if retry:
+                            self.stats["api_calls"] += 1
+                            batch_update(retry)
+                        self.stats["records_written"] += len(chunk)
+                        return
+                    except Exception as exc2:
+                        exc = exc2
+                log.warning(f"⚠️ Batch update failed ({len(chunk)} rows), retrying per record: {exc}")
+        # No batch API, or one bad row poisoned the batch → isolate per record
+        for rec in chunk:
+            try:
+                self.stats["api_calls"] += 1
+                self.tbl.update(rec["id"], rec["fields"])
+                self.stats["records_written"] += 1
+            except Exception as exc:
+                if "INVALID_MULTIPLE_CHOICE_OPTIONS" in str(exc):
+                    retry = {k: v for k, v in rec["fields"].items() if k != DRIP_STATUS_F}
+                    try:
+                        if retry:
+                            self.stats["api_calls"] += 1
+                            self.tbl.update(rec["id"], retry)
+                        self.stats["records_written"] += 1
+                        continue
+                    except Exception as exc2:
+                        exc = exc2
+                self.stats["failed"] += 1
+                self.failed_ids.add(rec["id"])
+                log.warning(f"⚠️ Update failed for {rec['id']}: {exc}")
+
 # --- Campaign status lookup (used to skip paused/completed) ---
 # (Module scope; not nested in _safe_update)
 def _campaign_status_map(ids: List[str]) -> Dict[str, str]:
@@ -301,6 +466,9 @@ def _campaign_status_map(ids: List[str]) -> Dict[str, str]:
     if not camp_tbl:
         return {}
     out: Dict[str, str] = {}
+    local = REPLICA.select(camp_tbl, ids=ids)
+    if local is not None and len(local) == len(set(ids)):
+        return {r["id"]: str((r.get("fields") or {}).get("Status", "")).strip().lower() for r in local}
     # chunk to ≤90 ids for Airtable OR() formula
     for i in range(0, len(ids), 90):
         chunk = ids[i:i+90]
@@ -314,41 +482,67 @@ def _campaign_status_map(ids: List[str]) -> Dict[str, str]:
 # Rate limiter (per-DID + global) using DispatchPolicy caps
 # ──────────────────────────────────────────────────────────────────────────────
 class _RateLimiter:
-    def __init__(self, per_did_per_min: int, global_per_min: int):
+    """
+    Per-process windows, optionally backed by the shared (Redis/Upstash) limiter so caps hold
+    across workers. `consume(did, n)` takes up to n tokens in one shared round-trip.
+    """
+
+    def __init__(self, per_did_per_min: int, global_per_min: int, shared: Optional[Callable[[str, int], int]] = None):
         self.per = max(1, per_did_per_min)
         self.glob = max(1, global_per_min)
+        self.shared = shared
         self._per_counts: Dict[str, Tuple[int, float]] = {}   # did -> (count, window_start_epoch)
         self._global: Tuple[int, float] = (0, time.time())
+        self._lock = threading.Lock()
 
-    def _tick(self, key: str) -> bool:
+    def _tick(self, key: str, n: int = 1) -> int:
         now = time.time()
         # per DID window
         cnt, start = self._per_counts.get(key, (0, now))
         if now - start >= 60.0:
             cnt, start = 0, now
-        if cnt + 1 > self.per:
-            return False
         # global window
         gcnt, gstart = self._global
         if now - gstart >= 60.0:
             gcnt, gstart = 0, now
-        if gcnt + 1 > self.glob:
-            return False
+        granted = max(0, min(n, self.per - cnt, self.glob - gcnt))
 
         # commit
-        self._per_counts[key] = (cnt + 1, start)
-        self._global = (gcnt + 1, gstart)
-        return True
+        self._per_counts[key] = (cnt + granted, start)
+        self._global = (gcnt + granted, gstart)
+        return granted
+
+    def consume(self, did: str, n: int) -> int:
+        with self._lock:
+            granted = self._tick(did, n)
+        if granted and self.shared is not None:
+            shared = self.shared(did, granted)
+            if shared < granted:
+                with self._lock:  # hand back what the shared limiter refused
+                    cnt, start = self._per_counts[did]
+                    gcnt, gstart = self._global
+                    self._per_counts[did] = (cnt - (granted - shared), start)
+                    self._global = (gcnt - (granted - shared), gstart)
+            granted = shared
+        return granted
 
     def try_consume(self, did: str) -> bool:
-        return self._tick(did)
+        return self.consume(did, 1) == 1
 
 def build_limiter() -> _RateLimiter:
     p = get_policy()
-    return _RateLimiter(p.rate_per_number_per_min, p.global_rate_per_min)
+    shared = None
+    if rt.is_shared():
+        def shared(did: str, n: int) -> int:
+            return rt.take_tokens(did, n, p.rate_per_number_per_min, p.global_rate_per_min)
+    return _RateLimiter(p.rate_per_number_per_min, p.global_rate_per_min, shared)
+
+def build_send_window() -> SendWindow:
+    return SendWindow.from_policy(get_policy())
 
 def is_quiet_hours_local() -> bool:
-    return get_policy().is_quiet()
+    """True only when no recipient timezone is inside its send window."""
+    return not build_send_window().any_open()
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Number selection (simple, robust)
@@ -384,14 +578,19 @@ def _pick_number_for_market(market: Optional[str]) -> Optional[str]:
     try:
         # Prefer market match
         if market:
-            recs = tbl.all(formula=f"LOWER({{Market}}) = '{str(market).strip().lower()}'")
+            want = str(market).strip().lower()
+            recs = REPLICA.select(tbl, where=lambda f: str(f.get("Market") or "").strip().lower() == want)
+            if recs is None:
+                recs = tbl.all(formula=f"LOWER({{Market}}) = '{want}'")
             did = _first_or_none(recs)
             if did:
                 log.info(f"Selected market-specific number for {market}: {did}")
                 return did
 
         # Fallback: any active
-        recs = tbl.all(formula="OR({Active} = 1, LOWER({Status}) = 'active')")
+        recs = REPLICA.select(tbl)  # _first_or_none applies the Active/Status test
+        if recs is None:
+            recs = tbl.all(formula="OR({Active} = 1, LOWER({Status}) = 'active')")
         fallback_number = _first_or_none(recs)
         if fallback_number:
             log.info(f"Selected fallback number: {fallback_number}")
@@ -405,14 +604,232 @@ def _pick_number_for_market(market: Optional[str]) -> Optional[str]:
         log.warning(f"Number pick failed during query: {e} - falling back to DEFAULT_FROM_NUMBER")
         return DEFAULT_FROM_NUMBER
 
+# ──────────────────────────────────────────────────────────────────────────────
+# Send stages (deliver → bookkeeping), sequential or pipelined
+# ──────────────────────────────────────────────────────────────────────────────
+@dataclass
+class _SendJob:
+    rid: str
+    phone: str
+    body: str
+    did: str
+    property_id: Optional[str] = None
+    campaign_id: Optional[str] = None
+    template_id: Optional[str] = None
+    prospect_id: Optional[str] = None
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+def _requeue(writes: DripWriteBuffer, rid: str, reason: str, at: datetime) -> None:
+    writes.update(
+        rid,
+        {
+            "STATUS": "Queued",  # ensure not stuck in Sending
+            "UI": "⏳",
+            "LAST_ERROR": reason,
+            "NEXT_SEND_DATE": _iso(at),
+        },
+    )
+
+
+OUTBOX_BLOCKED = "outbox_blocked"
+
+
+def _deliver(writes: DripWriteBuffer, job: _SendJob) -> Tuple[bool, Optional[str]]:
+    """
+    Record the intent in the outbox, transition to Sending and hand the message to the sender.
+    Returns (delivered, error). The outcome is logged in the outbox before any Airtable write;
+    a sender exception (timeout after the POST?) leaves the intent open for reconcile.
+    """
+    if MessageProcessor is None:
+        return False, "no_sender_available"
+    if not OUTBOX.begin(job.rid, job.phone, job.did, job.body):
+        return False, OUTBOX_BLOCKED
+    writes.update(job.rid, {"STATUS": "Sending", "UI": "⏳"})
+    try:
+        res = MessageProcessor.send(  # type: ignore[attr-defined]
+            phone=job.phone,
+            body=job.body,
+            from_number=job.did,
+            campaign_id=job.campaign_id,
+            template_id=job.template_id,
+            drip_queue_id=job.rid,
+            property_id=job.property_id,
+            direction="OUT",
+            metadata=job.metadata,
+        )
+    except Exception as e:  # pragma: no cover
+        return False, str(e)
+    res = res or {}
+    delivered = str(res.get("status", "")).lower() in {"sent", "delivered"}
+    if delivered or res.get("provider_status"):
+        OUTBOX.record(job.rid, ok=delivered, sid=res.get("sid"), error=None if delivered else res.get("error"))
+    return delivered, None
+
+
+def _record_outcome(
+    writes: DripWriteBuffer, prospects_tbl, job: _SendJob, delivered: bool, now: datetime, err: Optional[str] = None
+) -> None:
+    """Post-send bookkeeping: drip status, number counters, KPIs, prospect activity."""
+    if err == OUTBOX_BLOCKED:
+        return  # another batch owns this row; leave it alone
+    if delivered:
+        writes.update(
+            job.rid,
+            {
+                "STATUS": "Sent",
+                "UI": "✅",
+                "SENT_AT": _iso(utcnow()),
+                "LAST_ERROR": "",
+            },
+        )
+        try:
+            increment_sent(job.did)
+        except Exception:
+            pass
+        try:
+            log_kpi("OUTBOUND_SENT", 1, campaign=job.campaign_id or "ALL")
+        except Exception as kpi_exc:
+            log.warning(f"KPI logging skipped: {kpi_exc}")
+
+        # Update prospect with outbound data
+        try:
+            _safe_update_prospect_outbound(
+                prospects_tbl=prospects_tbl,
+                prospect_id=job.prospect_id,
+                phone=job.phone,
+                body=job.body,
+                textgrid_phone=job.did,
+            )
+        except Exception as prospect_exc:
+            log.warning(f"Prospect update skipped: {prospect_exc}")
+    else:
+        _requeue(writes, job.rid, "send_failed", now + timedelta(seconds=REQUEUE_SOFT_ERROR_SECONDS))
+        try:
+            log_kpi("OUTBOUND_FAILED_SOFT", 1)
+        except Exception as kpi_exc:
+            log.warning(f"KPI logging skipped: {kpi_exc}")
+
+
+def _reconcile_outbox(writes: DripWriteBuffer, due_ids: List[str], now: datetime) -> Tuple[List[str], int]:
+    """
+    Replay outbox entries a previous run left unacknowledged onto the Drip Queue.
+    Returns (drip ids to ack after the flush, number of unconfirmed rows held back).
+    """
+    try:
+        settled = OUTBOX.reconcile(due_ids)
+    except Exception as e:
+        log.warning(f"Outbox reconcile skipped: {e}")
+        return [], 0
+    for entry in settled["sent"]:
+        writes.update(
+            entry["drip_id"],
+            {
+                "STATUS": "Sent",
+                "UI": "✅",
+                "SENT_AT": _iso(datetime.fromtimestamp(entry["updated_at"], timezone.utc)),
+                "LAST_ERROR": "",
+            },
+        )
+    for entry in settled["failed"]:
+        _requeue(writes, entry["drip_id"], "send_failed", now + timedelta(seconds=REQUEUE_SOFT_ERROR_SECONDS))
+    for entry in settled["unconfirmed"]:
+        # Provider couldn't say whether it went out → hold the row; never resend blind
+        _requeue(writes, entry["drip_id"], "outbox_unconfirmed", now + timedelta(seconds=REQUEUE_SOFT_ERROR_SECONDS))
+    return [e["drip_id"] for e in settled["sent"] + settled["failed"]], len(settled["unconfirmed"])
+
+
+def _send_sequential(jobs: List[_SendJob], writes: DripWriteBuffer, prospects_tbl, now: datetime, timings: Dict[str, float]) -> List[Tuple[bool, Optional[str]]]:
+    """Legacy one-at-a-time path (SEND_WORKERS=1)."""
+    send_s = book_s = 0.0
+    outcomes: List[Tuple[bool, Optional[str]]] = []
+    for job in jobs:
+        t0 = time.perf_counter()
+        delivered, err = _deliver(writes, job)
+        t1 = time.perf_counter()
+        _record_outcome(writes, prospects_tbl, job, delivered, now, err)
+        send_s += t1 - t0
+        book_s += time.perf_counter() - t1
+        outcomes.append((delivered, err))
+        if SLEEP_BETWEEN_SENDS_SEC > 0:
+            time.sleep(SLEEP_BETWEEN_SENDS_SEC)
+    timings["send"] = round(send_s, 3)
+    timings["bookkeeping"] = round(book_s, 3)
+    return outcomes
+
+
+def _interleave_by_did(jobs: List[_SendJob]) -> List[_SendJob]:
+    """Round-robin jobs across DIDs so no single DID's in-flight cap stalls the pool."""
+    lanes: Dict[str, List[_SendJob]] = {}
+    for job in jobs:
+        lanes.setdefault(job.did, []).append(job)
+    out: List[_SendJob] = []
+    queues = list(lanes.values())
+    while queues:
+        for q in queues:
+            out.append(q.pop(0))
+        queues = [q for q in queues if q]
+    return out
+
+
+def _send_pipelined(
+    jobs: List[_SendJob], writes: DripWriteBuffer, prospects_tbl, now: datetime, workers: int, timings: Dict[str, float]
+) -> List[Tuple[bool, Optional[str]]]:
+    """
+    Bounded send pool + single write-behind thread for bookkeeping.
+    Rate-limit tokens were already taken in the prepare stage, so the pool only
+    bounds concurrency (global = workers, per DID = SEND_INFLIGHT_PER_DID).
+    """
+    per_did: Dict[str, threading.BoundedSemaphore] = {
+        did: threading.BoundedSemaphore(max(1, SEND_INFLIGHT_PER_DID)) for did in {j.did for j in jobs}
+    }
+
+    def _send_one(job: _SendJob) -> Tuple[bool, Optional[str]]:
+        with per_did[job.did]:
+            return _deliver(writes, job)
+
+    outcomes: List[Tuple[bool, Optional[str]]] = []
+    t_send = time.perf_counter()
+    writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbound-writeback")
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="outbound-send") as pool:
+            # Pool threads don't inherit contextvars: carry the caller's "send" lane into each task
+            futures = {
+                pool.submit(contextvars.copy_context().run, _send_one, job): job for job in _interleave_by_did(jobs)
+            }
+            for fut in as_completed(futures):
+                job = futures[fut]
+                try:
+                    delivered, err = fut.result()
+                except Exception as e:  # pragma: no cover
+                    delivered, err = False, str(e)
+                outcomes.append((delivered, err))
+                writer.submit(contextvars.copy_context().run, _record_outcome, writes, prospects_tbl, job, delivered, now, err)
+    finally:
+        timings["send"] = round(time.perf_counter() - t_send, 3)
+        t_drain = time.perf_counter()
+        writer.shutdown(wait=True)
+        # Bookkeeping overlaps the send stage; this is only the tail left after the last send
+        timings["bookkeeping"] = round(time.perf_counter() - t_drain, 3)
+    return outcomes
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # Core batch sender
 # ──────────────────────────────────────────────────────────────────────────────
-def send_batch(campaign_id: Optional[str] = None, limit: int = 500) -> Dict[str, Any]:
+@airtable_lane("send")
+def send_batch(campaign_id: Optional[str] = None, limit: int = 500, workers: Optional[int] = None) -> Dict[str, Any]:
     """
     Process due rows in Drip Queue and attempt to send messages.
-    Respects quiet hours and rate limits. Never crashes the process.
+    Respects quiet hours (in each seller's timezone) and rate limits. Never crashes the process.
+    Rows whose recipient is outside their window are pushed to the window's next opening.
+
+    workers > 1 (default SEND_WORKERS) enables the pipelined mode: sends run on a
+    bounded pool (≤ SEND_INFLIGHT_PER_DID per DID) and bookkeeping goes write-behind.
+    The summary carries per-stage wall-clock `timings` (seconds).
     """
+    t_start = time.perf_counter()
+    timings: Dict[str, float] = {}
     drip_tbl = get_table(LEADS_BASE_ENV, DRIP_TABLE_NAME)
     if not drip_tbl:
         return {"ok": False, "error": "missing_drip_table", "total_sent": 0}
@@ -503,30 +920,35 @@ def send_batch(campaign_id: Optional[str] = None, limit: int = 500) -> Dict[str,
     camp_status = _campaign_status_map(camp_ids)
 
     limiter = build_limiter()
+    window = build_send_window()
+    writes = DripWriteBuffer(drip_tbl)
     total_sent = 0
     total_failed = 0
+    deferred_quiet = 0
+    # Settle what a previous (crashed) run sent but never recorded, then keep those rows out of this batch
+    due_ids = [r.get("id") for r in due if r.get("id")]
+    to_ack, unconfirmed = _reconcile_outbox(writes, due_ids, now)
+    blocked = OUTBOX.blocked(due_ids)
     errors: List[str] = []
+    timings["read"] = round(time.perf_counter() - t_start, 3)
+    t_prepare = time.perf_counter()
 
     SUPPRESS_DUPLICATE_PHONES = os.getenv("SUPPRESS_DUPLICATE_PHONES", "true").lower() in {"1", "true", "yes"}
     seen: set[tuple[str, str]] = set()  # (e164_phone, property_id_or_blank)
+    picked_by_market: Dict[str, Optional[str]] = {}  # one Numbers lookup per market per batch
+    jobs: List[_SendJob] = []
 
     for r in due:
         rid = r.get("id")
         f = r.get("fields", {}) or {}
+        if rid in blocked:
+            continue
 
         # Campaign-status guard (skip paused/completed)
         links = f.get(campaign_link_key) or []
         linked_id = str(links[0]) if isinstance(links, list) and links else (str(links) if links else "")
         if linked_id and camp_status.get(linked_id) in {"paused", "completed"}:
-            _safe_update(
-                drip_tbl, rid,
-                {
-                    "STATUS": "Queued",  # ensure not stuck in Sending
-                    "UI": "⏳",
-                    "LAST_ERROR": "campaign_paused",
-                    "NEXT_SEND_DATE": _iso(now + timedelta(hours=24)),  # re-check later
-                },
-            )
+            _requeue(writes, rid, "campaign_paused", now + timedelta(hours=24))  # re-check later
             total_failed += 1
             continue
 
@@ -540,46 +962,27 @@ def send_batch(campaign_id: Optional[str] = None, limit: int = 500) -> Dict[str,
 
         # Extract linking data for proper conversation logging
         campaign_links = f.get(campaign_link_key) or []
-        campaign_id = str(campaign_links[0]) if isinstance(campaign_links, list) and campaign_links else (str(campaign_links) if campaign_links else None)
-        
+        row_campaign_id = str(campaign_links[0]) if isinstance(campaign_links, list) and campaign_links else (str(campaign_links) if campaign_links else None)
+
         template_links = f.get(template_link_key) or []
         template_id = str(template_links[0]) if isinstance(template_links, list) and template_links else (str(template_links) if template_links else None)
-        
-        prospect_links = f.get(prospect_link_key) or []
-        prospect_id = str(prospect_links[0]) if isinstance(prospect_links, list) and prospect_links else (str(prospect_links) if prospect_links else None)
-
-        # Infer stage and intent for outbound messages
-        # For campaign outreach, typically Stage 1 (initial contact)
-        stage = "Stage 1"
-        ai_intent = "campaign_outreach" if campaign_id else "outbound_follow_up"
 
         # Validate phone
         if not phone:
-            _safe_update(
-                drip_tbl,
-                rid,
-                {
-                    "STATUS": "Queued",
-                    "UI": "⏳",
-                    "LAST_ERROR": "invalid_phone",
-                    "NEXT_SEND_DATE": _iso(now + timedelta(seconds=REQUEUE_SOFT_ERROR_SECONDS)),
-                },
-            )
+            _requeue(writes, rid, "invalid_phone", now + timedelta(seconds=REQUEUE_SOFT_ERROR_SECONDS))
             total_failed += 1
             continue
 
+        # Recipient send window (seller's local time); off-window rows move to their next opening
+        open_now, opens_at, _tz = window.check(phone, market, now)
+        if not open_now:
+            _requeue(writes, rid, "quiet_hours", opens_at)
+            deferred_quiet += 1
+            continue
+
         # Validate body
         if not body:
-            _safe_update(
-                drip_tbl,
-                rid,
-                {
-                    "STATUS": "Queued",
-                    "UI": "⏳",
-                    "LAST_ERROR": "empty_message",
-                    "NEXT_SEND_DATE": _iso(now + timedelta(seconds=REQUEUE_SOFT_ERROR_SECONDS)),
-                },
-            )
+            _requeue(writes, rid, "empty_message", now + timedelta(seconds=REQUEUE_SOFT_ERROR_SECONDS))
             total_failed += 1
             continue
 
@@ -587,147 +990,92 @@ def send_batch(campaign_id: Optional[str] = None, limit: int = 500) -> Dict[str,
         if SUPPRESS_DUPLICATE_PHONES:
             key = (phone, str(property_id or ""))
             if key in seen:
-                _safe_update(
-                    drip_tbl,
-                    rid,
-                    {
-                        "STATUS": "Queued",
-                        "UI": "⏳",
-                        "LAST_ERROR": "duplicate_suppressed",
-                        "NEXT_SEND_DATE": _iso(now + timedelta(hours=24)),
-                    },
-                )
+                _requeue(writes, rid, "duplicate_suppressed", now + timedelta(hours=24))
                 total_failed += 1
                 continue
             seen.add(key)
 
         # Ensure DID
         if not did and AUTO_BACKFILL_FROM_NUMBER:
-            did = _pick_number_for_market(market)
-            did = _to_e164(did) if did else None
-            
+            market_key_norm = str(market or "").strip().lower()
+            if market_key_norm not in picked_by_market:
+                picked = _pick_number_for_market(market)
+                picked_by_market[market_key_norm] = _to_e164(picked) if picked else None
+            did = picked_by_market[market_key_norm]
+
             # If number picking failed, use DEFAULT_FROM_NUMBER as fallback
             if not did and DEFAULT_FROM_NUMBER:
                 did = _to_e164(DEFAULT_FROM_NUMBER)
                 log.info(f"Using DEFAULT_FROM_NUMBER fallback: {did}")
-            
+
             if did:
-                _safe_update(drip_tbl, rid, {"FROM_NUMBER": did})
+                writes.update(rid, {"FROM_NUMBER": did})
 
         if not did:
-            _safe_update(
-                drip_tbl,
-                rid,
-                {
-                    "STATUS": "Queued",
-                    "UI": "⏳",
-                    "LAST_ERROR": "no_did",
-                    "NEXT_SEND_DATE": _iso(now + timedelta(seconds=NO_NUMBER_REQUEUE_SECONDS)),
-                },
-            )
+            _requeue(writes, rid, "no_did", now + timedelta(seconds=NO_NUMBER_REQUEUE_SECONDS))
             total_failed += 1
             continue
 
-        # Rate limit
-        if not limiter.try_consume(did):
-            _safe_update(
-                drip_tbl,
-                rid,
-                {
-                    "STATUS": "Queued",
-                    "UI": "⏳",
-                    "LAST_ERROR": "rate_limited",
-                    "NEXT_SEND_DATE": _iso(now + timedelta(seconds=RATE_LIMIT_REQUEUE_SECONDS)),
-                },
-            )
-            continue
-
-        # Transition to SENDING
-        _safe_update(drip_tbl, rid, {"STATUS": "Sending", "UI": "⏳"})
-
-        delivered = False
-        # Extract prospect ID for updates
+        # Infer stage and intent for outbound messages
+        # For campaign outreach, typically Stage 1 (initial contact)
         prospect_id = _extract_prospect_id_from_drip(r)
+        metadata: Dict[str, Any] = {
+            "stage": "Stage 1",
+            "ai_intent": "campaign_outreach" if row_campaign_id else "outbound_follow_up",
+        }
+        if prospect_id:
+            metadata["prospect_id"] = prospect_id
 
-        try:
-            if MessageProcessor is None:
-                raise RuntimeError("no_sender_available")
-            
-            # Build metadata with stage, intent, and prospect_id
-            metadata = {
-                "stage": stage,
-                "ai_intent": ai_intent,
-            }
-            if prospect_id:
-                metadata["prospect_id"] = prospect_id
-                
-            res = MessageProcessor.send(  # type: ignore[attr-defined]
+        jobs.append(
+            _SendJob(
+                rid=rid,
                 phone=phone,
                 body=body,
-                from_number=did,
-                campaign_id=campaign_id,
-                template_id=template_id,
-                drip_queue_id=rid,
+                did=did,
                 property_id=property_id,
-                direction="OUT",
+                campaign_id=row_campaign_id,
+                template_id=template_id,
+                prospect_id=prospect_id,
                 metadata=metadata,
             )
-            delivered = bool(res and str(res.get("status", "")).lower() in {"sent", "delivered"})
-        except Exception as e:  # pragma: no cover
-            errors.append(str(e))
-            delivered = False
-
+        )
+
+    # Rate limit: one reservation per DID, taken in order before anything is in flight
+    by_did: Dict[str, List[_SendJob]] = {}
+    for job in jobs:
+        by_did.setdefault(job.did, []).append(job)
+    admitted: set[str] = set()
+    for did, group in by_did.items():
+        granted = limiter.consume(did, len(group))
+        admitted.update(job.rid for job in group[:granted])
+        for job in group[granted:]:
+            _requeue(writes, job.rid, "rate_limited", now + timedelta(seconds=RATE_LIMIT_REQUEUE_SECONDS))
+    jobs = [job for job in jobs if job.rid in admitted]
+
+    timings["prepare"] = round(time.perf_counter() - t_prepare, 3)
+
+    workers = SEND_WORKERS if workers is None else int(workers)
+    if workers > 1 and len(jobs) > 1:
+        outcomes = _send_pipelined(jobs, writes, prospects_tbl, now, workers, timings)
+    else:
+        outcomes = _send_sequential(jobs, writes, prospects_tbl, now, timings)
+
+    t_flush = time.perf_counter()
+    drip_write_stats = writes.flush()
+    timings["drip_flush"] = round(time.perf_counter() - t_flush, 3)
+    OUTBOX.ack(rid for rid in to_ack + [job.rid for job in jobs] if rid not in writes.failed_ids)
+
+    for delivered, err in outcomes:
+        if err == OUTBOX_BLOCKED:
+            continue
         if delivered:
             total_sent += 1
-            _safe_update(
-                drip_tbl,
-                rid,
-                {
-                    "STATUS": "Sent",
-                    "UI": "✅",
-                    "SENT_AT": _iso(utcnow()),
-                    "LAST_ERROR": "",
-                },
-            )
-            try:
-                increment_sent(did)
-            except Exception:
-                pass
-            try:
-                log_kpi("OUTBOUND_SENT", 1, campaign=campaign_id or "ALL")
-            except Exception as kpi_exc:
-                log.warning(f"KPI logging skipped: {kpi_exc}")
-            
-            # Update prospect with outbound data
-            try:
-                _safe_update_prospect_outbound(
-                    prospects_tbl=prospects_tbl,
-                    prospect_id=prospect_id,
-                    phone=phone,
-                    body=body,
-                    textgrid_phone=did
-                )
-            except Exception as prospect_exc:
-                log.warning(f"Prospect update skipped: {prospect_exc}")
         else:
             total_failed += 1
-            _safe_update(
-                drip_tbl,
-                rid,
-                {
-                    "STATUS": "Queued",
-                    "UI": "⏳",
-                    "LAST_ERROR": "send_failed",
-                    "NEXT_SEND_DATE": _iso(now + timedelta(seconds=REQUEUE_SOFT_ERROR_SECONDS)),
-                },
-            )
-            try:
-                log_kpi("OUTBOUND_FAILED_SOFT", 1)
-            except Exception as kpi_exc:
-                log.warning(f"KPI logging skipped: {kpi_exc}")
+        if err:
+            errors.append(err)
 
-        if SLEEP_BETWEEN_SENDS_SEC > 0:
-            time.sleep(SLEEP_BETWEEN_SENDS_SEC)
+    timings["total"] = round(time.perf_counter() - t_start, 3)
 
     # Telemetry
     attempts = total_sent + total_failed
@@ -737,11 +1085,26 @@ def send_batch(campaign_id: Optional[str] = None, limit: int = 500) -> Dict[str,
     except Exception as kpi_exc:
         log.warning(f"KPI logging skipped: {kpi_exc}")
     log_run("OUTBOUND_BATCH", processed=total_sent, breakdown={
-        "sent": total_sent, "failed": total_failed, "errors": len(errors)
+        "sent": total_sent, "failed": total_failed, "deferred_quiet": deferred_quiet,
+        "outbox_reconciled": len(to_ack), "outbox_unconfirmed": unconfirmed,
+        "errors": len(errors), "timings": timings,
     })
-    log.info(f"✅ Batch complete — sent={total_sent}, failed={total_failed}, rate={delivery_rate:.1f}%")
+    log.info(
+        f"✅ Batch complete — sent={total_sent}, failed={total_failed}, rate={delivery_rate:.1f}%, "
+        f"workers={max(1, workers)}, total={timings['total']}s"
+    )
 
-    return {"ok": True, "total_sent": total_sent, "total_failed": total_failed, "errors": errors}
+    return {
+        "ok": True,
+        "total_sent": total_sent,
+        "total_failed": total_failed,
+        "deferred_quiet": deferred_quiet,
+        "outbox_unconfirmed": unconfirmed,
+        "errors": errors,
+        "workers": max(1, workers),
+        "timings": timings,
+        "drip_writes": drip_write_stats,
+    }
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Campaign-level queuing interface
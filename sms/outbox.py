@@ -0,0 +1,257 @@
+"""
+📮 Send Outbox
+──────────────
+Local write-ahead log for outbound drip sends, so a crash between the TextGrid POST and the
+Drip Queue "Sent" update can't turn into a second text.
+
+- `begin()` records the intent (drip id, phone, DID, body hash) *before* the provider call;
+  a drip row with an open or sent entry is never handed to the provider again
+- `record()` stores the provider outcome (SID, sent / failed) as soon as the call returns
+- `ack()` marks entries whose Drip Queue update reached Airtable; only acked entries are done
+- `reconcile()` replays unacknowledged entries on the next batch: sent → re-apply "Sent",
+  failed → requeue, intent-only (crashed mid-call) → ask the provider's message list; when the
+  provider can't answer the row stays blocked rather than being sent blind
+- Stored in SQLite (WAL) under SMS_STATE_DIR; acked entries expire after OUTBOX_RETENTION_DAYS
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sms.runtime import get_logger, state_path
+
+logger = get_logger("outbox")
+
+# =========================
+# ENV / CONFIG
+# =========================
+OUTBOX_PATH = os.getenv("OUTBOX_PATH") or ""
+OUTBOX_INTENT_GRACE_SEC = float(os.getenv("OUTBOX_INTENT_GRACE_SEC", "120"))
+OUTBOX_LOOKUP_SKEW_SEC = float(os.getenv("OUTBOX_LOOKUP_SKEW_SEC", "300"))
+OUTBOX_RETENTION_DAYS = float(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+
+INTENT, SENT, FAILED = "intent", "sent", "failed"
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS entries ("
+    " drip_id TEXT PRIMARY KEY, phone TEXT, did TEXT, body_hash TEXT, state TEXT NOT NULL,"
+    " sid TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 1, acked INTEGER NOT NULL DEFAULT 0,"
+    " created_at REAL NOT NULL, updated_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS entries_unacked ON entries (acked, state)",
+)
+
+_COLUMNS = ("drip_id", "phone", "did", "body_hash", "state", "sid", "error", "attempts", "acked", "created_at", "updated_at")
+
+# entry → (sent?, sid), or None when the provider can't tell
+Lookup = Callable[[Dict[str, Any]], Optional[Tuple[bool, Optional[str]]]]
+
+
+def body_hash(body: Any) -> str:
+    return hashlib.sha1(str(body or "").strip().encode("utf-8")).hexdigest()
+
+
+def _provider_time(value: Any) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(str(value)).timestamp()  # RFC 2822 ("Tue, 14 Oct 2025 ...")
+    except Exception:
+        pass
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except Exception:
+        return None
+
+
+def provider_lookup(entry: Dict[str, Any]) -> Optional[Tuple[bool, Optional[str]]]:
+    """Look for the entry's message in TextGrid's message list (same To/From/body, sent after the intent)."""
+    from sms.textgrid_sender import find_messages
+
+    since = entry["created_at"] - OUTBOX_LOOKUP_SKEW_SEC
+    messages = find_messages(
+        to=entry["phone"], from_number=entry["did"], since=datetime.fromtimestamp(since, timezone.utc)
+    )
+    if messages is None:
+        return None
+    for msg in messages:
+        if body_hash(msg.get("body")) != entry["body_hash"]:
+            continue
+        if str(msg.get("status") or "").lower() == "failed":
+            continue
+        sent_at = _provider_time(msg.get("date_created") or msg.get("date_sent"))
+        if sent_at is not None and sent_at < since:
+            continue
+        return True, msg.get("sid")
+    return False, None
+
+
+# =========================
+# Store
+# =========================
+class Outbox:
+    """SQLite write-ahead log of drip sends: intent → sent | failed → acked."""
+
+    def __init__(self, path: Optional[str] = None, lookup: Optional[Lookup] = None):
+        self.path = path or OUTBOX_PATH
+        self.lookup: Lookup = lookup or provider_lookup
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.stats: Dict[str, int] = {
+            "begun": 0, "blocked": 0, "sent": 0, "failed": 0, "acked": 0,
+            "reconciled_sent": 0, "reconciled_failed": 0, "unconfirmed": 0, "pruned": 0,
+        }
+
+    # ---------- storage ----------
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path = self.path or state_path("outbox.sqlite3")
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")  # an intent must survive a power cut, not just a crash
+            for stmt in _SCHEMA:
+                conn.execute(stmt)
+            self._conn = conn
+        return self._conn
+
+    def _rows(self, sql: str, args: Tuple[Any, ...] = ()) -> List[Dict[str, Any]]:
+        rows = self._db().execute(f"SELECT {', '.join(_COLUMNS)} FROM entries {sql}", args).fetchall()
+        return [dict(zip(_COLUMNS, row)) for row in rows]
+
+    # ---------- send path ----------
+    def begin(self, drip_id: str, phone: str, did: Optional[str], body: str) -> bool:
+        """Record the intent to send. False → an open or sent entry exists; do not call the provider."""
+        now = time.time()
+        with self._lock:
+            cur = self._db().execute(
+                "INSERT INTO entries (drip_id, phone, did, body_hash, state, created_at, updated_at)"
+                " VALUES (?,?,?,?,?,?,?) ON CONFLICT(drip_id) DO UPDATE SET"
+                " phone=excluded.phone, did=excluded.did, body_hash=excluded.body_hash, state=excluded.state,"
+                " sid=NULL, error=NULL, attempts=entries.attempts + 1, acked=0,"
+                " created_at=excluded.created_at, updated_at=excluded.updated_at"
+                " WHERE entries.state = ?",
+                (drip_id, phone, did, body_hash(body), INTENT, now, now, FAILED),
+            )
+        ok = cur.rowcount > 0
+        self.stats["begun" if ok else "blocked"] += 1
+        return ok
+
+    def record(self, drip_id: str, *, ok: bool, sid: Optional[str] = None, error: Optional[str] = None) -> None:
+        """Store the provider outcome for an open intent."""
+        with self._lock:
+            self._db().execute(
+                "UPDATE entries SET state=?, sid=COALESCE(?, sid), error=?, updated_at=? WHERE drip_id=? AND state=?",
+                (SENT if ok else FAILED, sid, error, time.time(), drip_id, INTENT),
+            )
+        self.stats["sent" if ok else "failed"] += 1
+
+    def ack(self, drip_ids: Iterable[str]) -> int:
+        """Drip Queue update for these entries is in Airtable → nothing left to replay."""
+        ids = [(d,) for d in drip_ids if d]
+        if not ids:
+            return 0
+        with self._lock:
+            db = self._db()
+            before = db.total_changes
+            db.executemany("UPDATE entries SET acked=1 WHERE drip_id=? AND state != 'intent' AND acked=0", ids)
+            n = db.total_changes - before
+        self.stats["acked"] += n
+        return n
+
+    def release(self, drip_id: str) -> bool:
+        """Operator override: treat an unconfirmed send as failed so the row may be sent again."""
+        with self._lock:
+            cur = self._db().execute(
+                "UPDATE entries SET state=?, error='released', updated_at=? WHERE drip_id=? AND state=?",
+                (FAILED, time.time(), drip_id, INTENT),
+            )
+        return cur.rowcount > 0
+
+    # ---------- recovery ----------
+    def blocked(self, drip_ids: Iterable[str]) -> Set[str]:
+        """Drip ids that must not be sent: an intent is open or the message already went out."""
+        ids = [d for d in drip_ids if d]
+        out: Set[str] = set()
+        with self._lock:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                out.update(
+                    r[0] for r in self._db().execute(
+                        f"SELECT drip_id FROM entries WHERE drip_id IN ({marks}) AND state IN (?, ?)", (*chunk, INTENT, SENT)
+                    )
+                )
+        return out
+
+    def reconcile(self, due: Iterable[str] = (), now: Optional[float] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Settle entries whose Drip Queue update may be missing: every unacked entry, plus sent entries
+        whose row is due again (Airtable lost the "Sent"). Intents younger than OUTBOX_INTENT_GRACE_SEC
+        may still be in flight and are left alone. Returns entries grouped as sent / failed / unconfirmed;
+        the caller writes the Drip Queue and acks sent + failed once the writes are flushed.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            entries = self._rows("WHERE acked=0")
+            seen = {e["drip_id"] for e in entries}
+            stale_sent = self.blocked(d for d in due if d not in seen)
+            if stale_sent:
+                marks = ",".join("?" * len(stale_sent))
+                entries += self._rows(f"WHERE drip_id IN ({marks}) AND state=?", (*stale_sent, SENT))
+
+        out: Dict[str, List[Dict[str, Any]]] = {SENT: [], FAILED: [], "unconfirmed": []}
+        for entry in entries:
+            if entry["state"] != INTENT:
+                out[entry["state"]].append(entry)
+                continue
+            if now - entry["updated_at"] < OUTBOX_INTENT_GRACE_SEC:
+                continue
+            try:
+                found = self.lookup(entry)
+            except Exception as exc:
+                logger.warning(f"⚠️ Outbox lookup failed for {entry['drip_id']}: {exc}")
+                found = None
+            if found is None:
+                out["unconfirmed"].append(entry)
+                self.stats["unconfirmed"] += 1
+                continue
+            sent, sid = found
+            self.record(entry["drip_id"], ok=sent, sid=sid, error=None if sent else "not_found_at_provider")
+            entry.update(state=SENT if sent else FAILED, sid=sid or entry["sid"])
+            out[entry["state"]].append(entry)
+            self.stats["reconciled_sent" if sent else "reconciled_failed"] += 1
+        if any(out.values()):
+            logger.info(
+                f"📮 Outbox reconcile: sent={len(out[SENT])} failed={len(out[FAILED])} "
+                f"unconfirmed={len(out['unconfirmed'])}"
+            )
+        self.prune(now)
+        return out
+
+    def prune(self, now: Optional[float] = None) -> int:
+        cutoff = (time.time() if now is None else now) - OUTBOX_RETENTION_DAYS * 86400
+        with self._lock:
+            n = self._db().execute("DELETE FROM entries WHERE acked=1 AND updated_at < ?", (cutoff,)).rowcount
+        self.stats["pruned"] += n
+        return n
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._db().execute("SELECT state, acked, COUNT(*) FROM entries GROUP BY state, acked").fetchall()
+            oldest = self._db().execute("SELECT MIN(updated_at) FROM entries WHERE acked=0").fetchone()[0]
+        counts = {f"{state}{'' if acked else '_unacked'}": n for state, acked, n in rows}
+        return {
+            "path": self.path,
+            "entries": counts,
+            "oldest_unacked_age_sec": round(time.time() - oldest, 1) if oldest else None,
+            **self.stats,
+        }
+
+
+OUTBOX = Outbox()
@@ -0,0 +1,403 @@
+"""
+📇 Phone Index
+──────────────
+Persistent last-10-digits → record-id index for Leads / Prospects.
+
+- One paged sweep builds the index (phone columns only via `fields=` projection), on a
+  background thread (startup warm or first lookup); lookups scan until it completes
+- The sweep checkpoints its Airtable page offset after every page, so an interrupted sweep
+  resumes instead of starting over
+- Incremental refreshes only pull rows whose LAST_MODIFIED_TIME() is past the high-water mark,
+  outside the index lock (one pull per table at a time; failures back off before retrying)
+- Stored in SQLite (WAL) under SMS_STATE_DIR, so restarts reuse the index
+- Lookups are a primary-key read + one `get`, instead of a full table scan
+- Tables without a base id (tests / in-memory) fall back to the legacy linear scan
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sms.config import PHONE_FIELDS
+from sms.datastore import LEAD_FIELDS, LEGACY_PHONE_COLUMNS, PROSPECT_PHONE_COLUMNS, iter_records
+from sms.runtime import get_logger, last_10_digits, state_path
+
+logger = get_logger("phone_index")
+
+# =========================
+# ENV / CONFIG
+# =========================
+PHONE_INDEX_PATH = os.getenv("PHONE_INDEX_PATH") or ""
+PHONE_INDEX_REFRESH_SEC = float(os.getenv("PHONE_INDEX_REFRESH_SEC", "60"))
+PHONE_INDEX_MISS_REFRESH_SEC = float(os.getenv("PHONE_INDEX_MISS_REFRESH_SEC", "15"))
+PHONE_INDEX_SKEW_SEC = int(os.getenv("PHONE_INDEX_SKEW_SEC", "5"))
+PHONE_INDEX_SWEEP_RETRY_SEC = float(os.getenv("PHONE_INDEX_SWEEP_RETRY_SEC", "30"))
+PHONE_INDEX_REFRESH_RETRY_SEC = float(os.getenv("PHONE_INDEX_REFRESH_RETRY_SEC", "30"))
+PAGE_SIZE = 100
+
+# Every phone-like column we know about, in priority order (first match wins on sweep).
+INDEX_COLUMNS: List[str] = list(
+    dict.fromkeys(
+        [
+            *PROSPECT_PHONE_COLUMNS,
+            *LEGACY_PHONE_COLUMNS,
+            LEAD_FIELDS.get("PHONE", "phone"),
+            *PHONE_FIELDS,
+        ]
+    )
+)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS phone_index ("
+    " tbl TEXT NOT NULL, digits TEXT NOT NULL, record_id TEXT NOT NULL,"
+    " PRIMARY KEY (tbl, digits))",
+    "CREATE INDEX IF NOT EXISTS phone_index_record ON phone_index (tbl, record_id)",
+    "CREATE TABLE IF NOT EXISTS sync_state ("
+    " tbl TEXT PRIMARY KEY, high_water TEXT, swept_at TEXT, sweep_started TEXT, sweep_offset TEXT)",
+)
+
+
+# =========================
+# Helpers
+# =========================
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _iso(dt: datetime) -> str:
+    return dt.replace(microsecond=0).isoformat().replace("+00:00", "Z")
+
+
+def _resolve_table(obj: Any) -> Any:
+    """Accept a pyairtable Table, a datastore TableHandle or an autoresponder TableFacade."""
+    handle = getattr(obj, "handle", None)
+    if handle is not None:
+        obj = handle
+    if getattr(obj, "in_memory", False):
+        return None
+    return getattr(obj, "table", obj)
+
+
+def _table_key(tbl: Any) -> Optional[str]:
+    base = getattr(getattr(tbl, "base", None), "id", None)
+    name = getattr(tbl, "name", None)
+    if not (isinstance(base, str) and isinstance(name, str) and hasattr(tbl, "get")):
+        return None
+    return f"{base}/{name}"
+
+
+def _record_digits(fields: Dict[str, Any], columns: Iterable[str]) -> List[str]:
+    out: List[str] = []
+    for col in columns:
+        d = last_10_digits(fields.get(col))
+        if d and d not in out:
+            out.append(d)
+    return out
+
+
+def _scan(obj: Any, phone: str, columns: Iterable[str]) -> Optional[Dict[str, Any]]:
+    """Legacy O(n) fallback for tables the index can't identify."""
+    want = last_10_digits(phone)
+    if not want or obj is None:
+        return None
+    cols = [c for c in columns if c]
+    for rec in iter_records(obj, fields=cols, strict=False):  # stops downloading at the first match
+        fields = rec.get("fields", {}) or {}
+        for col in cols:
+            if last_10_digits(fields.get(col)) == want:
+                return rec
+    return None
+
+
+# =========================
+# Index
+# =========================
+class PhoneIndex:
+    """SQLite-backed phone → record index shared by inbound + autoresponder."""
+
+    def __init__(self, path: Optional[str] = None, columns: Optional[List[str]] = None):
+        self.path = path or PHONE_INDEX_PATH
+        self.columns = list(columns or INDEX_COLUMNS)
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._last_refresh: Dict[str, float] = {}
+        self._sweepers: Dict[str, threading.Thread] = {}
+        self._sweep_retry_at: Dict[str, float] = {}
+        self._refreshing: Set[str] = set()
+        self._refresh_retry_at: Dict[str, float] = {}
+        self.stats: Dict[str, int] = {
+            "hits": 0, "misses": 0, "scans": 0, "sweeps": 0, "sweep_errors": 0,
+            "refreshes": 0, "refresh_errors": 0, "rows_synced": 0, "stale": 0,
+        }
+
+    # ---------- storage ----------
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path = self.path or state_path("phone_index.sqlite3")
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for stmt in _SCHEMA:
+                conn.execute(stmt)
+            have = {row[1] for row in conn.execute("PRAGMA table_info(sync_state)")}
+            for col in ("sweep_started", "sweep_offset"):  # indexes created before checkpoints
+                if col not in have:
+                    conn.execute(f"ALTER TABLE sync_state ADD COLUMN {col} TEXT")
+            self._conn = conn
+        return self._conn
+
+    def _state(self, key: str) -> Optional[str]:
+        """High-water mark once the first sweep has completed, else None."""
+        row = self._db().execute("SELECT high_water FROM sync_state WHERE tbl=?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _store(self, key: str, records: Iterable[Dict[str, Any]], *, replace: bool) -> int:
+        n = 0
+        db = self._db()
+        db.execute("BEGIN")
+        try:
+            for rec in records:
+                rid = rec.get("id")
+                if not rid:
+                    continue
+                if replace:
+                    db.execute("DELETE FROM phone_index WHERE tbl=? AND record_id=?", (key, rid))
+                for d in _record_digits(rec.get("fields", {}) or {}, self.columns):
+                    db.execute("INSERT OR IGNORE INTO phone_index (tbl, digits, record_id) VALUES (?,?,?)", (key, d, rid))
+                n += 1
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return n
+
+    # ---------- sync ----------
+    def _pages(self, tbl: Any, formula: Optional[str]) -> Iterator[List[Dict[str, Any]]]:
+        opts: Dict[str, Any] = {"page_size": PAGE_SIZE, "fields": self.columns}
+        if formula:
+            opts["formula"] = formula
+        try:
+            yield from tbl.iterate(**opts)
+        except Exception as exc:
+            # Unknown projected columns → retry without projection
+            if "UNKNOWN_FIELD_NAME" not in str(exc):
+                raise
+            opts.pop("fields", None)
+            yield from tbl.iterate(**opts)
+
+    def _sweep_pages(self, tbl: Any, offset: Optional[str]) -> Iterator[Tuple[List[Dict[str, Any]], Optional[str]]]:
+        """Full-sweep pages, each paired with the offset that resumes right after it."""
+        api, url = getattr(tbl, "api", None), getattr(tbl, "url", None)
+        if not (callable(getattr(api, "iterate_requests", None)) and isinstance(url, str)):
+            # Table-likes without raw paging: plain iterate(), no checkpoint
+            for page in self._pages(tbl, None):
+                yield page, None
+            return
+        options: Dict[str, Any] = {"page_size": PAGE_SIZE, "fields": self.columns}
+        while True:
+            try:
+                for resp in api.iterate_requests(
+                    method="get",
+                    url=url,
+                    fallback=("post", f"{url}/listRecords"),
+                    options=options,
+                    params={"offset": offset} if offset else None,
+                ):
+                    offset = resp.get("offset")
+                    yield resp.get("records", []), offset
+                return
+            except Exception as exc:
+                msg = str(exc)
+                if "UNKNOWN_FIELD_NAME" in msg and "fields" in options:
+                    options.pop("fields")  # unknown projected column → sweep unprojected from the top
+                elif "LIST_RECORDS_ITERATOR_NOT_AVAILABLE" not in msg or not offset:
+                    raise
+                offset = None  # checkpoint expired on Airtable's side → start over (rows already stored stay)
+
+    def _sweep(self, tbl: Any, key: str) -> int:
+        """First full sweep, checkpointed per page. Runs on a sweeper thread, never under a lookup."""
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT sweep_started, sweep_offset FROM sync_state WHERE tbl=?", (key,)).fetchone()
+            started, offset = row if row and row[0] else (_iso(_utcnow()), None)
+            db.execute(
+                "INSERT INTO sync_state (tbl, sweep_started) VALUES (?,?) "
+                "ON CONFLICT(tbl) DO UPDATE SET sweep_started=excluded.sweep_started",
+                (key, started),
+            )
+        if offset:
+            logger.info(f"📇 Resuming sweep {key} from checkpoint")
+        total = 0
+        for page, next_offset in self._sweep_pages(tbl, offset):
+            with self._lock:
+                total += self._store(key, page, replace=False)
+                self._db().execute("UPDATE sync_state SET sweep_offset=? WHERE tbl=?", (next_offset, key))
+        # Changes made while the sweep ran (however long, across restarts) are caught by the delta pulls
+        mark = _iso(datetime.fromisoformat(started.replace("Z", "+00:00")) - timedelta(seconds=PHONE_INDEX_SKEW_SEC))
+        with self._lock:
+            self._db().execute(
+                "UPDATE sync_state SET high_water=?, swept_at=?, sweep_started=NULL, sweep_offset=NULL WHERE tbl=?",
+                (mark, _iso(_utcnow()), key),
+            )
+            self._last_refresh[key] = time.time()
+            self.stats["sweeps"] += 1
+            self.stats["rows_synced"] += total
+        logger.info(f"📇 Sweep {key}: {total} rows")
+        return total
+
+    def _run_sweep(self, tbl: Any, key: str) -> None:
+        try:
+            self._sweep(tbl, key)
+        except Exception as exc:
+            with self._lock:
+                self.stats["sweep_errors"] += 1
+                self._sweep_retry_at[key] = time.time() + PHONE_INDEX_SWEEP_RETRY_SEC
+            logger.warning(f"📇 Sweep {key} interrupted, resumes from its checkpoint: {exc}")
+
+    def _sync(self, tbl: Any, key: str) -> int:
+        """Incremental refresh: rows modified since the high-water mark. Pulls outside the lock."""
+        started = _utcnow()
+        with self._lock:
+            high_water = self._state(key)
+        formula = f"IS_AFTER(LAST_MODIFIED_TIME(), DATETIME_PARSE('{high_water}'))"
+        total = 0
+        for page in self._pages(tbl, formula):
+            with self._lock:
+                total += self._store(key, page, replace=True)
+        mark = _iso(started - timedelta(seconds=PHONE_INDEX_SKEW_SEC))
+        with self._lock:
+            self._db().execute("UPDATE sync_state SET high_water=? WHERE tbl=?", (mark, key))
+            self._last_refresh[key] = time.time()
+            self.stats["refreshes"] += 1
+            self.stats["rows_synced"] += total
+        logger.info(f"📇 Refresh {key}: {total} rows")
+        return total
+
+    def warm(self, obj: Any, *, wait: bool = False) -> bool:
+        """Start (or resume) the first sweep in the background. True once the table is fully indexed."""
+        tbl = _resolve_table(obj)
+        key = _table_key(tbl)
+        if not key:
+            return False
+        with self._lock:
+            if self._state(key) is not None:
+                return True
+            sweeper = self._sweepers.get(key)
+            if not (sweeper and sweeper.is_alive()) and time.time() >= self._sweep_retry_at.get(key, 0.0):
+                sweeper = threading.Thread(target=self._run_sweep, args=(tbl, key), name=f"phone-index-sweep:{key}", daemon=True)
+                self._sweepers[key] = sweeper
+                sweeper.start()
+        if wait and sweeper:
+            sweeper.join()
+        with self._lock:
+            return self._state(key) is not None
+
+    def ensure(self, obj: Any, *, max_age: float = PHONE_INDEX_REFRESH_SEC) -> bool:
+        """Incrementally refresh a swept table's index. False if not indexable, or still sweeping.
+
+        Only one caller per table pulls; others (and everyone during a failure backoff) read the
+        index as it stands instead of waiting on the network.
+        """
+        tbl = _resolve_table(obj)
+        key = _table_key(tbl)
+        if not key or not self.warm(tbl):
+            return False
+        now = time.time()
+        with self._lock:
+            if (
+                key in self._refreshing
+                or now - self._last_refresh.get(key, 0.0) < max_age
+                or now < self._refresh_retry_at.get(key, 0.0)
+            ):
+                return True
+            self._refreshing.add(key)
+        try:
+            self._sync(tbl, key)
+        except Exception as exc:
+            with self._lock:
+                self.stats["refresh_errors"] += 1
+                self._refresh_retry_at[key] = time.time() + PHONE_INDEX_REFRESH_RETRY_SEC
+            logger.warning(f"📇 Refresh {key} failed, serving the current index: {exc}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+        return True
+
+    # ---------- public API ----------
+    def lookup_id(self, obj: Any, phone: str) -> Optional[str]:
+        tbl = _resolve_table(obj)
+        key = _table_key(tbl)
+        d = last_10_digits(phone)
+        if not (key and d):
+            return None
+        with self._lock:
+            row = self._db().execute("SELECT record_id FROM phone_index WHERE tbl=? AND digits=?", (key, d)).fetchone()
+        return row[0] if row else None
+
+    def find(self, obj: Any, phone: str, fallback_columns: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+        """Return the record for `phone`, or None. O(1) for indexable tables."""
+        if not last_10_digits(phone):
+            return None
+        if not self.ensure(obj):
+            self.stats["scans"] += 1
+            return _scan(obj, phone, fallback_columns or self.columns)
+
+        rid = self.lookup_id(obj, phone)
+        if not rid:
+            # Newly created rows: one cheap delta pull, throttled so misses stay free
+            self.ensure(obj, max_age=PHONE_INDEX_MISS_REFRESH_SEC)
+            rid = self.lookup_id(obj, phone)
+        if not rid:
+            self.stats["misses"] += 1
+            return None
+
+        tbl = _resolve_table(obj)
+        try:
+            rec = tbl.get(rid)
+        except Exception:
+            rec = None
+        if not rec or last_10_digits(phone) not in _record_digits(rec.get("fields", {}) or {}, self.columns):
+            # Deleted or re-numbered since indexing → drop the stale entry
+            self.forget(obj, phone)
+            self.stats["stale"] += 1
+            return None
+        self.stats["hits"] += 1
+        return rec
+
+    def remember(self, obj: Any, phone: str, record_id: str) -> None:
+        """Record a freshly created row without waiting for the next refresh."""
+        key = _table_key(_resolve_table(obj))
+        d = last_10_digits(phone)
+        if not (key and d and record_id):
+            return
+        with self._lock:
+            self._db().execute("INSERT OR IGNORE INTO phone_index (tbl, digits, record_id) VALUES (?,?,?)", (key, d, record_id))
+
+    def forget(self, obj: Any, phone: str) -> None:
+        key = _table_key(_resolve_table(obj))
+        d = last_10_digits(phone)
+        if not (key and d):
+            return
+        with self._lock:
+            self._db().execute("DELETE FROM phone_index WHERE tbl=? AND digits=?", (key, d))
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT s.tbl, s.high_water, s.swept_at, COUNT(p.digits) FROM sync_state s "
+                "LEFT JOIN phone_index p ON p.tbl = s.tbl GROUP BY s.tbl"
+            ).fetchall()
+        return {
+            "path": self.path,
+            "tables": {t: {"high_water": hw, "swept_at": sw, "entries": n} for t, hw, sw, n in rows},
+            "sweeping": sorted(k for k, t in self._sweepers.items() if t.is_alive()),
+            **self.stats,
+        }
+
+
+PHONE_INDEX = PhoneIndex()
@@ -0,0 +1,490 @@
+"""
+🪞 Airtable Read Replica
+────────────────────────
+Opt-in local copy of the read-mostly tables (Campaigns, Numbers, Templates, Drip Queue, Prospects).
+
+- SQLite (WAL) under SMS_STATE_DIR; whole records as JSON plus indexes on phone (last 10 digits),
+  status, campaign link and next-send date
+- First use of a table → one full paged sweep on a background thread (reads fall back to Airtable
+  until it completes); afterwards LAST_MODIFIED_TIME() delta pulls through sms.datastore.iter_pages,
+  with a periodic background full sweep to drop deleted rows
+- Staleness bound per table (REPLICA_STALE_<TABLE>_SEC): a read older than the bound pulls a delta
+  first; if that pull fails the read returns None and the caller queries Airtable as before
+- Airtable pulls never hold the store lock (only the per-page SQLite writes do), so a sync on one
+  table doesn't block reads or local writes on any other
+- Read-only: writes still go to Airtable; callers mirror their own writes (`upsert_local` /
+  `patch_local`) so the next read sees them before the delta pull does
+- REPLICA_ENABLED=false (default) → every read returns None, nothing is stored
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+from sms.airtable_governor import airtable_lane
+from sms.config import DRIP_FIELD_MAP, PHONE_FIELDS
+from sms.datastore import LEGACY_PHONE_COLUMNS, PROSPECT_PHONE_COLUMNS, iter_pages
+from sms.phone_index import _resolve_table, _table_key
+from sms.runtime import get_logger, last_10_digits, state_path
+
+logger = get_logger("replica")
+
+# =========================
+# ENV / CONFIG
+# =========================
+REPLICA_ENABLED = os.getenv("REPLICA_ENABLED", "false").lower() in ("1", "true", "yes")
+REPLICA_PATH = os.getenv("REPLICA_PATH") or ""
+REPLICA_STALE_SEC = float(os.getenv("REPLICA_STALE_SEC", "60"))
+REPLICA_FULL_SWEEP_SEC = float(os.getenv("REPLICA_FULL_SWEEP_SEC", "3600"))
+REPLICA_SKEW_SEC = int(os.getenv("REPLICA_SKEW_SEC", "60"))
+REPLICA_SWEEP_RETRY_SEC = float(os.getenv("REPLICA_SWEEP_RETRY_SEC", "30"))
+
+_TABLE_NAMES = {
+    "campaigns": os.getenv("CAMPAIGNS_TABLE", "Campaigns"),
+    "numbers": os.getenv("NUMBERS_TABLE", "Numbers"),
+    "templates": os.getenv("TEMPLATES_TABLE", "Templates"),
+    "drip_queue": os.getenv("DRIP_QUEUE_TABLE", "Drip Queue"),
+    "prospects": os.getenv("PROSPECTS_TABLE", "Prospects"),
+}
+REPLICA_TABLES = [
+    t.strip() for t in os.getenv("REPLICA_TABLES", ",".join(_TABLE_NAMES.values())).split(",") if t.strip()
+]
+# The send path reads Numbers / Drip Queue → tighter default bounds than Templates / Prospects
+_DEFAULT_STALE = {
+    _TABLE_NAMES["campaigns"]: 60.0,
+    _TABLE_NAMES["numbers"]: 30.0,
+    _TABLE_NAMES["templates"]: 300.0,
+    _TABLE_NAMES["drip_queue"]: 30.0,
+    _TABLE_NAMES["prospects"]: 300.0,
+}
+
+# Indexed columns (first non-empty candidate wins; every phone column is indexed)
+PHONE_COLUMNS: List[str] = list(
+    dict.fromkeys([DRIP_FIELD_MAP["SELLER_PHONE"], *PROSPECT_PHONE_COLUMNS, *LEGACY_PHONE_COLUMNS, *PHONE_FIELDS, "Number"])
+)
+STATUS_COLUMNS = ("Status", "status")
+CAMPAIGN_COLUMNS = (DRIP_FIELD_MAP["CAMPAIGN_LINK"], "Campaigns")
+NEXT_SEND_COLUMNS = (DRIP_FIELD_MAP["NEXT_SEND_AT_UTC"], DRIP_FIELD_MAP["NEXT_SEND_DATE"])
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS records ("
+    " tbl TEXT NOT NULL, id TEXT NOT NULL, fields TEXT NOT NULL, created TEXT, status TEXT, next_send TEXT,"
+    " gen INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (tbl, id))",
+    "CREATE INDEX IF NOT EXISTS records_status ON records (tbl, status)",
+    "CREATE INDEX IF NOT EXISTS records_next_send ON records (tbl, next_send)",
+    "CREATE TABLE IF NOT EXISTS phones (tbl TEXT NOT NULL, digits TEXT NOT NULL, id TEXT NOT NULL, PRIMARY KEY (tbl, digits, id))",
+    "CREATE TABLE IF NOT EXISTS campaigns (tbl TEXT NOT NULL, campaign TEXT NOT NULL, id TEXT NOT NULL,"
+    " PRIMARY KEY (tbl, campaign, id))",
+    "CREATE TABLE IF NOT EXISTS sync_state ("
+    " tbl TEXT PRIMARY KEY, name TEXT, high_water TEXT, swept_at REAL, synced_at REAL, gen INTEGER NOT NULL DEFAULT 0)",
+)
+
+
+# =========================
+# Helpers
+# =========================
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _iso(dt: datetime) -> str:
+    return dt.replace(microsecond=0).isoformat().replace("+00:00", "Z")
+
+
+def max_stale_sec(name: str) -> float:
+    """Staleness bound for a table: REPLICA_STALE_<NAME>_SEC, else the built-in default, else REPLICA_STALE_SEC."""
+    env = "REPLICA_STALE_" + re.sub(r"[^A-Z0-9]+", "_", name.upper()).strip("_") + "_SEC"
+    return float(os.getenv(env) or _DEFAULT_STALE.get(name, REPLICA_STALE_SEC))
+
+
+def _first(fields: Dict[str, Any], columns: Iterable[str]) -> Any:
+    for col in columns:
+        value = fields.get(col)
+        if value not in (None, "", []):
+            return value
+    return None
+
+
+def _links(value: Any) -> List[str]:
+    """Linked-record ids (list) or a plain text value."""
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value if v]
+    return [str(value)] if value else []
+
+
+def _as_list(value: Union[None, str, Sequence[str]]) -> List[str]:
+    if value is None:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+
+# =========================
+# Store
+# =========================
+class Replica:
+    """SQLite mirror of Airtable tables with per-table staleness bounds."""
+
+    def __init__(self, path: Optional[str] = None, enabled: Optional[bool] = None, tables: Optional[Iterable[str]] = None):
+        self.path = path or REPLICA_PATH
+        self.enabled = REPLICA_ENABLED if enabled is None else enabled
+        self.tables = set(REPLICA_TABLES if tables is None else tables)
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._seen: Dict[str, Any] = {}  # key → table object, for background refreshes
+        self._errors: Dict[str, str] = {}
+        self._delta_locks: Dict[str, threading.Lock] = {}  # one delta pull per table; readers wait on it
+        self._sweepers: Dict[str, threading.Thread] = {}
+        self._sweep_gen: Dict[str, int] = {}  # generation a running full sweep writes
+        self._sweep_retry_at: Dict[str, float] = {}
+        self.stats: Dict[str, int] = {"reads": 0, "fallbacks": 0, "sweeps": 0, "deltas": 0, "rows_synced": 0, "local_writes": 0}
+
+    # ---------- storage ----------
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path = self.path or state_path("replica.sqlite3")
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for stmt in _SCHEMA:
+                conn.execute(stmt)
+            self._conn = conn
+        return self._conn
+
+    def _put(self, key: str, rec: Dict[str, Any], gen: int) -> None:
+        """Upsert one record + its index rows. Caller holds the lock + transaction."""
+        rid = rec.get("id")
+        if not rid:
+            return
+        fields = rec.get("fields", {}) or {}
+        status = _first(fields, STATUS_COLUMNS)
+        next_send = _first(fields, NEXT_SEND_COLUMNS)
+        db = self._db()
+        db.execute(
+            "INSERT OR REPLACE INTO records (tbl, id, fields, created, status, next_send, gen) VALUES (?,?,?,?,?,?,?)",
+            (key, rid, json.dumps(fields), rec.get("createdTime"), str(status).strip().lower() if status else None,
+             str(next_send) if next_send else None, gen),
+        )
+        db.execute("DELETE FROM phones WHERE tbl=? AND id=?", (key, rid))
+        db.execute("DELETE FROM campaigns WHERE tbl=? AND id=?", (key, rid))
+        for col in PHONE_COLUMNS:
+            d = last_10_digits(fields.get(col))
+            if d:
+                db.execute("INSERT OR IGNORE INTO phones (tbl, digits, id) VALUES (?,?,?)", (key, d, rid))
+        for col in CAMPAIGN_COLUMNS:
+            for cid in _links(fields.get(col)):
+                db.execute("INSERT OR IGNORE INTO campaigns (tbl, campaign, id) VALUES (?,?,?)", (key, cid, rid))
+
+    def _state(self, key: str) -> Optional[Tuple[Optional[str], Optional[float], Optional[float], int]]:
+        return self._db().execute("SELECT high_water, swept_at, synced_at, gen FROM sync_state WHERE tbl=?", (key,)).fetchone()
+
+    def _write_gen(self, key: str, state: Optional[Tuple[Any, ...]]) -> int:
+        """Generation for rows written now: a running full sweep's, so its final cleanup keeps them."""
+        return self._sweep_gen.get(key, state[3] if state else 0)
+
+    # ---------- sync ----------
+    def _sync(self, tbl: Any, key: str, *, full: bool) -> int:
+        """Full sweep or LAST_MODIFIED_TIME() delta. Raises if Airtable fails mid-way (nothing is dropped).
+
+        Pages are fetched outside the store lock; each page is written in its own short transaction.
+        """
+        started = _utcnow()
+        with self._lock:
+            state = self._state(key)
+            if full:
+                gen = max(state[3] if state else 0, self._sweep_gen.get(key, 0)) + 1
+                self._sweep_gen[key] = gen
+        high_water = None if full or not state else state[0]
+        formula = f"IS_AFTER(LAST_MODIFIED_TIME(), DATETIME_PARSE('{high_water}'))" if high_water else None
+        total = 0
+        try:
+            for page in iter_pages(tbl, formula=formula, strict=True):
+                with self._lock:
+                    db = self._db()
+                    page_gen = gen if full else self._write_gen(key, self._state(key))
+                    db.execute("BEGIN")
+                    try:
+                        for rec in page:
+                            self._put(key, rec, page_gen)
+                        db.execute("COMMIT")
+                    except Exception:
+                        db.execute("ROLLBACK")
+                        raise
+                total += len(page)
+            now = time.time()
+            with self._lock:
+                db = self._db()
+                current = self._state(key)
+                db.execute("BEGIN")
+                try:
+                    if full:  # rows a complete sweep didn't see (and nobody wrote since) were deleted in Airtable
+                        stale = "SELECT id FROM records WHERE tbl=? AND gen<?"
+                        db.execute(f"DELETE FROM phones WHERE tbl=? AND id IN ({stale})", (key, key, gen))
+                        db.execute(f"DELETE FROM campaigns WHERE tbl=? AND id IN ({stale})", (key, key, gen))
+                        db.execute("DELETE FROM records WHERE tbl=? AND gen<?", (key, gen))
+                    db.execute(
+                        "INSERT INTO sync_state (tbl, name, high_water, swept_at, synced_at, gen) VALUES (?,?,?,?,?,?) "
+                        "ON CONFLICT(tbl) DO UPDATE SET name=excluded.name, high_water=excluded.high_water,"
+                        " swept_at=COALESCE(excluded.swept_at, sync_state.swept_at), synced_at=excluded.synced_at, gen=excluded.gen",
+                        (key, getattr(tbl, "name", None), _iso(started - timedelta(seconds=REPLICA_SKEW_SEC)),
+                         now if full else None, now, gen if full else (current[3] if current else 0)),
+                    )
+                    db.execute("COMMIT")
+                except Exception:
+                    db.execute("ROLLBACK")
+                    raise
+                self._errors.pop(key, None)
+                self.stats["sweeps" if full else "deltas"] += 1
+                self.stats["rows_synced"] += total
+        finally:
+            if full:
+                with self._lock:
+                    if self._sweep_gen.get(key) == gen:
+                        self._sweep_gen.pop(key, None)
+        logger.info(f"🪞 {'Sweep' if full else 'Delta'} {key}: {total} rows")
+        return total
+
+    def _resolve(self, obj: Any) -> Tuple[Any, Optional[str]]:
+        if not self.enabled:
+            return None, None
+        tbl = _resolve_table(obj)
+        key = _table_key(tbl)
+        if not key or getattr(tbl, "name", None) not in self.tables:
+            return tbl, None
+        return tbl, key
+
+    def _run_sweep(self, tbl: Any, key: str) -> None:
+        try:
+            self._sync(tbl, key, full=True)
+        except Exception as exc:
+            with self._lock:
+                self._errors[key] = str(exc)
+                self._sweep_retry_at[key] = time.time() + REPLICA_SWEEP_RETRY_SEC
+            logger.warning(f"⚠️ Replica sweep failed for {key}; retrying in {REPLICA_SWEEP_RETRY_SEC:.0f}s: {exc}")
+
+    def _start_sweep(self, tbl: Any, key: str) -> Optional[threading.Thread]:
+        """Start a full sweep on a background thread unless one is running or backing off. Caller holds the lock."""
+        sweeper = self._sweepers.get(key)
+        if sweeper and sweeper.is_alive():
+            return sweeper
+        if time.time() < self._sweep_retry_at.get(key, 0.0):
+            return None
+        sweeper = threading.Thread(target=self._run_sweep, args=(tbl, key), name=f"replica-sweep:{key}", daemon=True)
+        self._sweepers[key] = sweeper
+        sweeper.start()
+        return sweeper
+
+    def _delta(self, tbl: Any, key: str, fresh_within: float) -> bool:
+        """Pull a delta unless another caller just did. One pull per table; other tables aren't blocked."""
+        with self._lock:
+            lock = self._delta_locks.setdefault(key, threading.Lock())
+        with lock:
+            with self._lock:
+                state = self._state(key)
+            if state and time.time() - (state[2] or 0) < fresh_within:
+                return True  # the pull we waited on covered us
+            try:
+                self._sync(tbl, key, full=False)
+                return True
+            except Exception as exc:
+                with self._lock:
+                    self._errors[key] = str(exc)
+                logger.warning(f"⚠️ Replica sync failed for {key}; reads fall back to Airtable: {exc}")
+                return False
+
+    def warm(self, obj: Any, *, wait: bool = False) -> bool:
+        """Start the first full sweep in the background. True once the table has a complete copy."""
+        tbl, key = self._resolve(obj)
+        if not key:
+            return False
+        with self._lock:
+            self._seen[key] = tbl
+            state = self._state(key)
+            if state and state[1]:
+                return True
+            sweeper = self._start_sweep(tbl, key)
+        if wait and sweeper:
+            sweeper.join()
+        with self._lock:
+            state = self._state(key)
+        return bool(state and state[1])
+
+    def ensure(self, obj: Any) -> Optional[str]:
+        """Make the table's copy fresh within its staleness bound. Returns its key, or None (→ use Airtable)."""
+        tbl, key = self._resolve(obj)
+        if not key:
+            return None
+        if not self.warm(tbl):
+            return None  # first sweep still running in the background
+        bound = max_stale_sec(tbl.name)
+        with self._lock:
+            state = self._state(key)
+            now = time.time()
+            if state and now - (state[1] or 0) >= REPLICA_FULL_SWEEP_SEC:
+                self._start_sweep(tbl, key)  # periodic cleanup of deleted rows, off the read path
+            if state and now - (state[2] or 0) < bound:
+                return key
+        return key if self._delta(tbl, key, bound) else None
+
+    @airtable_lane("bulk")
+    def refresh(self) -> Dict[str, Any]:
+        """Background pass: keep every table already read well inside its bound (worker step)."""
+        synced: Dict[str, Any] = {}
+        for key, tbl in list(self._seen.items()):
+            with self._lock:
+                state = self._state(key)
+                sweeping = key in self._sweep_gen
+                if not sweeping and (not state or not state[1] or time.time() - state[1] >= REPLICA_FULL_SWEEP_SEC):
+                    sweeper = self._start_sweep(tbl, key)
+                else:
+                    sweeper = None
+            if sweeping:
+                continue
+            if sweeper:
+                sweeper.join()  # this step is already off the request path
+                synced[key] = f"error: {self._errors[key]}" if key in self._errors else "sweep"
+                continue
+            if not state or not state[1]:
+                continue  # first sweep backing off after a failure
+            half = max_stale_sec(tbl.name) / 2
+            if time.time() - (state[2] or 0) < half:
+                continue
+            synced[key] = "delta" if self._delta(tbl, key, half) else f"error: {self._errors.get(key)}"
+        return {"ok": True, "processed": len(synced), "tables": synced}
+
+    # ---------- reads ----------
+    def select(
+        self,
+        obj: Any,
+        *,
+        ids: Optional[Iterable[str]] = None,
+        status: Union[None, str, Sequence[str]] = None,
+        campaign: Optional[str] = None,
+        phone: Optional[str] = None,
+        due_by: Optional[str] = None,
+        where: Optional[Callable[[Dict[str, Any]], bool]] = None,
+        limit: Optional[int] = None,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        pyairtable-shaped records matching every given filter, or None when the replica can't
+        answer (disabled, table not replicated, sync failed) — the caller then asks Airtable.
+        `status` is case-insensitive; `due_by` compares the next-send column as text (same format).
+        """
+        key = self.ensure(obj)
+        if not key:
+            if self.enabled:
+                self.stats["fallbacks"] += 1
+            return None
+        sql = ["SELECT id, fields, created FROM records WHERE tbl=?"]
+        args: List[Any] = [key]
+        if ids is not None:
+            id_list = list(dict.fromkeys(ids))
+            if not id_list:
+                return []
+            sql.append(f"AND id IN ({','.join('?' * len(id_list))})")
+            args += id_list
+        statuses = [s.strip().lower() for s in _as_list(status)]
+        if statuses:
+            sql.append(f"AND status IN ({','.join('?' * len(statuses))})")
+            args += statuses
+        if phone is not None:
+            sql.append("AND id IN (SELECT id FROM phones WHERE tbl=? AND digits=?)")
+            args += [key, last_10_digits(phone) or ""]
+        if campaign is not None:
+            sql.append("AND id IN (SELECT id FROM campaigns WHERE tbl=? AND campaign=?)")
+            args += [key, campaign]
+        if due_by is not None:
+            sql.append("AND next_send <= ?")
+            args.append(due_by)
+        sql.append("ORDER BY created, id")
+        with self._lock:
+            rows = self._db().execute(" ".join(sql), args).fetchall()
+        self.stats["reads"] += 1
+        out: List[Dict[str, Any]] = []
+        for rid, fields_json, created in rows:
+            fields = json.loads(fields_json)
+            if where is not None and not where(fields):
+                continue
+            out.append({"id": rid, "createdTime": created, "fields": fields})
+            if limit and len(out) >= limit:
+                break
+        return out
+
+    # ---------- write-through ----------
+    def upsert_local(self, obj: Any, records: Iterable[Dict[str, Any]]) -> int:
+        """Mirror records Airtable just returned (create / update responses)."""
+        _, key = self._resolve(obj)
+        if not key:
+            return 0
+        n = 0
+        with self._lock:
+            state = self._state(key)
+            if not state:
+                return 0  # never synced → the first sweep will pick them up
+            gen = self._write_gen(key, state)
+            db = self._db()
+            db.execute("BEGIN")
+            try:
+                for rec in records or []:
+                    if isinstance(rec, dict) and rec.get("id"):
+                        self._put(key, rec, gen)
+                        n += 1
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        self.stats["local_writes"] += n
+        return n
+
+    def patch_local(self, obj: Any, record_id: str, fields: Dict[str, Any]) -> bool:
+        """Merge a field patch this process just sent to Airtable into the local copy."""
+        _, key = self._resolve(obj)
+        if not (key and record_id):
+            return False
+        with self._lock:
+            row = self._db().execute("SELECT fields, created FROM records WHERE tbl=? AND id=?", (key, record_id)).fetchone()
+        if not row:
+            return False
+        merged = {**json.loads(row[0]), **(fields or {})}
+        return self.upsert_local(obj, [{"id": record_id, "createdTime": row[1], "fields": merged}]) == 1
+
+    # ---------- maintenance ----------
+    def status(self) -> Dict[str, Any]:
+        tables: Dict[str, Any] = {}
+        if self.enabled:
+            with self._lock:
+                db = self._db()
+                for key, name, high_water, swept_at, synced_at in db.execute(
+                    "SELECT tbl, name, high_water, swept_at, synced_at FROM sync_state"
+                ).fetchall():
+                    count = db.execute("SELECT COUNT(*) FROM records WHERE tbl=?", (key,)).fetchone()[0]
+                    age = round(time.time() - synced_at, 1) if synced_at else None
+                    bound = max_stale_sec(name or "")
+                    tables[key] = {
+                        "name": name,
+                        "rows": count,
+                        "age_sec": age,
+                        "max_stale_sec": bound,
+                        "fresh": age is not None and age < bound,
+                        "high_water": high_water,
+                        "full_sweep_age_sec": round(time.time() - swept_at, 1) if swept_at else None,
+                        "last_error": self._errors.get(key),
+                    }
+        sweeping = sorted(k for k, t in self._sweepers.items() if t.is_alive())
+        return {
+            "enabled": self.enabled,
+            "path": self.path,
+            "replicated": sorted(self.tables),
+            "tables": tables,
+            "sweeping": sweeping,
+            **self.stats,
+        }
+
+
+REPLICA = Replica()
@@ -9,11 +9,12 @@ Adds:
 """
 
 from __future__ import annotations
-import os, traceback, re
+import os, traceback
 from datetime import datetime, timezone
 from typing import Optional, Dict, Any, List
 
 from sms.runtime import get_logger
+from sms.field_registry import FIELD_REGISTRY
 
 log = get_logger("reset_daily_stats")
 
@@ -42,7 +43,8 @@ try:
 except Exception:
     pass
 try:
-    from pyairtable import Api as _PyApi
+    import pyairtable  # noqa: F401  (Api path needs pyairtable installed)
+    from sms.http_transport import airtable_api as _PyApi  # pooled, cached per key
 except Exception:
     pass
 
@@ -93,23 +95,8 @@ def _today_iso() -> str:
     return datetime.now(timezone.utc).date().isoformat()
 
 
-def _auto_field_map(tbl) -> Dict[str, str]:
-    try:
-        sample = tbl.all(max_records=1)
-        keys = list(sample[0].get("fields", {}).keys()) if sample else []
-    except Exception:
-        keys = []
-    return {re.sub(r"[^a-z0-9]+", "", k.lower()): k for k in keys}
-
-
 def _existing_only(tbl, patch: Dict[str, Any]) -> Dict[str, Any]:
-    amap = _auto_field_map(tbl)
-    out = {}
-    for k, v in patch.items():
-        ak = amap.get(re.sub(r"[^a-z0-9]+", "", k.lower()))
-        if ak:
-            out[ak] = v
-    return out
+    return FIELD_REGISTRY.remap(tbl, patch)
 
 
 def _cap_for_row(f: Dict[str, Any]) -> int:
@@ -11,13 +11,14 @@ Adds:
 """
 
 from __future__ import annotations
-import os, traceback, re
+import os, traceback
 from datetime import datetime, timedelta, timezone
 from functools import lru_cache
 from typing import Literal, Optional, Dict, Any
 
 from sms.config import CONV_FIELDS, CONVERSATIONS_FIELDS
 from sms.runtime import get_logger
+from sms.field_registry import FIELD_REGISTRY
 
 log = get_logger("retry_handler")
 
@@ -46,7 +47,8 @@ try:
 except Exception:
     pass
 try:
-    from pyairtable import Api as _PyApi
+    import pyairtable  # noqa: F401  (Api path needs pyairtable installed)
+    from sms.http_transport import airtable_api as _PyApi  # pooled, cached per key
 except Exception:
     pass
 
@@ -85,27 +87,8 @@ def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-def _norm(s: str) -> str:
-    return re.sub(r"[^a-z0-9]+", "", s.strip().lower()) if isinstance(s, str) else s
-
-
-def _auto_field_map(tbl) -> Dict[str, str]:
-    try:
-        page = tbl.all(max_records=1)
-        keys = list(page[0].get("fields", {}).keys()) if page else []
-    except Exception:
-        keys = []
-    return {_norm(k): k for k in keys}
-
-
 def _remap_existing_only(tbl, payload: Dict[str, Any]) -> Dict[str, Any]:
-    amap = _auto_field_map(tbl)
-    out = {}
-    for k, v in payload.items():
-        ak = amap.get(_norm(k))
-        if ak:
-            out[ak] = v
-    return out
+    return FIELD_REGISTRY.remap(tbl, payload)
 
 
 @lru_cache(maxsize=1)
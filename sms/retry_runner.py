@@ -19,6 +19,7 @@ from sms.airtable_schema import (
     ConversationDirection,
     conversations_field_map,
 )
+from sms.airtable_governor import airtable_lane
 from sms.config import DEFAULT_FROM_NUMBER
 from sms.datastore import CONNECTOR, list_records, update_record
 from sms.dispatcher import get_policy
@@ -335,6 +336,7 @@ class RetryRunner:
         )
 
 
+@airtable_lane("send")
 def run_retry(limit: int = 100, view: Optional[str] = None) -> Dict[str, Any]:
     return RetryRunner().run(limit, view)
 
@@ -9,13 +9,14 @@ Adds:
 """
 
 from __future__ import annotations
-import os, time, traceback, re
+import os, time, traceback
 from datetime import datetime, timezone, timedelta
 from functools import lru_cache
 from typing import Optional, Dict, Any, List
 
 from sms.config import CONV_FIELDS, CONVERSATIONS_FIELDS
 from sms.runtime import get_logger
+from sms.field_registry import FIELD_REGISTRY
 
 log = get_logger("retry_worker")
 
@@ -61,7 +62,8 @@ try:
 except Exception:
     pass
 try:
-    from pyairtable import Api as _PyApi
+    import pyairtable  # noqa: F401  (Api path needs pyairtable installed)
+    from sms.http_transport import airtable_api as _PyApi  # pooled, cached per key
 except Exception:
     pass
 
@@ -139,24 +141,8 @@ def _parse_dt(s: Any) -> Optional[datetime]:
         return None
 
 
-def _norm(s: str) -> str:
-    return re.sub(r"[^a-z0-9]+", "", s.strip().lower()) if isinstance(s, str) else s
-
-
-def _auto_field_map(tbl) -> Dict[str, str]:
-    try:
-        rows = tbl.all(max_records=1)
-        keys = list(rows[0].get("fields", {}).keys()) if rows else []
-    except Exception:
-        keys = []
-    return {_norm(k): k for k in keys}
-
-
 def _remap_existing_only(tbl, payload: Dict[str, Any]) -> Dict[str, Any]:
-    amap = _auto_field_map(tbl)
-    if not amap:
-        return dict(payload)
-    return {amap[_norm(k)]: v for k, v in payload.items() if _norm(k) in amap}
+    return FIELD_REGISTRY.remap(tbl, payload)
 
 
 def _is_retryable(f: Dict[str, Any]) -> bool:
@@ -3,9 +3,10 @@
 ────────────────────────────────────
 Global rate & quiet-hour limiter for SMS sends.
 Supports:
- - Redis Lua (atomic)
- - Upstash REST
+ - Redis Lua (atomic sliding window, per-DID + global in one EVALSHA)
+ - Upstash REST (same script, one request)
  - Local fallback
+ - Batch acquisition (take N) + local lease fast path over the shared backends
 Adds:
  - Structured logging
  - Telemetry on quiet/rate blocks
@@ -13,19 +14,18 @@ Adds:
 """
 
 from __future__ import annotations
-import os, hashlib, traceback
+import os, hashlib, threading, time, traceback
 from datetime import datetime, timezone, timedelta
 from typing import Optional
 
+from sms.http_transport import TRANSPORT
+from sms.send_window import quiet_at
+
 # Optional deps
 try:
     import redis as _redis
 except Exception:
     _redis = None
-try:
-    import requests
-except Exception:
-    requests = None
 
 # Logging / telemetry
 try:
@@ -90,12 +90,7 @@ def _parse_quiet(spec: str) -> tuple[int, int]:
 def in_cst_quiet_hours(now_ts: Optional[float] = None) -> bool:
     start, end = _parse_quiet(QUIET_SPEC)
     now = _tz_now() if now_ts is None else datetime.fromtimestamp(now_ts, _tz_now().tzinfo)
-    h = now.hour
-    if start == end:
-        return False
-    if start < end:
-        return start <= h < end
-    return (h >= start) or (h < end)
+    return quiet_at(now.hour, start, end)
 
 
 def seconds_until_quiet_end() -> int:
@@ -113,8 +108,13 @@ def seconds_until_quiet_end() -> int:
 
 
 # ---------------- redis helpers ----------------
-def _minute_bucket() -> str:
-    return datetime.utcnow().strftime("%Y%m%d%H%M")
+WINDOW_SEC = 60
+RT_LEASE_SIZE = int(os.getenv("RT_LEASE_SIZE", "10"))
+
+
+def _minute_bucket(ts: Optional[float] = None) -> str:
+    ts = time.time() if ts is None else ts
+    return datetime.fromtimestamp(ts - ts % WINDOW_SEC, timezone.utc).strftime("%Y%m%d%H%M")
 
 
 def _hash_did(did: str) -> str:
@@ -125,6 +125,15 @@ def _key(*parts: str) -> str:
     return ":".join([KEY_PREFIX, *[p for p in parts if p]])
 
 
+def _window_keys(did: str, ts: Optional[float] = None) -> tuple[list, float]:
+    """[did current, did previous, global current, global previous] + elapsed fraction of the current window."""
+    ts = time.time() if ts is None else ts
+    cur, prev = _minute_bucket(ts), _minute_bucket(ts - WINDOW_SEC)
+    h = _hash_did(did or "")
+    keys = [_key("rl", "did", cur, h), _key("rl", "did", prev, h), _key("rl", "glob", cur), _key("rl", "glob", prev)]
+    return keys, (ts % WINDOW_SEC) / WINDOW_SEC
+
+
 _RTCP = None
 
 
@@ -145,76 +154,110 @@ def _redis_tcp():
 
 
 # ---------------- limiters ----------------
+# Sliding-window counter: used = current + previous * (1 - elapsed). Per-DID and global caps are
+# checked and charged together; grants up to ARGV[3] tokens (partial grants allowed), returns the grant.
+SLIDING_WINDOW_LUA = """
+local per, glob, want = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local carry = 1 - tonumber(ARGV[4])
+local function used(cur, prev)
+  return tonumber(redis.call('GET', cur) or '0') + math.floor(tonumber(redis.call('GET', prev) or '0') * carry)
+end
+local free = math.min(per - used(KEYS[1], KEYS[2]), glob - used(KEYS[3], KEYS[4]))
+local grant = math.max(0, math.min(want, free))
+if grant > 0 then
+  redis.call('INCRBY', KEYS[1], grant)
+  redis.call('PEXPIRE', KEYS[1], ARGV[5])
+  redis.call('INCRBY', KEYS[3], grant)
+  redis.call('PEXPIRE', KEYS[3], ARGV[5])
+end
+return grant
+"""
+_KEY_TTL_MS = 2 * WINDOW_SEC * 1000
+
+
+def _blocked(backend: str, did: str, want: int, granted: int) -> None:
+    if granted < want:
+        log.warning(f"🚫 {backend} rate limit hit → did={did} granted={granted}/{want}")
+        log_kpi("RATE_LIMIT_BLOCK", want - granted)
+
+
 class _LuaLimiter:
-    LUA = """<same script as original>"""  # omitted here for brevity
+    LUA = SLIDING_WINDOW_LUA
+    NAME = "Redis"
 
     def __init__(self, per_limit: int, global_limit: int):
         self.per, self.glob = per_limit, global_limit
         self.r = _redis_tcp()
-        self.script = self.r.register_script(self.LUA) if self.r else None
+        self.script = self.r.register_script(self.LUA) if self.r else None  # EVALSHA, EVAL on NOSCRIPT
         log.info(f"RT: LuaLimiter initialized per={self.per} glob={self.glob}")
 
-    def take(self, did: str) -> bool:
+    def take_n(self, did: str, n: int, *, report: bool = True) -> int:
         if not self.r or not self.script:
-            return True
+            return n
+        keys, elapsed = _window_keys(did)
         try:
-            bucket = _minute_bucket()
-            ok = self.script(
-                keys=[_key("rl", "did", bucket, _hash_did(did or "")), _key("rl", "glob", bucket)], args=[self.per, self.glob, 65000]
-            )
-            if not ok:
-                log.warning(f"🚫 Rate limit hit → did={did}")
-                log_kpi("RATE_LIMIT_BLOCK", 1)
-            return bool(ok)
+            granted = int(self.script(keys=keys, args=[self.per, self.glob, n, elapsed, _KEY_TTL_MS]))
         except Exception:
             log.error("LuaLimiter failed", exc_info=True)
-            return True
+            return n
+        if report:
+            _blocked(self.NAME, did, n, granted)
+        return granted
+
+    def take(self, did: str) -> bool:
+        return self.take_n(did, 1) == 1
 
 
 class _UpstashRestLimiter:
+    """Same Lua script over the Upstash REST API: one EVALSHA request per call (EVAL once on NOSCRIPT)."""
+
+    NAME = "Upstash"
+
     def __init__(self, per_limit, global_limit):
         self.base = (UPSTASH_REDIS_REST_URL or "").rstrip("/")
         self.tok = UPSTASH_REDIS_REST_TOKEN
         self.per, self.glob = per_limit, global_limit
-        self.enabled = bool(self.base and self.tok and requests)
+        self.sha = hashlib.sha1(SLIDING_WINDOW_LUA.encode()).hexdigest()
+        self.enabled = bool(self.base and self.tok)
         if self.enabled:
             log.info("RT: Upstash REST limiter active")
             log_run("RT_INIT", breakdown={"backend": "upstash"})
 
-    def _get(self, k):
-        try:
-            r = requests.post(f"{self.base}/get/{k}", headers={"Authorization": f"Bearer {self.tok}"}, timeout=2)
-            if r.ok:
-                return int(r.json().get("result") or 0)
-        except Exception:
-            pass
-        return 0
+    def _call(self, cmd: list):
+        r = TRANSPORT.post(self.base, json=cmd, headers={"Authorization": f"Bearer {self.tok}"}, timeout=2)
+        body = r.json() if r.content else {}
+        if r.status_code >= 400 or "error" in body:
+            raise RuntimeError(str(body.get("error") or r.status_code))
+        return body.get("result")
 
-    def _incr_exp(self, k, ttl=60):
+    def take_n(self, did: str, n: int, *, report: bool = True) -> int:
+        if not self.enabled:
+            return n
+        keys, elapsed = _window_keys(did)
+        args = [4, *keys, self.per, self.glob, n, elapsed, _KEY_TTL_MS]
         try:
-            cmds = [["INCR", k], ["EXPIRE", k, str(ttl)]]
-            requests.post(f"{self.base}/pipeline", json=cmds, headers={"Authorization": f"Bearer {self.tok}"}, timeout=2)
+            try:
+                granted = int(self._call(["EVALSHA", self.sha, *args]))
+            except RuntimeError as e:
+                if "NOSCRIPT" not in str(e):
+                    raise
+                granted = int(self._call(["EVAL", SLIDING_WINDOW_LUA, *args]))
         except Exception:
-            pass
+            log.error("Upstash limiter failed", exc_info=True)
+            return n
+        if report:
+            _blocked(self.NAME, did, n, granted)
+        return granted
 
     def take(self, did: str) -> bool:
-        if not self.enabled:
-            return True
-        bucket = _minute_bucket()
-        dk, gk = _key("rl", "did", bucket, _hash_did(did or "")), _key("rl", "glob", bucket)
-        if self._get(dk) >= self.per or self._get(gk) >= self.glob:
-            log.warning(f"🚫 Upstash rate limit hit → {did}")
-            log_kpi("RATE_LIMIT_BLOCK", 1)
-            return False
-        self._incr_exp(dk)
-        self._incr_exp(gk)
-        return True
+        return self.take_n(did, 1) == 1
 
 
 class _LocalLimiter:
     def __init__(self, per_limit, global_limit):
         self.per, self.glob = per_limit, global_limit
         self._bucket, self._per, self._glob = None, {}, 0
+        self._lock = threading.Lock()
         log.info("RT: LocalLimiter fallback active")
         log_run("RT_INIT", breakdown={"backend": "local"})
 
@@ -223,34 +266,84 @@ class _LocalLimiter:
         if m != self._bucket:
             self._bucket, self._per, self._glob = m, {}, 0
 
+    def take_n(self, did, n):
+        with self._lock:
+            self._roll()
+            granted = max(0, min(n, self.glob - self._glob, self.per - self._per.get(did, 0)))
+            self._glob += granted
+            self._per[did] = self._per.get(did, 0) + granted
+        _blocked("Local", did, n, granted)
+        return granted
+
     def take(self, did):
-        self._roll()
-        if self._glob >= self.glob or self._per.get(did, 0) >= self.per:
-            log.warning(f"🚫 Local limiter hit → {did}")
-            log_kpi("RATE_LIMIT_BLOCK", 1)
-            return False
-        self._glob += 1
-        self._per[did] = self._per.get(did, 0) + 1
-        return True
+        return self.take_n(did, 1) == 1
+
+
+class _LeasedLimiter:
+    """
+    Local fast path over a shared backend: pre-leases up to RT_LEASE_SIZE tokens per DID
+    in one round-trip and serves sends from the lease. Leases die with their window, so
+    unused tokens can only under-send, never over-send, the global caps. Blocks are reported
+    against the caller's demand, not the lease top-up (a short lease that still covers n is no block).
+    """
+
+    def __init__(self, backend, per_limit: int, lease_size: int = RT_LEASE_SIZE):
+        self.backend = backend
+        self.lease = max(1, min(lease_size, per_limit // 4 or 1))
+        self._leases: dict = {}  # did -> (tokens, window)
+        self._lock = threading.Lock()
+        self.stats = {"local_grants": 0, "remote_calls": 0}
+
+    def take_n(self, did: str, n: int) -> int:
+        win = _minute_bucket()
+        with self._lock:
+            have, w = self._leases.get(did, (0, win))
+            have = have if w == win else 0
+            if have >= n:
+                self._leases[did] = (have - n, win)
+                self.stats["local_grants"] += n
+                return n
+            ask = max(n - have, self.lease)
+        got = self.backend.take_n(did, ask, report=False)
+        with self._lock:
+            self.stats["remote_calls"] += 1
+            have, w = self._leases.get(did, (0, win))
+            total = (have if w == win else 0) + got
+            served = min(n, total)
+            self._leases[did] = (total - served, win)
+        _blocked(getattr(self.backend, "NAME", "Shared"), did, n, served)
+        return served
+
+    def take(self, did: str) -> bool:
+        return self.take_n(did, 1) == 1
 
 
 # ---------------- builder ----------------
+def is_shared() -> bool:
+    """True when limits are enforced across workers (Redis / Upstash), not per process."""
+    return bool(_redis_tcp() or (UPSTASH_REDIS_REST_URL and UPSTASH_REDIS_REST_TOKEN))
+
+
 def _build_limiter(per_min, global_min):
     if _redis_tcp():
-        return _LuaLimiter(per_min, global_min)
-    if UPSTASH_REDIS_REST_URL and UPSTASH_REDIS_REST_TOKEN and requests:
-        return _UpstashRestLimiter(per_min, global_min)
-    return _LocalLimiter(per_min, global_min)
+        backend = _LuaLimiter(per_min, global_min)
+    elif UPSTASH_REDIS_REST_URL and UPSTASH_REDIS_REST_TOKEN:
+        backend = _UpstashRestLimiter(per_min, global_min)
+    else:
+        return _LocalLimiter(per_min, global_min)
+    return _LeasedLimiter(backend, per_min) if RT_LEASE_SIZE > 1 else backend
 
 
 _LIMITER_CACHE = {}
+_LIMITER_LOCK = threading.Lock()
 
 
 def _limiter(per_min, global_min):
     key = (per_min, global_min)
-    if key not in _LIMITER_CACHE:
-        _LIMITER_CACHE[key] = _build_limiter(per_min, global_min)
-    return _LIMITER_CACHE[key]
+    with _LIMITER_LOCK:
+        if key not in _LIMITER_CACHE:
+            _LIMITER_CACHE[key] = _build_limiter(per_min, global_min)
+        return _LIMITER_CACHE[key]
 
 
 # ---------------- public API ----------------
@@ -270,12 +363,20 @@ def take_token2(did: str, per_min: int, global_per_min: Optional[int] = None) ->
     return _limiter(int(per_min or 1), glob).take(did or "")
 
 
+def take_tokens(did: str, n: int, per_min: int, global_per_min: Optional[int] = None) -> int:
+    """Batch acquisition: up to `n` tokens for `did` under per-DID + global caps. Returns the grant."""
+    if n <= 0:
+        return 0
+    glob = int(global_per_min) if global_per_min is not None else int(GLOBAL_RATE_PER_MIN or 999999)
+    return _limiter(int(per_min or 1), glob).take_n(did or "", int(n))
+
+
 def minute_bucket_key_examples(did: str) -> dict:
-    bucket = _minute_bucket()
+    keys, _ = _window_keys(did)
     return {
-        "did_key": _key("rl", "did", bucket, _hash_did(did or "")),
-        "glob_key": _key("rl", "glob", bucket),
-        "bucket": bucket,
+        "did_key": keys[0],
+        "glob_key": keys[2],
+        "bucket": _minute_bucket(),
     }
 
 
@@ -287,8 +388,14 @@ def get_limiter_status() -> dict:
         backend = "upstash"
     else:
         backend = "local"
+    leases = [lim.stats for lim in list(_LIMITER_CACHE.values()) if isinstance(lim, _LeasedLimiter)]
     return {
         "backend": backend,
+        "lease_size": RT_LEASE_SIZE,
+        "lease_stats": {
+            "local_grants": sum(st["local_grants"] for st in leases),
+            "remote_calls": sum(st["remote_calls"] for st in leases),
+        },
         "global_rate": GLOBAL_RATE_PER_MIN,
         "quiet_spec": QUIET_SPEC,
         "quiet_active": in_cst_quiet_hours(),
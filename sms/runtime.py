@@ -158,6 +158,16 @@ def _log_core_env() -> None:
     _CORE_ENV_LOGGED = True
 
 
+# ────────────────────────────────────────────────
+# LOCAL STATE
+# ────────────────────────────────────────────────
+def state_path(filename: str) -> str:
+    """Return a path inside SMS_STATE_DIR (default ./.sms_state) for local caches/stores."""
+    base = os.getenv("SMS_STATE_DIR") or os.path.join(os.getcwd(), ".sms_state")
+    os.makedirs(base, exist_ok=True)
+    return os.path.join(base, filename)
+
+
 # ────────────────────────────────────────────────
 # TIME UTILITIES
 # ────────────────────────────────────────────────
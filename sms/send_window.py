@@ -0,0 +1,219 @@
+"""
+🕘 Send Window
+──────────────
+Per-recipient quiet hours: the policy's window (QUIET_START_HOUR → QUIET_END_HOUR) is applied
+in the seller's own timezone instead of one server clock.
+
+- Timezone from the seller's area code (precomputed NPA → IANA zone table), falling back to the
+  state in the Prospect's market ("Houston, TX" / "Texas"), then the policy default (QUIET_TZ)
+- `next_open()` gives the UTC instant a quiet recipient's window reopens (for Next Send Date)
+- `any_open()` tells whether *any* US zone is inside its window → a cycle only idles when
+  nobody can be messaged
+- `quiet_at()` is the one place the start/end hour comparison lives (dispatcher, campaign
+  runner and rt all use it)
+- SEND_WINDOW_MODE=global keeps the old behaviour (everyone on the policy timezone)
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from sms.runtime import get_logger
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:
+    ZoneInfo = None
+
+logger = get_logger("send_window")
+
+# =========================
+# ENV / CONFIG
+# =========================
+SEND_WINDOW_MODE = os.getenv("SEND_WINDOW_MODE", "recipient").strip().lower()  # recipient | global
+DEFAULT_TZ = os.getenv("QUIET_TZ", "America/Chicago")
+
+EASTERN, CENTRAL, MOUNTAIN, ARIZONA = "America/New_York", "America/Chicago", "America/Denver", "America/Phoenix"
+PACIFIC, ALASKA, HAWAII, PUERTO_RICO = "America/Los_Angeles", "America/Anchorage", "Pacific/Honolulu", "America/Puerto_Rico"
+
+# =========================
+# Lookup tables
+# =========================
+STATE_TZ: Dict[str, str] = {
+    **{s: EASTERN for s in "CT DE DC FL GA IN KY ME MD MA MI NH NJ NY NC OH PA RI SC VT VA WV".split()},
+    **{s: CENTRAL for s in "AL AR IL IA KS LA MN MS MO NE ND OK SD TN TX WI".split()},
+    **{s: MOUNTAIN for s in "CO ID MT NM UT WY".split()},
+    **{s: PACIFIC for s in "CA NV OR WA".split()},
+    "AZ": ARIZONA, "AK": ALASKA, "HI": HAWAII, "PR": PUERTO_RICO,
+}
+
+STATE_NAMES: Dict[str, str] = {
+    "alabama": "AL", "alaska": "AK", "arizona": "AZ", "arkansas": "AR", "california": "CA", "colorado": "CO",
+    "connecticut": "CT", "delaware": "DE", "district of columbia": "DC", "florida": "FL", "georgia": "GA",
+    "hawaii": "HI", "idaho": "ID", "illinois": "IL", "indiana": "IN", "iowa": "IA", "kansas": "KS",
+    "kentucky": "KY", "louisiana": "LA", "maine": "ME", "maryland": "MD", "massachusetts": "MA",
+    "michigan": "MI", "minnesota": "MN", "mississippi": "MS", "missouri": "MO", "montana": "MT",
+    "nebraska": "NE", "nevada": "NV", "new hampshire": "NH", "new jersey": "NJ", "new mexico": "NM",
+    "new york": "NY", "north carolina": "NC", "north dakota": "ND", "ohio": "OH", "oklahoma": "OK",
+    "oregon": "OR", "pennsylvania": "PA", "puerto rico": "PR", "rhode island": "RI", "south carolina": "SC",
+    "south dakota": "SD", "tennessee": "TN", "texas": "TX", "utah": "UT", "vermont": "VT", "virginia": "VA",
+    "washington": "WA", "west virginia": "WV", "wisconsin": "WI", "wyoming": "WY",
+}
+
+_STATE_NPAS: Dict[str, str] = {
+    "AL": "205 251 256 334 659 938", "AK": "907", "AZ": "480 520 602 623 928", "AR": "327 479 501 870",
+    "CA": "209 213 279 310 323 341 350 369 408 415 424 442 510 530 559 562 619 626 628 650 657 661 669 707 "
+          "714 747 760 805 818 820 831 840 858 909 916 925 949 951",
+    "CO": "303 719 720 970 983", "CT": "203 475 860 959", "DE": "302", "DC": "202 771",
+    "FL": "239 305 321 324 352 386 407 448 561 645 656 689 727 728 754 772 786 813 850 863 904 941 954",
+    "GA": "229 404 470 478 678 706 762 770 912 943", "HI": "808", "ID": "208 986",
+    "IL": "217 224 309 312 331 447 464 618 630 708 730 773 779 815 847 861 872",
+    "IN": "219 260 317 463 574 765 812 930", "IA": "319 515 563 641 712", "KS": "316 620 785 913",
+    "KY": "270 364 502 606 859", "LA": "225 318 337 504 985", "ME": "207", "MD": "227 240 301 410 443 667",
+    "MA": "339 351 413 508 617 774 781 857 978",
+    "MI": "231 248 269 313 517 586 616 679 734 810 906 947 989", "MN": "218 320 507 612 651 763 924 952",
+    "MS": "228 471 601 662 769", "MO": "235 314 417 557 573 636 660 816 975", "MT": "406",
+    "NE": "308 402 531", "NV": "702 725 775", "NH": "603", "NJ": "201 551 609 640 732 848 856 862 908 973",
+    "NM": "505 575",
+    "NY": "212 315 329 332 347 363 516 518 585 607 624 631 646 680 716 718 838 845 914 917 929 934",
+    "NC": "252 336 472 704 743 828 910 919 980 984", "ND": "701",
+    "OH": "216 220 234 283 326 330 380 419 436 440 513 567 614 740 937", "OK": "405 539 572 580 918",
+    "OR": "458 503 541 971", "PA": "215 223 267 272 412 445 484 570 582 610 717 724 814 835 878",
+    "PR": "787 939", "RI": "401", "SC": "803 821 839 843 854 864", "SD": "605",
+    "TN": "423 615 629 731 865 901 931",
+    "TX": "210 214 254 281 325 346 361 409 430 432 469 512 682 713 726 737 806 817 830 832 903 915 936 940 "
+          "945 956 972 979",
+    "UT": "385 435 801", "VT": "802", "VA": "276 434 540 571 686 703 757 804 826 948",
+    "WA": "206 253 360 425 509 564", "WV": "304 681", "WI": "262 274 414 534 608 715 920", "WY": "307",
+}
+
+# Area codes in split-zone states that sit (mostly) in the state's other zone
+_NPA_OVERRIDES: Dict[str, str] = {
+    "219": CENTRAL,   # NW Indiana (Gary)
+    "270": CENTRAL,   # western Kentucky
+    "364": CENTRAL,
+    "850": CENTRAL,   # Florida panhandle (Pensacola / Panama City)
+    "423": EASTERN,   # east Tennessee (Chattanooga)
+    "865": EASTERN,   # Knoxville
+    "915": MOUNTAIN,  # El Paso
+}
+
+NPA_TZ: Dict[str, str] = {
+    **{npa: STATE_TZ[state] for state, npas in _STATE_NPAS.items() for npa in npas.split()},
+    **_NPA_OVERRIDES,
+}
+
+_STATE_CODE_RE = re.compile(r"\b([A-Z]{2})\b")
+_STATE_NAMES_LONGEST_FIRST = sorted(STATE_NAMES, key=len, reverse=True)  # "west virginia" before "virginia"
+
+
+# =========================
+# Helpers
+# =========================
+@lru_cache(maxsize=64)
+def _zone(name: str):
+    if ZoneInfo is None:
+        return timezone.utc
+    try:
+        return ZoneInfo(name)
+    except Exception:
+        logger.warning(f"⚠️ Unknown timezone {name!r}; using UTC")
+        return timezone.utc
+
+
+def quiet_at(hour: int, start: int, end: int) -> bool:
+    """True when `hour` (local) falls inside quiet hours [start, end), wrapping past midnight."""
+    if start == end:
+        return False
+    if start < end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+def npa_of(phone: Any) -> Optional[str]:
+    digits = re.sub(r"\D", "", str(phone or ""))
+    if len(digits) == 11 and digits.startswith("1"):
+        digits = digits[1:]
+    return digits[:3] if len(digits) == 10 else None
+
+
+def state_of(market: Any) -> Optional[str]:
+    """Market text ("Houston, TX" / "Dallas TX" / "Texas") → two-letter state code."""
+    text = str(market or "").strip()
+    if not text:
+        return None
+    for code in reversed(_STATE_CODE_RE.findall(text.upper() if len(text) == 2 else text)):
+        if code in STATE_TZ:
+            return code
+    lowered = text.lower()
+    for name in _STATE_NAMES_LONGEST_FIRST:
+        if name in lowered:
+            return STATE_NAMES[name]
+    return None
+
+
+def recipient_tz(phone: Any, market: Any = None) -> Optional[str]:
+    """IANA zone for a seller: area code first, then the market's state. None when unknown."""
+    npa = npa_of(phone)
+    if npa and npa in NPA_TZ:
+        return NPA_TZ[npa]
+    state = state_of(market)
+    return STATE_TZ.get(state) if state else None
+
+
+# =========================
+# Window
+# =========================
+class SendWindow:
+    """The policy's send window, evaluated in each recipient's local time."""
+
+    def __init__(self, start_hour: int = 21, end_hour: int = 9, enforced: bool = True,
+                 default_tz: str = DEFAULT_TZ, mode: str = SEND_WINDOW_MODE):
+        self.start, self.end = int(start_hour), int(end_hour)
+        self.enforced = enforced
+        self.default_tz = default_tz
+        self.per_recipient = mode != "global"
+
+    @classmethod
+    def from_policy(cls, policy: Any) -> "SendWindow":
+        tz = getattr(policy.quiet_tz, "key", None) or DEFAULT_TZ
+        return cls(policy.quiet_start_hour, policy.quiet_end_hour, policy.quiet_enforced, tz)
+
+    def tz_for(self, phone: Any, market: Any = None) -> str:
+        if not self.per_recipient:
+            return self.default_tz
+        return recipient_tz(phone, market) or self.default_tz
+
+    def is_open(self, tz_name: str, now: Optional[datetime] = None) -> bool:
+        if not self.enforced:
+            return True
+        local = (now or datetime.now(timezone.utc)).astimezone(_zone(tz_name))
+        return not quiet_at(local.hour, self.start, self.end)
+
+    def next_open(self, tz_name: str, now: Optional[datetime] = None) -> datetime:
+        """UTC instant the window next opens for `tz_name` (now, when already open)."""
+        now = now or datetime.now(timezone.utc)
+        if self.is_open(tz_name, now):
+            return now
+        local = now.astimezone(_zone(tz_name))
+        opens = local.replace(hour=self.end % 24, minute=0, second=0, microsecond=0)
+        if opens <= local:
+            opens += timedelta(days=1)
+        return opens.astimezone(timezone.utc)
+
+    def zones(self) -> Iterable[str]:
+        return set(NPA_TZ.values()) | {self.default_tz} if self.per_recipient else {self.default_tz}
+
+    def any_open(self, now: Optional[datetime] = None) -> bool:
+        return any(self.is_open(tz, now) for tz in self.zones())
+
+    def check(self, phone: Any, market: Any = None, now: Optional[datetime] = None) -> Tuple[bool, datetime, str]:
+        """(open, next_open_utc, tz) for one recipient."""
+        now = now or datetime.now(timezone.utc)
+        tz = self.tz_for(phone, market)
+        at = self.next_open(tz, now)
+        return at == now, at, tz
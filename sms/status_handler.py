@@ -6,10 +6,12 @@ Fully idempotent, provider-agnostic, and telemetry-rich.
 """
 
 from __future__ import annotations
-import os, re, traceback, hashlib
+import os, traceback, hashlib
 from datetime import datetime, timezone
 from typing import Any, Dict, Optional
 from fastapi import APIRouter, Request, Header
+from sms.http_transport import TRANSPORT
+from sms.field_registry import FIELD_REGISTRY
 
 # ────────────────────────────────────────────────
 # Optional deps
@@ -70,10 +72,6 @@ def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat(timespec="seconds")
 
 
-def _norm(s: Any) -> str:
-    return re.sub(r"[^a-z0-9]+", "", str(s).lower().strip()) if s else ""
-
-
 def _get_table(base: str, name: str):
     if not (AIRTABLE_API_KEY and base and _AirTable):
         return None
@@ -84,18 +82,8 @@ def _get_table(base: str, name: str):
         return None
 
 
-def _auto_field_map(tbl) -> Dict[str, str]:
-    try:
-        rec = tbl.all(max_records=1)
-        keys = list(rec[0].get("fields", {}).keys()) if rec else []
-    except Exception:
-        keys = []
-    return {_norm(k): k for k in keys}
-
-
 def _remap_existing_only(tbl, patch: Dict) -> Dict:
-    amap = _auto_field_map(tbl)
-    return {amap.get(_norm(k), k): v for k, v in patch.items() if amap.get(_norm(k))} if amap else patch
+    return FIELD_REGISTRY.remap(tbl, patch)
 
 
 def _safe_update(tbl, rec_id: str, patch: Dict):
@@ -119,10 +107,10 @@ def _safe_get(tbl, rec_id: str):
 def _increment_numeric(tbl, rec_id: str, field_name: str, by: int = 1) -> bool:
     """Airtable-safe numeric increment."""
     try:
-        amap = _auto_field_map(tbl)
-        real = amap.get(_norm(field_name))
-        if not real:
+        known = FIELD_REGISTRY.remap(tbl, {field_name: None})
+        if not known:
             return False
+        real = next(iter(known))
         row = _safe_get(tbl, rec_id)
         cur = row.get("fields", {}).get(real, 0) if row else 0
         try:
@@ -176,14 +164,14 @@ class _Idempotency:
         # Upstash REST
         if UPSTASH_REDIS_REST_URL and UPSTASH_REDIS_REST_TOKEN and requests:
             try:
-                g = requests.post(
+                g = TRANSPORT.post(
                     f"{UPSTASH_REDIS_REST_URL}/get/{key}",
                     headers={"Authorization": f"Bearer {UPSTASH_REDIS_REST_TOKEN}"},
                     timeout=2,
                 )
-                if g.ok and g.json().get("result") is not None:
+                if g.status_code < 400 and g.json().get("result") is not None:
                     return True
-                requests.post(
+                TRANSPORT.post(
                     f"{UPSTASH_REDIS_REST_URL}/pipeline",
                     json=[["SETNX", key, "1"], ["EXPIRE", key, "21600"]],
                     headers={"Authorization": f"Bearer {UPSTASH_REDIS_REST_TOKEN}"},
@@ -0,0 +1,189 @@
+"""
+🧩 Template Engine
+──────────────────
+Compile-once rendering for campaign + autoresponder message templates.
+
+- `compile_template()` parses a template once into literal runs + placeholder slots; legacy
+  aliases (`{Property City}`, `{Owner First Name}`) are normalized at compile time
+- Rendering is a single `%`-format over the slot values: no per-message re-parsing, no
+  `str.replace` chains
+- Two placeholder syntaxes, matching the two callers:
+    names=None      → `str.format` semantics (autoresponder, local templates): every `{field}` is a
+                      slot, `{{`/`}}` are escapes, a missing key raises KeyError
+    names={...}     → token semantics (campaign queueing): only `{Name}` for the given names is a
+                      slot; any other brace text is kept verbatim
+- `TEMPLATE_CACHE` keeps compiled Airtable templates per record id, recompiled when the record's
+  last-modified time (TEMPLATE_MODIFIED_FIELD) — or, without that column, its body — changes
+- `render_many()` renders one template over many rows (bulk campaign queueing)
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import string
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from operator import itemgetter
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Mapping, Optional, Tuple, Union
+
+from sms.runtime import get_logger
+
+logger = get_logger("template_engine")
+
+# =========================
+# ENV / CONFIG
+# =========================
+TEMPLATE_CACHE_SIZE = int(os.getenv("TEMPLATE_CACHE_SIZE", "2048"))
+TEMPLATE_MODIFIED_FIELD = os.getenv("TEMPLATE_MODIFIED_FIELD", "Last Modified")
+
+# Legacy placeholder spellings → canonical slot names
+ALIASES: Dict[str, str] = {
+    "Property City": "Property_City",
+    "Owner First Name": "First",
+}
+
+_FORMATTER = string.Formatter()
+
+
+def _normalize(source: str) -> str:
+    for alias, target in ALIASES.items():
+        source = source.replace("{" + alias + "}", "{" + target + "}")
+    return source
+
+
+def _getter(slots: Tuple[str, ...]) -> Callable[[Mapping[str, Any]], Tuple[Any, ...]]:
+    if not slots:
+        return lambda _values: ()
+    if len(slots) == 1:
+        only = slots[0]
+        return lambda values: (values[only],)
+    return itemgetter(*slots)
+
+
+class Template:
+    """A compiled template: literal runs with slots between them."""
+
+    __slots__ = ("source", "text", "slots", "_fmt", "_get", "_dynamic")
+
+    def __init__(self, source: str, text: str, literals: List[str], slots: Tuple[str, ...], dynamic: bool = False):
+        self.source = source
+        self.text = text  # alias-normalized source (what callers fall back to on a missing key)
+        self.slots = slots
+        self._dynamic = dynamic  # format specs / attribute access → defer to str.format
+        self._fmt = "%s".join(lit.replace("%", "%%") for lit in literals)
+        self._get = _getter(slots)
+
+    def render(self, values: Mapping[str, Any]) -> str:
+        if self._dynamic:
+            return self.text.format(**values)
+        return self._fmt % self._get(values)
+
+    def __repr__(self) -> str:
+        return f"Template({self.text!r}, slots={self.slots})"
+
+
+def _compile_format(source: str, text: str) -> Template:
+    literals: List[str] = []
+    slots: List[str] = []
+    try:
+        parsed = list(_FORMATTER.parse(text))
+    except ValueError:  # unbalanced braces: render raises like str.format would
+        return Template(source, text, [text], (), dynamic=True)
+    pending = ""
+    for literal, field, spec, conversion in parsed:
+        pending += literal
+        if field is None:
+            continue
+        if not field or field.isdigit() or "." in field or "[" in field or spec or conversion:
+            return Template(source, text, [text], (), dynamic=True)
+        literals.append(pending)
+        slots.append(field)
+        pending = ""
+    literals.append(pending)
+    return Template(source, text, literals, tuple(slots))
+
+
+def _compile_tokens(source: str, text: str, names: FrozenSet[str]) -> Template:
+    if not names:
+        return Template(source, text, [text], ())
+    pattern = re.compile(r"\{(" + "|".join(re.escape(n) for n in sorted(names)) + r")\}")
+    parts = pattern.split(text)  # literal, slot, literal, slot, …, literal
+    return Template(source, text, parts[0::2], tuple(parts[1::2]))
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def compile_template(source: str, names: Optional[FrozenSet[str]] = None) -> Template:
+    """Compile (memoized by text). `names=None` → str.format syntax; a frozenset → token syntax."""
+    source = source or ""
+    text = _normalize(source)
+    return _compile_format(source, text) if names is None else _compile_tokens(source, text, names)
+
+
+def render_many(template: Union[Template, str], rows: Iterable[Mapping[str, Any]]) -> List[str]:
+    """Render one template over many value rows (str templates use str.format syntax)."""
+    tpl = compile_template(template) if isinstance(template, str) else template
+    if tpl._dynamic:
+        return [tpl.text.format(**row) for row in rows]
+    fmt, get = tpl._fmt, tpl._get
+    if not tpl.slots:
+        return [fmt % () for _ in rows]
+    return [fmt % get(row) for row in rows]
+
+
+# =========================
+# Per-record cache
+# =========================
+class TemplateCache:
+    """Compiled Airtable templates by record id; an entry is rebuilt when the record changes."""
+
+    def __init__(self, size: int = TEMPLATE_CACHE_SIZE):
+        self.size = max(1, size)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, Optional[FrozenSet[str]]], Tuple[Any, Template]]" = OrderedDict()
+        self.stats: Dict[str, int] = {"hits": 0, "compiles": 0, "invalidations": 0}
+
+    def get(
+        self, template_id: Optional[str], body: str, *, modified: Any = None, names: Optional[FrozenSet[str]] = None
+    ) -> Template:
+        """Compiled template for a record; `modified` (else the body itself) decides freshness."""
+        if not template_id:
+            return compile_template(body or "", names)
+        key = (template_id, names)
+        version = modified or body
+        cached = self._entries.get(key)  # hit path is lock-free (single dict read)
+        if cached is not None and cached[0] == version:
+            self.stats["hits"] += 1
+            return cached[1]
+        tpl = compile_template(body or "", names)
+        with self._lock:
+            if cached is not None:
+                self.stats["invalidations"] += 1
+                self._entries.pop(key, None)
+            self.stats["compiles"] += 1
+            self._entries[key] = (version, tpl)
+            while len(self._entries) > self.size:  # oldest compile first out
+                self._entries.popitem(last=False)
+        return tpl
+
+    def for_record(
+        self, record: Dict[str, Any], message_field: str, *, names: Optional[FrozenSet[str]] = None
+    ) -> Optional[Template]:
+        """Compiled template for a pyairtable record, or None when its message is blank."""
+        fields = (record or {}).get("fields", {}) or {}
+        body = fields.get(message_field)
+        if not isinstance(body, str) or not body.strip():
+            return None
+        return self.get(record.get("id"), body.strip(), modified=fields.get(TEMPLATE_MODIFIED_FIELD), names=names)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def status(self) -> Dict[str, Any]:
+        info = compile_template.cache_info()
+        return {"entries": len(self._entries), "compiled_texts": info.currsize, **self.stats}
+
+
+TEMPLATE_CACHE = TemplateCache()
@@ -1,6 +1,8 @@
 # sms/templates.py
 import random
 
+from sms.template_engine import compile_template
+
 # -------------------------------
 # Outreach Templates
 # -------------------------------
@@ -48,11 +50,11 @@ def _get_first_name(full_name: str | None) -> str:
 
 
 def _format_safe(template: str, fields: dict) -> str:
-    """Safely format a template with prospect/lead fields."""
-    return template.format(
-        First=_get_first_name(fields.get("Phone 1 Name (Primary)") or fields.get("First")),
-        Address=fields.get("Property Address") or fields.get("Address") or "your property",
-    )
+    """Safely format a template with prospect/lead fields (compiled once per template text)."""
+    return compile_template(template).render({
+        "First": _get_first_name(fields.get("Phone 1 Name (Primary)") or fields.get("First")),
+        "Address": fields.get("Property Address") or fields.get("Address") or "your property",
+    })
 
 
 # -------------------------------
@@ -2,29 +2,23 @@
 """
 📡 TextGrid Sender — Transport + Safe Conversations Logging
 - Uses 2010-04-01 TextGrid endpoint (Twilio-style)
+- Sends over the shared pooled keep-alive transport (sms.http_transport)
 - No dependency on sms.tables (avoids signature mismatches)
-- Writes to Airtable Conversations with "existing fields only"
+- Writes to Airtable Conversations through the conversation journal (SID upsert, batched)
+- `journal=False` is pure transport for callers that journal the richer row themselves
 - Never crashes sending if Airtable is down/misconfigured
 """
 
 from __future__ import annotations
 
 import os
-import re
 import time
 from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from typing import Any, Dict, Optional, Tuple, List
+from urllib.parse import urljoin
 
-# --- HTTP client (prefer httpx, fallback to requests) ---
-try:
-    import httpx  # type: ignore
-except Exception:
-    httpx = None
-try:
-    import requests  # type: ignore
-except Exception:
-    requests = None
-
+from .conversation_journal import JOURNAL
 from .config import (
     TEXTGRID_ACCOUNT_SID,
     TEXTGRID_AUTH_TOKEN,
@@ -32,6 +26,7 @@ from .config import (
     MESSAGING_SERVICE_SID,
     E164_RE,
 )
+from .http_transport import TRANSPORT
 from .runtime import get_logger
 
 logger = get_logger("textgrid_sender")
@@ -63,6 +58,7 @@ else:
 AIRTABLE_KEY = os.getenv("AIRTABLE_API_KEY")
 LEADS_CONVOS_BASE = os.getenv("LEADS_CONVOS_BASE") or os.getenv("AIRTABLE_LEADS_CONVOS_BASE_ID")
 CONVERSATIONS_TABLE = os.getenv("CONVERSATIONS_TABLE", "Conversations")
+LOOKUP_MAX_PAGES = max(1, int(os.getenv("TEXTGRID_LOOKUP_MAX_PAGES", "10")))
 
 # Conversations field mapping (try to be flexible; we’ll remap to existing)
 FROM_FIELD = os.getenv("CONV_FROM_FIELD", "phone")            # counterparty phone (recipient)
@@ -125,32 +121,21 @@ class TextGridError(RuntimeError):
 def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat(timespec="seconds")
 
-def _norm(s: Any) -> str:
-    return re.sub(r"[^a-z0-9]+", "", str(s).strip().lower()) if s is not None else ""
+_CONVOS_TBL: Optional[Any] = None
+
 
 def _convos_tbl() -> Optional[Any]:
+    """One cached Conversations handle (the journal keys its SID map on it)."""
+    global _CONVOS_TBL
+    if _CONVOS_TBL is not None:
+        return _CONVOS_TBL
     if not (AIRTABLE_KEY and LEADS_CONVOS_BASE and Table and CONVERSATIONS_TABLE):
         return None
     try:
-        return Table(AIRTABLE_KEY, LEADS_CONVOS_BASE, CONVERSATIONS_TABLE)
-    except Exception:
-        return None
-
-def _safe_create(tbl: Any, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    """Create with existing fields only to avoid 422s."""
-    if not tbl or not payload:
-        return None
-    try:
-        try:
-            probe = tbl.all(max_records=1)
-            keys = list((probe[0] or {}).get("fields", {}).keys()) if probe else []
-        except Exception:
-            keys = list(payload.keys())
-        lut = {_norm(k): k for k in keys}
-        filtered = {lut.get(_norm(k), k): v for k, v in payload.items() if _norm(k) in lut}
-        return tbl.create(filtered if filtered else {})
+        _CONVOS_TBL = Table(AIRTABLE_KEY, LEADS_CONVOS_BASE, CONVERSATIONS_TABLE)
     except Exception:
         return None
+    return _CONVOS_TBL
 
 
 def _has_value(value: Any) -> bool:
@@ -222,35 +207,8 @@ def _http_post(url: str, data: Dict[str, Any], auth: Tuple[str, str], timeout: i
         print(f"[DRY RUN] POST {url} data={data}")
         return {"sid": f"SM_fake_{int(time.time())}", "status": "queued"}
 
-    client = httpx or requests
-    if client is None:
-        raise RuntimeError("No HTTP client available (install httpx or requests).")
-
-    if httpx:
-        resp = httpx.post(url, data=data, auth=auth, timeout=timeout)
-        if resp.status_code >= 400:
-            logger.error("TextGrid %s error body: %s", resp.status_code, resp.text)
-        if resp.status_code == 429:
-            raise TextGridError(
-                f"429 rate limited; retry_after={resp.headers.get('Retry-After')}",
-                status_code=429,
-                body=resp.headers.get("Retry-After"),
-                payload=data,
-            )
-        if resp.is_error:
-            body = _extract_error_body(resp)
-            summary = _summarize_error_body(body)
-            message = f"TextGrid HTTP {resp.status_code}"
-            if summary:
-                message = f"{message}: {summary}"
-            raise TextGridError(message, status_code=resp.status_code, body=body, payload=data)
-        try:
-            return resp.json()
-        except Exception:
-            return {"raw": resp.text}
-
-    # requests fallback
-    resp = requests.post(url, data=data, auth=auth, timeout=timeout)
+    # Pooled keep-alive client (httpx/HTTP2 when available, requests otherwise)
+    resp = TRANSPORT.post(url, data=data, auth=auth, timeout=timeout)
     if resp.status_code >= 400:
         logger.error("TextGrid %s error body: %s", resp.status_code, resp.text)
     if resp.status_code == 429:
@@ -287,10 +245,11 @@ def send_message(
     lead_id: Optional[str] = None,
     property_id: Optional[str] = None,
     timeout: int = 15,
+    journal: bool = True,
 ) -> Dict[str, Any]:
     """
-    Send one SMS via TextGrid and log a Conversations row (best-effort).
-    Signature kept compatible with MessageProcessor.
+    Send one SMS via TextGrid and journal a Conversations row (best-effort).
+    `journal=False` only sends — the caller owns the Conversations row (MessageProcessor).
     Returns minimal normalized envelope: {"status": "sent"|"failed", "sid": ..., "raw": ...}
     """
     # =====================================================
@@ -332,58 +291,113 @@ def send_message(
         meta: Dict[str, Any] = {"error": str(e)}
         if e.body not in (None, "", {}):
             meta["error_body"] = e.body
-        _log_conversation(
-            status="FAILED",
-            phone=to,
-            from_number=from_number,
-            body=message,
-            sid=None,
-            campaign=campaign or campaign_id,
-            template_id=template_id,
-            lead_id=lead_id,
-            property_id=property_id,
-            meta=meta,
-        )
+        if journal:
+            _log_conversation(
+                status="FAILED",
+                phone=to,
+                from_number=from_number,
+                body=message,
+                sid=None,
+                campaign=campaign or campaign_id,
+                template_id=template_id,
+                lead_id=lead_id,
+                property_id=property_id,
+                meta=meta,
+            )
         raise
     except Exception as e:
         # Log FAILED conversation (best-effort), then bubble up
+        if journal:
+            _log_conversation(
+                status="FAILED",
+                phone=to,
+                from_number=from_number_log,
+                body=message,
+                sid=None,
+                campaign=campaign or campaign_id,
+                template_id=template_id,
+                lead_id=lead_id,
+                property_id=property_id,
+                meta={"error": str(e)},
+            )
+        raise
+
+    # Normalize provider response
+    sid = (resp or {}).get("sid") or (resp or {}).get("messageSid") or (resp or {}).get("id")
+    provider_status = str((resp or {}).get("status") or "sent").lower()
+    ok = provider_status in {"queued", "accepted", "submitted", "enroute", "sent", "delivered"}
+
+    # --- Conversations log (best-effort) ---
+    if journal:
         _log_conversation(
-            status="FAILED",
+            status="SENT" if ok else "FAILED",
             phone=to,
             from_number=from_number_log,
             body=message,
-            sid=None,
+            sid=sid,
             campaign=campaign or campaign_id,
             template_id=template_id,
             lead_id=lead_id,
             property_id=property_id,
-            meta={"error": str(e)},
+            meta={"provider_status": provider_status},
         )
-        raise
-
-    # Normalize provider response
-    sid = (resp or {}).get("sid") or (resp or {}).get("messageSid") or (resp or {}).get("id")
-    provider_status = str((resp or {}).get("status") or "sent").lower()
-    ok = provider_status in {"queued", "accepted", "submitted", "enroute", "sent", "delivered"}
-
-    # --- Conversations log (best-effort) ---
-    _log_conversation(
-        status="SENT" if ok else "FAILED",
-        phone=to,
-        from_number=from_number_log,
-        body=message,
-        sid=sid,
-        campaign=campaign or campaign_id,
-        template_id=template_id,
-        lead_id=lead_id,
-        property_id=property_id,
-        meta={"provider_status": provider_status},
-    )
 
     # Final envelope
     out = {"status": "sent" if ok else "failed", "sid": sid, "raw": resp}
     return out
 
+
+def find_messages(*, to: str, from_number: Optional[str], since: datetime, timeout: int = 15) -> Optional[List[Dict[str, Any]]]:
+    """
+    Messages sent to `to` (from `from_number`) since `since`, from the provider's message list.
+    Follows `next_page_uri` until a page reaches back past `since` (the list is newest first).
+    Returns None when the provider can't be asked (no credentials / HTTP error) or the window
+    wasn't covered within TEXTGRID_LOOKUP_MAX_PAGES — callers must treat that as "unknown", not "not sent".
+    """
+    if DRY_RUN:
+        return []
+    if not (ACCOUNT_SID and AUTH_TOKEN and API_URL):
+        return None
+    params: Optional[Dict[str, Any]] = {"To": to, "DateSent>": since.astimezone(timezone.utc).strftime("%Y-%m-%d")}
+    if from_number:
+        params["From"] = from_number
+    url: Optional[str] = API_URL
+    out: List[Dict[str, Any]] = []
+    for _ in range(LOOKUP_MAX_PAGES):
+        try:
+            resp = TRANSPORT.request("GET", url, params=params, auth=(ACCOUNT_SID, AUTH_TOKEN), timeout=timeout)
+            if resp.status_code >= 400:
+                logger.warning("TextGrid message lookup HTTP %s for %s", resp.status_code, to)
+                return None
+            data = resp.json() or {}
+        except Exception as e:
+            logger.warning("TextGrid message lookup failed for %s: %s", to, e)
+            return None
+        page = list(data.get("messages") or [])
+        out.extend(page)
+        next_uri = data.get("next_page_uri")
+        if not next_uri or not page or _predates(page[-1], since):
+            return out
+        url, params = urljoin(API_URL, next_uri), None  # the next-page URI carries its own query
+    logger.warning("TextGrid message lookup for %s truncated after %d pages; treating as unknown", to, LOOKUP_MAX_PAGES)
+    return None
+
+
+def _predates(msg: Dict[str, Any], since: datetime) -> bool:
+    raw = msg.get("date_created") or msg.get("date_sent")
+    if not raw:
+        return False
+    try:
+        sent = parsedate_to_datetime(str(raw))
+    except Exception:
+        try:
+            sent = datetime.fromisoformat(str(raw).replace("Z", "+00:00"))
+        except Exception:
+            return False
+    if sent.tzinfo is None:
+        sent = sent.replace(tzinfo=timezone.utc)
+    return sent < since
+
 # =========================
 # Airtable logging
 # =========================
@@ -424,10 +438,10 @@ def _log_conversation(
     if property_id and PROPERTY_ID_FIELD:
         payload[PROPERTY_ID_FIELD] = property_id
     if meta:
-        # Merge meta keys that happen to exist in the table (safe_create filters them)
+        # Merge meta keys that happen to exist in the table (the journal's remap filters them)
         payload.update(meta)
 
-    _safe_create(tbl, payload)
+    JOURNAL.append(tbl, payload, sid=sid)
 
 # Back-compat alias used by some call sites
 def queue_message(from_number: str, to_number: str, body: str, campaign=None):
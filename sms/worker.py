@@ -1,18 +1,23 @@
 """
 🚀 Advanced SMS Worker (Bulletproof Edition) — ++HARDENED++
-- Per-runner timeouts (prevents hangs)
-- Adaptive backoff on failure streaks
+- Step scheduler: campaigns / send / retry / autoresponder / metrics each run on their own
+  cadence in a shared pool, each under its own Dist.lock → a slow metrics rollup no longer
+  delays the autoresponder
+- Hard per-step timeouts (hung runners are abandoned, not joined) + cooperative cancellation
+- Per-step duration / lag / backlog metrics in the scheduler log
+- Adaptive backoff on failure streaks (per step)
 - Optional system metrics (psutil if available)
 - Startup warmup jitter
-- Final metrics flush on shutdown
+- Final metrics flush on shutdown (+ KPI / Numbers write-behind drain)
 - Same ENV toggles / Redis locks / telemetry
 """
 
 from __future__ import annotations
-import os, time, json, uuid, signal, traceback, random
+import os, time, json, uuid, signal, threading, traceback, random
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from contextlib import contextmanager
-from typing import Any, Dict, Optional, Callable
+from typing import Any, Dict, List, Optional, Callable, Tuple
 import concurrent.futures
 
 try:
@@ -56,9 +61,13 @@ JITTER_SEC = _env_int("WORKER_JITTER_SEC", 5)
 WARMUP_MIN_SEC = _env_int("WORKER_WARMUP_MIN_SEC", 5)
 WARMUP_MAX_SEC = _env_int("WORKER_WARMUP_MAX_SEC", 15)
 
-# Per-task timeout (seconds)
+# Per-task timeout (seconds); per step: WORKER_<STEP>_TIMEOUT_SEC / WORKER_<STEP>_INTERVAL_SEC
 RUNNER_TIMEOUT_SEC = _env_int("WORKER_RUNNER_TIMEOUT_SEC", 120)
 
+# Shared step pool (steps run concurrently) + how long shutdown waits for running steps
+POOL_SIZE = _env_int("WORKER_POOL_SIZE", 8)
+SHUTDOWN_GRACE_SEC = _env_float("WORKER_SHUTDOWN_GRACE_SEC", 10.0)
+
 # Adaptive backoff (on failure streak)
 BACKOFF_MAX_EXP = _env_int("WORKER_BACKOFF_MAX_EXP", 3)  # caps 2^exp multiplier
 BACKOFF_BASE = _env_float("WORKER_BACKOFF_BASE", 1.0)  # multiplier base on INTERVAL
@@ -68,6 +77,7 @@ ENABLE_SEND = _env_bool("ENABLE_SEND", True)
 ENABLE_RETRY = _env_bool("ENABLE_RETRY", True)
 ENABLE_AUTORESPONDER = _env_bool("ENABLE_AUTORESPONDER", True)
 ENABLE_METRICS = _env_bool("ENABLE_METRICS", True)
+ENABLE_REPLICA = _env_bool("REPLICA_ENABLED", False)
 
 CAMPAIGN_LIMIT = os.getenv("CAMPAIGN_LIMIT", "ALL")
 CAMPAIGN_SEND_AFTER = _env_bool("RUNNER_SEND_AFTER_QUEUE", False)
@@ -142,17 +152,64 @@ def _update_metrics():
         return {"ok": False, "error": str(e)}
 
 
+def _sync_replica():
+    try:
+        from sms.replica import REPLICA
+
+        return REPLICA.refresh()
+    except Exception as e:
+        traceback.print_exc()
+        return {"ok": False, "error": str(e)}
+
+
 # ────────────────────────────────────────────────
-# RUNNER SAFETY WRAPPER (timeouts)
+# SHARED STEP POOL + RUNNER SAFETY WRAPPER (timeouts)
 # ────────────────────────────────────────────────
-def _run_safely(fn: Callable[[], Dict[str, Any]], timeout_sec: int = RUNNER_TIMEOUT_SEC) -> Dict[str, Any]:
+class _Pool:
+    """
+    Bounded pool of daemon threads shared by all steps. Unlike a ThreadPoolExecutor
+    (joined on `with` exit and at interpreter exit), a hung runner is simply abandoned:
+    it keeps its slot until it returns, but never blocks other steps or shutdown.
+    """
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self._slots = threading.BoundedSemaphore(self.size)
+
+    def submit(self, fn: Callable[[], Any], name: str = "step") -> concurrent.futures.Future:
+        fut: concurrent.futures.Future = concurrent.futures.Future()
+
+        def _run():
+            with self._slots:
+                if not fut.set_running_or_notify_cancel():
+                    return
+                try:
+                    fut.set_result(fn())
+                except BaseException as e:
+                    fut.set_exception(e)
+
+        threading.Thread(target=_run, name=f"{WORKER_NAME}-{name}", daemon=True).start()
+        return fut
+
+
+_POOL = _Pool(POOL_SIZE)
+_LOCAL = threading.local()
+
+
+def cancel_requested() -> bool:
+    """Cooperative cancellation: long-running steps may poll this and return early."""
+    ev = getattr(_LOCAL, "cancel", None)
+    return bool(ev and ev.is_set()) or _STOP.is_set()
+
+
+def _run_safely(fn: Callable[[], Dict[str, Any]], timeout_sec: float = RUNNER_TIMEOUT_SEC) -> Dict[str, Any]:
+    fut = _POOL.submit(fn, name=getattr(fn, "__name__", "task"))
     try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as ex:
-            fut = ex.submit(fn)
-            return fut.result(timeout=timeout_sec) or {}
+        return fut.result(timeout=timeout_sec) or {}
     except concurrent.futures.TimeoutError:
+        fut.cancel()  # no-op once running; the thread is abandoned, not joined
         msg = f"Timeout after {timeout_sec}s"
-        print(f"⏱️ {fn.__name__} {msg}")
+        print(f"⏱️ {getattr(fn, '__name__', 'task')} {msg}")
         return {"ok": False, "error": msg}
     except Exception as e:
         traceback.print_exc()
@@ -181,9 +238,37 @@ class Dist:
         except Exception:
             traceback.print_exc()
 
+    _RELEASE = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    else
+        return 0
+    end
+    """
+    _EXTEND = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('EXPIRE', KEYS[1], ARGV[2])
+    else
+        return 0
+    end
+    """
+
+    def _keepalive(self, key: str, token: str, ttl: int, done: threading.Event) -> None:
+        """Re-arm the lock's TTL every ttl/3 while its holder runs, so a hung holder keeps it."""
+        while not done.wait(ttl / 3):
+            try:
+                if not self.r.eval(self._EXTEND, 1, key, token, ttl):
+                    return  # lost (expired during a Redis outage, or taken over)
+            except Exception:
+                traceback.print_exc()
+
     @contextmanager
     def lock(self, name: str, ttl: int):
-        """Redis NX lock (safe for multi-worker operation)."""
+        """
+        Redis NX lock (safe for multi-worker operation). The TTL is refreshed while the
+        body runs, so the lock is held until the body returns; `ttl` only bounds how long
+        a dead holder's lock lingers.
+        """
         if not self.r:
             yield True
             return
@@ -195,34 +280,30 @@ class Dist:
         except Exception:
             traceback.print_exc()
             acquired = True
+        done = threading.Event()
+        if acquired:
+            threading.Thread(
+                target=self._keepalive, args=(key, token, ttl, done), name=f"lock-keepalive-{name}", daemon=True
+            ).start()
         try:
             yield acquired
         finally:
+            done.set()
             if acquired and self.r:
                 try:
-                    lua = """
-                    if redis.call('GET', KEYS[1]) == ARGV[1] then
-                        return redis.call('DEL', KEYS[1])
-                    else
-                        return 0
-                    end
-                    """
-                    self.r.eval(lua, 1, key, token)
+                    self.r.eval(self._RELEASE, 1, key, token)
                 except Exception:
                     traceback.print_exc()
 
 
 DIST = Dist()
+_STOP = threading.Event()
 
 # ────────────────────────────────────────────────
 # SIGNAL HANDLERS
 # ────────────────────────────────────────────────
-_shutdown = False
-
-
 def _signal_handler(signum, frame):
-    global _shutdown
-    _shutdown = True
+    _STOP.set()
     print(f"👋 {WORKER_NAME}[{INSTANCE_ID}] got signal {signum}, shutting down...")
 
 
@@ -278,6 +359,24 @@ def _compact(res: Optional[Dict[str, Any]]) -> Dict[str, Any]:
     return filtered
 
 
+def _drain_buffers() -> Dict[str, Any]:
+    """Flush write-behind buffers (KPI sink, Numbers counters) before exit."""
+    out: Dict[str, Any] = {}
+    try:
+        from sms.kpi_logger import drain_kpis
+
+        out["kpis"] = drain_kpis(timeout=max(5, RUNNER_TIMEOUT_SEC // 4))
+    except Exception:
+        traceback.print_exc()
+    try:
+        from sms.number_pools import flush_number_pool
+
+        out["numbers"] = flush_number_pool()
+    except Exception:
+        traceback.print_exc()
+    return out
+
+
 def _sys_metrics() -> Optional[Dict[str, Any]]:
     """Lightweight system metrics (optional)."""
     try:
@@ -291,109 +390,220 @@ def _sys_metrics() -> Optional[Dict[str, Any]]:
         return None
 
 
+# ────────────────────────────────────────────────
+# STEP SCHEDULER
+# ────────────────────────────────────────────────
+@dataclass
+class Step:
+    """One independently cadenced loop (own lock, own interval, own timeout)."""
+
+    name: str
+    fn: Callable[[], Dict[str, Any]]
+    every_sec: float
+    timeout_sec: float
+    work_keys: Tuple[str, ...] = ()
+    next_at: float = 0.0
+    fail_streak: int = 0
+    rounds: int = 0
+    future: Optional[concurrent.futures.Future] = None
+    started_at: float = 0.0
+    timed_out: bool = False
+    cancel: threading.Event = field(default_factory=threading.Event)
+    stats: Dict[str, Any] = field(
+        default_factory=lambda: {
+            "runs": 0, "failures": 0, "timeouts": 0, "skipped_lock": 0,
+            "last_duration": None, "avg_duration": None, "max_duration": 0.0,
+            "lag_sec": 0.0, "backlog": None, "last_result": None,
+        }
+    )
+
+
+def _step_env(name: str, suffix: str, default: float) -> float:
+    return _env_float(f"WORKER_{name.upper()}_{suffix}", default)
+
+
+def _build_steps() -> List[Step]:
+    def step(name: str, fn: Callable[[], Dict[str, Any]], *work_keys: str) -> Step:
+        return Step(
+            name=name,
+            fn=fn,
+            every_sec=_step_env(name, "INTERVAL_SEC", INTERVAL_SEC),
+            timeout_sec=_step_env(name, "TIMEOUT_SEC", RUNNER_TIMEOUT_SEC),
+            work_keys=work_keys,
+        )
+
+    steps: List[Step] = []
+    if ENABLE_CAMPAIGNS:
+        steps.append(step("campaigns", lambda: _run_campaigns(CAMPAIGN_LIMIT, CAMPAIGN_SEND_AFTER), "processed", "queued"))
+    if ENABLE_SEND:
+        steps.append(step("send_batch", lambda: _send_batch(SEND_BATCH_LIMIT), "total_sent"))
+    if ENABLE_RETRY:
+        steps.append(step("retry", lambda: _run_retry(RETRY_LIMIT), "retried"))
+    if ENABLE_AUTORESPONDER:
+        steps.append(step("autoresponder", lambda: _run_autoresponder(AUTORESPONDER_LIMIT, AUTORESPONDER_VIEW), "processed"))
+    if ENABLE_METRICS:
+        steps.append(step("metrics", _update_metrics))
+    if ENABLE_REPLICA:
+        steps.append(step("replica", _sync_replica, "processed"))
+    return steps
+
+
+class Scheduler:
+    """
+    Runs each Step on its own cadence in the shared pool. A step never overlaps itself
+    (locally or, via Dist.lock, across workers); a step past its timeout is flagged,
+    asked to cancel and left behind while every other step keeps its schedule. The
+    left-behind run keeps its Dist.lock (the TTL is refreshed while it runs) until it returns.
+    """
+
+    def __init__(self, steps: List[Step], pool: Optional[_Pool] = None, stop: Optional[threading.Event] = None, max_runs: int = 0):
+        self.steps = steps
+        self.pool = pool or _POOL
+        self.stop = stop or _STOP
+        self.max_runs = max_runs
+        self._wake = threading.Event()
+
+    # ---------- per step ----------
+    def _task(self, step: Step) -> Optional[Dict[str, Any]]:
+        _LOCAL.cancel = step.cancel
+        ttl = int(max(60, step.timeout_sec + step.every_sec))  # only matters if this worker dies holding it
+        with DIST.lock(step.name, ttl=ttl) as ok:
+            if not ok:
+                return None
+            return step.fn() or {}
+
+    def _start(self, step: Step, now: float) -> None:
+        step.stats["lag_sec"] = round(max(0.0, now - step.next_at), 3) if step.rounds else 0.0
+        step.started_at = now
+        step.timed_out = False
+        step.cancel.clear()
+        step.future = self.pool.submit(lambda: self._task(step), name=step.name)
+        step.future.add_done_callback(lambda _f: self._wake.set())
+
+    def _reschedule(self, step: Step, now: float, did_work: bool) -> None:
+        if did_work:
+            delay = step.every_sec
+        else:
+            # Adaptive backoff when a step keeps failing (protects Airtable)
+            delay = max(1.0, max(step.every_sec, IDLE_INTERVAL_SEC) * BACKOFF_BASE * (2 ** step.fail_streak))
+        step.next_at = now + min(3600, delay + random.uniform(0, max(0, JITTER_SEC)))
+
+    def _reap(self, step: Step, now: float) -> None:
+        fut, step.future = step.future, None
+        late = step.timed_out
+        try:
+            res = fut.result()
+        except Exception as e:
+            res = {"ok": False, "error": str(e)}
+        duration = round(now - step.started_at, 3)
+        st = step.stats
+        if res is None:
+            st["skipped_lock"] += 1
+            _log("skip_lock", step=step.name)
+            self._reschedule(step, now, did_work=True)
+        else:
+            ok = bool(res.get("ok", True))
+            st["runs"] += 1
+            st["failures"] += int(not ok)
+            st["last_duration"] = duration
+            st["max_duration"] = max(st["max_duration"], duration)
+            prev = st["avg_duration"]
+            st["avg_duration"] = duration if prev is None else round(0.8 * prev + 0.2 * duration, 3)
+            st["backlog"] = next((res[k] for k in ("backlog", "remaining", "pending") if k in res), st["backlog"])
+            st["last_result"] = _compact(res)
+            step.fail_streak = 0 if ok else min(step.fail_streak + 1, BACKOFF_MAX_EXP)
+            _log("step", step=step.name, duration=duration, late=late or None, result=_compact(res))
+            if not late:
+                self._reschedule(step, now, did_work=any(res.get(k) for k in step.work_keys))
+        if not late:  # a timed-out run was already counted + rescheduled
+            step.rounds += 1
+
+    def _check_timeout(self, step: Step, now: float) -> None:
+        if step.timed_out or now - step.started_at < step.timeout_sec:
+            return
+        step.timed_out = True
+        step.cancel.set()
+        step.rounds += 1
+        step.stats["timeouts"] += 1
+        step.fail_streak = min(step.fail_streak + 1, BACKOFF_MAX_EXP)
+        self._reschedule(step, now, did_work=False)
+        _log("step_timeout", step=step.name, timeout_sec=step.timeout_sec)
+
+    # ---------- loop ----------
+    def done(self) -> bool:
+        return bool(self.max_runs) and all(s.rounds >= self.max_runs for s in self.steps)
+
+    def tick(self, now: float) -> float:
+        """Reap finished runs, flag overdue ones, start due ones. Returns seconds until the next event."""
+        wait = 1.0
+        for step in self.steps:
+            if step.future is not None:
+                if step.future.done():
+                    self._reap(step, now)
+                else:
+                    self._check_timeout(step, now)
+            if step.future is None:
+                if self.max_runs and step.rounds >= self.max_runs:
+                    continue
+                if now >= step.next_at:
+                    self._start(step, now)
+                else:
+                    wait = min(wait, step.next_at - now)
+        return max(0.05, wait)
+
+    def run(self, report_every: float = INTERVAL_SEC) -> None:
+        next_report = 0.0
+        while not self.stop.is_set() and not self.done():
+            now = time.monotonic()
+            wait = self.tick(now)
+            if now >= next_report:
+                next_report = now + max(1.0, report_every)
+                DIST.hb(f"{KEY_PREFIX}:hb:{WORKER_NAME}:{INSTANCE_ID}", ttl=max(60, INTERVAL_SEC * 3))
+                _log("scheduler", sys=_sys_metrics(), steps=self.status())
+                _ping_health()
+            self._wake.wait(wait)
+            self._wake.clear()
+
+    def shutdown(self, grace_sec: float) -> None:
+        """Signal cancellation and give running steps `grace_sec` to finish; hung ones are abandoned."""
+        running = [s for s in self.steps if s.future is not None]
+        for s in running:
+            s.cancel.set()
+        concurrent.futures.wait([s.future for s in running], timeout=grace_sec)
+        now = time.monotonic()
+        for s in running:
+            if s.future.done():
+                self._reap(s, now)
+
+    def status(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            s.name: {
+                **{k: v for k, v in s.stats.items() if k != "last_result"},
+                "running_for": round(now - s.started_at, 1) if s.future is not None else None,
+                "next_in": round(max(0.0, s.next_at - now), 1) if s.future is None else None,
+            }
+            for s in self.steps
+        }
+
+
 # ────────────────────────────────────────────────
 # MAIN WORKER LOOP
 # ────────────────────────────────────────────────
 def main():
-    print(f"🚀 Starting {WORKER_NAME} [{INSTANCE_ID}] | interval={INTERVAL_SEC}s idle={IDLE_INTERVAL_SEC}s jitter={JITTER_SEC}s")
+    print(f"🚀 Starting {WORKER_NAME} [{INSTANCE_ID}] | interval={INTERVAL_SEC}s idle={IDLE_INTERVAL_SEC}s jitter={JITTER_SEC}s pool={POOL_SIZE}")
 
     # Warmup (only if enabled)
     if (WARMUP_MAX_SEC > 0) and not RUN_ONCE:
         warm = random.randint(max(0, WARMUP_MIN_SEC), max(WARMUP_MIN_SEC, WARMUP_MAX_SEC))
         print(f"⏳ Warming up worker for {warm}s ...")
-        time.sleep(warm)
-
-    cycles = 0
-    fail_streak = 0  # consecutive cycle-level failures
+        _STOP.wait(warm)
 
+    sched = Scheduler(_build_steps(), max_runs=1 if RUN_ONCE else MAX_CYCLES)
     try:
-        while True:
-            if _shutdown:
-                break
-            if MAX_CYCLES and cycles >= MAX_CYCLES:
-                break
-
-            cycles += 1
-            DIST.hb(f"{KEY_PREFIX}:hb:{WORKER_NAME}:{INSTANCE_ID}", ttl=max(60, INTERVAL_SEC * 3))
-            did_work = False
-            cycle_ok = True
-            results: Dict[str, Any] = {}
-
-            lock_ttl_short = max(30, INTERVAL_SEC * 2)
-            lock_ttl_long = max(60, INTERVAL_SEC * 2)
-
-            # --- Campaign Scheduler ---
-            if ENABLE_CAMPAIGNS:
-                with DIST.lock("campaigns", ttl=lock_ttl_short) as ok:
-                    if ok:
-                        res = _run_safely(lambda: _run_campaigns(CAMPAIGN_LIMIT, CAMPAIGN_SEND_AFTER))
-                        results["campaigns"] = res
-                        did_work |= bool(res and (res.get("processed") or res.get("queued")))
-                        cycle_ok &= bool(res.get("ok", True))
-                    else:
-                        _log("skip_lock", step="campaigns")
-
-            # --- Outbound Sending ---
-            if ENABLE_SEND:
-                with DIST.lock("send_batch", ttl=lock_ttl_long) as ok:
-                    if ok:
-                        res = _run_safely(lambda: _send_batch(SEND_BATCH_LIMIT))
-                        results["send_batch"] = res
-                        did_work |= bool(res and res.get("total_sent"))
-                        cycle_ok &= bool(res.get("ok", True))
-                    else:
-                        _log("skip_lock", step="send_batch")
-
-            # --- Retry Failed Sends ---
-            if ENABLE_RETRY:
-                with DIST.lock("retry", ttl=lock_ttl_short) as ok:
-                    if ok:
-                        res = _run_safely(lambda: _run_retry(RETRY_LIMIT))
-                        results["retry"] = res
-                        did_work |= bool(res and res.get("retried"))
-                        cycle_ok &= bool(res.get("ok", True))
-                    else:
-                        _log("skip_lock", step="retry")
-
-            # --- Autoresponder (Inbound) ---
-            if ENABLE_AUTORESPONDER:
-                with DIST.lock("autoresponder", ttl=lock_ttl_short) as ok:
-                    if ok:
-                        res = _run_safely(lambda: _run_autoresponder(AUTORESPONDER_LIMIT, AUTORESPONDER_VIEW))
-                        results["autoresponder"] = res
-                        did_work |= bool(res and res.get("processed"))
-                        cycle_ok &= bool(res.get("ok", True))
-                    else:
-                        _log("skip_lock", step="autoresponder")
-
-            # --- Metrics Rollup ---
-            if ENABLE_METRICS:
-                with DIST.lock("metrics", ttl=lock_ttl_short) as ok:
-                    if ok:
-                        res = _run_safely(_update_metrics)
-                        results["metrics"] = res
-                        cycle_ok &= bool(res.get("ok", True))
-                    else:
-                        _log("skip_lock", step="metrics")
-
-            # --- Summary & Telemetry ---
-            _log("cycle", cycle=cycles, sys=_sys_metrics(), summary={k: _compact(v) for k, v in results.items()})
-            _ping_health()
-
-            # Update failure streak & choose sleep
-            fail_streak = 0 if cycle_ok else min(fail_streak + 1, BACKOFF_MAX_EXP)
-            if RUN_ONCE:
-                break
-
-            if did_work:
-                _sleep_with_jitter(INTERVAL_SEC)
-            else:
-                # Adaptive backoff when cycles keep failing (protects Airtable)
-                backoff_mult = BACKOFF_BASE * (2**fail_streak)
-                sleep_sec = max(1.0, IDLE_INTERVAL_SEC * backoff_mult)
-                _sleep_with_jitter(sleep_sec)
-
+        sched.run()
     finally:
+        sched.shutdown(grace_sec=SHUTDOWN_GRACE_SEC)
         # Final metrics flush on shutdown (best-effort)
         if ENABLE_METRICS:
             try:
@@ -401,9 +611,10 @@ def main():
                 _log("metrics_flush", result=_compact(res))
             except Exception:
                 traceback.print_exc()
+        _log("buffers_drained", result=_drain_buffers())
 
-    _log("shutdown", cycles=cycles)
-    print(f"🏁 {WORKER_NAME}[{INSTANCE_ID}] stopped cleanly after {cycles} cycles.")
+    _log("shutdown", steps=sched.status())
+    print(f"🏁 {WORKER_NAME}[{INSTANCE_ID}] stopped cleanly.")
 
 
 if __name__ == "__main__":
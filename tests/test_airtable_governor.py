@@ -0,0 +1,111 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+import sms.airtable_governor as gov
+
+BASE = "appAAAAAAAAAAAAAA"
+
+
+def test_waiters_are_served_by_lane_then_arrival():
+    g = gov.Governor(rps=5, use_shared=False)
+    for _ in range(5):
+        g.acquire(BASE, "bulk")  # drain the burst
+    order = []
+
+    def take(lane):
+        g.acquire(BASE, lane)
+        order.append(lane)
+
+    threads = [threading.Thread(target=take, args=(lane,)) for lane in ("bulk", "default", "interactive")]
+    for t in threads:
+        t.start()
+        time.sleep(0.02)
+    assert g.status()["bases"][BASE]["queue_depth"] == {"interactive": 1, "send": 0, "default": 1, "bulk": 1}
+    for t in threads:
+        t.join(5)
+
+    assert order == ["interactive", "default", "bulk"]
+    lanes = g.status()["bases"][BASE]["lanes"]
+    assert lanes["bulk"]["requests"] == 6 and lanes["interactive"]["requests"] == 1
+    assert lanes["bulk"]["wait_max_ms"] > lanes["interactive"]["wait_max_ms"] > 0
+
+
+def test_lane_handle_prepays_the_transport_admission():
+    g = gov.Governor(rps=5, use_shared=False)
+    with gov.airtable_lane("send"):
+        with g.handle(BASE).sending():
+            g.admit(BASE)  # the batch call inside the block → already admitted
+        g.admit(BASE)
+    lanes = g.status()["bases"][BASE]["lanes"]
+    assert lanes["send"]["requests"] == 2
+    assert gov.current_lane() == "default"
+    assert gov.retry_after_seconds("2") == 2.0 and gov.retry_after_seconds(None, 7) == 7
+
+
+def test_adapter_retries_429_after_retry_after_and_slows_the_base(monkeypatch):
+    hits = []
+
+    class _Airtable(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            hits.append(self.path)
+            throttled = len(hits) == 1
+            body = b'{"errors": "RATE_LIMIT"}' if throttled else b'{"records": []}'
+            self.send_response(429 if throttled else 200)
+            if throttled:
+                self.send_header("Retry-After", "0.1")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *_a):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Airtable)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    g = gov.Governor(rps=4, use_shared=False)
+    session = requests.Session()
+    session.mount("http://", gov.GovernedAdapter(governor=g))
+    try:
+        started = time.monotonic()
+        resp = session.get(f"http://127.0.0.1:{server.server_port}/v0/{BASE}/Leads")
+        elapsed = time.monotonic() - started
+    finally:
+        session.close()
+        server.shutdown()
+
+    assert resp.status_code == 200 and len(hits) == 2
+    assert elapsed >= 0.1
+    base = g.status()["bases"][BASE]
+    assert base["throttled_429"] == 1 and base["retried_429"] == 1
+    assert base["rate"] == 2.25  # halved on the 429, +0.25 on the success
+
+
+def test_unused_prepay_does_not_leak_to_the_next_request():
+    g = gov.Governor(rps=5, use_shared=False)
+    with gov.airtable_lane("send"):
+        with g.handle(BASE).sending():
+            pass  # e.g. nothing left to write
+        g.handle(BASE).acquire()  # plain acquire never prepays
+    with gov.airtable_lane("bulk"):
+        g.admit(BASE)  # unrelated request: charged in its own lane
+    lanes = g.status()["bases"][BASE]["lanes"]
+    assert lanes["send"]["requests"] == 2 and lanes["bulk"]["requests"] == 1
+
+
+def test_pipelined_send_threads_keep_the_send_lane(monkeypatch):
+    import sms.outbound_batcher as ob
+
+    seen = []
+    monkeypatch.setattr(ob, "_deliver", lambda writes, job: seen.append(("deliver", gov.current_lane())) or (True, None))
+    monkeypatch.setattr(
+        ob, "_record_outcome", lambda writes, tbl, job, delivered, now, err: seen.append(("record", gov.current_lane()))
+    )
+    jobs = [ob._SendJob(rid=f"rec{i}", phone="+15555550101", body="hi", did="+15550000001") for i in range(3)]
+    with gov.airtable_lane("send"):
+        ob._send_pipelined(jobs, None, None, None, workers=2, timings={})
+    assert len(seen) == 6 and {lane for _, lane in seen} == {"send"}
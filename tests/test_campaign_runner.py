@@ -0,0 +1,81 @@
+import threading
+from types import SimpleNamespace
+
+from sms import campaign_runner as cr
+
+
+class FakeDrip:
+    def __init__(self, bad_market=None, bad_phone=None):
+        self.calls = []
+        self.rows = []
+        self.bad_market = bad_market
+        self.bad_phone = bad_phone
+        self._lock = threading.Lock()
+
+    def batch_create(self, rows):
+        with self._lock:
+            self.calls.append(len(rows))
+            assert len(rows) <= 10
+            if self.bad_market and any(r.get(cr.DRIP_MARKET_F) == self.bad_market for r in rows):
+                raise Exception("422 INVALID_MULTIPLE_CHOICE_OPTIONS")
+            if self.bad_phone and any(r.get(cr.DRIP_SELLER_PHONE_F) == self.bad_phone for r in rows):
+                raise Exception("422 INVALID_VALUE_FOR_COLUMN")
+            self.rows.extend(rows)
+            return rows
+
+
+def _payloads(n, market="Houston"):
+    return [{cr.DRIP_SELLER_PHONE_F: f"+1555555{i:04d}", cr.DRIP_MARKET_F: market} for i in range(n)]
+
+
+def test_bulk_create_chunks_by_ten():
+    drip = FakeDrip()
+    handle = SimpleNamespace(table=drip, base_id="appTEST")
+
+    created, failed = cr._bulk_create_drips(handle, _payloads(95))
+
+    assert (created, failed) == (95, 0)
+    assert sorted(drip.calls) == [5] + [10] * 9
+
+
+def test_bulk_create_retries_only_failed_chunk_without_market():
+    drip = FakeDrip(bad_market="Nowhere", bad_phone="+15555550003")
+    handle = SimpleNamespace(table=drip, base_id="appTEST")
+    rows = _payloads(10) + _payloads(10, market="Nowhere")
+    for i, r in enumerate(rows[10:]):
+        r[cr.DRIP_SELLER_PHONE_F] = f"+1555556{i:04d}"
+
+    created, failed = cr._bulk_create_drips(handle, rows)
+
+    # first chunk has one bad phone → isolated; second chunk retried without Market
+    assert (created, failed) == (19, 1)
+    assert sum(1 for r in drip.rows if cr.DRIP_MARKET_F not in r) == 10
+
+
+class IterDrip:
+    def __init__(self, rows):
+        self.rows = rows
+        self.iterate_calls = []
+
+    def iterate(self, **opts):
+        self.iterate_calls.append(opts)
+        yield [r for r in self.rows if r["fields"].get(cr.DRIP_STATUS_F) != "Failed"]
+
+
+def test_dedupe_index_preloads_once_and_tracks_new_rows():
+    drip = IterDrip(
+        [
+            {"id": "d1", "fields": {cr.DRIP_SELLER_PHONE_F: "+15555550101", cr.DRIP_CAMPAIGN_LINK_F: ["camA"], cr.DRIP_STATUS_F: "Sent"}},
+            {"id": "d2", "fields": {cr.DRIP_SELLER_PHONE_F: "+15555550202", cr.DRIP_CAMPAIGN_LINK_F: ["camB"], cr.DRIP_STATUS_F: "Failed"}},
+        ]
+    )
+    idx = cr.DripDedupeIndex.load(SimpleNamespace(table=drip, base_id="appTEST"))
+
+    assert idx.loaded and len(drip.iterate_calls) == 1
+    assert drip.iterate_calls[0]["fields"] == [cr.DRIP_SELLER_PHONE_F, cr.DRIP_CAMPAIGN_LINK_F, cr.DRIP_STATUS_F]
+    assert idx.in_campaign("camA", "(555) 555-0101")
+    assert not idx.in_campaign("camB", "+15555550202")  # Failed rows don't count
+    assert not idx.active_for_phone("+15555550202")
+
+    idx.add(["camC"], "+15555550303")
+    assert idx.in_campaign("camC", "5555550303") and idx.active_for_phone("5555550303")
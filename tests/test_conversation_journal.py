@@ -0,0 +1,144 @@
+from types import SimpleNamespace
+
+from sms import conversation_journal as cj
+from sms import textgrid_sender as tg
+from sms.conversation_journal import ConversationJournal
+
+
+class FakeConvos:
+    """Quacks like pyairtable.Table: batch_upsert keyed on a column, batch_create, create."""
+
+    def __init__(self):
+        self.rows = {}
+        self.calls = []
+
+    def batch_upsert(self, records, key_fields):
+        self.calls.append(("upsert", len(records)))
+        out = []
+        for rec in records:
+            sid = rec["fields"][key_fields[0]]
+            rid = next((r for r, f in self.rows.items() if f.get(key_fields[0]) == sid), f"rec{len(self.rows)}")
+            self.rows.setdefault(rid, {}).update(rec["fields"])
+            out.append({"id": rid, "fields": dict(self.rows[rid])})
+        return {"records": out, "createdRecords": [], "updatedRecords": []}
+
+    def batch_update(self, records):
+        self.calls.append(("update", len(records)))
+        for rec in records:
+            self.rows[rec["id"]].update(rec["fields"])
+        return [{"id": rec["id"], "fields": self.rows[rec["id"]]} for rec in records]
+
+    def batch_create(self, records):
+        self.calls.append(("create", len(records)))
+        return [self.create(fields, _count=False) for fields in records]
+
+    def create(self, fields, _count=True):
+        if _count:
+            self.calls.append(("create", 1))
+        rid = f"rec{len(self.rows)}"
+        self.rows[rid] = dict(fields)
+        return {"id": rid, "fields": fields}
+
+
+def test_one_row_per_sid_across_paths_and_flushes(monkeypatch):
+    tbl, seen = FakeConvos(), []
+    j = ConversationJournal(buffered=True)
+    monkeypatch.setattr(j, "start", lambda: None)  # flush by hand, no background flusher
+    j.append(tbl, {"Message": "hi", "Status": "SENT"}, sid="SM1", on_written=seen.append)
+    j.append(tbl, {"Stage": "Stage 1"}, sid="SM1")  # second path reporting the same message
+    for n in range(12):
+        j.append(tbl, {"Message": f"trail {n}"})
+    assert j.backlog() == 13 and tbl.calls == []
+
+    assert j.flush() == 13
+    assert tbl.calls == [("upsert", 1), ("create", 10), ("create", 2)]
+    assert tbl.rows["rec0"] == {"Message": "hi", "Status": "SENT", "Stage": "Stage 1", "TextGrid ID": "SM1"}
+    assert seen == ["rec0"]
+
+    j.append(tbl, {"Status": "DELIVERED"}, sid="SM1")  # already written → update, not a new row
+    j.flush()
+    assert tbl.calls[-1] == ("update", 1) and len(tbl.rows) == 13
+    assert tbl.rows["rec0"]["Status"] == "DELIVERED"
+    assert j.status()["merged"] == 1 and j.status()["pending"] == 0
+
+
+def test_write_returns_the_id_and_failures_are_requeued(monkeypatch):
+    monkeypatch.setattr(cj, "JOURNAL_RETRY_BASE_SEC", 0.0)
+    class Flaky(FakeConvos):
+        fail = True
+
+        def create(self, fields, _count=True):
+            if self.fail:
+                self.fail = False
+                raise RuntimeError("502 Bad Gateway")
+            return super().create(fields, _count)
+
+    tbl = Flaky()
+    j = ConversationJournal(buffered=True)
+    assert j.write(tbl, {"Message": "failed send"}, timeout=1) is None
+    assert j.backlog() == 1 and j.stats["retried"] == 1
+    assert j.drain(timeout=1) and tbl.rows == {"rec0": {"Message": "failed send"}}
+    j.stop()
+
+
+def test_failed_rows_back_off_before_retrying(monkeypatch):
+    class Down(FakeConvos):
+        def create(self, fields, _count=True):
+            self.calls.append(("create", 1))
+            raise RuntimeError("503 Service Unavailable")
+
+    clock = [1000.0]
+    monkeypatch.setattr(cj.time, "time", lambda: clock[0])
+    monkeypatch.setattr(cj, "JOURNAL_MAX_ATTEMPTS", 3)
+    tbl = Down()
+    j = ConversationJournal(buffered=False)
+    j.append(tbl, {"Message": "hi"})
+    assert len(tbl.calls) == 1 and j.backlog() == 1
+
+    for _ in range(5):  # flusher ticks inside the backoff don't spend attempts
+        assert j.flush() == 0
+    assert len(tbl.calls) == 1
+
+    clock[0] += cj.JOURNAL_RETRY_BASE_SEC
+    j.flush()
+    assert len(tbl.calls) == 2 and j.backlog() == 1  # second backoff is twice as long
+    clock[0] += cj.JOURNAL_RETRY_BASE_SEC
+    j.flush()
+    assert len(tbl.calls) == 2
+    clock[0] += cj.JOURNAL_RETRY_BASE_SEC
+    j.flush()
+    assert len(tbl.calls) == 3 and j.backlog() == 0 and j.stats["dropped"] == 1
+
+
+def test_sid_index_is_shared_across_table_objects(monkeypatch):
+    def table(rows):
+        tbl = FakeConvos()
+        tbl.rows, tbl.base, tbl.name = rows, SimpleNamespace(id="appX"), "Conversations"
+        return tbl
+
+    rows = {}
+    first, second = table(rows), table(rows)
+    j = ConversationJournal(buffered=True)
+    monkeypatch.setattr(j, "start", lambda: None)
+    j.append(first, {"Status": "SENT"}, sid="SM1")
+    j.append(second, {"Stage": "Stage 1"}, sid="SM1")
+    assert j.backlog() == 1 and j.stats["merged"] == 1
+
+    j.flush()
+    j.append(second, {"Status": "DELIVERED"}, sid="SM1")
+    j.flush()
+    assert second.calls == [("update", 1)] and len(rows) == 1
+
+
+def test_transport_only_send_skips_the_sender_row(monkeypatch):
+    logged = []
+    monkeypatch.setattr(tg, "ACCOUNT_SID", "AC123")
+    monkeypatch.setattr(tg, "AUTH_TOKEN", "token")
+    monkeypatch.setattr(tg, "API_URL", "https://example.com")
+    monkeypatch.setattr(tg, "_http_post", lambda *_a, **_k: {"sid": "SM9", "status": "queued"})
+    monkeypatch.setattr(tg, "_log_conversation", lambda **kw: logged.append(kw["sid"]))
+
+    assert tg.send_message(from_number="+15550000000", to="+15551234567", message="hi", journal=False)["sid"] == "SM9"
+    assert logged == []
+    tg.send_message(from_number="+15550000000", to="+15551234567", message="hi")
+    assert logged == ["SM9"]
@@ -0,0 +1,134 @@
+import threading
+from types import SimpleNamespace
+
+import sms.airtable_client as airtable_client
+import sms.message_processor as mp
+from sms.conversation_journal import ConversationJournal
+from sms.conversation_summary import ConversationSummary
+
+
+class FakeConvos:
+    """Quacks like pyairtable.Table for Conversations: iterate(), create(), all()."""
+
+    def __init__(self, rows):
+        self.base = SimpleNamespace(id="appTEST")
+        self.name = "Conversations"
+        self.rows = list(rows)
+        self.new_rows = []
+        self.iterate_calls = []
+        self.all_calls = 0
+        self.created = []
+
+    def iterate(self, **opts):
+        self.iterate_calls.append(opts)
+        yield list(self.new_rows if opts.get("formula") else self.rows)
+
+    def get(self, rid):
+        return next((r for r in self.rows if r["id"] == rid), None)
+
+    def all(self, **_opts):
+        self.all_calls += 1
+        return []
+
+    def create(self, fields):
+        rec = {"id": f"recNew{len(self.created)}", "fields": fields}
+        self.created.append(rec)
+        return rec
+
+
+def _row(rid, phone, direction, at, **extra):
+    key = "Last Sent Time" if direction == "OUTBOUND" else "Received Time"
+    return {"id": rid, "fields": {"Seller Phone Number": phone, "Direction": direction, key: at, **extra}}
+
+
+def test_sweep_then_incremental_updates_without_double_counting(tmp_path):
+    tbl = FakeConvos(
+        [
+            _row("rec1", "+15555550101", "OUTBOUND", "2025-01-01T00:00:00Z", Stage="Stage 1"),
+            _row("rec2", "(555) 555-0101", "INBOUND", "2025-01-02T00:00:00Z", Lead=["recLead"]),
+        ]
+    )
+    store = ConversationSummary(path=str(tmp_path / "s.sqlite3"))
+    assert store.warm(tbl, wait=True)
+
+    s = store.get(tbl, "5555550101")
+    assert (s["sent"], s["replies"], s["lead_id"], s["stage"]) == (1, 1, "recLead", "Stage 1")
+    assert s["last_inbound"] == "2025-01-02T00:00:00Z"
+
+    store.record(tbl, "+15555550101", "OUTBOUND", at="2025-01-03T00:00:00Z", record_id="rec3")
+    store.record(tbl, "+15555550101", "OUTBOUND", at="2025-01-03T00:00:00Z", record_id="rec3")
+    assert store.counts(tbl, "5555550101") == (2, 1)
+
+    # Delta pull returns our own row again plus one written elsewhere
+    tbl.new_rows = [_row("rec3", "5555550101", "OUTBOUND", "x"), _row("rec4", "5555550101", "INBOUND", "2025-01-04T00:00:00Z")]
+    store.ensure(tbl, max_age=0)
+    assert store.counts(tbl, "5555550101") == (2, 2)
+    assert len(tbl.iterate_calls) == 2
+
+
+def test_logging_a_send_does_no_history_reads(tmp_path, monkeypatch):
+    tbl = FakeConvos([_row("rec1", "+15555550101", "OUTBOUND", "2025-01-01T00:00:00Z", Lead=["recLead"])])
+    store = ConversationSummary(path=str(tmp_path / "s.sqlite3"))
+    monkeypatch.setattr(mp, "CONVO_SUMMARY", store)
+    monkeypatch.setattr(mp, "get_convos", lambda: tbl)
+    monkeypatch.setattr(airtable_client, "get_leads", lambda: None)
+    monkeypatch.setattr(mp, "_remap_existing_only", lambda _tbl, payload: payload)
+    monkeypatch.setattr(mp.FIELD_REGISTRY, "remap", lambda _tbl, payload, existing_only=True: dict(payload))
+    monkeypatch.setattr(mp, "JOURNAL", ConversationJournal(buffered=False))
+    store.warm(tbl, wait=True)
+
+    kwargs = dict(
+        status="SENT", phone="+15555550101", body="hi", from_number="+18885550000", direction="OUTBOUND",
+        sid="SM1", campaign_id=None, template_id=None, drip_queue_id=None, metadata=None,
+    )
+    mp.MessageProcessor._log_conversation(**kwargs)
+    mp.MessageProcessor._log_conversation(**{**kwargs, "sid": "SM2"})
+
+    assert tbl.all_calls == 0
+    assert len(tbl.iterate_calls) == 1  # the one warm-up sweep
+    assert len(tbl.created) == 2
+    assert tbl.created[1]["fields"]["Lead"] == ["recLead"]
+    assert tbl.created[1]["fields"]["Stage"] == "Stage 1 - Ownership Confirmation"
+    assert store.counts(tbl, "5555550101") == (3, 0)
+
+
+def test_sends_fall_back_while_the_sweep_runs_in_the_background(tmp_path):
+    gate = threading.Event()
+
+    class SlowConvos(FakeConvos):
+        def iterate(self, **opts):
+            gate.wait(5)
+            yield from super().iterate(**opts)
+
+    tbl = SlowConvos([_row("rec1", "+15555550101", "OUTBOUND", "2025-01-01T00:00:00Z")])
+    store = ConversationSummary(path=str(tmp_path / "s.sqlite3"))
+
+    assert store.get(tbl, "5555550101") is None  # legacy path, not blocked on the sweep
+    assert store.status()["sweeping"] == ["appTEST/Conversations"]
+    store.record(tbl, "+15555550101", "INBOUND", at="2025-01-02T00:00:00Z", record_id="rec2")
+
+    gate.set()
+    assert store.warm(tbl, wait=True)
+    assert store.counts(tbl, "5555550101") == (1, 1)
+    assert store.stats["sweeps"] == 1
+
+
+def test_refresh_prunes_counted_ids_behind_the_high_water_mark(tmp_path, monkeypatch):
+    import sms.conversation_summary as cs
+
+    tbl = FakeConvos([_row(f"rec{i}", "5555550101", "OUTBOUND", "2025-01-01T00:00:00Z") for i in range(3)])
+    store = ConversationSummary(path=str(tmp_path / "s.sqlite3"))
+    assert store.warm(tbl, wait=True)
+    store.record(tbl, "5555550101", "OUTBOUND", record_id="recNew")
+    counted = lambda: store._db().execute("SELECT COUNT(*) FROM counted").fetchone()[0]  # noqa: E731
+    assert counted() == 4
+
+    # Fresh ids survive a refresh: a delta pull could still return them
+    store.ensure(tbl, max_age=0)
+    assert counted() == 4
+
+    later = cs._utcnow() + cs.timedelta(seconds=3 * cs.CONVO_SUMMARY_SKEW_SEC)
+    monkeypatch.setattr(cs, "_utcnow", lambda: later)
+    store.ensure(tbl, max_age=0)
+    assert counted() == 0 and store.stats["pruned"] == 4
+    assert store.counts(tbl, "5555550101") == (4, 0)
@@ -0,0 +1,123 @@
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import sms.delivery_webhook as delivery_webhook
+import sms.dlr_pipeline as dlr
+from sms.dlr_pipeline import DlrPipeline
+from sms.field_registry import FieldRegistry
+
+
+class FakeTable:
+    def __init__(self, name):
+        self.name = name
+        self.batches = []
+        self.lookups = 0
+
+    def batch_update(self, records):
+        self.batches.append(records)
+        return records
+
+    def all(self, **_kw):
+        self.lookups += 1
+        return []
+
+
+def _pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr(dlr, "FIELD_REGISTRY", FieldRegistry(path=str(tmp_path / "fields.json")))
+    monkeypatch.setattr(dlr, "base_bucket", lambda _b: SimpleNamespace(sending=nullcontext))
+    tables = {"conversations": FakeTable("Conversations"), "drip": FakeTable("Drip Queue")}
+    handles = {
+        name: (lambda t=t: SimpleNamespace(table=t, in_memory=False, base_id="appT", table_name=t.name))
+        for name, t in tables.items()
+    }
+    return DlrPipeline(path=str(tmp_path / "dlr.sqlite3"), handles=handles), tables
+
+
+def test_burst_is_coalesced_into_ten_record_batches_without_lookups(tmp_path, monkeypatch):
+    pipe, tables = _pipeline(tmp_path, monkeypatch)
+    pipe.resolver = lambda sid: (_ for _ in ()).throw(AssertionError("indexed SIDs need no lookup"))
+    for i in range(25):
+        pipe.remember(f"SM{i}", drip_id=f"recD{i}", did="+15550000001")
+        pipe.remember(f"SM{i}", convo_id=f"recC{i}")
+
+    for i in range(25):
+        pipe.submit(f"SM{i}", delivery_webhook._status_patches("sent", None), delivery_webhook.STATUS_RANK["sent"])
+        pipe.submit(f"SM{i}", delivery_webhook._status_patches("delivered", None), delivery_webhook.STATUS_RANK["delivered"])
+    # a late "sent" must not undo "delivered"
+    pipe.submit("SM0", delivery_webhook._status_patches("sent", None), delivery_webhook.STATUS_RANK["sent"])
+
+    assert pipe.drain(timeout=5)
+    for name, col in (("conversations", delivery_webhook.CONV_STATUS), ("drip", delivery_webhook.DRIP_STATUS)):
+        assert [len(b) for b in tables[name].batches] == [10, 10, 5]
+        assert {r["fields"][col] for b in tables[name].batches for r in b} == {"DELIVERED"}
+    assert {r["id"] for b in tables["drip"].batches for r in b} == {f"recD{i}" for i in range(25)}
+    assert pipe.status()["pending"] == 0 and pipe.stats["coalesced"] == 26
+
+
+def test_unindexed_sid_falls_back_to_lookup_after_grace(tmp_path, monkeypatch):
+    pipe, tables = _pipeline(tmp_path, monkeypatch)
+    monkeypatch.setattr(dlr, "DLR_RESOLVE_GRACE_SEC", 0)
+    calls = []
+    pipe.resolver = lambda sid: calls.append(sid) or ("recC9", None)
+
+    pipe.submit("SM-OLD", delivery_webhook._status_patches("failed", "30007"), 2)
+    assert pipe.drain(timeout=5)
+
+    assert calls == ["SM-OLD"]
+    [[record]] = tables["conversations"].batches
+    assert record["id"] == "recC9" and record["fields"][delivery_webhook.CONV_STATUS] == "FAILED"
+    assert record["fields"][delivery_webhook.CONV_LAST_ERR] == "30007"
+    assert tables["drip"].batches == []
+    assert pipe.lookup("SM-OLD")["conversations"] == "recC9"
+
+
+def test_webhook_only_enqueues(tmp_path, monkeypatch):
+    pipe, tables = _pipeline(tmp_path, monkeypatch)
+    monkeypatch.setattr(delivery_webhook, "DLR_PIPELINE", pipe)
+    monkeypatch.setattr(delivery_webhook, "IDEM", delivery_webhook.IdemStore())
+    monkeypatch.setattr(delivery_webhook, "WEBHOOK_TOKEN", None)
+    monkeypatch.setattr(delivery_webhook, "_bump_numbers", lambda *_a: None)
+    monkeypatch.setattr(pipe, "start", lambda: None)
+    app = FastAPI()
+    app.include_router(delivery_webhook.router_root)
+    client = TestClient(app)
+
+    payload = {"MessageSid": "SM1", "To": "+15555550123", "From": "+14444440123"}
+    assert client.post("/status", data={**payload, "MessageStatus": "sent"}).json()["normalized"] == "sent"
+    assert client.post("/status", data={**payload, "MessageStatus": "delivered"}).json()["normalized"] == "delivered"
+    assert client.post("/status", data={**payload, "MessageStatus": "delivered"}).json()["note"] == "duplicate"
+
+    assert pipe.status()["pending"] == 1
+    assert all(not t.batches and not t.lookups for t in tables.values())
+
+
+def test_receipt_waits_for_the_journaled_conversation_id(tmp_path, monkeypatch):
+    pipe, tables = _pipeline(tmp_path, monkeypatch)
+    pipe.resolver = lambda sid: (_ for _ in ()).throw(AssertionError("no lookup inside the grace window"))
+    # Send side: drip id known now, Conversations row still queued on the journal
+    pipe.remember("SM1", drip_id="recD1", did="+15550000001", expect=("conversations", "drip"))
+    pipe.submit("SM1", delivery_webhook._status_patches("delivered", None), delivery_webhook.STATUS_RANK["delivered"])
+
+    assert pipe.flush()["waiting"] == 1
+    assert pipe.status()["pending"] == 1 and tables["drip"].batches == []
+
+    pipe.remember("SM1", convo_id="recC1")  # journal landed the row
+    assert pipe.drain(timeout=5)
+    assert [r["id"] for b in tables["conversations"].batches for r in b] == ["recC1"]
+    assert [r["id"] for b in tables["drip"].batches for r in b] == ["recD1"]
+
+
+def test_missing_table_is_resolved_by_lookup_after_grace(tmp_path, monkeypatch):
+    pipe, tables = _pipeline(tmp_path, monkeypatch)
+    monkeypatch.setattr(dlr, "DLR_RESOLVE_GRACE_SEC", 0)
+    pipe.resolver = lambda sid: ("recC2", None)
+    pipe.remember("SM2", drip_id="recD2", expect=("conversations", "drip"))
+    pipe.submit("SM2", delivery_webhook._status_patches("delivered", None), delivery_webhook.STATUS_RANK["delivered"])
+
+    assert pipe.drain(timeout=5)
+    assert [r["id"] for b in tables["conversations"].batches for r in b] == ["recC2"]
+    assert [r["id"] for b in tables["drip"].batches for r in b] == ["recD2"]
+    assert pipe.lookup("SM2") == {"conversations": "recC2", "drip": "recD2", "did": None}
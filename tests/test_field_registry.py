@@ -0,0 +1,133 @@
+import json
+from types import SimpleNamespace
+
+import sms.datastore as datastore
+import sms.field_registry as fr
+from sms.datastore import TableHandle
+from sms.field_registry import FieldRegistry
+
+
+class FakeBase:
+    def __init__(self, columns, fail=False):
+        self.id = "appTEST"
+        self.columns = columns
+        self.fail = fail
+        self.schema_calls = 0
+
+    def schema(self, force=False):
+        self.schema_calls += 1
+        if self.fail:
+            raise RuntimeError("403 schema.bases:read missing")
+        fields = [SimpleNamespace(name=c) for c in self.columns]
+        return SimpleNamespace(tables=[SimpleNamespace(id="tblConvos", name="Conversations", fields=fields)])
+
+
+class FakeTable:
+    def __init__(self, base, reject=()):
+        self.base = base
+        self.name = "Conversations"
+        self.reject = set(reject)
+        self.all_calls = 0
+        self.created = []
+
+    def all(self, **_opts):
+        self.all_calls += 1
+        return []
+
+    def create(self, fields):
+        bad = self.reject & set(fields)
+        if bad:
+            raise RuntimeError(f'422 UNKNOWN_FIELD_NAME Unknown field name: "{bad.pop()}"')
+        self.created.append(fields)
+        return {"id": f"rec{len(self.created)}", "fields": fields}
+
+
+def test_static_seed_remaps_without_probing(tmp_path):
+    tbl = FakeTable(FakeBase([], fail=True))
+    reg = FieldRegistry(path=str(tmp_path / "fields.json"))
+
+    out = reg.remap(tbl, {"seller phone number": "+15555550101", "message": "hi", "Custom Col": 1})
+
+    assert out == {"Seller Phone Number": "+15555550101", "Message": "hi", "Custom Col": 1}
+    assert tbl.all_calls == 0
+
+
+def test_metadata_refresh_is_authoritative_and_snapshotted(tmp_path):
+    path = str(tmp_path / "fields.json")
+    base = FakeBase(["Seller Phone Number", "Message"])
+    tbl = FakeTable(base)
+    reg = FieldRegistry(path=path)
+
+    assert reg.refresh("appTEST", tbl)
+    assert reg.remap(tbl, {"message": "hi", "Custom Col": 1}) == {"Message": "hi"}
+    assert reg.remap(tbl, {"Custom Col": 1}, existing_only=False) == {"Custom Col": 1}
+
+    cold = FieldRegistry(path=path)
+    assert cold.remap(tbl, {"MESSAGE": "x", "Nope": 2}) == {"Message": "x"}
+    assert base.schema_calls == 1  # snapshot was fresh → no metadata call
+    assert tbl.all_calls == 0
+
+
+def test_unknown_field_errors_are_learned_on_write(tmp_path, monkeypatch):
+    reg = FieldRegistry(path=str(tmp_path / "fields.json"))
+    monkeypatch.setattr(datastore, "FIELD_REGISTRY", reg)
+    monkeypatch.setattr(datastore, "retry", lambda fn, **_k: fn())
+    tbl = FakeTable(FakeBase([], fail=True), reject={"Legacy Col"})
+    handle = TableHandle(table=tbl, in_memory=False, base_id="appTEST", table_name="Conversations")
+
+    assert datastore._safe_create(handle, {"Message": "hi", "Legacy Col": 1})
+    assert datastore._safe_create(handle, {"Message": "again", "Legacy Col": 2})
+
+    assert tbl.created == [{"Message": "hi"}, {"Message": "again"}]
+    assert reg.status()["missing"] == {"appTEST/Conversations": ["Legacy Col"]}
+    assert tbl.all_calls == 0
+
+
+def test_unknown_field_retries_are_bounded(tmp_path, monkeypatch):
+    reg = FieldRegistry(path=str(tmp_path / "fields.json"))
+    monkeypatch.setattr(datastore, "FIELD_REGISTRY", reg)
+    monkeypatch.setattr(datastore, "retry", lambda fn, **_k: fn())
+    tbl = FakeTable(FakeBase([], fail=True), reject={"Owner's Name"})
+    handle = TableHandle(table=tbl, in_memory=False, base_id="appTEST", table_name="Conversations")
+    calls = []
+    create = tbl.create
+    monkeypatch.setattr(tbl, "create", lambda fields: calls.append(fields) or create(fields))
+
+    assert datastore._safe_create(handle, {"Message": "hi", "Owner's Name": "Pat"})
+    assert reg.status()["missing"] == {"appTEST/Conversations": ["Owner's Name"]}
+    assert len(calls) == 2
+
+    # A column the remap can't drop (not in the payload) → no retry loop
+    def always_reject(fields):
+        calls.append(fields)
+        raise RuntimeError('422 UNKNOWN_FIELD_NAME Unknown field name: "Ghost"')
+
+    calls.clear()
+    monkeypatch.setattr(tbl, "create", always_reject)
+    assert datastore._safe_create(handle, {"Message": "again"}) is None
+    assert datastore._safe_create(handle, {"Message": "again"}) is None
+    assert len(calls) == 2
+
+
+def test_learned_missing_columns_expire(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(fr.time, "time", lambda: clock[0])
+    monkeypatch.setattr(fr, "FIELD_REGISTRY_METADATA", False)
+    monkeypatch.setattr(fr, "FIELD_REGISTRY_MISSING_TTL_SEC", 60)
+    path = tmp_path / "fields.json"
+    reg = FieldRegistry(path=str(path))
+    tbl = FakeTable(FakeBase([], fail=True))
+
+    assert reg.note_error(tbl, RuntimeError('UNKNOWN_FIELD_NAME Unknown field name: "New Col"')) == "New Col"
+    assert reg.remap(tbl, {"Message": "hi", "New Col": 1}) == {"Message": "hi"}
+
+    clock[0] += 61  # the column was added in Airtable meanwhile; no metadata refresh will say so
+    assert reg.remap(tbl, {"Message": "hi", "New Col": 1}) == {"Message": "hi", "New Col": 1}
+    assert reg.status()["missing"] == {}
+
+    # Snapshots from before the TTL stored bare lists: loaded as learned now
+    path.write_text(json.dumps({"bases": {}, "missing": {"appTEST/Conversations": ["Old Col"]}}))
+    cold = FieldRegistry(path=str(path))
+    assert cold.remap(tbl, {"Old Col": 1, "Message": "x"}) == {"Message": "x"}
+    clock[0] += 61
+    assert cold.remap(tbl, {"Old Col": 1}) == {"Old Col": 1}
@@ -0,0 +1,52 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sms.http_transport import AIRTABLE_HOST, HttpTransport
+
+
+class _Echo(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_a):
+        pass
+
+
+def test_posts_reuse_one_pooled_connection():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Echo)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/Messages.json"
+    transport = HttpTransport()
+    try:
+        for i in range(5):
+            assert transport.post(url, data={"n": i}).json() == {"ok": True}
+    finally:
+        transport.close()
+        server.shutdown()
+
+    host = transport.status()["hosts"][f"127.0.0.1:{server.server_port}"]
+    assert host["requests"] == 5
+    assert host["new_connections"] == 1
+    assert host["reuse_ratio"] == 0.8
+    assert sum(host["latency_histogram"].values()) == 5
+
+
+def test_airtable_apis_share_one_adapter_per_host():
+    transport = HttpTransport()
+    a = transport.airtable_api("key-a")
+    b = transport.airtable_api("key-b")
+
+    assert transport.airtable_api("key-a") is a
+    url = f"https://{AIRTABLE_HOST}/v0/app/tbl"
+    assert a.session.get_adapter(url) is b.session.get_adapter(url)
+    # pyairtable's retry strategy survives the remount; auth stays per key
+    assert a.session.get_adapter(url).max_retries.total
+    assert a.session.headers["Authorization"] != b.session.headers["Authorization"]
@@ -0,0 +1,163 @@
+import asyncio
+import threading
+import time
+
+import sms.inbound_queue as inbound_queue
+import sms.inbound_webhook as inbound_webhook
+from sms.inbound_queue import InboundQueue
+
+
+def test_jobs_run_once_and_duplicates_are_dropped(tmp_path):
+    q = InboundQueue(path=str(tmp_path / "q.sqlite3"), workers=2)
+    seen = []
+    q.register("inbound", lambda p: seen.append(p["Body"]) or {"ok": True})
+
+    assert q.enqueue("inbound", {"Body": "a"}, "SM1")[1] is False
+    assert q.enqueue("inbound", {"Body": "a"}, "SM1")[1] is True
+    q.enqueue("inbound", {"Body": "b"}, "SM2")
+    assert q.drain(5)
+
+    assert sorted(seen) == ["a", "b"]
+    assert q.status()["jobs"] == {"done": 2}
+    assert q.stats["duplicates"] == 1
+    q.stop()
+
+
+def test_timed_out_tasks_are_abandoned_not_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr(inbound_queue, "INBOUND_RETRY_BASE_SEC", 0)
+    release = threading.Event()
+    runs = []
+    q = InboundQueue(path=str(tmp_path / "q.sqlite3"), workers=1, timeout_sec=0.1, max_abandoned=0)
+    q.register("inbound", lambda p: runs.append(p["Body"]) or release.wait(5))
+
+    q.enqueue("inbound", {"Body": "slow"}, "SM1")
+    q.enqueue("inbound", {"Body": "waiting"}, "SM2")
+    assert not q.drain(0.5)  # no spare thread → slot held by the abandoned attempt
+    status = q.status()
+    assert status["abandoned"] == 1 and status["jobs"] == {"running": 1, "queued": 1}
+    assert runs == ["slow"]  # the queued job's clock never started, and nothing was retried
+
+    release.set()
+    assert q.drain(5)
+    assert runs == ["slow", "waiting"]
+    assert q.status()["jobs"] == {"done": 2}
+    assert q.stats["timeouts"] == 1 and q.stats["retried"] == 0
+    q.stop()
+
+
+def test_hung_task_does_not_block_the_next_job(tmp_path):
+    release = threading.Event()
+    runs = []
+    q = InboundQueue(path=str(tmp_path / "q.sqlite3"), workers=1, timeout_sec=0.1, max_abandoned=1)
+    q.register("inbound", lambda p: runs.append(p["Body"]) or (p["Body"] != "hung" or release.wait(5)))
+
+    q.enqueue("inbound", {"Body": "hung"}, "SM1")
+    q.enqueue("inbound", {"Body": "next"}, "SM2")
+    deadline = time.time() + 2
+    while "next" not in runs and time.time() < deadline:
+        time.sleep(0.02)
+
+    assert runs == ["hung", "next"]  # ran on the slot the hung job moved off
+    assert q.status()["abandoned"] == 1
+    release.set()
+    assert q.drain(5)
+    assert q.status()["jobs"] == {"done": 2}
+    q.stop()
+
+
+def test_failed_tasks_retry_then_park_as_failed(tmp_path, monkeypatch):
+    monkeypatch.setattr(inbound_queue, "INBOUND_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(inbound_queue, "INBOUND_RETRY_BASE_SEC", 0)
+    q = InboundQueue(path=str(tmp_path / "q.sqlite3"), workers=1)
+
+    def boom(_payload):
+        raise RuntimeError("airtable down")
+
+    q.register("inbound", boom)
+    q.enqueue("inbound", {"Body": "x"}, "SM1")
+    assert q.drain(5)
+
+    assert q.status()["jobs"] == {"failed": 1}
+    assert q.stats["retried"] == 1 and q.stats["failed"] == 1
+    q.stop()
+
+
+def test_running_jobs_are_requeued_after_restart(tmp_path):
+    path = str(tmp_path / "q.sqlite3")
+    first = InboundQueue(path=path)
+    first._db().execute(
+        "INSERT INTO jobs (kind, payload, status, available_at, enqueued_at, updated_at) VALUES ('inbound','{}','running',0,0,0)"
+    )
+
+    again = InboundQueue(path=path)
+    assert again.status()["jobs"] == {"queued": 1}
+
+
+def test_queue_mode_acks_without_running_handler(tmp_path, monkeypatch):
+    q = InboundQueue(path=str(tmp_path / "q.sqlite3"))
+    monkeypatch.setattr(inbound_webhook, "INBOUND_QUEUE_MODE", True)
+    monkeypatch.setattr(inbound_webhook, "INBOUND_QUEUE", q)
+    monkeypatch.setattr(q, "start", lambda: None)
+
+    def boom(_payload):
+        raise AssertionError("handler must not run on the request path")
+
+    payload = {"From": "+15555550123", "Body": "hello", "MessageSid": "SMq1"}
+    started = time.time()
+    res = asyncio.run(inbound_webhook._dispatch("inbound", payload, boom))
+
+    assert res["status"] == "queued" and res["job_id"]
+    assert time.time() - started < 1
+    assert q.status()["jobs"] == {"queued": 1}
+
+
+def test_emergency_paths_only_run_in_queue_mode(monkeypatch):
+    calls = []
+    monkeypatch.setattr(inbound_webhook, "increment_opt_out", lambda did: calls.append(("optout", did)))
+    monkeypatch.setattr(inbound_webhook, "update_prospect_comprehensive", lambda **kw: calls.append(("prospect", kw["stage"])))
+    monkeypatch.setattr(inbound_webhook, "_lookup_existing_lead", lambda phone: (None, None))
+    monkeypatch.setattr(inbound_webhook, "_lookup_prospect_info", lambda phone: (None, None))
+    monkeypatch.setattr(inbound_webhook, "safe_log_conversation", lambda record: calls.append(("log", record["Intent Detected"])))
+    payload = {"From": "+15555550123", "To": "+15555550999", "Body": "STOP"}
+
+    monkeypatch.setattr(inbound_webhook, "INBOUND_QUEUE_MODE", False)
+    assert inbound_webhook.process_optout(payload, check_idempotency=False) == {"status": "optout"}
+    assert calls == []  # no idempotency off queue mode → no row a STOP retry could duplicate
+
+    monkeypatch.setattr(inbound_webhook, "INBOUND_QUEUE_MODE", True)
+    assert inbound_webhook.process_optout(payload, check_idempotency=False) == {"status": "optout"}
+    assert calls == [("optout", "+15555550999"), ("log", "DNC"), ("prospect", "OPT OUT")]
+
+
+def test_direct_mode_dispatch_answers_within_the_handler_deadline(monkeypatch):
+    monkeypatch.setattr(inbound_webhook, "INBOUND_QUEUE_MODE", False)
+    monkeypatch.setattr(inbound_webhook, "INBOUND_HANDLER_TIMEOUT_SEC", 0.1)
+    release = threading.Event()
+
+    async def call():
+        started = time.time()
+        res = await inbound_webhook._dispatch("inbound", {"MessageSid": "SMd1"}, lambda p: release.wait(5))
+        release.set()  # asyncio.run joins the executor thread on exit
+        return res, time.time() - started
+
+    res, took = asyncio.run(call())
+    assert res == {"status": "timeout", "msg_id": "SMd1"}
+    assert took < 1
+
+
+def test_lookups_are_bounded_off_the_main_thread():
+    release = threading.Event()
+    result = {}
+
+    def worker():
+        try:
+            inbound_webhook.call_with_timeout(0.1, release.wait, 5)
+        except TimeoutError as exc:
+            result["error"] = exc
+
+    t = threading.Thread(target=worker)
+    t.start()
+    t.join(2)
+    release.set()
+    assert isinstance(result.get("error"), TimeoutError)
+    assert inbound_webhook.call_with_timeout(1, lambda: "ok") == "ok"
@@ -0,0 +1,44 @@
+from sms import intent
+from sms.autoresponder import _base_intent
+from sms.inbound_webhook import _classify_message, _extract_price_from_message, _is_opt_out
+
+
+def test_one_scan_reports_overlapping_prefix_and_bounded_hits():
+    m = intent.PhraseMatcher({
+        "neg": ({"not interested"}, False),
+        "pos": ({"interested", "inter"}, False),
+        "no": ({"no"}, True),
+        "k": ({" k"}, False),
+    })
+    cats, phrases = m.match(intent.normalize("Not  interested, no"))
+    assert cats == {"neg", "pos", "no"}
+    assert phrases == {"not interested", "interested", "inter", "no"}
+    assert m.match("nowhere uninteresting")[0] == {"pos"}  # substring hits, no bounded "no"
+    assert m.match("250 k")[0] == {"k"} and m.match("ok")[0] == frozenset()
+
+    hit = intent.classify("What's your offer? I'm not selling below 250k")
+    assert hit.has("ASK_OFFER_PHRASES", "INTEREST_NO_PHRASES", "PRICE_KEYWORDS")
+    assert not hit.has("YES_WORDS", "NO_WORDS")
+
+
+def test_classify_many_matches_single_calls_and_consumers_keep_their_order():
+    bodies = ["yes", "Wrong number", "yes", "call me at 555-1234", "remove me", "please remove this item"]
+    batch = intent.classify_many(bodies)
+    assert batch == [intent.classify(b) for b in bodies]
+    assert batch[0] is batch[2]
+
+    assert [_base_intent(b) for b in bodies] == ["affirm", "ownership_no", "affirm", "neutral", "optout", "neutral"]
+    assert _base_intent("yesterday") == "neutral" and _base_intent("nope!") == "deny"
+    assert _classify_message("Lets talk price")[1:] == ("Positive", "interest_detected")
+    assert _classify_message("when would closing be")[1:] == ("Delay", "timeline_question")
+    assert _is_opt_out("please remove this item") and not _is_opt_out("sounds good")
+    assert intent.classify_intent("Not interested") == "followup_no"
+
+
+def test_extractors_use_shared_patterns():
+    assert _extract_price_from_message("Asking $245,000 firm") == "245000"
+    assert _extract_price_from_message("around 180k, needs a roof") == "180000"
+    assert intent.extract_condition("It is vacant and needs a new roof") == "It is vacant and needs a new roof; needs roof"
+    timeline = intent.extract_timeline("We need to sell by the end of the month because of a divorce")
+    assert timeline.endswith("deadline: the end of the")
+    assert intent.extract_condition("") is None and intent.extract_timeline("ok") is None
@@ -0,0 +1,67 @@
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import sms.kpi_aggregator as ka
+from sms.kpi_buckets import KpiBuckets
+
+
+class FakeKpis:
+    """Quacks like pyairtable.Table for Performance › KPIs."""
+
+    def __init__(self, rows):
+        self.base = SimpleNamespace(id="appPERF")
+        self.name = "KPIs"
+        self.rows = list(rows)
+        self.formulas = []
+        self.creates = []
+        self.updates = []
+
+    def iterate(self, **opts):
+        self.formulas.append(opts.get("formula"))
+        seen = len(self.formulas) > 1
+        yield [r for r in self.rows if not (seen and r.get("_old"))]
+
+    def get(self, rid):
+        return None
+
+    def batch_create(self, payloads):
+        self.creates.append(payloads)
+        out = []
+        for p in payloads:
+            rec = {"id": f"recT{len(self.rows)}", "fields": p, "_old": True}
+            self.rows.append(rec)
+            out.append(rec)
+        return out
+
+    def batch_update(self, records):
+        self.updates.append(records)
+        return records
+
+
+def _raw(rid, value, day, metric="TOTAL_SENT"):
+    return {"id": rid, "fields": {"Metric": metric, "Value": value, "Date": day}}
+
+
+def test_runs_read_only_new_rows_and_batch_changed_totals(tmp_path, monkeypatch):
+    today = ka._tz_now().date().isoformat()
+    tbl = FakeKpis([dict(_raw("rec1", 5, today), _old=True), dict(_raw("rec2", "1,000", today), _old=True)])
+    monkeypatch.setattr(ka, "TEST_MODE", False)
+    monkeypatch.setattr(ka, "CONNECTOR", SimpleNamespace(performance=lambda: tbl))
+    monkeypatch.setattr(ka, "KPI_BUCKETS", KpiBuckets(path=str(tmp_path / "k.sqlite3")))
+    monkeypatch.setattr(ka, "base_bucket", lambda _b: SimpleNamespace(sending=nullcontext))
+
+    first = ka.aggregate_kpis()
+    assert first["written"] == {"daily": 1, "weekly": 1, "monthly": 1}
+    assert len(tbl.creates) == 1
+    assert {p["Metric"]: p["Value"] for p in tbl.creates[0]}["TOTAL_SENT_DAILY_TOTAL"] == 1005
+
+    # Nothing new → nothing rewritten
+    assert ka.aggregate_kpis()["written"] == {"daily": 0, "weekly": 0, "monthly": 0}
+    assert tbl.updates == []
+
+    tbl.rows.append(_raw("rec9", 2, today))
+    third = ka.aggregate_kpis()
+    assert third["written"] == {"daily": 1, "weekly": 1, "monthly": 1}
+    assert len(tbl.updates) == 1 and len(tbl.creates) == 1
+    assert {r["fields"]["Value"] for r in tbl.updates[0]} == {1007}
+    assert all("CREATED_TIME()" in f for f in tbl.formulas)
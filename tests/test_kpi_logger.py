@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+
+from sms import kpi_logger
+
+
+class FakePerf:
+    def __init__(self):
+        self.batches = []
+
+    def create(self, row):
+        self.batches.append([row])
+
+    def batch_create(self, rows):
+        assert len(rows) <= 10
+        self.batches.append(list(rows))
+
+
+def _buffer(monkeypatch, maxsize=1000):
+    perf = FakePerf()
+    monkeypatch.setattr(kpi_logger.CONNECTOR, "performance", lambda: SimpleNamespace(table=perf, base_id="appKPI"))
+    buf = kpi_logger.KpiBuffer(maxsize=maxsize)
+    monkeypatch.setattr(buf, "_ensure_thread", lambda: None)  # flush by hand
+    return perf, buf
+
+
+def test_counters_aggregate_by_event_and_campaign(monkeypatch):
+    perf, buf = _buffer(monkeypatch)
+    for _ in range(25):
+        buf.put("OUTBOUND_SENT", 1, {"campaign": "camA"})
+    for _ in range(5):
+        buf.put("OUTBOUND_SENT", 1, {"campaign": "camB"})
+    buf.put("OUTBOUND_DELIVERY_RATE", 97.5, {})
+
+    assert buf.flush() == 3
+    rows = [r for b in perf.batches for r in b]
+    sent = {r["campaign"]: r["Value"] for r in rows if r["Event"] == "OUTBOUND_SENT"}
+    assert sent == {"camA": 25, "camB": 5}
+    assert {"Event": "OUTBOUND_DELIVERY_RATE", "Value": 97.5} in rows
+    assert len(perf.batches) == 1
+
+
+def test_bounded_queue_counts_drops(monkeypatch):
+    perf, buf = _buffer(monkeypatch, maxsize=3)
+    for _ in range(5):
+        buf.put("RATE_LIMIT_BLOCK", 1, {})
+
+    assert buf.stats["dropped"] == 2
+    buf.flush()
+    assert perf.batches == [[{"Event": "RATE_LIMIT_BLOCK", "Value": 3}]]
+
+
+def test_failed_chunk_is_requeued_once_then_counted_as_dropped(monkeypatch):
+    perf, buf = _buffer(monkeypatch)
+    fails = {"n": 1}
+
+    def flaky_batch_create(rows):
+        if fails["n"]:
+            fails["n"] -= 1
+            raise RuntimeError("502 Bad Gateway")
+        perf.batches.append(list(rows))
+
+    monkeypatch.setattr(perf, "batch_create", flaky_batch_create)
+    buf.put("OUTBOUND_SENT", 1, {"campaign": "camA"})
+    assert buf.flush() == 0
+    assert buf.stats["requeued"] == 1 and buf.status()["pending_rows"] == 1
+
+    assert buf.flush() == 1
+    assert perf.batches == [[{"Event": "OUTBOUND_SENT", "Value": 1, "campaign": "camA"}]]
+
+    fails["n"] = 2
+    buf.put("OUTBOUND_SENT", 1, {})
+    buf.flush()
+    buf.flush()
+    assert buf.stats["dropped"] == 1 and buf.status()["pending_rows"] == 0
@@ -0,0 +1,86 @@
+from types import SimpleNamespace
+
+import sms.metrics_tracker as mt
+from sms.metrics_rollup import CAMPAIGN_FIELD, DIR_FIELD, STATUS_FIELD, MetricsRollup
+
+
+class FakeConvos:
+    """Quacks like pyairtable.Table: iterate() serves the full table, or `changed` for delta formulas."""
+
+    def __init__(self, rows):
+        self.base = SimpleNamespace(id="appTEST")
+        self.name = "Conversations"
+        self.rows = list(rows)
+        self.changed = []
+        self.formulas = []
+        self.all_calls = 0
+
+    def iterate(self, **opts):
+        self.formulas.append(opts.get("formula"))
+        yield list(self.changed if opts.get("formula") else self.rows)
+
+    def get(self, rid):
+        return None
+
+    def all(self, **_opts):
+        self.all_calls += 1
+        return []
+
+
+class FakeCampaigns:
+    def __init__(self, rows):
+        self.base = SimpleNamespace(id="appTEST")
+        self.name = "Campaigns"
+        self.rows = rows
+        self.batches = []
+
+    def all(self, **_opts):
+        return self.rows
+
+    def batch_update(self, records):
+        self.batches.append(records)
+        return records
+
+    def update(self, *_a, **_k):
+        raise AssertionError("campaign patches must go through batch_update")
+
+
+def _row(rid, direction, campaign="recCampA", status="SENT", body="hi"):
+    return {"id": rid, "fields": {CAMPAIGN_FIELD: [campaign], DIR_FIELD: direction, STATUS_FIELD: status, "Message": body}}
+
+
+def test_delta_refresh_moves_changed_rows_without_double_counting(tmp_path):
+    convos = FakeConvos([_row("rec1", "OUTBOUND"), _row("rec2", "OUTBOUND", status="DELIVERED"), _row("rec3", "INBOUND")])
+    store = MetricsRollup(path=str(tmp_path / "m.sqlite3"))
+
+    key = store.refresh(convos)
+    assert store.totals(key)["recCampA"] == {"sent": 2, "delivered": 1, "failed": 0, "replies": 1, "optouts": 0}
+
+    # rec1 was delivered, one new STOP reply arrived; nothing else is re-read
+    convos.changed = [_row("rec1", "OUTBOUND", status="DELIVERED"), _row("rec4", "INBOUND", body="STOP please")]
+    store.refresh(convos)
+    store.refresh(convos)  # same delta again → idempotent
+    assert store.totals(key)["recCampA"] == {"sent": 2, "delivered": 2, "failed": 0, "replies": 2, "optouts": 1}
+    assert convos.formulas[0] is None and "LAST_MODIFIED_TIME()" in convos.formulas[1]
+
+
+def test_update_metrics_batches_patches_and_skips_unchanged(tmp_path, monkeypatch):
+    convos = FakeConvos([_row("rec1", "OUTBOUND", status="DELIVERED"), _row("rec2", "OUTBOUND", campaign="recCampB")])
+    campaigns = FakeCampaigns([{"id": "recCampA", "fields": {"Name": "A"}}, {"id": "recCampB", "fields": {"Name": "B"}}])
+    monkeypatch.setattr(mt, "METRICS_ROLLUP", MetricsRollup(path=str(tmp_path / "m.sqlite3")))
+    monkeypatch.setattr(mt, "_t_convos", lambda: convos)
+    monkeypatch.setattr(mt, "_t_campaigns", lambda: campaigns)
+    monkeypatch.setattr(mt, "_notify", lambda _m: None)
+    monkeypatch.setattr(mt, "log_kpi", lambda *_a, **_k: None)
+    monkeypatch.setattr(mt, "log_run", lambda *_a, **_k: None)
+    monkeypatch.setattr(mt, "_sync_to_campaign_control_base", lambda *_a: None)
+
+    first = mt.update_metrics()
+    assert first["global"]["sent"] == 2 and first["global"]["delivered"] == 1
+    assert len(campaigns.batches) == 1
+    assert sorted(r["id"] for r in campaigns.batches[0]) == ["recCampA", "recCampB"]
+
+    convos.changed = [_row("rec2", "OUTBOUND", campaign="recCampB", status="DELIVERED")]
+    mt.update_metrics()
+    assert [r["id"] for r in campaigns.batches[1]] == ["recCampB"]
+    assert convos.all_calls == 0  # no per-campaign Conversations scans
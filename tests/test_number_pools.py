@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta, timezone
+
+from sms import number_pools as np
+
+
+class FakeNumbers:
+    def __init__(self, rows):
+        self.rows = {r["id"]: r for r in rows}
+        self.all_calls = 0
+        self.batches = []
+
+    def all(self, **_kw):
+        self.all_calls += 1
+        return [{"id": rid, "fields": dict(r["fields"])} for rid, r in self.rows.items()]
+
+    def batch_update(self, records):
+        self.batches.append(records)
+        for rec in records:
+            self.rows[rec["id"]]["fields"].update(rec["fields"])
+
+
+def _today():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _yesterday():
+    return (datetime.now(timezone.utc) - timedelta(days=1)).isoformat()
+
+
+def _setup(monkeypatch, rows):
+    tbl = FakeNumbers(rows)
+    pool = np.NumberPool()
+    monkeypatch.setattr(np, "_numbers_tbl", lambda: tbl)
+    monkeypatch.setattr(np, "POOL", pool)
+    monkeypatch.setattr(np, "log_kpi", lambda *_a, **_k: None)
+    monkeypatch.setattr(np, "log_run", lambda *_a, **_k: None)
+    monkeypatch.setattr(np, "NUMBER_POOL_FLUSH_SEC", 3600)
+    return tbl, pool
+
+
+def test_counters_stay_local_until_flush(monkeypatch):
+    tbl, pool = _setup(
+        monkeypatch,
+        [
+            {"id": "n1", "fields": {"Number": "+15550000001", "Market": "Houston", "Sent Today": 3, "Sent Total": 10, "Delivered Today": 0, "Remaining": 7, "Daily Reset": 10, "Last Used": _today()}},
+            {"id": "n2", "fields": {"Number": "+15550000002", "Market": "Dallas", "Remaining": 5, "Last Used": _today()}},
+        ],
+    )
+
+    assert np.get_from_number("Houston") == "+15550000001"
+    for _ in range(3):
+        np.increment_sent("+1 (555) 000-0001")
+    np.increment_delivered("5550000001")
+
+    assert tbl.all_calls == 1 and tbl.batches == []
+    assert np.POOL.flush() == 1
+    f = tbl.rows["n1"]["fields"]
+    assert (f["Sent Today"], f["Sent Total"], f["Remaining"], f["Delivered Today"]) == (6, 13, 4, 1)
+    assert len(tbl.batches) == 1
+    assert tbl.all_calls == 1  # flushed by record id from the cache, no table scan
+
+
+def test_reload_reapplies_pending_deltas_to_fresh_values(monkeypatch):
+    tbl, pool = _setup(
+        monkeypatch,
+        [{"id": "n1", "fields": {"Number": "+15550000001", "Sent Today": 2, "Sent Total": 20, "Remaining": 8, "Last Used": _today()}}],
+    )
+    np.get_from_number(None)
+    np.increment_sent("+15550000001")
+    tbl.rows["n1"]["fields"]["Sent Total"] = 30  # another writer, seen by the next reload
+
+    pool._load(tbl)
+    assert pool.find(tbl, "+15550000001")["fields"]["Sent Total"] == 31
+    assert pool.flush() == 1 and tbl.all_calls == 2
+    assert tbl.rows["n1"]["fields"]["Sent Total"] == 31
+
+
+def test_daily_reset_is_applied_once_on_flush(monkeypatch):
+    tbl, pool = _setup(
+        monkeypatch,
+        [{"id": "n1", "fields": {"Number": "+15550000001", "Sent Today": 40, "Sent Total": 100, "Remaining": 0, "Daily Reset": 50, "Last Used": _yesterday()}}],
+    )
+
+    # Yesterday's exhausted number is available again today
+    assert np.get_from_number(None) == "+15550000001"
+    np.increment_sent("+15550000001")
+    pool.flush()
+
+    f = tbl.rows["n1"]["fields"]
+    assert (f["Sent Today"], f["Sent Total"], f["Remaining"]) == (1, 101, 49)
+
+
+def test_due_flush_and_reload_run_off_the_callers_thread(monkeypatch):
+    import threading
+    import time
+
+    tbl, pool = _setup(
+        monkeypatch,
+        [{"id": "n1", "fields": {"Number": "+15550000001", "Sent Today": 0, "Sent Total": 0, "Remaining": 9, "Last Used": _today()}}],
+    )
+    callers = []
+    fetch = tbl.all
+    monkeypatch.setattr(tbl, "all", lambda **kw: callers.append(threading.current_thread().name) or fetch(**kw))
+
+    np.get_from_number(None)  # first load is inline
+    monkeypatch.setattr(np, "NUMBER_POOL_FLUSH_SEC", 0.05)
+    monkeypatch.setattr(np, "NUMBER_POOL_RELOAD_SEC", 0)
+    np.increment_sent("+15550000001")
+
+    deadline = time.time() + 5
+    while not tbl.batches and time.time() < deadline:
+        time.sleep(0.01)
+    assert tbl.rows["n1"]["fields"]["Sent Today"] == 1
+    assert callers[0] == threading.current_thread().name
+    assert set(callers[1:]) == {"number-pool-flusher"}
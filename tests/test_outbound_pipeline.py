@@ -0,0 +1,155 @@
+import threading
+import time
+
+from sms import outbound_batcher as ob
+from sms.outbox import Outbox
+
+
+class FakeDrip:
+    def __init__(self, n, dids=("+15550000001", "+15550000002")):
+        self.rows = [
+            {
+                "id": f"rec{i}",
+                "fields": {
+                    "Status": "Queued",
+                    "Seller Phone Number": f"+1555555{i:04d}",
+                    "TextGrid Phone Number": dids[i % len(dids)],
+                    "Message": f"hello {i}",
+                },
+            }
+            for i in range(n)
+        ]
+        self.updates = []
+        self._lock = threading.Lock()
+
+    def all(self, **_kw):
+        return self.rows
+
+    def update(self, rid, fields):
+        with self._lock:
+            self.updates.append((rid, dict(fields)))
+
+
+class SlowSender:
+    in_flight = 0
+    peak = 0
+    _lock = threading.Lock()
+
+    @classmethod
+    def send(cls, **_kw):
+        with cls._lock:
+            cls.in_flight += 1
+            cls.peak = max(cls.peak, cls.in_flight)
+        time.sleep(0.05)
+        with cls._lock:
+            cls.in_flight -= 1
+        return {"status": "sent"}
+
+
+def _patch(monkeypatch, drip):
+    monkeypatch.setattr(ob, "get_table", lambda _b, name: drip if name == ob.DRIP_TABLE_NAME else None)
+    monkeypatch.setattr(ob, "is_quiet_hours_local", lambda: False)
+    monkeypatch.setattr(ob, "build_send_window", lambda: ob.SendWindow(enforced=False))
+    monkeypatch.setattr(ob, "_campaign_status_map", lambda _ids: {})
+    monkeypatch.setattr(ob, "build_limiter", lambda: ob._RateLimiter(1000, 1000))
+    monkeypatch.setattr(ob, "MessageProcessor", SlowSender)
+    monkeypatch.setattr(ob, "increment_sent", lambda *_a, **_k: None)
+    monkeypatch.setattr(ob, "log_kpi", lambda *_a, **_k: None)
+    monkeypatch.setattr(ob, "log_run", lambda *_a, **_k: None)
+    monkeypatch.setattr(ob, "SLEEP_BETWEEN_SENDS_SEC", 0)
+    monkeypatch.setattr(ob, "SEND_INFLIGHT_PER_DID", 2)
+    monkeypatch.setattr(ob, "OUTBOX", Outbox(path=":memory:"))
+    SlowSender.in_flight = SlowSender.peak = 0
+
+
+def test_pipelined_send_overlaps_and_bounds_per_did(monkeypatch):
+    drip = FakeDrip(12)
+    _patch(monkeypatch, drip)
+
+    res = ob.send_batch(limit=50, workers=8)
+
+    assert res["total_sent"] == 12 and res["total_failed"] == 0
+    assert res["workers"] == 8
+    assert {"read", "prepare", "send", "bookkeeping", "total"} <= set(res["timings"])
+    # 2 DIDs × 2 in flight each, never more
+    assert 1 < SlowSender.peak <= 4
+    # every row ends up Sent, written by the write-behind stage
+    sent = {rid for rid, f in drip.updates if f.get("Status") == "Sent"}
+    assert sent == {r["id"] for r in drip.rows}
+
+
+def test_sequential_mode_is_default(monkeypatch):
+    drip = FakeDrip(3)
+    _patch(monkeypatch, drip)
+
+    res = ob.send_batch(limit=50, workers=1)
+
+    assert res["total_sent"] == 3
+    assert SlowSender.peak == 1
+
+
+class BatchDrip(FakeDrip):
+    def __init__(self, n, reject_status=False):
+        super().__init__(n)
+        self.batches = []
+        self.reject_status = reject_status
+
+    def batch_update(self, records):
+        if self.reject_status and any("Status" in r["fields"] for r in records):
+            raise Exception("422 INVALID_MULTIPLE_CHOICE_OPTIONS")
+        assert len(records) <= 10
+        self.batches.append([dict(r) for r in records])
+
+
+def test_drip_writes_merge_and_flush_in_batches(monkeypatch):
+    drip = BatchDrip(25)
+    _patch(monkeypatch, drip)
+
+    res = ob.send_batch(limit=50, workers=1)
+
+    assert res["total_sent"] == 25
+    # Sending + Sent per row merge into one write; 25 rows → 3 PATCH calls
+    assert res["drip_writes"]["api_calls"] == 3
+    assert res["drip_writes"]["records_written"] == 25
+    assert drip.updates == []
+    final = {r["id"]: r["fields"] for b in drip.batches for r in b}
+    assert all(f["Status"] == "Sent" for f in final.values())
+
+
+def test_drip_buffer_keeps_whitelist_and_status_fallback():
+    drip = BatchDrip(0, reject_status=True)
+    buf = ob.DripWriteBuffer(drip, max_age_sec=60)
+    buf.update("rec1", {"STATUS": "Sent", "LAST_ERROR": "", "Bogus Field": 1})
+    assert drip.batches == []  # still pending
+    stats = buf.flush()
+
+    assert drip.batches == [[{"id": "rec1", "fields": {"Last Error": ""}}]]
+    assert stats["records_written"] == 1 and stats["failed"] == 0
+
+
+def test_drip_buffer_writes_off_the_caller_and_on_a_timer():
+    gate, writing = threading.Event(), threading.Event()
+
+    class HungDrip(BatchDrip):
+        def batch_update(self, records):
+            writing.set()
+            gate.wait(5)
+            super().batch_update(records)
+
+    drip = HungDrip(0)
+    buf = ob.DripWriteBuffer(drip, batch_size=2, max_age_sec=0.05)
+    for i in range(3):  # third row fills a batch → writer thread takes it
+        buf.update(f"rec{i}", {"STATUS": "Sending"})
+    assert writing.wait(2)
+
+    started = time.monotonic()
+    buf.update("rec9", {"STATUS": "Sending"})  # batch_update is hung; update() must not wait on it
+    assert time.monotonic() - started < 0.5
+    gate.set()
+
+    # The quiet tail goes out on the age timer, with no later update() or flush()
+    deadline = time.monotonic() + 2
+    while sum(len(b) for b in drip.batches) < 4 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert sorted(r["id"] for b in drip.batches for r in b) == ["rec0", "rec1", "rec2", "rec9"]
+    assert buf.flush()["records_written"] == 4
@@ -0,0 +1,116 @@
+import sms.outbox as outbox
+from sms import outbound_batcher as ob
+from sms.outbox import Outbox
+
+
+class FakeDrip:
+    def __init__(self, n):
+        self.rows = [
+            {
+                "id": f"rec{i}",
+                "fields": {
+                    "Status": "Sending",
+                    "Seller Phone Number": f"+1555555{i:04d}",
+                    "TextGrid Phone Number": "+15550000001",
+                    "Message": f"hello {i}",
+                },
+            }
+            for i in range(n)
+        ]
+        self.updates = []
+
+    def all(self, **_kw):
+        return self.rows
+
+    def update(self, rid, fields):
+        self.updates.append((rid, dict(fields)))
+
+
+class RecordingSender:
+    sent_to = []
+
+    @classmethod
+    def send(cls, **kw):
+        cls.sent_to.append(kw["drip_queue_id"])
+        return {"status": "sent", "sid": f"SM_{kw['drip_queue_id']}", "provider_status": "queued"}
+
+
+def _patch(monkeypatch, drip):
+    monkeypatch.setattr(ob, "get_table", lambda _b, name: drip if name == ob.DRIP_TABLE_NAME else None)
+    monkeypatch.setattr(ob, "is_quiet_hours_local", lambda: False)
+    monkeypatch.setattr(ob, "build_send_window", lambda: ob.SendWindow(enforced=False))
+    monkeypatch.setattr(ob, "_campaign_status_map", lambda _ids: {})
+    monkeypatch.setattr(ob, "build_limiter", lambda: ob._RateLimiter(1000, 1000))
+    monkeypatch.setattr(ob, "MessageProcessor", RecordingSender)
+    monkeypatch.setattr(ob, "increment_sent", lambda *_a, **_k: None)
+    monkeypatch.setattr(ob, "log_kpi", lambda *_a, **_k: None)
+    monkeypatch.setattr(ob, "log_run", lambda *_a, **_k: None)
+    monkeypatch.setattr(ob, "SLEEP_BETWEEN_SENDS_SEC", 0)
+    RecordingSender.sent_to = []
+
+
+def test_intent_blocks_resend_until_outcome_is_known():
+    box = Outbox(path=":memory:")
+    assert box.begin("rec1", "+15555550001", "+15550000001", "hi")
+    assert not box.begin("rec1", "+15555550001", "+15550000001", "hi")  # open intent → no second POST
+
+    box.record("rec1", ok=False, error="provider_down")
+    assert box.ack(["rec1"]) == 1
+    assert box.begin("rec1", "+15555550001", "+15550000001", "hi")  # a known failure may retry
+
+    box.record("rec1", ok=True, sid="SM1")
+    assert not box.begin("rec1", "+15555550001", "+15550000001", "hi")
+    assert box.blocked(["rec1", "rec2"]) == {"rec1"}
+    assert box.reconcile()["sent"][0]["sid"] == "SM1"  # sent but never acked → replayed
+    assert box.ack(["rec1"]) == 1
+    assert box.reconcile() == {"sent": [], "failed": [], "unconfirmed": []}
+    assert box.status()["entries"] == {"sent": 1}
+
+
+def test_batch_replays_crashed_sends_without_resending(monkeypatch):
+    drip = FakeDrip(4)
+    _patch(monkeypatch, drip)
+    monkeypatch.setattr(outbox, "OUTBOX_INTENT_GRACE_SEC", 0)
+    provider = {"rec1": (True, "SM_found"), "rec2": None}
+    box = Outbox(path=":memory:", lookup=lambda e: provider[e["drip_id"]])
+    monkeypatch.setattr(ob, "OUTBOX", box)
+
+    # Previous run died: rec0 after the POST, rec1/rec2 mid-call
+    for r in drip.rows[:3]:
+        f = r["fields"]
+        box.begin(r["id"], f["Seller Phone Number"], f["TextGrid Phone Number"], f["Message"])
+    box.record("rec0", ok=True, sid="SM_sent")
+
+    res = ob.send_batch(limit=50, workers=1)
+
+    assert RecordingSender.sent_to == ["rec3"]
+    assert res["total_sent"] == 1 and res["outbox_unconfirmed"] == 1
+    final = {}
+    for rid, fields in drip.updates:
+        final.setdefault(rid, {}).update(fields)
+    assert {rid for rid, f in final.items() if f.get("Status") == "Sent"} == {"rec0", "rec1", "rec3"}
+    assert final["rec2"]["Last Error"] == "outbox_unconfirmed"
+    assert box.blocked(["rec0", "rec1", "rec2", "rec3"]) == {"rec0", "rec1", "rec2", "rec3"}
+    assert box.status()["entries"] == {"sent": 3, "intent_unacked": 1}
+
+
+def test_provider_lookup_matches_body_after_intent(monkeypatch):
+    import sms.textgrid_sender as tg
+
+    box = Outbox(path=":memory:")
+    box.begin("rec1", "+15555550001", "+15550000001", "hello there")
+    entry = box._rows("WHERE drip_id=?", ("rec1",))[0]
+
+    listed = [
+        {"sid": "SMx", "body": "something else", "status": "delivered"},
+        {"sid": "SMy", "body": "hello there", "status": "failed"},
+        {"sid": "SMz", "body": "hello there ", "status": "delivered"},
+    ]
+    monkeypatch.setattr(tg, "find_messages", lambda **_kw: listed)
+    assert outbox.provider_lookup(entry) == (True, "SMz")
+
+    monkeypatch.setattr(tg, "find_messages", lambda **_kw: listed[:2])
+    assert outbox.provider_lookup(entry) == (False, None)
+
+    monkeypatch.setattr(tg, "find_messages", lambda **_kw: None)
+    assert outbox.provider_lookup(entry) is None
@@ -0,0 +1,145 @@
+import threading
+from types import SimpleNamespace
+
+from sms.phone_index import PhoneIndex
+
+
+class FakeAirtable:
+    """Quacks like pyairtable.Table: base.id, name, iterate(), get()."""
+
+    def __init__(self, rows):
+        self.base = SimpleNamespace(id="appTEST")
+        self.name = "Prospects"
+        self.rows = {r["id"]: r for r in rows}
+        self.iterate_calls = []
+
+    def iterate(self, **opts):
+        self.iterate_calls.append(opts)
+        if opts.get("formula"):
+            yield []
+            return
+        yield list(self.rows.values())
+
+    def get(self, rid):
+        return self.rows.get(rid)
+
+
+def test_index_sweeps_once_and_hits_by_last10(tmp_path):
+    tbl = FakeAirtable(
+        [
+            {"id": "rec1", "fields": {"Phone 1": "(555) 555-0101"}},
+            {"id": "rec2", "fields": {"Phone 2 (from Linked Owner)": "+1 555 555 0202"}},
+        ]
+    )
+    idx = PhoneIndex(path=str(tmp_path / "idx.sqlite3"))
+    assert idx.warm(tbl, wait=True)
+
+    assert idx.find(tbl, "+15555550202")["id"] == "rec2"
+    assert idx.find(tbl, "5555550101")["id"] == "rec1"
+    assert idx.stats["sweeps"] == 1
+    assert idx.stats["hits"] == 2 and idx.stats["scans"] == 0
+
+    # Restart: a new instance reuses the on-disk index, no new sweep
+    again = PhoneIndex(path=str(tmp_path / "idx.sqlite3"))
+    assert again.find(tbl, "555-555-0101")["id"] == "rec1"
+    assert again.stats["sweeps"] == 0
+
+
+def test_stale_entries_are_dropped(tmp_path):
+    tbl = FakeAirtable([{"id": "rec1", "fields": {"Phone 1": "5555550101"}}])
+    idx = PhoneIndex(path=str(tmp_path / "idx.sqlite3"))
+    idx.warm(tbl, wait=True)
+    assert idx.find(tbl, "5555550101")
+
+    tbl.rows.pop("rec1")
+    assert idx.find(tbl, "5555550101") is None
+    assert idx.lookup_id(tbl, "5555550101") is None
+
+
+def test_unidentifiable_tables_fall_back_to_scan(tmp_path):
+    class Plain:
+        def all(self):
+            return [{"id": "recX", "fields": {"phone": "5555550303"}}]
+
+    idx = PhoneIndex(path=str(tmp_path / "idx.sqlite3"))
+    assert idx.find(Plain(), "+15555550303", ["phone"])["id"] == "recX"
+
+
+class PagedApi:
+    """Raw list-records paging (pyairtable Api.iterate_requests) with resumable offsets."""
+
+    def __init__(self, rows, fail_after=None):
+        self.rows = rows
+        self.fail_after = fail_after
+        self.started_at = []
+
+    def iterate_requests(self, method, url, fallback=None, options=None, params=None):
+        start = int((params or {}).get("offset") or 0)
+        self.started_at.append(start)
+        for i in range(start, len(self.rows), 2):
+            if self.fail_after is not None and i >= self.fail_after:
+                raise RuntimeError("503 Service Unavailable")
+            nxt = i + 2
+            yield {"records": self.rows[i:nxt], **({"offset": str(nxt)} if nxt < len(self.rows) else {})}
+
+
+def test_interrupted_sweep_resumes_from_its_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr("sms.phone_index.PHONE_INDEX_SWEEP_RETRY_SEC", 0)
+    rows = [{"id": f"rec{i}", "fields": {"Phone 1": f"555555{i:04d}"}} for i in range(6)]
+    tbl = FakeAirtable(rows)
+    tbl.api, tbl.url = PagedApi(rows, fail_after=4), "https://api.airtable.com/v0/appTEST/Prospects"
+    idx = PhoneIndex(path=str(tmp_path / "idx.sqlite3"))
+
+    assert idx.warm(tbl, wait=True) is False and idx.stats["sweep_errors"] == 1
+    tbl.api.fail_after = None
+    again = PhoneIndex(path=str(tmp_path / "idx.sqlite3"))  # restart mid-sweep
+    assert again.warm(tbl, wait=True) is True
+    assert tbl.api.started_at == [0, 4]  # pages 1-2 were not downloaded again
+    assert again.lookup_id(tbl, "5555550000") == "rec0" and again.lookup_id(tbl, "5555550005") == "rec5"
+
+
+def test_lookups_scan_while_the_first_sweep_runs(tmp_path):
+    release = threading.Event()
+
+    class SlowSweep(FakeAirtable):
+        def iterate(self, **opts):
+            if threading.current_thread().name.startswith("phone-index-sweep"):
+                release.wait(5)
+            yield from super().iterate(**opts)
+
+    tbl = SlowSweep([{"id": "rec1", "fields": {"Phone 1": "5555550101"}}])
+    idx = PhoneIndex(path=str(tmp_path / "idx.sqlite3"))
+    assert idx.find(tbl, "5555550101")["id"] == "rec1"  # served by the scan, not blocked on the sweep
+    assert idx.stats["scans"] == 1 and idx.status()["sweeping"] == ["appTEST/Prospects"]
+    release.set()
+    assert idx.warm(tbl, wait=True)
+
+
+def test_failed_refresh_backs_off_and_lookups_skip_the_pull(tmp_path):
+    tbl = FakeAirtable([{"id": "rec1", "fields": {"Phone 1": "5555550101"}}])
+    idx = PhoneIndex(path=str(tmp_path / "idx.sqlite3"))
+    assert idx.warm(tbl, wait=True)
+
+    gate, pulling = threading.Event(), threading.Event()
+
+    def down(**opts):
+        tbl.iterate_calls.append(opts)
+        pulling.set()
+        gate.wait(5)
+        raise RuntimeError("airtable down")
+        yield  # pragma: no cover
+
+    tbl.iterate = down
+    puller = threading.Thread(target=idx.ensure, args=(tbl,), kwargs={"max_age": 0})
+    puller.start()
+    assert pulling.wait(2)
+    # Another caller reads the index while the pull is in flight, without waiting on it
+    assert idx.find(tbl, "5555550999") is None and idx.lookup_id(tbl, "5555550101") == "rec1"
+    gate.set()
+    puller.join(2)
+
+    # Outage: misses serve the current index instead of re-pulling on every lookup
+    for _ in range(3):
+        assert idx.find(tbl, "5555550999") is None
+    assert len(tbl.iterate_calls) == 2  # the sweep + the one failed pull
+    assert idx.stats["refresh_errors"] == 1
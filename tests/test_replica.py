@@ -0,0 +1,152 @@
+from sms import replica as rp
+from sms.replica import Replica
+
+
+class FakeBase:
+    id = "appTEST"
+
+
+class FakeTable:
+    """Quacks like pyairtable.Table for delta pulls: records the formula of every iterate() call."""
+
+    base = FakeBase()
+
+    def __init__(self, name, rows):
+        self.name = name
+        self.rows = {r["id"]: r for r in rows}
+        self.formulas = []
+        self.fail = False
+
+    def get(self, record_id):
+        return self.rows[record_id]
+
+    def iterate(self, **opts):
+        self.formulas.append(opts.get("formula"))
+        if self.fail:
+            raise RuntimeError("503 Service Unavailable")
+        rows = list(self.rows.values())
+        if opts.get("formula"):  # a delta only returns what changed since the last pull
+            rows = [r for r in rows if r.get("changed")]
+        yield [{"id": r["id"], "createdTime": r["id"], "fields": dict(r["fields"])} for r in rows]
+
+
+def _drips():
+    return FakeTable("Drip Queue", [
+        {"id": "rec1", "fields": {"Seller Phone Number": "+1 (555) 000-0001", "Status": "QUEUED",
+                                  "Campaign": ["recC1"], "Next Send Date": "2026-01-01T10:00:00"}},
+        {"id": "rec2", "fields": {"Seller Phone Number": "+15550000002", "Status": "Sent",
+                                  "Campaign": ["recC2"], "Next Send Date": "2026-01-03T10:00:00"}},
+        {"id": "rec3", "fields": {"Seller Phone Number": "+15550000003", "Status": "queued",
+                                  "Campaign": ["recC1"], "Next Send Date": "2026-01-05T10:00:00"}},
+    ])
+
+
+def _replica(tmp_path, *names):
+    return Replica(path=str(tmp_path / "replica.sqlite3"), enabled=True, tables=names)
+
+
+def test_indexed_reads_and_delta_pulls_within_the_staleness_bound(tmp_path, monkeypatch):
+    tbl, r = _drips(), _replica(tmp_path, "Drip Queue")
+
+    def ids(recs):
+        return [x["id"] for x in recs]
+
+    assert r.select(tbl) is None  # first sweep runs in the background; Airtable answers meanwhile
+    assert r.warm(tbl, wait=True)
+    assert ids(r.select(tbl, status="queued")) == ["rec1", "rec3"]
+    assert ids(r.select(tbl, phone="5550000001")) == ["rec1"]
+    assert ids(r.select(tbl, campaign="recC1", due_by="2026-01-02")) == ["rec1"]
+    assert ids(r.select(tbl, ids=["rec3", "rec2"], where=lambda f: f["Status"] == "Sent")) == ["rec2"]
+    assert tbl.formulas == [None]  # one sweep served every read
+
+    tbl.rows["rec2"]["fields"]["Status"] = "QUEUED"
+    tbl.rows["rec2"]["changed"] = True
+    monkeypatch.setitem(rp._DEFAULT_STALE, "Drip Queue", 0)  # bound expired → next read pulls a delta
+    assert ids(r.select(tbl, status="queued")) == ["rec1", "rec2", "rec3"]
+    assert tbl.formulas[-1].startswith("IS_AFTER(LAST_MODIFIED_TIME(), DATETIME_PARSE(")
+    assert r.status()["tables"]["appTEST/Drip Queue"]["rows"] == 3
+
+
+def test_failed_sync_falls_back_and_full_sweeps_drop_deleted_rows(tmp_path, monkeypatch):
+    tbl, r = _drips(), _replica(tmp_path, "Drip Queue")
+    assert r.warm(tbl, wait=True)
+    assert len(r.select(tbl)) == 3
+    assert r.select(FakeTable("Conversations", [])) is None  # not replicated → Airtable
+
+    monkeypatch.setitem(rp._DEFAULT_STALE, "Drip Queue", 0)
+    tbl.fail = True
+    assert r.select(tbl) is None and r.stats["fallbacks"] == 2
+    assert "503" in r.status()["tables"]["appTEST/Drip Queue"]["last_error"]
+
+    tbl.fail = False
+    del tbl.rows["rec2"]
+    monkeypatch.setattr(rp, "REPLICA_FULL_SWEEP_SEC", 0)
+    assert r.refresh()["tables"] == {"appTEST/Drip Queue": "sweep"}  # cleanup sweeps run off the read path
+    monkeypatch.setattr(rp, "REPLICA_FULL_SWEEP_SEC", 3600)
+    assert [x["id"] for x in r.select(tbl)] == ["rec1", "rec3"]
+    assert r.select(tbl, campaign="recC2") == []
+
+
+def test_own_writes_are_visible_before_the_next_pull(tmp_path):
+    tbl, r = _drips(), _replica(tmp_path, "Drip Queue")
+    assert r.upsert_local(tbl, [{"id": "recX", "fields": {"Status": "QUEUED"}}]) == 0  # never synced yet
+    r.warm(tbl, wait=True)
+
+    assert r.upsert_local(tbl, [{"id": "rec4", "createdTime": "rec4", "fields": {"Status": "QUEUED", "Campaign": ["recC9"]}}]) == 1
+    assert r.patch_local(tbl, "rec1", {"Status": "Sent"})
+    assert not r.patch_local(tbl, "recMissing", {"Status": "Sent"})
+    assert [x["id"] for x in r.select(tbl, status="QUEUED")] == ["rec3", "rec4"]
+    assert [x["id"] for x in r.select(tbl, campaign="recC9")] == ["rec4"]
+    assert tbl.formulas == [None]
+
+    assert Replica(path=str(tmp_path / "off.sqlite3"), enabled=False).select(tbl) is None
+
+
+def test_a_slow_sweep_blocks_neither_reads_nor_other_tables(tmp_path):
+    import threading
+
+    gate = threading.Event()
+
+    class SlowTable(FakeTable):
+        def iterate(self, **opts):
+            gate.wait(5)
+            yield from super().iterate(**opts)
+
+    drips = _drips()
+    prospects = SlowTable("Prospects", [{"id": "recP", "fields": {"Phone 1": "5550000009"}}])
+    r = _replica(tmp_path, "Drip Queue", "Prospects")
+    assert r.warm(drips, wait=True)
+
+    assert r.select(prospects) is None  # sweep started, caller falls back instead of waiting
+    assert r.status()["sweeping"] == ["appTEST/Prospects"]
+    assert len(r.select(drips)) == 3  # other tables keep answering while it runs
+    assert r.upsert_local(drips, [{"id": "rec9", "createdTime": "rec9", "fields": {"Status": "QUEUED"}}]) == 1
+
+    gate.set()
+    assert r.warm(prospects, wait=True)
+    assert [x["id"] for x in r.select(prospects, phone="5550000009")] == ["recP"]
+
+
+def test_local_writes_during_a_full_sweep_survive_its_cleanup(tmp_path):
+    import threading
+
+    tbl, r = _drips(), _replica(tmp_path, "Drip Queue")
+    assert r.warm(tbl, wait=True)
+
+    gate, paging = threading.Event(), threading.Event()
+    plain = FakeTable.iterate
+
+    def slow(**opts):
+        paging.set()
+        gate.wait(5)
+        yield from plain(tbl, **opts)
+
+    tbl.iterate = slow
+    sweep = threading.Thread(target=r._sync, args=(tbl, "appTEST/Drip Queue"), kwargs={"full": True})
+    sweep.start()
+    assert paging.wait(2)
+    # Created after the sweep's listing was taken: the sweep won't see it, but it must not be dropped
+    assert r.upsert_local(tbl, [{"id": "recNew", "createdTime": "recNew", "fields": {"Status": "QUEUED"}}]) == 1
+    gate.set()
+    sweep.join(2)
+    assert "recNew" in [x["id"] for x in r.select(tbl)]
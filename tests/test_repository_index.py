@@ -0,0 +1,87 @@
+import sms.datastore as datastore
+from sms.datastore import LEAD_FIELDS, Repository, TableHandle
+
+
+class LeadsTable:
+    """Paged Leads table that can be told to fail mid-sweep."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.sweeps = 0
+        self.fail = False
+
+    def iterate(self, **_opts):
+        self.sweeps += 1
+        yield [r for r in self.rows[:1]]
+        if self.fail:
+            raise RuntimeError("503 Service Unavailable")
+        yield [r for r in self.rows[1:]]
+
+    def get(self, rid):
+        return next((r for r in self.rows if r["id"] == rid), None)
+
+
+def _repo(monkeypatch, *phones):
+    col = LEAD_FIELDS["PHONE"]
+    tbl = LeadsTable([{"id": f"rec{i}", "fields": {col: p}} for i, p in enumerate(phones)])
+    handle = TableHandle(table=tbl, in_memory=False, base_id="appLEADS", table_name="Leads")
+    monkeypatch.setattr(datastore.CONNECTOR, "leads", lambda: handle)
+    clock = {"now": 1000.0}
+    monkeypatch.setattr(datastore.time, "time", lambda: clock["now"])
+    return tbl, Repository(), clock
+
+
+def test_index_and_negative_cache_expire_on_their_ttls(monkeypatch):
+    monkeypatch.setattr(datastore, "REPOSITORY_INDEX_TTL_SEC", 300)
+    monkeypatch.setattr(datastore, "REPOSITORY_NEGATIVE_TTL_SEC", 60)
+    tbl, repo, clock = _repo(monkeypatch, "+15550000001", "+15550000002")
+
+    assert repo.find_lead_by_phone("555-000-0002")["id"] == "rec1"
+    assert repo.find_lead_by_phone("5550009999") is None
+    assert repo.find_lead_by_phone("5550009999") is None
+    assert tbl.sweeps == 1
+    assert {k: repo.stats[k] for k in ("hits", "misses", "negative_hits", "refreshes")} == {
+        "hits": 1, "misses": 1, "negative_hits": 1, "refreshes": 1,
+    }
+
+    clock["now"] += 61  # negative entry expired, index still fresh
+    assert repo.find_lead_by_phone("5550009999") is None
+    assert repo.stats["misses"] == 2 and tbl.sweeps == 1
+
+    clock["now"] += 300  # index TTL expired → one new sweep
+    tbl.rows.append({"id": "rec9", "fields": {LEAD_FIELDS["PHONE"]: "+15550009999"}})
+    assert repo.find_lead_by_phone("5550009999")["id"] == "rec9"
+    assert tbl.sweeps == 2 and repo.stats["refreshes"] == 2
+
+
+def test_failed_refresh_keeps_the_old_index_and_skips_negative_caching(monkeypatch):
+    tbl, repo, clock = _repo(monkeypatch, "+15550000001", "+15550000002")
+    assert repo.find_lead_by_phone("5550000002")["id"] == "rec1"
+
+    clock["now"] += datastore.REPOSITORY_INDEX_TTL_SEC
+    tbl.fail = True  # sweep dies after the first page
+    assert repo.find_lead_by_phone("5550000002")["id"] == "rec1"  # previous index kept
+    assert repo.find_lead_by_phone("5550007777") is None
+    assert repo.find_lead_by_phone("5550007777") is None
+    assert repo.stats["refresh_errors"] == 1 and tbl.sweeps == 2  # no sweep per lookup during the outage
+    assert repo.stats["negative_hits"] == 0
+    assert repo.cache_stats()["refresh_failed"] == ["lead"]
+
+    tbl.fail = False
+    clock["now"] += datastore.REPOSITORY_INDEX_RETRY_SEC  # retry-after passed → next lookup sweeps again
+    assert repo.find_lead_by_phone("5550007777") is None
+    assert repo.stats["refreshes"] == 2 and repo.cache_stats()["refresh_failed"] == []
+    assert repo.find_lead_by_phone("5550007777") is None
+    assert repo.stats["negative_hits"] == 1
+
+
+def test_reset_state_clears_failed_refreshes(monkeypatch):
+    tbl, repo, _clock = _repo(monkeypatch, "+15550000001")
+    tbl.fail = True
+    monkeypatch.setattr(datastore, "REPOSITORY", repo)
+    assert repo.find_lead_by_phone("5550000001") is None
+    assert repo.cache_stats()["refresh_failed"] == ["lead"]
+
+    datastore.reset_state()
+    assert repo.cache_stats()["refresh_failed"] == []
+    assert repo._index_retry_at == {}
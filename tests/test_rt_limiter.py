@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+
+import sms.outbound_batcher as ob
+import sms.rt as rt
+
+
+class CountingBackend:
+    """Shared-limiter stand-in: grants up to `cap` tokens, counts round-trips."""
+
+    def __init__(self, cap):
+        self.cap = cap
+        self.calls = []
+
+    def take_n(self, did, n, report=True):
+        self.calls.append(n)
+        assert report is False  # the lease reports blocks itself
+        granted = min(n, self.cap)
+        self.cap -= granted
+        return granted
+
+
+def test_lease_serves_many_sends_per_round_trip(monkeypatch):
+    window = ["w1"]
+    monkeypatch.setattr(rt, "_minute_bucket", lambda ts=None: window[0])
+    backend = CountingBackend(cap=25)
+    lim = rt._LeasedLimiter(backend, per_limit=100, lease_size=10)
+
+    assert sum(lim.take_n("+15550001", 1) for _ in range(10)) == 10
+    assert backend.calls == [10]
+    assert lim.take_n("+15550001", 12) == 12  # batch larger than the lease
+    assert backend.calls == [10, 12]
+
+    # Unused lease tokens die with the window; partial grants are passed through
+    window[0] = "w2"
+    assert lim.take_n("+15550001", 5) == 3
+    assert backend.calls == [10, 12, 10]
+
+
+def test_lease_top_up_shortfall_is_not_a_block(monkeypatch):
+    monkeypatch.setattr(rt, "_minute_bucket", lambda ts=None: "w1")
+    kpis = []
+    monkeypatch.setattr(rt, "log_kpi", lambda name, value, *a, **k: kpis.append((name, value)))
+    lim = rt._LeasedLimiter(CountingBackend(cap=4), per_limit=100, lease_size=10)
+
+    assert lim.take_n("+15550001", 3) == 3  # lease asked for 10, got 4: caller fully served
+    assert kpis == []
+    assert lim.take_n("+15550001", 3) == 1
+    assert kpis == [("RATE_LIMIT_BLOCK", 2)]
+
+
+def test_upstash_single_evalsha_with_eval_fallback(monkeypatch):
+    monkeypatch.setattr(rt, "UPSTASH_REDIS_REST_URL", "https://upstash.test")
+    monkeypatch.setattr(rt, "UPSTASH_REDIS_REST_TOKEN", "tok")
+    sent = []
+
+    def post(url, json=None, **_k):
+        sent.append(json)
+        if json[0] == "EVALSHA" and len(sent) == 1:
+            return SimpleNamespace(status_code=200, content=b"x", json=lambda: {"error": "NOSCRIPT No matching script"})
+        return SimpleNamespace(status_code=200, content=b"x", json=lambda: {"result": min(2, json[-3])})
+
+    monkeypatch.setattr(rt, "TRANSPORT", SimpleNamespace(post=post))
+    lim = rt._UpstashRestLimiter(5, 50)
+
+    assert lim.take_n("+15550002", 4) == 2
+    assert [c[0] for c in sent] == ["EVALSHA", "EVAL"]
+    assert sent[1][2] == 4 and len(sent[1]) == 3 + 4 + 5  # cmd, script, numkeys, 4 keys, 5 args
+
+    assert lim.take_n("+15550002", 1) == 1
+    assert [c[0] for c in sent][2:] == ["EVALSHA"]  # script cached → one request
+
+
+def test_batcher_reserves_per_did_and_refunds_shared_shortfall():
+    shared_calls = []
+
+    def shared(did, n):
+        shared_calls.append((did, n))
+        return n - 1
+
+    lim = ob._RateLimiter(5, 100, shared=shared)
+    assert lim.consume("+15550003", 8) == 4  # local cap 5, shared refuses one
+    assert shared_calls == [("+15550003", 5)]
+    assert lim._per_counts["+15550003"][0] == 4
+    assert lim.consume("+15550003", 1) == 0  # one refunded token left locally, shared refuses it
+    assert lim._per_counts["+15550003"][0] == 4
@@ -0,0 +1,70 @@
+from datetime import datetime, timezone
+
+from sms import outbound_batcher as ob
+from sms.outbox import Outbox
+from sms.send_window import SendWindow, recipient_tz
+
+# 03:30 UTC → 23:30 ET, 22:30 CT, 20:30 PT
+LATE = datetime(2026, 10, 16, 3, 30, tzinfo=timezone.utc)
+
+
+def test_timezone_from_area_code_then_market():
+    assert recipient_tz("+1 (213) 555-0101") == "America/Los_Angeles"
+    assert recipient_tz("+19155550101") == "America/Denver"  # El Paso override
+    assert recipient_tz("+15555550101", "Miami, FL") == "America/New_York"
+    assert recipient_tz("+15555550101", "North Dakota") == "America/Chicago"
+    assert recipient_tz("+15555550101") is None
+
+
+def test_window_is_evaluated_in_recipient_local_time():
+    w = SendWindow(21, 9, default_tz="America/Chicago")
+    assert w.check("+12135550101", None, LATE)[0] is True
+    ok, opens, tz = w.check("+17135550101", None, LATE)
+    assert not ok and tz == "America/Chicago"
+    assert opens == datetime(2026, 10, 16, 14, 0, tzinfo=timezone.utc)  # 09:00 CDT
+    assert w.any_open(LATE)
+    assert not SendWindow(21, 9, mode="global").any_open(LATE)
+
+
+class FakeDrip:
+    def __init__(self):
+        phones = ["+12135550101", "+17135550102", "+13055550103"]
+        self.rows = [
+            {"id": f"rec{i}", "fields": {"Status": "Queued", "Seller Phone Number": p,
+                                         "TextGrid Phone Number": "+15550000001", "Message": "hi"}}
+            for i, p in enumerate(phones)
+        ]
+        self.updates = []
+
+    def all(self, **_kw):
+        return self.rows
+
+    def update(self, rid, fields):
+        self.updates.append((rid, dict(fields)))
+
+
+class Sender:
+    @staticmethod
+    def send(**_kw):
+        return {"status": "sent"}
+
+
+def test_send_batch_releases_in_window_rows_and_defers_the_rest(monkeypatch):
+    drip = FakeDrip()
+    monkeypatch.setattr(ob, "get_table", lambda _b, name: drip if name == ob.DRIP_TABLE_NAME else None)
+    monkeypatch.setattr(ob, "utcnow", lambda: LATE)
+    monkeypatch.setattr(ob, "build_send_window", lambda: SendWindow(21, 9, default_tz="America/Chicago"))
+    monkeypatch.setattr(ob, "_campaign_status_map", lambda _ids: {})
+    monkeypatch.setattr(ob, "build_limiter", lambda: ob._RateLimiter(1000, 1000))
+    monkeypatch.setattr(ob, "MessageProcessor", Sender)
+    monkeypatch.setattr(ob, "increment_sent", lambda *_a, **_k: None)
+    monkeypatch.setattr(ob, "log_kpi", lambda *_a, **_k: None)
+    monkeypatch.setattr(ob, "log_run", lambda *_a, **_k: None)
+    monkeypatch.setattr(ob, "SLEEP_BETWEEN_SENDS_SEC", 0)
+    monkeypatch.setattr(ob, "OUTBOX", Outbox(path=":memory:"))
+
+    res = ob.send_batch(limit=10, workers=1)
+
+    assert res["total_sent"] == 1 and res["deferred_quiet"] == 2
+    deferred = {rid: f["Next Send Date"] for rid, f in drip.updates if f.get("Last Error") == "quiet_hours"}
+    assert deferred == {"rec1": "2026-10-16T14:00:00+00:00", "rec2": "2026-10-16T13:00:00+00:00"}
@@ -0,0 +1,60 @@
+import pytest
+
+from sms import campaign_runner as cr
+from sms.template_engine import TemplateCache, compile_template, render_many
+
+VALUES = {"First": "Ann", "Address": "12 Oak St", "Property_City": "Tulsa"}
+
+
+def test_format_syntax_matches_str_format_with_aliases_resolved_at_compile_time():
+    raw = "Hi {Owner First Name}, 100% about {Address} in {Property City}? {{not a slot}}"
+    tpl = compile_template(raw)
+    assert tpl.slots == ("First", "Address", "Property_City")
+    expected = tpl.text.format(**VALUES)
+    assert tpl.render(VALUES) == expected == "Hi Ann, 100% about 12 Oak St in Tulsa? {not a slot}"
+    assert compile_template(raw) is tpl  # compiled once per text
+
+    with pytest.raises(KeyError):
+        compile_template("Hi {Unknown}").render(VALUES)
+    assert compile_template("{Address:>12}").render(VALUES) == "   12 Oak St"  # format specs defer to str.format
+
+
+def test_campaign_tokens_keep_unknown_braces_and_render_many_matches_render():
+    tpl = compile_template("Hi {First}! Still own {Address} in {Property City}? {Other}", cr.TEMPLATE_SLOTS)
+    rows = [dict(VALUES, First=f"n{i}") for i in range(5)]
+    assert render_many(tpl, rows) == [tpl.render(r) for r in rows]
+    assert rows and render_many(tpl, rows)[0] == "Hi n0! Still own 12 Oak St in Tulsa? {Other}"
+
+    pf = {"Owner Name": "Bob Jones", "Property Address": ["9 Elm"], "Property City": "Waco"}
+    assert cr._render_message("  {First} at {Address}, {Property City}  ", pf) == "Bob at 9 Elm, Waco"
+
+
+def test_cache_recompiles_only_when_the_record_changes():
+    cache = TemplateCache()
+    rec = {"id": "tpl1", "fields": {"Message": "Hi {First}", "Last Modified": "2026-01-01T00:00:00.000Z"}}
+    first = cache.for_record(rec, "Message")
+    assert cache.for_record(rec, "Message") is first and cache.stats["hits"] == 1
+
+    rec["fields"].update({"Message": "Hello {First}", "Last Modified": "2026-01-02T00:00:00.000Z"})
+    assert cache.for_record(rec, "Message").render(VALUES) == "Hello Ann"
+    assert cache.stats["invalidations"] == 1
+    assert cache.for_record({"id": "tpl2", "fields": {"Message": "  "}}, "Message") is None
+
+
+def test_campaign_templates_fetched_once_per_run(monkeypatch):
+    fetched = []
+
+    def fake_fetch(_tbl, ids):
+        fetched.append(list(ids))
+        return [{"id": rid, "fields": {"Message": f"{rid} {{First}}"}} for rid in ids]
+
+    monkeypatch.setattr(cr, "_fetch_records_by_ids", fake_fetch)
+    monkeypatch.setattr(cr.CONNECTOR, "templates", lambda: type("H", (), {"table": object()})())
+    camps = [{"id": "c1", "fields": {"Templates": ["t1", "t2"]}}, {"id": "c2", "fields": {"Templates": ["t2"]}}]
+    known = cr._prefetch_templates(camps)
+    assert fetched == [["t1", "t2"]]
+
+    pairs = cr._fetch_template_messages(None, ["t2"], known)
+    assert fetched == [["t1", "t2"]] and pairs[0][0] == "t2"
+    prospects = [{"fields": {"Owner Name": "Cy"}}] * 3
+    assert cr._render_batch(pairs, prospects) == [("t2", "t2 Cy")] * 3
@@ -1,3 +1,6 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
 import pytest
 
 from sms import textgrid_sender as tg
@@ -37,3 +40,51 @@ def test_send_message_exposes_error_body(monkeypatch):
     assert exc.value.body == {"message": "Invalid number"}
     assert captured["meta"]["error_body"] == {"message": "Invalid number"}
 
+
+
+class _Pages:
+    """Provider message list, newest first, served `size` per page via next_page_uri."""
+
+    def __init__(self, dates, size=2):
+        self.msgs = [{"sid": f"SM{i}", "date_created": d} for i, d in enumerate(dates)]
+        self.size = size
+        self.urls = []
+
+    def request(self, method, url, params=None, **_kw):
+        self.urls.append(url)
+        page = int(url.rsplit("Page=", 1)[1]) if "Page=" in url else 0
+        chunk = self.msgs[page * self.size:(page + 1) * self.size]
+        more = (page + 1) * self.size < len(self.msgs)
+        body = {"messages": chunk, "next_page_uri": f"/2010-04-01/Accounts/AC123/Messages.json?Page={page + 1}" if more else None}
+        return SimpleNamespace(status_code=200, json=lambda: body)
+
+
+def _lookup_env(monkeypatch, transport):
+    monkeypatch.setattr(tg, "DRY_RUN", False)
+    monkeypatch.setattr(tg, "ACCOUNT_SID", "AC123")
+    monkeypatch.setattr(tg, "AUTH_TOKEN", "token")
+    monkeypatch.setattr(tg, "API_URL", "https://api.textgrid.com/2010-04-01/Accounts/AC123/Messages.json")
+    monkeypatch.setattr(tg, "TRANSPORT", transport)
+
+
+def test_find_messages_follows_pages_until_the_window_is_covered(monkeypatch):
+    since = datetime(2025, 10, 14, 12, 0, tzinfo=timezone.utc)
+    dates = ["Tue, 14 Oct 2025 12:05:00 +0000"] * 3 + ["Tue, 14 Oct 2025 11:00:00 +0000"] * 4
+    transport = _Pages(dates)
+    _lookup_env(monkeypatch, transport)
+
+    found = tg.find_messages(to="+15551234567", from_number=None, since=since)
+
+    assert [m["sid"] for m in found] == ["SM0", "SM1", "SM2", "SM3"]
+    assert len(transport.urls) == 2  # stopped once a page reached back past `since`
+    assert transport.urls[1] == "https://api.textgrid.com/2010-04-01/Accounts/AC123/Messages.json?Page=1"
+
+
+def test_find_messages_truncated_window_is_unknown(monkeypatch):
+    since = datetime(2025, 10, 14, 12, 0, tzinfo=timezone.utc)
+    transport = _Pages(["Tue, 14 Oct 2025 12:05:00 +0000"] * 10)
+    _lookup_env(monkeypatch, transport)
+    monkeypatch.setattr(tg, "LOOKUP_MAX_PAGES", 3)
+
+    assert tg.find_messages(to="+15551234567", from_number=None, since=since) is None
+    assert len(transport.urls) == 3
@@ -0,0 +1,106 @@
+import threading
+import time
+
+import sms.worker as worker
+
+
+def _step(name, fn, every=0.05, timeout=5.0, *work_keys):
+    return worker.Step(name=name, fn=fn, every_sec=every, timeout_sec=timeout, work_keys=work_keys)
+
+
+def test_run_safely_returns_at_timeout_instead_of_joining():
+    release = threading.Event()
+
+    def hung():
+        release.wait(5)
+        return {"ok": True}
+
+    t0 = time.monotonic()
+    res = worker._run_safely(hung, timeout_sec=0.2)
+    release.set()
+    assert res["ok"] is False and "Timeout" in res["error"]
+    assert time.monotonic() - t0 < 1.0
+
+
+def test_hung_step_does_not_hold_up_other_steps(monkeypatch):
+    monkeypatch.setattr(worker, "JITTER_SEC", 0)
+    monkeypatch.setattr(worker, "IDLE_INTERVAL_SEC", 0)
+    monkeypatch.setattr(worker, "BACKOFF_BASE", 0.0)
+    release = threading.Event()
+    cancelled = []
+    fast_runs = []
+
+    def slow():
+        while not worker.cancel_requested():
+            time.sleep(0.01)
+        cancelled.append(True)
+        release.wait(5)
+        return {"ok": True}
+
+    def fast():
+        fast_runs.append(time.monotonic())
+        return {"ok": True, "processed": 1, "backlog": 7}
+
+    stop = threading.Event()
+    sched = worker.Scheduler(
+        [_step("metrics", slow, timeout=0.3), _step("autoresponder", fast, 0.05, 5.0, "processed")],
+        pool=worker._Pool(4), stop=stop, max_runs=0,
+    )
+    threading.Timer(0.8, stop.set).start()
+    sched.run(report_every=60)
+    release.set()
+
+    status = sched.status()
+    assert status["metrics"]["timeouts"] == 1 and cancelled == [True]
+    assert len(fast_runs) >= 5  # kept its own cadence while metrics was stuck
+    assert status["autoresponder"]["backlog"] == 7 and status["autoresponder"]["last_duration"] is not None
+
+
+def test_run_once_runs_every_step_concurrently(monkeypatch):
+    barrier = threading.Barrier(3, timeout=2)
+    steps = [_step(n, lambda: {"ok": True, "n": barrier.wait()}) for n in ("campaigns", "send_batch", "retry")]
+    sched = worker.Scheduler(steps, pool=worker._Pool(3), stop=threading.Event(), max_runs=1)
+
+    sched.run(report_every=60)
+
+    assert sched.done()
+    assert all(s.stats["runs"] == 1 and s.stats["failures"] == 0 for s in steps)
+
+
+class FakeRedis:
+    """SET NX EX plus the two compare-and-act scripts Dist uses, on a monotonic clock."""
+
+    def __init__(self):
+        self.keys = {}  # key -> (value, expires_at)
+
+    def _live(self, key):
+        val = self.keys.get(key)
+        return val[0] if val and val[1] > time.monotonic() else None
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and self._live(key) is not None:
+            return False
+        self.keys[key] = (value, time.monotonic() + ex)
+        return True
+
+    def eval(self, script, _numkeys, key, token, *args):
+        if self._live(key) != token:
+            return 0
+        if "EXPIRE" in script:
+            self.keys[key] = (token, time.monotonic() + float(args[0]))
+        else:
+            del self.keys[key]
+        return 1
+
+
+def test_dist_lock_is_kept_while_a_hung_holder_runs():
+    dist = worker.Dist()
+    dist.r = FakeRedis()
+
+    with dist.lock("metrics", ttl=0.3) as ok:
+        assert ok
+        time.sleep(1.0)  # > 3× the TTL: the holder is stuck past its timeout
+        with dist.lock("metrics", ttl=0.3) as other:
+            assert other is False
+    with dist.lock("metrics", ttl=0.3) as again:
+        assert again  # released on exit